@@ -26,6 +26,8 @@ def after_post(this, solution):# Do not edit this line
     lengthUnitStr = 'in'            # DESIRED LENGTH OUTPUT UNIT (usually 'in' or 'mm')
     forceUnitStr = 'lbf'            # DESIRED FOURCE OUTPUT UNIT (usually 'lbf' or 'N')
     momentUnitStr = forceUnitStr + '*' + lengthUnitStr                  # Desired moment/torque output unit
+    GLOBAL_COMPONENTS = 'n'         # ALSO WRITE FORCE AND MOMENT COMPONENTS IN THE GLOBAL CSYS (must be one of 'y' or 'n')
+    REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
     #################################################################################
 
     import wbjn
@@ -34,6 +36,11 @@ def after_post(this, solution):# Do not edit this line
     import mech_dpf
     import Ans.DataProcessing as dpf
     import materials
+    import sys
+    if REPO_DIR not in sys.path:
+        sys.path.append(REPO_DIR)
+    from mech_lib import smisc_reader
+    from mech_lib import joint_reactions as jr
     cmd = 'returnValue(GetUserFilesDirectory())'
     user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
     mech_dpf.setExtAPI(ExtAPI)
@@ -58,16 +65,16 @@ def after_post(this, solution):# Do not edit this line
 
     ################### End Parameters ########################
 
-    def writeCSV(filename, data, cols):
+    def writeCSVRows(filename, rows, cols):
         """
-        Function to write python data to a csv file.
+        Function to write rows of python data to a csv file as they are produced.
         
         Parameters
         ----------
         filename : str
             Filepath for the output file
-        data : dict
-            Data dictionary
+        rows : iterable of list
+            Rows of data, e.g. a generator that yields one row at a time
         cols : list of str
             Column header names
         
@@ -78,7 +85,7 @@ def after_post(this, solution):# Do not edit this line
         with open(filename, 'wb') as csvfile:
             writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
             writer.writerow(cols)
-            writer.writerows(zip(*[data[col] for col in cols]))
+            writer.writerows(rows)
 
 
     def computeEquivStress(combStrs, torStrs):
@@ -144,102 +151,46 @@ def after_post(this, solution):# Do not edit this line
     # Get all joints and the element information
     joints = {}
     joint_conns = DataModel.GetObjectsByType(DataModelObjectCategory.Joint)
-    jointElemIds = [solver_data.GetObjectData(joint).ElementId for joint in joint_conns]
-    jointNames = [j.Name for j in joint_conns]
-    jointTypes = [j.Type for j in joint_conns]
-    
-    for j, eid in zip(joint_conns, jointElemIds):
+    free = Ansys.Mechanical.DataModel.Enums.FixedOrFree.Free
+    for j in joint_conns:
+        eid = solver_data.GetObjectData(j).ElementId
         if eid != 0:
-            joints[eid]={}
-            joints[eid]['Name'] = j.Name
-            joints[eid]['TranslationX'] = j.TranslationX
-            joints[eid]['TranslationY'] = j.TranslationY
-            joints[eid]['TranslationZ'] = j.TranslationZ
-            joints[eid]['Rotations'] = j.Rotations
-            joints[eid]['Conn ID'] = j.ObjectId
-            joints[eid]['Type'] = j.Type
-            joints[eid]['times'] = all_times
-            joints[eid]['FX'] = []
-            joints[eid]['FY'] = []
-            joints[eid]['FZ'] = []
-            joints[eid]['F_total'] = []
-            joints[eid]['MX'] = []
-            joints[eid]['MY'] = []
-            joints[eid]['MZ'] = []
-            joints[eid]['M_total'] = []
-    
-    jointElemIds = [j for j in jointElemIds if j != 0]
-    
-    # Joint Element Scoping
-    jointElem_scoping = dpf.Scoping()
-    jointElem_scoping.Location = "Elemental"
-    jointElem_scoping.Ids = joints.keys()
-    
-    # Get Field data
-    # item_index is the SMISC item ID found in MPC184 documentation
-    # FX = axial force in X-dir, FY = axial force in Y-dir, FZ = axial force in Z-dir 
-    # MX = Bending moment in X-dir, MY = Bending moment in Y-dir, MZ = Bending Moment in Z-dir
-    
-    force_fields_idx = {'FX': 1, 'FY': 2, 'FZ': 3, 'JEF1': 43, 'JEF2': 44, 'JEF3': 45}
-    moment_fields_idx = {'MX': 4, 'MY': 5, 'MZ': 6, 'JEF4': 46, 'JEF5': 47, 'JEF6': 48}
-    
-    force_fields = {}
-    moment_fields = {}
+            joints[eid] = j
+
+    joint_keys = sorted(joints.keys())
+    nTimes = len(timeScoping.Ids)
+
+    # Free/fixed state of the six DOFs of each joint, read once per joint
+    masks = []
+    prefix = []
+    matrices = []
+    for eid in joint_keys:
+        j = joints[eid]
+        masks.append(jr.dof_mask(j.TranslationX == free, j.TranslationY == free, j.TranslationZ == free,
+                                 jr.rotation_dofs(j.Rotations)))
+        prefix.append([j.Name, j.Type, eid, j.ObjectId])
+        if GLOBAL_COMPONENTS == 'y'.ToLower():
+            csys = j.ReferenceCoordinateSystem
+            matrices.append(jr.csys_matrix(csys.XAxis, csys.YAxis, csys.ZAxis))
+
+    # Read every SMISC item in one pass.
+    # Take negative value from SMISC output to get correct reaction force direction and convert to the output units.
+    forceFactor = (solForceQuan / forceQuan).Value
+    momentFactor = (solMomentQuan / momentQuan).Value
+    factors = {}
+    for k in jr.JOINT_ITEMS:
+        if k in jr.FORCE_ITEMS:
+            factors[k] = -forceFactor
+        else:
+            factors[k] = -momentFactor
+    smiscSource = smisc_reader.DpfSmiscSource(dataSource)
+    items = smisc_reader.read_smisc_block(smiscSource, jr.JOINT_ITEMS, joint_keys, timeIds, factors)
+
+    # Constraint or joint element reaction of every DOF, selected with the masks, and the totals
+    # (components in the reference coordinate system of each joint)
+    res = jr.compute_joint_reactions(items, masks, nTimes)
+    keys = jr.COLUMN_KEYS
 
-    # Create force and moment operator
-    smiscOp = dpf.operators.result.smisc()
-    smiscOp.inputs.data_sources.Connect(dataSource)
-    smiscOp.inputs.time_scoping.Connect(timeScoping)
-    smiscOp.inputs.mesh_scoping.Connect(jointElem_scoping)
-
-    for k, v in force_fields_idx.items():
-        smiscOp.inputs.item_index.Connect(v)
-        force_fields[k] = smiscOp.outputs.fields_container.GetData()
-    for k, v in moment_fields_idx.items():
-        smiscOp.inputs.item_index.Connect(v)
-        moment_fields[k] = smiscOp.outputs.fields_container.GetData()
-
-    # Place the axial force and moment reactions into the data dictionary.
-    # Take negative value from SMISC output to get correct reaction force direction.
-    for t in range(len(timeScoping.Ids)):
-        for i, eid in enumerate(force_fields['FX'][t].ScopingIds):
-            fx = -force_fields['FX'][t].Data[i]
-            fy = -force_fields['FY'][t].Data[i]
-            fz = -force_fields['FZ'][t].Data[i]
-            mx = -moment_fields['MX'][t].Data[i]
-            my = -moment_fields['MY'][t].Data[i]
-            mz = -moment_fields['MZ'][t].Data[i]
-            if joints[eid]['TranslationX'] == Ansys.Mechanical.DataModel.Enums.FixedOrFree.Free:
-                fx = -force_fields['JEF1'][t].Data[i]
-            if joints[eid]['TranslationY'] == Ansys.Mechanical.DataModel.Enums.FixedOrFree.Free:
-                fy = -force_fields['JEF2'][t].Data[i]
-            if joints[eid]['TranslationZ'] == Ansys.Mechanical.DataModel.Enums.FixedOrFree.Free:
-                fz = -force_fields['JEF3'][t].Data[i]
-            if joints[eid]['Rotations'] == Ansys.Mechanical.DataModel.Enums.JointRotationDOFType.FreeAll:
-                mx = -moment_fields['JEF4'][t].Data[i]
-                my = -moment_fields['JEF5'][t].Data[i]
-                mz = -moment_fields['JEF6'][t].Data[i]
-            elif joints[eid]['Rotations'] == Ansys.Mechanical.DataModel.Enums.JointRotationDOFType.FreeX:
-                mx = -moment_fields['JEF4'][t].Data[i]
-            elif joints[eid]['Rotations'] == Ansys.Mechanical.DataModel.Enums.JointRotationDOFType.FreeY:
-                my = -moment_fields['JEF5'][t].Data[i]
-            elif joints[eid]['Rotations'] == Ansys.Mechanical.DataModel.Enums.JointRotationDOFType.FreeZ:
-                mz = -moment_fields['JEF6'][t].Data[i]
-            else:
-                pass
-            f_total = (fx**2 + fy**2 + fz**2)**0.5
-            m_total = (mx**2 + my**2 + mz**2)**0.5
-            joints[eid]['FX'].append(fx * solForceQuan)
-            joints[eid]['FY'].append(fy * solForceQuan)
-            joints[eid]['FZ'].append(fz * solForceQuan)
-            joints[eid]['F_total'].append(f_total * solForceQuan)
-            joints[eid]['MX'].append(mx * solMomentQuan)
-            joints[eid]['MY'].append(my * solMomentQuan)
-            joints[eid]['MZ'].append(mz * solMomentQuan)
-            joints[eid]['M_total'].append(m_total * solMomentQuan)
-            
-    # Create data dictionary to written to output csv file
-    data = {}
     cols = ['Joint Connection Name',
             'Joint Type',
             'Joint Element ID',
@@ -254,34 +205,34 @@ def after_post(this, solution):# Do not edit this line
             'MY ' + momentUnit,
             'MZ ' + momentUnit,
             'M Total ' + momentUnit]
-    
-    for c in cols:
-        data[c] = []
-
-    for eid in sorted(joints.keys()):
-        for t in range(len(timeScoping.Ids)):
-            data[cols[0]].append(joints[eid]['Name'])
-            data[cols[1]].append(joints[eid]['Type'])
-            data[cols[2]].append(eid)
-            data[cols[3]].append(joints[eid]['Conn ID'])
-            data[cols[4]].append(joints[eid]['times'][t])
-            if str(analysis_type).ToLower().Contains('spectrum'): 
-                data[cols[5]].append(timeIds[0])
-            else:
-                data[cols[5]].append(t+1)
-            data[cols[6]].append(joints[eid]['FX'][t] / forceQuan)
-            data[cols[7]].append(joints[eid]['FY'][t] / forceQuan)
-            data[cols[8]].append(joints[eid]['FZ'][t] / forceQuan)
-            data[cols[9]].append(joints[eid]['F_total'][t] / forceQuan)
-            data[cols[10]].append(joints[eid]['MX'][t] / momentQuan)
-            data[cols[11]].append(joints[eid]['MY'][t] / momentQuan)
-            data[cols[12]].append(joints[eid]['MZ'][t] / momentQuan)
-            data[cols[13]].append(joints[eid]['M_total'][t] / momentQuan)
-      
+    if GLOBAL_COMPONENTS == 'y'.ToLower() and str(analysis_type).ToLower().Contains('spectrum'):
+        # Combined (RMS/SRSS) components are not vectors and cannot be rotated
+        print("[WARNING] Global components are not written for spectrum analysis " + analysis.Name)
+    elif GLOBAL_COMPONENTS == 'y'.ToLower() and getattr(analysis.AnalysisSettings, 'LargeDeflection', False):
+        # The reference coordinate system of a joint turns with the joint, its undeformed axes would give wrong
+        # global components
+        print("[WARNING] Global components are not written for large deflection analysis " + analysis.Name)
+    elif GLOBAL_COMPONENTS == 'y'.ToLower():
+        # Rotate all joints and times to the global coordinate system in one pass
+        res.update(jr.global_components(res, matrices, nTimes))
+        keys = jr.COLUMN_KEYS + jr.GLOBAL_KEYS
+        cols += ['FX Global ' + forceUnit,
+                 'FY Global ' + forceUnit,
+                 'FZ Global ' + forceUnit,
+                 'MX Global ' + momentUnit,
+                 'MY Global ' + momentUnit,
+                 'MZ Global ' + momentUnit]
+
+    times = [all_times[t] for t in range(nTimes)]
+    if str(analysis_type).ToLower().Contains('spectrum'):
+        sets = [timeIds[0]] * nTimes
+    else:
+        sets = [t+1 for t in range(nTimes)]
+    rows = jr.joint_rows(res, prefix, times, sets, keys)
 
     x = datetime.datetime.now()
-    
+
     file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Joint_Reactions_' + x.strftime("%m-%d-%y")
-    writeCSV(user_dir + '/' + file_name_body + ".csv", data, cols)
+    writeCSVRows(user_dir + '/' + file_name_body + ".csv", rows, cols)
     
     model.ReleaseStreams()
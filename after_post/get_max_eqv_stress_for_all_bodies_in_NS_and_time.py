@@ -33,6 +33,7 @@ def after_post(this, solution):# Do not edit this line
     # Set the scale factor for Random Vibration Analyses
     # The last part of the Enumeration can be (Sigma1, Sigma2, Sigma3, UserDefined)
     SCALE_FACTOR = Ansys.Mechanical.DataModel.Enums.ScaleFactorType.Sigma3
+    REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
     #################################################################################
 
     import wbjn
@@ -41,6 +42,10 @@ def after_post(this, solution):# Do not edit this line
     import mech_dpf
     import Ans.DataProcessing as dpf
     import materials
+    import sys
+    if REPO_DIR not in sys.path:
+        sys.path.append(REPO_DIR)
+    from mech_lib.fields import NonEmptyFields
     cmd = 'returnValue(GetUserFilesDirectory())'
     user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
     mech_dpf.setExtAPI(ExtAPI)
@@ -182,7 +187,7 @@ def after_post(this, solution):# Do not edit this line
     seqvOp.inputs.time_scoping.Connect(timeScoping)
     
     # Create the min-max operator
-    minMaxOp = dpf.operators.min_max.min_max_fc()
+    minMaxOp = dpf.operators.min_max.min_max()
     
     # Create the unit convert operator
     unitConvOp = dpf.operators.math.unit_convert_fc()
@@ -235,29 +240,16 @@ def after_post(this, solution):# Do not edit this line
         # Scale the von Mises stress
         vmStressFC = unitConvOp.outputs.fields_container
         scaleOp.inputs.fields_container.Connect(vmStressFC)
-        vmStress = scaleOp.outputs.fields_container.GetData()
-        
-        # Remove fields with 0 entities by creating a new fields container by adding fields
-        # if they are greater than zero.
-        # Create empry fields_container and set label space equal to that of the stress FC
-        fc = dpf.FieldsContainer()
-        fc.Labels = list(vmStress.GetLabelSpace(0).Keys)
-        fcLblSpcLen = len(fc.Labels)
-        # Get fields with more than zero entities
-        j = 1
-        for i in range(vmStress.FieldCount):
-            if vmStress[i].ElementaryDataCount > 0:
-                fc.Add(vmStress[i],vmStress.GetLabelSpace(i))
-                j = j + 1
+        # Skip the fields with 0 entities
+        vmStress = NonEmptyFields(scaleOp.outputs.fields_container.GetData())
         
         # Get the maximum von Mises stress for all times
-        minMaxOp.inputs.fields_container.Connect(fc)
-        maxVmStress = minMaxOp.outputs.field_max.GetData()
-        
         for t in range(len(timeScoping.Ids)):
+            minMaxOp.inputs.field.Connect(vmStress[t])
+            maxVmStress = minMaxOp.outputs.field_max.GetData()
             res[nid]['Times'].append(all_times[t])
             res[nid]['Sets'].append(timeScoping.Ids[t])
-            res[nid]['Max Eqv. Stress'].append(maxVmStress.Data[t])
+            res[nid]['Max Eqv. Stress'].append(maxVmStress.Data[0])
         
     # Create data dictionary to written to output csv file
     data = {}
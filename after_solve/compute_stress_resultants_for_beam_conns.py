@@ -33,6 +33,9 @@ def after_solve(this, analysis):# Do not edit this line
         stressUnitStr = forceUnitStr + '*' + lengthUnitStr + '^-2'          # Desired stress output unit
     momentUnitStr = forceUnitStr + '*' + lengthUnitStr                  # Desired moment/torque output unit
     stiffnessUnitStr = forceUnitStr + '*' + lengthUnitStr + '^-1'       # Desired stiffness output unit
+    TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE (0 = ALL, > 0 BOUNDS MEMORY FOR LONG TRANSIENTS)
+    ENVELOPE_ONLY = 'n'             # ONE ROW PER BEAM WITH THE MAXIMUM OVER ALL TIMES (must be one of 'y' or 'n')
+    REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
     #################################################################################
 
     import wbjn
@@ -41,6 +44,12 @@ def after_solve(this, analysis):# Do not edit this line
     import mech_dpf
     import Ans.DataProcessing as dpf
     import materials
+    import sys
+    if REPO_DIR not in sys.path:
+        sys.path.append(REPO_DIR)
+    from mech_lib import beam_resultants as br
+    from mech_lib import smisc_reader
+    from mech_lib import beam_table
     cmd = 'returnValue(GetUserFilesDirectory())'
     user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
     mech_dpf.setExtAPI(ExtAPI)
@@ -100,16 +109,16 @@ def after_solve(this, analysis):# Do not edit this line
 
     ################### End Parameters ########################
 
-    def writeCSV(filename, data, cols):
+    def writeCSVRows(filename, rows, cols):
         """
-        Function to write python data to a csv file.
+        Function to write rows of python data to a csv file as they are produced.
         
         Parameters
         ----------
         filename : str
             Filepath for the output file
-        data : dict
-            Data dictionary
+        rows : iterable of list
+            Rows of data, e.g. a generator that yields one row at a time
         cols : list of str
             Column header names
         
@@ -120,26 +129,8 @@ def after_solve(this, analysis):# Do not edit this line
         with open(filename, 'wb') as csvfile:
             writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
             writer.writerow(cols)
-            writer.writerows(zip(*[data[col] for col in cols]))
+            writer.writerows(rows)
 
-
-    def computeEquivStress(combStrs, torStrs):
-        """
-        Function to compute the von Mises equivalent stress given the combined and torsional stresses
-        
-        Parameters
-        ----------
-        combStrs : stress Quantity
-            Combined stress = direct stress plus bending stress
-        torStrs : stress Quantity
-            Torsional stress
-        
-        Returns
-        von Mises stress Quantity
-        """
-        return (combStrs**2 + 3.0*torStrs**2)**(0.5)
-
-       
     # Model and time steps
     all_times = model.TimeFreqSupport.TimeFreqs.Data
     timeUnitStr = str(model.TimeFreqSupport.TimeFreqs.Unit)               # Time stepping unit
@@ -162,161 +153,44 @@ def after_solve(this, analysis):# Do not edit this line
     timeScoping.Ids = timeIds
     timeScoping.Location = 'Time'
     
-    # Get all materials and properties
-    mats = {}
-    matList = ExtAPI.DataModel.Project.Model.Materials.Children
-    matNames = [m.Name for m in matList]
-    matEDs = [m.GetEngineeringDataMaterial() for m in matList]
-    matProps = [materials.GetListMaterialProperties(ed) for ed in matEDs]
-    for n, ed, p in zip(matNames, matEDs, matProps):
-        if 'Elasticity' in p:
-            elasticity = materials.GetMaterialPropertyByName(ed, "Elasticity")
-            if "Young's Modulus" in elasticity:
-                mats[n] = {}
-                mats[n]['ElasticModulus'] = elasticity["Young's Modulus"][1] * Quantity('1 ['+ elasticity["Young's Modulus"][0] + ']')
-
-    # Get all beams and the element information
-    beams = {}
+    # Beam connection table, read through the API only when the beams, their sections or the mesh have changed
     beam_conns = DataModel.GetObjectsByType(DataModelObjectCategory.Beam)
-    beamElemIds = [solver_data.GetObjectData(beam).ElementId for beam in beam_conns]
-    
-    for b, eid in zip(beam_conns, beamElemIds):
-        if eid != 0:
-            beams[eid]={}
-            beams[eid]['Name'] = b.Name
-            beams[eid]['Conn ID'] = b.ObjectId
-            xr = b.ReferenceXCoordinate
-            yr = b.ReferenceYCoordinate
-            zr = b.ReferenceZCoordinate
-            xm = b.MobileXCoordinate
-            ym = b.MobileYCoordinate
-            zm = b.MobileZCoordinate
-            l = ((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5)
-            beams[eid]['len'] = l
-            beams[eid]['Material'] = b.Material
-            rad = b.Radius
-            beams[eid]['rad'] = rad
-            area = pi*rad**2
-            beams[eid]['area'] = area
-            beams[eid]['dia'] = 2.0*rad
-            beams[eid]['I'] = pi*rad**4/4.0
-            beams[eid]['J'] = pi*rad**4/2.0
-            if b.Material in mats.keys():
-                modulus = mats[b.Material]['ElasticModulus']
-                stiffness = modulus*area/l
-                beams[eid]['Stiffness'] = stiffness
-            beams[eid]['times'] = all_times
-            beams[eid]['FX'] = []
-            beams[eid]['Shear Force'] = []
-            beams[eid]['Bending Moment'] = []
-            beams[eid]['Torque'] = []
-            beams[eid]['Direct Stress'] = []
-            beams[eid]['Bending Stress'] = []
-            beams[eid]['Torsional Stress'] = []
-            beams[eid]['Equivalent Stress'] = []
-            beams[eid]['Combined Stress'] = []
-    
-    beamElemIds = [b for b in beamElemIds if b != 0]
-    xRefCoords = [b.ReferenceXCoordinate for b in beam_conns]
-    yRefCoords = [b.ReferenceYCoordinate for b in beam_conns]
-    zRefCoords = [b.ReferenceZCoordinate for b in beam_conns]
-    xMobCoords = [b.MobileXCoordinate for b in beam_conns]
-    yMobCoords = [b.MobileYCoordinate for b in beam_conns]
-    zMobCoords = [b.MobileZCoordinate for b in beam_conns]
-    beamLengths = [((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5) for xr, yr ,zr, xm, ym, zm in zip(xRefCoords, yRefCoords, zRefCoords, xMobCoords, yMobCoords, zMobCoords)]
-    beamMats = [b.Material for b in beam_conns]
-    
-    # Beam Element Scoping
-    beamElem_scoping = dpf.Scoping()
-    beamElem_scoping.Location = "Elemental"
-    beamElem_scoping.Ids = beams.keys()
-    
+    tableFile = user_dir + '/' + analysis.Name + ' - beam_table.json'
+    moduli = beam_table.material_moduli(Model.Materials.Children)
+    tableKey = beam_table.beam_model_key(beam_conns, solver_data, moduli, analysis.MeshData)
+    table = beam_table.load_or_build(tableFile, tableKey, lambda: beam_table.beam_records(beam_conns, solver_data, moduli)).solved()
+    table = table.with_lengths(beam_table.mesh_beam_lengths(my_mesh, table.element_id))
+    beam_keys = table.element_id
+    nBeams = len(beam_keys)
+    nTimes = len(timeScoping.Ids)
+
+    # Beam geometry and axial stiffness as floats in the desired output units
+    section = table.geometry((Quantity(1, 'mm') / lengthQuan).Value, (Quantity(1, 'MPa') / stressQuan).Value)
+    beamRads = section['radius']
+
     analysis_settings = analysis.AnalysisSettings
 
     # Get Field data
-    # item_index is the SMISC item ID found in BEAM188 documentation
-    # FX = axial force, MY = Bending moment in Y-dir, MZ = Bending Moment in Z-dir, TQ = torque, SFz = Shear Force in Z-dir, SFy = Shear force in Y-dir
+    # SMISC item indices for BEAM188 are defined in br.FORCE_ITEMS and br.MOMENT_ITEMS
     # SDIR = direct stress from axial loading
     # SByT = Bending stress on top in Y-dir, SByB = Bending stress on bottom in Y-dir
     # SBzT = Bending stress on top in Z-dir, SBzB = Bending stress on bottom in Z-dir
-    
-    #force_fields_idx = {'FX_I': 1, 'FX_J': 14, 'SFz_I': 5, 'SFz_J': 18, 'SFy_I': 6, 'SFy_J': 19}
-    force_fields_idx = {'FX_I': 1, 'FX_J': 14, 'SFz_I': 5, 'SFz_J': 18, 'SFy_I': 6, 'SFy_J': 19}
-    moment_fields_idx = {'MY_I': 2, 'MY_J': 15, 'MZ_I': 3, 'MZ_J': 16, 'TQ_I': 4, 'TQ_J': 17}
-    #moment_fields_idx = {'MY_I': 2, 'MY_J': 15, 'MZ_I': 3, 'MZ_J': 16}
     stress_fields_idx = {'SDIR_I': 31, 'SDIR_J': 36, 'SByT_I': 32, 'SByT_J': 37, 'SByB_I': 33, 'SByB_J': 38, 'SBzT_I': 34, 'SBzT_J': 39, 'SBzB_I': 35, 'SBzB_J': 40}
     
-    force_fields = {}
-    moment_fields = {}
+    # Conversion factors from solver units to the desired output units
+    forceFactor = (solForceQuan / forceQuan).Value
+    momentFactor = (solMomentQuan / momentQuan).Value
 
-    # Create force and moment operator
-    smiscOp = dpf.operators.result.smisc()
-    smiscOp.inputs.data_sources.Connect(dataSource)
-    smiscOp.inputs.time_scoping.Connect(timeScoping)
-    smiscOp.inputs.mesh_scoping.Connect(beamElem_scoping)
-
-    for k, v in force_fields_idx.items():
-        smiscOp.inputs.item_index.Connect(v)
-        force_fields[k] = smiscOp.outputs.fields_container.GetData()
-    for k, v in moment_fields_idx.items():
-        smiscOp.inputs.item_index.Connect(v)
-        moment_fields[k] = smiscOp.outputs.fields_container.GetData()
-        
-    # Place the axial forces and direct stresses into the data dictionary
-    for t in range(len(timeScoping.Ids)):
-        for i, eid in enumerate(force_fields['FX_I'][t].ScopingIds):
-            F_I = force_fields['FX_I'][t].Data[i]
-            F_J = force_fields['FX_J'][t].Data[i]
-            if abs(F_I) >= abs(F_J):
-                f = F_I * solForceQuan
-            else:
-                f = F_J * solForceQuan
-            beams[eid]['FX'].append(f)
-            SFz_I = force_fields['SFz_I'][t].Data[i]
-            SFy_I = force_fields['SFy_I'][t].Data[i]
-            SFz_J = force_fields['SFz_J'][t].Data[i]
-            SFy_J = force_fields['SFy_J'][t].Data[i]
-            SF_I = (SFz_I**2 + SFy_I**2)**(0.5)
-            SF_J = (SFz_J**2 + SFy_J**2)**(0.5)
-            if abs(SF_I) >= abs(SF_J):
-                beams[eid]['Shear Force'].append(SF_I * solForceQuan)
-            else:
-                beams[eid]['Shear Force'].append(SF_J * solForceQuan)
-            s = f/beams[eid]['area']
-            beams[eid]['Direct Stress'].append(s)
-            
-    # Compute the equivalent stress at I and J.  Record whichever result is larger in magnitude in the data dictionary.
-    for t in range(len(timeScoping.Ids)):
-        for i, eid in enumerate(moment_fields['MY_I'][t].ScopingIds):
-            M_I = (moment_fields['MY_I'][t].Data[i]**2 + moment_fields['MZ_I'][t].Data[i]**2)**(0.5)*solMomentQuan
-            M_J = (moment_fields['MY_J'][t].Data[i]**2 + moment_fields['MZ_J'][t].Data[i]**2)**(0.5)*solMomentQuan
-            TQ_I = moment_fields['TQ_I'][t].Data[i]*solMomentQuan
-            TQ_J = moment_fields['TQ_J'][t].Data[i]*solMomentQuan
-            bendStr_I = M_I * beams[eid]['rad'] / beams[eid]['I']
-            bendStr_J = M_J * beams[eid]['rad'] / beams[eid]['I']
-            combStr_I = beams[eid]['Direct Stress'][t] + bendStr_I
-            combStr_J = beams[eid]['Direct Stress'][t] + bendStr_J
-            torStr_I = TQ_I * beams[eid]['rad'] / beams[eid]['J']
-            torStr_J = TQ_J * beams[eid]['rad'] / beams[eid]['J']
-            eqvStr_I = computeEquivStress(combStr_I, torStr_I)
-            eqvStr_J = computeEquivStress(combStr_J, torStr_J)
-            if abs(eqvStr_I) >= abs(eqvStr_J):
-                beams[eid]['Bending Moment'].append(M_I)
-                beams[eid]['Torque'].append(TQ_I)
-                beams[eid]['Bending Stress'].append(bendStr_I)
-                beams[eid]['Torsional Stress'].append(torStr_I)
-                beams[eid]['Equivalent Stress'].append(eqvStr_I)
-                beams[eid]['Combined Stress'].append(combStr_I)
-            else:
-                beams[eid]['Bending Moment'].append(M_J)
-                beams[eid]['Torque'].append(TQ_J)
-                beams[eid]['Bending Stress'].append(bendStr_J)
-                beams[eid]['Torsional Stress'].append(torStr_J)
-                beams[eid]['Equivalent Stress'].append(eqvStr_J)
-                beams[eid]['Combined Stress'].append(combStr_J)
+    # Read every SMISC item in one pass, scaled to the desired output units
+    factors = {}
+    for k in br.BEAM_ITEMS:
+        if k in br.FORCE_ITEMS:
+            factors[k] = forceFactor
+        else:
+            factors[k] = momentFactor
+    smiscSource = smisc_reader.DpfSmiscSource(dataSource)
     
-    # Create data dictionary to written to output csv file
-    data = {}
+    # Output columns
     cols = ['Beam Connection Name',
             'Beam Element ID',
             'Beam Connection ID',
@@ -339,45 +213,41 @@ def after_solve(this, analysis):# Do not edit this line
             'Combined Stress ' + stressUnit,
             'Torsional Stress ' + stressUnit]
     
-    for c in cols:
-        data[c] = []
-
-    beam_keys = sorted(beams.keys())
-    for eid in beam_keys:
-        for t in range(len(timeScoping.Ids)):
-            data[cols[0]].append(beams[eid]['Name'])
-            data[cols[1]].append(eid)
-            data[cols[2]].append(beams[eid]['Conn ID'])
-            data[cols[3]].append(beams[eid]['Material'])
-            data[cols[4]].append(beams[eid]['dia'] / lengthQuan)
-            data[cols[5]].append(beams[eid]['len'] / lengthQuan)
-            data[cols[6]].append(beams[eid]['area'] / areaQuan)
-            data[cols[7]].append(beams[eid]['I'] / inertiaQuan)
-            data[cols[8]].append(beams[eid]['J'] / inertiaQuan)
-            if beams[eid]['Material'] in mats.keys():
-                data[cols[9]].append(beams[eid]['Stiffness'] / stiffnessQuan)
-            else:
-                data[cols[9]].append(0)
-            data[cols[10]].append(beams[eid]['times'][t])
-            if str(analysis_type).ToLower().Contains('spectrum'): 
-                data[cols[11]].append(timeIds[0])
-            else:
-                data[cols[11]].append(t+1) 
-            data[cols[12]].append(beams[eid]['FX'][t] / forceQuan)
-            data[cols[13]].append(beams[eid]['Shear Force'][t] / forceQuan)
-            data[cols[14]].append(beams[eid]['Torque'][t] / momentQuan)
-            data[cols[15]].append(beams[eid]['Bending Moment'][t] / momentQuan)
-            data[cols[16]].append(beams[eid]['Equivalent Stress'][t] / stressQuan)
-            data[cols[17]].append(beams[eid]['Direct Stress'][t] / stressQuan)
-            data[cols[18]].append(beams[eid]['Bending Stress'][t] / stressQuan)
-            data[cols[19]].append(beams[eid]['Combined Stress'][t] / stressQuan)
-            data[cols[20]].append(beams[eid]['Torsional Stress'][t] / stressQuan)
+    times = [all_times[t] for t in range(nTimes)]
+    if str(analysis_type).ToLower().Contains('spectrum'): 
+        sets = [timeIds[0]] * nTimes
+    else:
+        sets = [t+1 for t in range(nTimes)]
+    
+    # Time independent columns for each beam
+    prefix = [list(v) for v in zip(table.name, beam_keys, table.object_id, table.material, section['dia'],
+                                   section['length'], section['area'], section['I'], section['J'], section['stiffness'])]
+    resKeys = ['FX', 'Shear Force', 'Torque', 'Bending Moment', 'Equivalent Stress', 'Direct Stress', 'Bending Stress',
+               'Combined Stress', 'Torsional Stress']
+    
+    if ENVELOPE_ONLY == 'y'.ToLower():
+        # One row per beam with the maximum of each resultant over all time sets and where it occurred
+        envKeys = ['FX', 'Shear Force', 'Torque', 'Bending Moment', 'Equivalent Stress']
+        envCols = ['Axial Force ' + forceUnit, 'Shear Force ' + forceUnit, 'Torque ' + momentUnit,
+                   'Bending Moment ' + momentUnit, 'Equivalent Stress ' + stressUnit]
+        cols = cols[:cols.index('Time ' + timeUnit)]
+        for c in envCols:
+            name = c.split(' [')[0]
+            cols += ['Max ' + c, 'Time of Max ' + name + ' ' + timeUnit, 'Set of Max ' + name]
+        rows = br.envelope_beam_rows(smiscSource, beam_keys, timeIds, beamRads, section, prefix, times, sets, factors,
+                                     TIME_CHUNK_SIZE, envKeys)
+        resultsName = ' - Bolt_Envelope_'
+    else:
+        # Read, compute and write the results one chunk of time sets at a time
+        rows = br.stream_beam_rows(smiscSource, beam_keys, timeIds, beamRads, section, prefix, times, sets, factors,
+                                   TIME_CHUNK_SIZE, resKeys)
+        resultsName = ' - Bolt_Results_'
         
 
     x = datetime.datetime.now()
     
-    file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Bolt_Results_' + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
-    writeCSV(user_dir + '/' + file_name_body + ".csv", data, cols)
+    file_name_body = analysis.Name + ' - type=' + str(analysis_type) + resultsName + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
+    writeCSVRows(user_dir + '/' + file_name_body + ".csv", rows, cols)
     
     print("[INFO] Process completed for " + analysis.Name)
     print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34))
@@ -0,0 +1,12 @@
+"""
+Shared engines for the Ansys Mechanical scripts.
+================================================
+
+The modules in this package are pure Python (no Mechanical, DPF or NumPy dependency) so that they can be imported from
+the IronPython 2.7 interpreter embedded in Mechanical as well as from a regular CPython interpreter for benchmarking
+on synthetic data.  To use them from a Mechanical script, append the local path of this repository to ``sys.path``:
+
+    import sys
+    sys.path.append(r'C:\\path\\to\\Ansys-Mechanical-Scripts')
+    from mech_lib import beam_resultants
+"""
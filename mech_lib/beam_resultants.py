@@ -0,0 +1,571 @@
+"""
+Vectorized stress resultants for circular beam connections.
+===========================================================
+
+All SMISC items are held as flat, beam-major lists of length ``n_beams * n_times`` (row ``b * n_times + t`` is beam
+``b`` at time index ``t``), which is the same order the CSV rows are written in.  Every derived quantity and the
+governing I/J end are then computed one whole column at a time instead of one beam and one time at a time.
+
+Values are plain floats in a consistent unit system (e.g. lbf and in, or N and mm).  Unit conversion is done once by
+the calling script with scalar factors instead of creating a Quantity for every value.
+
+For long transient runs, stream_beam_rows() reads the SMISC items a few time sets at a time and yields finished output
+rows, so peak memory is bounded by the chunk size instead of the full time history.  envelope_beam_rows() streams the
+same way but only keeps a running maximum per beam and writes one row per beam with the time and set of each maximum.
+
+Run this module directly to benchmark the engine on synthetic arrays:
+
+    python -m mech_lib.beam_resultants [n_beams] [n_times]
+"""
+from __future__ import division
+
+import math
+
+from mech_lib.smisc_reader import read_smisc_block
+
+hypot = math.hypot
+SQRT3 = math.sqrt(3.0)
+
+# item_index is the SMISC item ID found in BEAM188 documentation
+# FX = axial force, MY = Bending moment in Y-dir, MZ = Bending Moment in Z-dir, TQ = torque, SFz = Shear Force in Z-dir,
+# SFy = Shear force in Y-dir
+FORCE_ITEMS = {'FX_I': 1, 'FX_J': 14, 'SFz_I': 5, 'SFz_J': 18, 'SFy_I': 6, 'SFy_J': 19}
+MOMENT_ITEMS = {'MY_I': 2, 'MY_J': 15, 'MZ_I': 3, 'MZ_J': 16, 'TQ_I': 4, 'TQ_J': 17}
+BEAM_ITEMS = dict(list(FORCE_ITEMS.items()) + list(MOMENT_ITEMS.items()))
+
+# Keys of the dictionary returned by compute_beam_resultants(), in the order of the output spreadsheet columns
+COLUMN_KEYS = ['FX',
+               'SF_Y',
+               'SF_Z',
+               'Total Shear Force',
+               'Torque',
+               'Bending Moment',
+               'Equivalent Stress',
+               'Direct Stress',
+               'Bending Stress',
+               'Combined Stress',
+               'Torsional Stress']
+# 'Shear Force' is the larger of the I and J total shear forces (2024 R1 output), 'End' is the governing end
+RESULT_KEYS = COLUMN_KEYS + ['Shear Force', 'End']
+# Resultants tracked by envelope_beam_rows() (largest magnitude over all time sets), in output column order
+ENVELOPE_KEYS = ['FX', 'Total Shear Force', 'Torque', 'Bending Moment', 'Equivalent Stress']
+
+
+def circular_section(rad):
+    """
+    Compute the section properties of solid circular beams
+
+    Parameters
+    ----------
+    rad : list of float
+        Beam radii
+
+    Returns
+    -------
+    dict
+        Lists of 'dia', 'area', 'I' (moment of inertia) and 'J' (polar moment of inertia), one value per beam
+    """
+    pi = math.pi
+    return {'dia': [2.0*r for r in rad],
+            'area': [pi*r**2 for r in rad],
+            'I': [pi*r**4/4.0 for r in rad],
+            'J': [pi*r**4/2.0 for r in rad]}
+
+
+def expand(values, n_times):
+    """
+    Repeat per-beam values so that they line up with beam-major (n_beams x n_times) columns
+
+    Parameters
+    ----------
+    values : list
+        One value per beam
+    n_times : int
+        Number of time sets per beam
+
+    Returns
+    -------
+    list
+        Flat list of length len(values) * n_times
+    """
+    return [v for v in values for _ in range(n_times)]
+
+
+def block_from_fields(fields, element_ids, scale=1.0):
+    """
+    Gather a list of per-time fields into one flat beam-major column aligned to element_ids
+
+    Parameters
+    ----------
+    fields : list of Field
+        One field per time set.  Only the ``ScopingIds`` and ``Data`` attributes are used.
+    element_ids : list of int
+        Element order of the output column
+    scale : float, optional
+        Factor applied to every value (e.g. a unit conversion factor).  Default = 1.0.
+
+    Returns
+    -------
+    list of float
+        Column of length len(element_ids) * len(fields).  Elements missing from a field are set to 0.0.
+    """
+    n_times = len(fields)
+    column = [0.0] * (len(element_ids) * n_times)
+    row = dict((eid, b * n_times) for b, eid in enumerate(element_ids))
+    for t, field in enumerate(fields):
+        for eid, v in zip(field.ScopingIds, field.Data):
+            b = row.get(eid)
+            if b is not None:
+                column[b + t] = v * scale
+    return column
+
+
+def governing(a, b):
+    """
+    Element-wise selection of the value with the larger magnitude (ties go to ``a``)
+
+    Parameters
+    ----------
+    a, b : list of float
+        Values at the I and J ends
+
+    Returns
+    -------
+    list of float
+    """
+    return [x if abs(x) >= abs(y) else y for x, y in zip(a, b)]
+
+
+def compute_beam_resultants(items, rad, area, inertia, polar, n_times):
+    """
+    Compute forces, moments and stresses for all beams and times, selecting the governing I/J end
+
+    The axial force and shear force components are each taken from the end with the larger magnitude.  The bending
+    moment, torque and stresses are taken from the end with the larger von Mises equivalent stress.  'Shear Force' is
+    the total shear force of whichever end has the larger total shear force.
+
+    Parameters
+    ----------
+    items : dict
+        Flat beam-major columns keyed by the names in BEAM_ITEMS (forces and moments in consistent units)
+    rad, area, inertia, polar : list of float
+        Radius, cross-sectional area, moment of inertia and polar moment of inertia for each beam
+    n_times : int
+        Number of time sets in each column
+
+    Returns
+    -------
+    dict
+        Flat beam-major columns keyed by RESULT_KEYS.  'End' holds 'I' or 'J', the end governing the equivalent stress.
+    """
+    r = expand(rad, n_times)
+    inertia = expand(inertia, n_times)
+    polar = expand(polar, n_times)
+
+    fx = governing(items['FX_I'], items['FX_J'])
+    sfy = governing(items['SFy_I'], items['SFy_J'])
+    sfz = governing(items['SFz_I'], items['SFz_J'])
+    sf = list(map(hypot, sfy, sfz))
+    s_dir = [f / a for f, a in zip(fx, expand(area, n_times))]
+
+    m_i = list(map(hypot, items['MY_I'], items['MZ_I']))
+    m_j = list(map(hypot, items['MY_J'], items['MZ_J']))
+    s_bend_i = [m * x / i for m, x, i in zip(m_i, r, inertia)]
+    s_bend_j = [m * x / i for m, x, i in zip(m_j, r, inertia)]
+    s_comb_i = [s + b for s, b in zip(s_dir, s_bend_i)]
+    s_comb_j = [s + b for s, b in zip(s_dir, s_bend_j)]
+    s_tors_i = [tq * x / j for tq, x, j in zip(items['TQ_I'], r, polar)]
+    s_tors_j = [tq * x / j for tq, x, j in zip(items['TQ_J'], r, polar)]
+    s_eqv_i = compute_equiv_stress(s_comb_i, s_tors_i)
+    s_eqv_j = compute_equiv_stress(s_comb_j, s_tors_j)
+
+    use_i = [a >= b for a, b in zip(s_eqv_i, s_eqv_j)]
+
+    def pick(a, b):
+        return [x if u else y for u, x, y in zip(use_i, a, b)]
+
+    return {'FX': fx,
+            'SF_Y': sfy,
+            'SF_Z': sfz,
+            'Total Shear Force': sf,
+            'Torque': pick(items['TQ_I'], items['TQ_J']),
+            'Bending Moment': pick(m_i, m_j),
+            'Equivalent Stress': pick(s_eqv_i, s_eqv_j),
+            'Direct Stress': s_dir,
+            'Bending Stress': pick(s_bend_i, s_bend_j),
+            'Combined Stress': pick(s_comb_i, s_comb_j),
+            'Torsional Stress': pick(s_tors_i, s_tors_j),
+            'Shear Force': governing(list(map(hypot, items['SFy_I'], items['SFz_I'])),
+                                     list(map(hypot, items['SFy_J'], items['SFz_J']))),
+            'End': ['I' if u else 'J' for u in use_i]}
+
+
+def compute_equiv_stress(comb_strs, tor_strs):
+    """
+    Compute the von Mises equivalent stress given the combined and torsional stresses
+
+    Parameters
+    ----------
+    comb_strs : list of float
+        Combined stress = direct stress plus bending stress
+    tor_strs : list of float
+        Torsional stress
+
+    Returns
+    -------
+    list of float
+        von Mises stress
+    """
+    return [hypot(c, SQRT3*t) for c, t in zip(comb_strs, tor_strs)]
+
+
+def iter_time_chunks(time_ids, chunk_size):
+    """
+    Split the time set ids into consecutive chunks
+
+    Parameters
+    ----------
+    time_ids : list of int
+        Time set ids
+    chunk_size : int
+        Number of time sets per chunk.  0 or less returns all time sets in one chunk.
+
+    Returns
+    -------
+    generator of tuple
+        (start, chunk) where start is the index of the first time set of the chunk in time_ids
+    """
+    time_ids = list(time_ids)
+    if chunk_size <= 0:
+        chunk_size = max(len(time_ids), 1)
+    for start in range(0, len(time_ids), chunk_size):
+        yield start, time_ids[start:start + chunk_size]
+
+
+def iter_beam_columns(source, element_ids, time_ids, rad, section, factors=None, chunk_size=0, keys=COLUMN_KEYS):
+    """
+    Read and compute the resultants one chunk of time sets at a time
+
+    Parameters
+    ----------
+    source : object
+        SMISC result source (see mech_lib.smisc_reader)
+    element_ids : list of int
+        Beam element ids
+    time_ids : list of int
+        Time set ids to read
+    rad : list of float
+        Radius of each beam
+    section : dict
+        Section properties of each beam as returned by circular_section()
+    factors : dict, optional
+        Scale factor keyed by SMISC item name, passed to read_smisc_block()
+    chunk_size : int, optional
+        Number of time sets read at once.  Default = 0 (all time sets).
+    keys : list of str, optional
+        Resultants returned for each chunk.  Default = COLUMN_KEYS.
+
+    Returns
+    -------
+    generator of tuple
+        (start, chunk, columns) where columns holds one flat beam-major (n_beams x len(chunk)) list per key
+    """
+    for start, chunk in iter_time_chunks(time_ids, chunk_size):
+        items = read_smisc_block(source, BEAM_ITEMS, element_ids, chunk, factors)
+        res = compute_beam_resultants(items, rad, section['area'], section['I'], section['J'], len(chunk))
+        del items
+        yield start, chunk, [res[k] for k in keys]
+
+
+def format_beam_rows(prefix, columns, times, sets, scales=None):
+    """
+    Yield the output rows of one chunk of time sets, ordered by beam, then scale, then time
+
+    Parameters
+    ----------
+    prefix : list of list
+        Leading (time independent) output values for each beam
+    columns : list of list of float
+        Flat beam-major (n_beams x n_times) result columns
+    times, sets : list
+        Time and set values of the chunk
+    scales : list of float, optional
+        Positive scale factors written after the set column, the result columns are multiplied by them.
+        Default = None (no scale column).
+
+    Returns
+    -------
+    generator of list
+        One output row per beam and time set (and scale)
+    """
+    n = len(times)
+    for b, pre in enumerate(prefix):
+        if scales is None:
+            for t in range(n):
+                i = b * n + t
+                yield pre + [times[t], sets[t]] + [c[i] for c in columns]
+        else:
+            for f in scales:
+                for t in range(n):
+                    i = b * n + t
+                    yield pre + [times[t], sets[t], f] + [c[i] * f for c in columns]
+
+
+def stream_beam_rows(source, element_ids, time_ids, rad, section, prefix, times, sets, factors=None, chunk_size=0,
+                     keys=COLUMN_KEYS, scales=None):
+    """
+    Read, compute and yield output rows one chunk of time sets at a time
+
+    Only the SMISC items and resultants of the current chunk are held in memory.  Within a chunk the rows are ordered
+    by beam, then time, so a single chunk (chunk_size = 0) gives the same row order as the full in-memory path.
+
+    Every resultant is homogeneous of degree one in the SMISC items (sums, magnitudes and products with section
+    constants), so scaling the items by a positive factor scales every resultant by the same factor and does not change
+    the governing end.  With ``scales`` (e.g. 1, 2 and 3 sigma for a random vibration analysis read once at 1 sigma)
+    the resultants are computed once and written for each scale, ordered by beam, then scale, then time.
+
+    Parameters
+    ----------
+    source : object
+        SMISC result source (see mech_lib.smisc_reader)
+    element_ids : list of int
+        Beam element ids
+    time_ids : list of int
+        Time set ids to read
+    rad : list of float
+        Radius of each beam
+    section : dict
+        Section properties of each beam as returned by circular_section()
+    prefix : list of list
+        Leading (time independent) output values for each beam
+    times, sets : list
+        Time and set values written for each entry of time_ids
+    factors : dict, optional
+        Scale factor keyed by SMISC item name, passed to read_smisc_block()
+    chunk_size : int, optional
+        Number of time sets read at once.  Default = 0 (all time sets).
+    keys : list of str, optional
+        Result columns written after the time and set columns.  Default = COLUMN_KEYS.
+    scales : list of float, optional
+        Positive scale factors (e.g. sigma levels).  Each row gets the scale after the set column and the numeric
+        result columns multiplied by it, so keys must not include 'End'.  Default = None (no scale column).
+
+    Returns
+    -------
+    generator of list
+        One output row per beam and time set (and scale)
+    """
+    for start, chunk, columns in iter_beam_columns(source, element_ids, time_ids, rad, section, factors, chunk_size,
+                                                   keys):
+        n = len(chunk)
+        for row in format_beam_rows(prefix, columns, times[start:start + n], sets[start:start + n], scales):
+            yield row
+
+
+def envelope_beam_rows(source, element_ids, time_ids, rad, section, prefix, times, sets, factors=None, chunk_size=0,
+                       keys=ENVELOPE_KEYS, scales=None):
+    """
+    Read and compute the resultants one chunk of time sets at a time and keep the maximum of each beam over all times
+
+    The maximum of each key is the value with the largest magnitude (the sign is kept, e.g. compressive axial force);
+    ties keep the earliest time set.  Memory is bounded by the chunk size plus one value and one time index per beam
+    and key.
+
+    Parameters
+    ----------
+    source : object
+        SMISC result source (see mech_lib.smisc_reader)
+    element_ids : list of int
+        Beam element ids
+    time_ids : list of int
+        Time set ids to read
+    rad : list of float
+        Radius of each beam
+    section : dict
+        Section properties of each beam as returned by circular_section()
+    prefix : list of list
+        Leading (time independent) output values for each beam
+    times, sets : list
+        Time and set values written for each entry of time_ids
+    factors : dict, optional
+        Scale factor keyed by SMISC item name, passed to read_smisc_block()
+    chunk_size : int, optional
+        Number of time sets read at once.  Default = 0 (all time sets).
+    keys : list of str, optional
+        Resultants to track, keys of compute_beam_resultants().  Default = ENVELOPE_KEYS.
+    scales : list of float, optional
+        Positive scale factors (e.g. sigma levels), see stream_beam_rows().  The maxima occur at the same time set for
+        every scale.  Default = None.
+
+    Returns
+    -------
+    list of list
+        One output row per beam (and scale): the prefix (and scale) followed by (maximum, time, set) for each key
+    """
+    n_beams = len(element_ids)
+    peak = dict((k, [None] * n_beams) for k in keys)
+    peak_mag = dict((k, [-1.0] * n_beams) for k in keys)
+    peak_at = dict((k, [0] * n_beams) for k in keys)
+    for start, chunk in iter_time_chunks(time_ids, chunk_size):
+        n = len(chunk)
+        items = read_smisc_block(source, BEAM_ITEMS, element_ids, chunk, factors)
+        res = compute_beam_resultants(items, rad, section['area'], section['I'], section['J'], n)
+        del items
+        for k in keys:
+            col = res[k]
+            mags = list(map(abs, col))
+            pk, pm, pa = peak[k], peak_mag[k], peak_at[k]
+            for b in range(n_beams):
+                seg = mags[b * n:(b + 1) * n]
+                m = max(seg)
+                if m > pm[b]:
+                    t = seg.index(m)
+                    pk[b] = col[b * n + t]
+                    pm[b] = m
+                    pa[b] = start + t
+        del res
+
+    rows = []
+    for b, pre in enumerate(prefix):
+        for f in (scales if scales is not None else [None]):
+            row = list(pre) if f is None else list(pre) + [f]
+            for k in keys:
+                t = peak_at[k][b]
+                row += [peak[k][b] if f is None else peak[k][b] * f, times[t], sets[t]]
+            rows.append(row)
+    return rows
+
+
+def synthetic_items(n_beams, n_times, seed=0):
+    """
+    Create random SMISC columns for benchmarking without Mechanical
+
+    Parameters
+    ----------
+    n_beams : int
+        Number of beams
+    n_times : int
+        Number of time sets
+    seed : int, optional
+        Random seed.  Default = 0.
+
+    Returns
+    -------
+    dict
+        Flat beam-major columns keyed by the names in BEAM_ITEMS
+    """
+    import random
+    rng = random.Random(seed)
+    n = n_beams * n_times
+    items = {}
+    for k in sorted(BEAM_ITEMS.keys()):
+        scale = 100.0 if k in FORCE_ITEMS else 1000.0
+        items[k] = [rng.uniform(-scale, scale) for _ in range(n)]
+    return items
+
+
+def _scalar_reference(items, rad, area, inertia, polar, n_times):
+    # Per-beam, per-time loop equivalent to the original scripts, used to check and time the engine
+    out = dict((k, []) for k in RESULT_KEYS)
+    for b in range(len(rad)):
+        for t in range(n_times):
+            i = b * n_times + t
+            F_I, F_J = items['FX_I'][i], items['FX_J'][i]
+            f = F_I if abs(F_I) >= abs(F_J) else F_J
+            SFy_I, SFy_J = items['SFy_I'][i], items['SFy_J'][i]
+            SFz_I, SFz_J = items['SFz_I'][i], items['SFz_J'][i]
+            SFy = SFy_I if abs(SFy_I) >= abs(SFy_J) else SFy_J
+            SFz = SFz_I if abs(SFz_I) >= abs(SFz_J) else SFz_J
+            s = f / area[b]
+            M_I = (items['MY_I'][i]**2 + items['MZ_I'][i]**2)**(0.5)
+            M_J = (items['MY_J'][i]**2 + items['MZ_J'][i]**2)**(0.5)
+            TQ_I, TQ_J = items['TQ_I'][i], items['TQ_J'][i]
+            bendStr_I = M_I * rad[b] / inertia[b]
+            bendStr_J = M_J * rad[b] / inertia[b]
+            torStr_I = TQ_I * rad[b] / polar[b]
+            torStr_J = TQ_J * rad[b] / polar[b]
+            eqvStr_I = ((s + bendStr_I)**2 + 3.0*torStr_I**2)**(0.5)
+            eqvStr_J = ((s + bendStr_J)**2 + 3.0*torStr_J**2)**(0.5)
+            end = 'I' if eqvStr_I >= eqvStr_J else 'J'
+            out['FX'].append(f)
+            out['SF_Y'].append(SFy)
+            out['SF_Z'].append(SFz)
+            out['Total Shear Force'].append((SFy**2 + SFz**2)**(0.5))
+            SF_I = (SFz_I**2 + SFy_I**2)**(0.5)
+            SF_J = (SFz_J**2 + SFy_J**2)**(0.5)
+            out['Shear Force'].append(SF_I if SF_I >= SF_J else SF_J)
+            out['Direct Stress'].append(s)
+            out['End'].append(end)
+            if end == 'I':
+                out['Torque'].append(TQ_I)
+                out['Bending Moment'].append(M_I)
+                out['Equivalent Stress'].append(eqvStr_I)
+                out['Bending Stress'].append(bendStr_I)
+                out['Combined Stress'].append(s + bendStr_I)
+                out['Torsional Stress'].append(torStr_I)
+            else:
+                out['Torque'].append(TQ_J)
+                out['Bending Moment'].append(M_J)
+                out['Equivalent Stress'].append(eqvStr_J)
+                out['Bending Stress'].append(bendStr_J)
+                out['Combined Stress'].append(s + bendStr_J)
+                out['Torsional Stress'].append(torStr_J)
+    return out
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_beams = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_times = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rad = [0.1 + 0.001 * (b % 100) for b in range(n_beams)]
+    sec = circular_section(rad)
+    items = synthetic_items(n_beams, n_times)
+
+    t0 = time.time()
+    compute_beam_resultants(items, rad, sec['area'], sec['I'], sec['J'], n_times)
+    t1 = time.time()
+    _scalar_reference(items, rad, sec['area'], sec['I'], sec['J'], n_times)
+    t2 = time.time()
+    print('%d beams x %d times' % (n_beams, n_times))
+    print('column engine:   %.3f s' % (t1 - t0))
+    print('scalar loop:     %.3f s' % (t2 - t1))
+
+    # Streaming and envelope: time and engine peak memory per chunk size
+    from mech_lib.smisc_reader import SyntheticSmiscSource
+    n_stream = min(n_beams, 1000)
+    element_ids = list(range(1, n_stream + 1))
+    time_ids = list(range(1, 4 * n_times + 1))
+    source = SyntheticSmiscSource(element_ids, time_ids)
+    prefix = [[eid] for eid in element_ids]
+    sec = circular_section(rad[:n_stream])
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    for name in ('stream', 'envelope'):
+        for chunk_size in (0, n_times, 1):
+            if tracemalloc:
+                tracemalloc.start()
+            t0 = time.time()
+            if name == 'stream':
+                n_rows = sum(1 for _ in stream_beam_rows(source, element_ids, time_ids, rad[:n_stream], sec, prefix,
+                                                         time_ids, time_ids, chunk_size=chunk_size))
+            else:
+                n_rows = len(envelope_beam_rows(source, element_ids, time_ids, rad[:n_stream], sec, prefix, time_ids,
+                                                time_ids, chunk_size=chunk_size))
+            peak = tracemalloc.get_traced_memory()[1] / 1e6 if tracemalloc else float('nan')
+            if tracemalloc:
+                tracemalloc.stop()
+            print('%-8s chunk_size=%-4d %d rows  %.3f s  engine peak %.1f MB' % (name, chunk_size, n_rows,
+                                                                                time.time() - t0, peak))
+
+    # Several sigma levels from one read of the 1 sigma items
+    sigmas = [1, 2, 3]
+    source.reads = 0
+    t0 = time.time()
+    for row in stream_beam_rows(source, element_ids, time_ids[:1], rad[:n_stream], sec, prefix, [0.0], [2],
+                                scales=sigmas):
+        pass
+    print('multi-sigma %s: %d read(s) instead of %d, %.3f s' % (sigmas, source.reads, source.reads * len(sigmas),
+                                                                time.time() - t0))
@@ -0,0 +1,430 @@
+"""
+Beam connection geometry and section property table.
+====================================================
+
+Reading ``ReferenceXCoordinate``, ``MobileXCoordinate``, ``Radius``, ``Material`` etc. through the Mechanical API costs
+several property accesses per beam, which takes minutes on models with tens of thousands of beam connections.
+``BeamTable`` holds the element ID, object ID, name, material, radius, length and Young's modulus of every beam
+connection as plain columns, built once per model state and saved to a JSON file keyed by a model fingerprint.  The
+beam resultant and beam probe scripts load the table instead of walking the beam connections when the fingerprint
+matches.
+
+Lengths are stored in mm and the modulus in MPa so that one table can be shared by scripts using different output
+units; geometry() scales them with two scalar factors and derives the section properties and axial stiffness.
+
+The fingerprint (model_key()) describes the model state the table depends on, not the result file, so a re-solve of
+an unchanged model reuses the table:
+
+- geometry: the mesh fingerprint of mech_lib.ns_index.mesh_key()
+- connections: the number of beam connections and a checksum of the ObjectId, material and radius of every beam
+- sections: the Young's modulus of every material, and the full record (coordinates, element ID, ...) of a fixed sample
+  of beams
+
+The checksum costs three property accesses per beam instead of the ten of a full record.  It does not cover the end
+point coordinates, so the stored lengths are only used for beams without an element in the result file: the scripts
+replace the length of every solved beam with the distance between the I and J nodes of its beam element
+(``mesh_beam_lengths()``, one connectivity and one coordinate read of the result mesh) through ``with_lengths()``.
+Compare building and loading with:
+
+    python -m mech_lib.beam_table [n_beams]
+"""
+from __future__ import division
+
+import json
+import os
+import zlib
+
+from mech_lib.beam_resultants import circular_section
+
+# Table columns, in record order
+FIELDS = ['element_id', 'object_id', 'name', 'material', 'radius', 'length', 'modulus']
+
+# Number of beams whose full record enters the model fingerprint
+N_SAMPLES = 64
+
+
+def records_from_beams(beams, element_ids, moduli, to_float):
+    """
+    Read one table record per beam connection through the Mechanical API
+
+    Parameters
+    ----------
+    beams : list of Ansys.ACT.Automation.Mechanical.Connections.Beam
+        Beam connections
+    element_ids : list of int
+        Beam element ID of each beam connection (0 if not solved)
+    moduli : dict
+        Young's modulus in MPa keyed by material name
+    to_float : callable
+        Converts a length Quantity to a float in mm, e.g. lambda q: (q / Quantity(1, 'mm')).Value
+
+    Returns
+    -------
+    list of list
+        Records in FIELDS order
+    """
+    records = []
+    for b, eid in zip(beams, element_ids):
+        xr = b.ReferenceXCoordinate
+        yr = b.ReferenceYCoordinate
+        zr = b.ReferenceZCoordinate
+        xm = b.MobileXCoordinate
+        ym = b.MobileYCoordinate
+        zm = b.MobileZCoordinate
+        length = to_float(((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5))
+        records.append([eid, b.ObjectId, b.Name, b.Material, to_float(b.Radius), length, moduli.get(b.Material)])
+    return records
+
+
+def model_key(beams, element_id, moduli, to_float, mesh=None, n_samples=N_SAMPLES):
+    """
+    Fingerprint of the beam connections, sections and geometry the table is built from
+
+    Parameters
+    ----------
+    beams : list of Ansys.ACT.Automation.Mechanical.Connections.Beam
+        Beam connections
+    element_id : callable
+        Returns the beam element ID of a beam connection, e.g. lambda b: solver_data.GetObjectData(b).ElementId
+    moduli : dict
+        Young's modulus in MPa keyed by material name
+    to_float : callable
+        Converts a length Quantity to a float in mm
+    mesh : dict, optional
+        Mesh fingerprint, e.g. mech_lib.ns_index.mesh_key(analysis.MeshData).  Default = None.
+    n_samples : int, optional
+        Number of evenly spaced beams whose full record is part of the key.  Default = N_SAMPLES.
+
+    Returns
+    -------
+    dict
+        {'beams', 'state', 'moduli', 'mesh', 'sample'}, JSON serializable
+    """
+    state = [[b.ObjectId, b.Material, to_float(b.Radius)] for b in beams]
+    sample = list(beams)[::max(1, len(beams) // n_samples)][:n_samples]
+    return {'beams': len(beams),
+            'state': zlib.crc32(json.dumps(state).encode('utf-8')) & 0xffffffff,
+            'moduli': moduli,
+            'mesh': mesh,
+            'sample': records_from_beams(sample, [element_id(b) for b in sample], moduli, to_float)}
+
+
+def element_lengths(element_ids, connectivity, coords):
+    """
+    Distance between the first two nodes (I and J) of each beam element
+
+    Parameters
+    ----------
+    element_ids : list of int
+        Beam element IDs
+    connectivity : dict
+        Node IDs of each element keyed by element ID
+    coords : dict
+        [x, y, z] keyed by node ID
+
+    Returns
+    -------
+    dict
+        Length keyed by element ID, in the unit of coords, for the elements of connectivity
+    """
+    out = {}
+    for eid in element_ids:
+        nodes = connectivity.get(eid)
+        if not nodes or len(nodes) < 2:
+            continue
+        a = coords[nodes[0]]
+        b = coords[nodes[1]]
+        out[eid] = ((a[0] - b[0])**2 + (a[1] - b[1])**2 + (a[2] - b[2])**2)**0.5
+    return out
+
+
+def mesh_beam_lengths(mesh, element_ids):
+    """
+    Length in mm of the beam elements of a result mesh (Mechanical only)
+
+    Parameters
+    ----------
+    mesh : dpf.MeshedRegion
+        Mesh of the result file, e.g. the output of dpf.operators.mesh.mesh_provider
+    element_ids : list of int
+        Beam element IDs
+
+    Returns
+    -------
+    dict
+        Length in mm keyed by element ID, for the elements found in the mesh
+    """
+    import Ans.DataProcessing as dpf
+    from mech_lib.section_cuts import connectivity_from_field
+    conn_field = mesh.GetPropertyField('connectivity')
+    connectivity = connectivity_from_field(element_ids, conn_field.ScopingIds, conn_field.DataPointer,
+                                           conn_field.Data, mesh.NodeIds)
+    used = set(nid for nodes in connectivity.values() for nid in nodes[:2])
+    coords_op = dpf.operators.mesh.node_coordinates()
+    coords_op.inputs.mesh.Connect(mesh)
+    conv = dpf.operators.math.unit_convert()
+    conv.inputs.unit_name.Connect('mm')
+    conv.inputs.entity_to_convert.Connect(coords_op.outputs.getcoordinates_as_field())
+    field = conv.outputs.getconverted_entity_as_field()
+    data = field.Data
+    coords = {}
+    for k, nid in enumerate(field.ScopingIds):
+        if nid in used:
+            coords[nid] = [data[3*k], data[3*k + 1], data[3*k + 2]]
+    return element_lengths(element_ids, connectivity, coords)
+
+
+def mm_converter():
+    """
+    Return a function converting a length Quantity to a float in mm (Mechanical only)
+    """
+    from Ansys.Core.Units import Quantity
+    mm = Quantity(1, 'mm')
+    return lambda q: (q / mm).Value
+
+
+def material_moduli(material_objects):
+    """
+    Read the Young's modulus of the materials of a Mechanical model (Mechanical only)
+
+    Parameters
+    ----------
+    material_objects : list of Ansys.ACT.Automation.Mechanical.Material
+        Materials, e.g. Model.Materials.Children
+
+    Returns
+    -------
+    dict
+        Young's modulus in MPa keyed by material name, for the materials with an isotropic elasticity
+    """
+    import materials
+    from Ansys.Core.Units import Quantity
+    moduli = {}
+    for m in material_objects:
+        ed = m.GetEngineeringDataMaterial()
+        if 'Elasticity' in materials.GetListMaterialProperties(ed):
+            elasticity = materials.GetMaterialPropertyByName(ed, "Elasticity")
+            if "Young's Modulus" in elasticity:
+                modulus = elasticity["Young's Modulus"][1] * Quantity('1 [' + elasticity["Young's Modulus"][0] + ']')
+                moduli[m.Name] = (modulus / Quantity(1, 'MPa')).Value
+    return moduli
+
+
+def beam_records(beams, solver_data, moduli):
+    """
+    Read the table records of all beam connections of an analysis through the Mechanical API (Mechanical only)
+
+    Parameters
+    ----------
+    beams : list of Ansys.ACT.Automation.Mechanical.Connections.Beam
+        Beam connections
+    solver_data : Ansys.ACT.Automation.Mechanical.SolverData
+        Solver data of the analysis (beam element IDs)
+    moduli : dict
+        Young's modulus in MPa keyed by material name, see material_moduli()
+
+    Returns
+    -------
+    list of list
+        Records in FIELDS order, lengths in mm and Young's modulus in MPa
+    """
+    element_ids = [solver_data.GetObjectData(b).ElementId for b in beams]
+    return records_from_beams(beams, element_ids, moduli, mm_converter())
+
+
+def beam_model_key(beams, solver_data, moduli, mesh_data):
+    """
+    model_key() of the beam connections of an analysis (Mechanical only)
+
+    Parameters
+    ----------
+    beams : list of Ansys.ACT.Automation.Mechanical.Connections.Beam
+        Beam connections
+    solver_data : Ansys.ACT.Automation.Mechanical.SolverData
+        Solver data of the analysis (beam element IDs)
+    moduli : dict
+        Young's modulus in MPa keyed by material name, see material_moduli()
+    mesh_data : Ansys.ACT.Automation.Mechanical.MeshData
+        Mesh data of the analysis, e.g. analysis.MeshData
+
+    Returns
+    -------
+    dict
+    """
+    from mech_lib.ns_index import mesh_key
+    return model_key(beams, lambda b: solver_data.GetObjectData(b).ElementId, moduli, mm_converter(),
+                     mesh_key(mesh_data))
+
+
+class BeamTable(object):
+    """
+    Column table of beam connection properties
+
+    Parameters
+    ----------
+    records : list of list
+        One record per beam connection in FIELDS order
+    """
+
+    def __init__(self, records):
+        self.records = [list(r) for r in records]
+        columns = list(zip(*self.records)) if self.records else [()] * len(FIELDS)
+        for name, col in zip(FIELDS, columns):
+            setattr(self, name, list(col))
+
+    def __len__(self):
+        return len(self.records)
+
+    def solved(self):
+        """
+        Return the beams that have a beam element in the result file, sorted by element ID
+        """
+        return BeamTable(sorted(r for r in self.records if r[0] != 0))
+
+    def with_lengths(self, lengths):
+        """
+        Return a copy of the table with the length of the beams found in lengths replaced
+
+        Parameters
+        ----------
+        lengths : dict
+            Length in mm keyed by element ID, e.g. mesh_beam_lengths(mesh, table.element_id)
+        """
+        k = FIELDS.index('length')
+        records = []
+        for r in self.records:
+            r = list(r)
+            if r[0] in lengths:
+                r[k] = lengths[r[0]]
+            records.append(r)
+        return BeamTable(records)
+
+    def index_by(self, name):
+        """
+        Return {value: row index} for one column, e.g. index_by('object_id')
+        """
+        return dict((v, i) for i, v in enumerate(getattr(self, name)))
+
+    def geometry(self, length_factor=1.0, stress_factor=1.0):
+        """
+        Section properties and axial stiffness in the desired output units
+
+        Parameters
+        ----------
+        length_factor : float, optional
+            Output length units per mm, e.g. (Quantity(1, 'mm') / Quantity(1, 'in')).Value
+        stress_factor : float, optional
+            Output stress units per MPa, e.g. (Quantity(1, 'MPa') / Quantity(1, 'psi')).Value
+
+        Returns
+        -------
+        dict
+            Lists of 'radius', 'length', 'dia', 'area', 'I', 'J' and 'stiffness' (modulus * area / length, 0 if the
+            material has no Young's modulus), one value per beam
+        """
+        rad = [r * length_factor for r in self.radius]
+        length = [l * length_factor for l in self.length]
+        geom = circular_section(rad)
+        geom['radius'] = rad
+        geom['length'] = length
+        geom['stiffness'] = [e * stress_factor * a / l if e is not None and l else 0
+                             for e, a, l in zip(self.modulus, geom['area'], length)]
+        return geom
+
+    def save(self, path, key):
+        """
+        Write the table and its fingerprint to a JSON file
+        """
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'key': key, 'fields': FIELDS, 'records': self.records}, f)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """
+        Read a table saved with save(), or return None if the file is missing, unreadable or was saved for a different
+        fingerprint
+        """
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f)
+        except ValueError:
+            return None
+        if stored.get('key') != json.loads(json.dumps(key, sort_keys=True)) or stored.get('fields') != FIELDS:
+            return None
+        return cls(stored['records'])
+
+
+def load_or_build(path, key, build):
+    """
+    Load the beam table for a model fingerprint, building and saving it if the cached copy is missing or stale
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON cache file
+    key : dict
+        Model fingerprint, e.g. beam_model_key(beam_conns, solver_data, moduli, analysis.MeshData)
+    build : callable
+        Returns the table records when called without arguments (only called on a cache miss)
+
+    Returns
+    -------
+    BeamTable
+    """
+    table = BeamTable.load(path, key)
+    if table is None:
+        table = BeamTable(build())
+        table.save(path, key)
+    return table
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import tempfile
+    import time
+
+    class _SlowBeam(object):
+        """Stand-in for a beam connection whose property access goes through the API"""
+
+        def __init__(self, rng, i):
+            self._props = {'ReferenceXCoordinate': rng.uniform(0, 100), 'ReferenceYCoordinate': rng.uniform(0, 100),
+                           'ReferenceZCoordinate': rng.uniform(0, 100), 'MobileXCoordinate': rng.uniform(0, 100),
+                           'MobileYCoordinate': rng.uniform(0, 100), 'MobileZCoordinate': rng.uniform(0, 100),
+                           'Radius': rng.uniform(1, 5), 'ObjectId': 1000 + i, 'Name': 'Circular - %d' % i,
+                           'Material': 'Structural Steel'}
+
+        def __getattr__(self, name):
+            time.sleep(2e-5)
+            return self._props[name]
+
+    n_beams = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(0)
+    beams = [_SlowBeam(rng, i) for i in range(n_beams)]
+    eids = [100001 + i for i in range(n_beams)]
+    path = os.path.join(tempfile.mkdtemp(), 'beam_table.json')
+    moduli = {'Structural Steel': 200000.0}
+    mesh = {'elements': 1, 'nodes': 1, 'sample': 0}
+
+    def build():
+        return records_from_beams(beams, eids, moduli, float)
+
+    t0 = time.time()
+    key = model_key(beams, lambda b: eids[b.ObjectId - 1000], moduli, float, mesh)
+    built = load_or_build(path, key, build).solved().geometry(1 / 25.4, 145.0377)
+    t1 = time.time()
+    key = model_key(beams, lambda b: eids[b.ObjectId - 1000], moduli, float, mesh)
+    loaded = load_or_build(path, key, build).solved().geometry(1 / 25.4, 145.0377)
+    t2 = time.time()
+    assert built == loaded
+    beams[n_beams // 3]._props['Radius'] += 0.5
+    assert model_key(beams, lambda b: eids[b.ObjectId - 1000], moduli, float, mesh) != key
+    print('%d beams' % n_beams)
+    print('key + build from API: %.3f s' % (t1 - t0))
+    print('key + load from disk: %.3f s' % (t2 - t1))
@@ -0,0 +1,472 @@
+"""
+Nodal fatigue load line, safety factor and Miner's rule damage from aligned stress and strength arrays.
+======================================================================================================
+
+The pre-stressed RS/RV script computed the load line and the fatigue safety factor with a chain of DPF math operators
+(component-wise divide, sqr, pow, sqrt, scale and add constant on fields and fields containers), so every criterion
+materialized 5 to 12 intermediate fields per time set and per sigma level, and the Gerber chain needed a different
+scale input on each Ansys version.  ``safety_factors()`` takes the alternating stress Sa, mean stress Sm, endurance
+limit Se and strength S (Sy or Sut, depending on the criterion) as aligned lists, one value per node, and returns the
+load line r = Sa / Sm and the safety factor nf of every node in one pass:
+
+    Goodman, Soderberg     nf = 1 / (Sa/Se + Sm/S)
+    ASME-elliptic          nf = 1 / sqrt[(Sa/Se)^2 + (Sm/S)^2]
+    Gerber                 nf = 1/2 (S/Sm)^2 (Sa/Se) {-1 + sqrt[1 + (2 Sm/S Se/Sa)^2]}
+    Langer static yield    nf = S / (Sa + Sm)
+
+The zero cases are explicit instead of relying on the inf/nan of a division: Sm = 0 gives r = inf and the fully
+reversed nf = Se / Sa (S / Sa for Langer), Sa = 0 gives the static nf = S / Sm, and a node with Sa = Sm = 0 has
+nf = inf.  Gerber is evaluated as 2 / {q [1 + sqrt(1 + x^2)]} with q = Sa/Se and x = 2 (Sm/S) / q, the same value
+without the cancellation of -1 + sqrt(...) at small Sm, so it tends to the same limits.
+
+The strengths come from the material of the body of each node.  ``NodeMaterialIndex`` is built once per model from the
+node IDs of every body (one MeshRegionById per body, kept in the body index file of mech_lib.ns_index.BodyIndex) and
+holds a node to body integer array and a body to material list, so the Se, Sy or Sut of all nodes of a named selection
+are one gather instead of NodeById, BodyIds, GeoEntityById, GetBody and Material calls per node.
+
+Miner's rule damage D = sum(n / N(Sa)) uses the fully reversed S-N curve of each material, parsed once from the
+Engineering Data ``S-N Curve`` property into a log-log table (``sn_curve()``, ``SNCurve``).  ``miner_damage()`` groups
+the nodes by material and maps the alternating stress of all nodes of a group to allowable cycles with one sorted
+table per material, accumulating the damage of every (alternating stress, applied cycles) block.  A stress below the
+lowest stress of the table has infinite life (no damage); above the highest stress the last segment is extrapolated.
+
+For random vibration, ``steinberg_blocks()`` turns the 1, 2 and 3 sigma stresses of every node into the three load
+blocks of Steinberg's method, 68.3 %, 27.1 % and 4.33 % of the cycles (duration x expected frequency) at 1, 2 and 3
+sigma, which miner_damage() sums in the same pass.
+
+Run this module directly to time the one-pass kernels against the step-by-step operator chain on synthetic arrays:
+
+    python -m mech_lib.fatigue [n_nodes] [criterion]
+"""
+from __future__ import division
+
+import math
+from array import array
+from bisect import bisect_right
+
+INF = float('inf')
+
+# Steinberg's three-band method: (sigma level, fraction of the cycles) of a Gaussian random stress response
+STEINBERG_BANDS = [(1, 0.683), (2, 0.271), (3, 0.0433)]
+
+# Fatigue criteria: key of the FATIGUE_LINE_TYPE input -> (name, strength used for S)
+CRITERIA = {'g': ('Goodman', 'S_ut'),
+            's': ('Soderberg', 'S_y'),
+            'ger': ('Gerber', 'S_ut'),
+            'asme': ('ASME-elliptic', 'S_y'),
+            'l': ('Langer Static Yield', 'S_y')}
+
+
+def safety_factors(sa, sm, se, s, criterion='s'):
+    """
+    Load line and fatigue safety factor of every node in one pass
+
+    Parameters
+    ----------
+    sa : list of float
+        Alternating stress of each node (>= 0)
+    sm : list of float
+        Mean stress of each node (>= 0, e.g. von Mises), aligned with sa
+    se : list of float
+        Endurance limit of each node, aligned with sa
+    s : list of float
+        Tensile yield or ultimate strength of each node (see CRITERIA), aligned with sa
+    criterion : str, optional
+        Fatigue criterion, one of CRITERIA.keys().  Default = 's' for Soderberg.
+
+    Returns
+    -------
+    tuple
+        (load_line, nf) lists, load_line = Sa / Sm (inf where Sm = 0) and nf the safety factor (inf where Sa = Sm = 0)
+    """
+    if criterion not in CRITERIA:
+        raise ValueError("Fatigue criterion " + str(criterion) + " must be one of " + ', '.join(sorted(CRITERIA)))
+    load_line = [a / m if m else INF for a, m in zip(sa, sm)]
+    if criterion == 'g' or criterion == 's':
+        # Sm = 0 and Sa = 0 reduce to Se / Sa and S / Sm
+        nf = [1.0 / (a / e + m / x) if a or m else INF for a, m, e, x in zip(sa, sm, se, s)]
+    elif criterion == 'asme':
+        nf = [1.0 / math.sqrt((a / e) ** 2 + (m / x) ** 2) if a or m else INF for a, m, e, x in zip(sa, sm, se, s)]
+    elif criterion == 'ger':
+        # nf = 2 / {q [1 + sqrt(1 + x^2)]}, q = Sa/Se, x = 2 (Sm/S) / q, which gives Se / Sa at Sm = 0
+        nf = [2.0 * e / (a * (1.0 + math.sqrt(1.0 + (2.0 * m * e / (x * a)) ** 2))) if a else (x / m if m else INF)
+              for a, m, e, x in zip(sa, sm, se, s)]
+    else:
+        nf = [x / (a + m) if a or m else INF for a, m, x in zip(sa, sm, s)]
+    return load_line, nf
+
+
+class NodeMaterialIndex(object):
+    """
+    Node to body integer array and body to material map of a model
+
+    Parameters
+    ----------
+    body_nodes : list of list of int
+        Node IDs of each body, e.g. [body_index.nodes(b) for b in range(len(body_index))] of a ns_index.BodyIndex
+    body_materials : list of str
+        Material name of each body (body.Material), aligned with body_nodes
+
+    Notes
+    -----
+    A node shared by several bodies (shared topology) takes the material of the first of them in body_nodes.
+    """
+
+    def __init__(self, body_nodes, body_materials):
+        self.body_materials = list(body_materials)
+        n_max = max([max(nodes) for nodes in body_nodes if len(nodes)] or [0])
+        node_body = array('i', [-1]) * (n_max + 1)
+        for b, nodes in enumerate(body_nodes):
+            for nid in nodes:
+                if node_body[nid] < 0:
+                    node_body[nid] = b
+        self.node_body = node_body
+
+    def bodies(self, node_ids):
+        """
+        Body index of each node
+
+        Parameters
+        ----------
+        node_ids : list of int
+            Node IDs
+
+        Returns
+        -------
+        list of int
+            Index in body_materials of the body of each node
+        """
+        node_body = self.node_body
+        n = len(node_body)
+        codes = [node_body[nid] if nid < n else -1 for nid in node_ids]
+        if -1 in codes:
+            raise ValueError("Node " + str(node_ids[codes.index(-1)]) + " does not belong to any body of the index")
+        return codes
+
+    def gather(self, node_ids, mats, keys):
+        """
+        Material properties of each node, one gather per property
+
+        Parameters
+        ----------
+        node_ids : list of int
+            Node IDs
+        mats : dict
+            Properties of each material, {material name: {key: value}}
+        keys : list of str
+            Properties to gather, e.g. ['S_e', 'S_ut']
+
+        Returns
+        -------
+        list of list
+            One list per key with the value of each node, aligned with node_ids
+        """
+        codes = self.bodies(node_ids)
+        out = []
+        for key in keys:
+            table = [mats[m][key] for m in self.body_materials]
+            out.append([table[c] for c in codes])
+        return out
+
+    def groups(self, node_ids):
+        """
+        Positions of the nodes of each material
+
+        Parameters
+        ----------
+        node_ids : list of int
+            Node IDs
+
+        Returns
+        -------
+        dict
+            {material name: list of positions in node_ids}
+        """
+        materials = self.body_materials
+        out = {}
+        for k, c in enumerate(self.bodies(node_ids)):
+            out.setdefault(materials[c], []).append(k)
+        return out
+
+
+class SNCurve(object):
+    """
+    S-N curve interpolated linearly in log(stress) - log(cycles)
+
+    Parameters
+    ----------
+    stresses : list of float
+        Alternating stresses of the curve points (> 0)
+    cycles : list of float
+        Cycles to failure of the curve points (> 0), aligned with stresses
+    """
+
+    def __init__(self, stresses, cycles):
+        points = {}
+        for s, n in zip(stresses, cycles):
+            if s <= 0 or n <= 0:
+                raise ValueError("S-N curve stresses and cycles must be positive")
+            points[float(s)] = max(float(n), points.get(float(s), 0.0))
+        if not points:
+            raise ValueError("S-N curve has no points")
+        stresses = sorted(points)
+        self.log_s = [math.log10(s) for s in stresses]
+        self.log_n = [math.log10(points[s]) for s in stresses]
+        self.s_min = stresses[0]
+
+    def cycles(self, sa):
+        """
+        Allowable cycles of each alternating stress
+
+        Parameters
+        ----------
+        sa : list of float
+            Alternating stresses
+
+        Returns
+        -------
+        list of float
+            Cycles to failure, inf below the lowest stress of the curve
+        """
+        log_s = self.log_s
+        log_n = self.log_n
+        last = len(log_s) - 1
+        if last == 0:
+            n0 = 10.0 ** log_n[0]
+            return [n0 if s >= self.s_min else INF for s in sa]
+        # Slope of every segment, the last one also extrapolates above the curve
+        slopes = [(log_n[j + 1] - log_n[j]) / (log_s[j + 1] - log_s[j]) for j in range(last)]
+        s_min = self.s_min
+        out = []
+        for s in sa:
+            if s < s_min:
+                out.append(INF)
+                continue
+            x = math.log10(s)
+            j = min(bisect_right(log_s, x), last) - 1
+            out.append(10.0 ** (log_n[j] + (x - log_s[j]) * slopes[j]))
+        return out
+
+
+def fully_reversed_rows(table):
+    """
+    Positions of the fully reversed points of an Engineering Data S-N Curve property
+
+    The endurance limit (the alternating stress of the last of these points) and the S-N curve of Miner's rule are
+    both taken from these points, so they always describe the same curve.
+
+    Parameters
+    ----------
+    table : dict
+        materials.GetMaterialPropertyByName(ed, "S-N Curve"), see sn_curve()
+
+    Returns
+    -------
+    list of int
+        Positions in the table lists (the unit at position 0 is skipped) of the points with R-Ratio = -1, or with
+        Mean Stress = 0, or of all points if the table has a single curve.  Empty if the table has several curves and
+        none of them is fully reversed.
+    """
+    if 'R-Ratio' in table:
+        return [i for i, r in enumerate(table['R-Ratio']) if i > 0 and r == -1]
+    if 'Mean Stress' in table:
+        return [i for i, m in enumerate(table['Mean Stress']) if i > 0 and m == 0]
+    return list(range(1, len(table['Alternating Stress'])))
+
+
+def sn_curve(table, stress_scale=1.0):
+    """
+    Fully reversed S-N curve of an Engineering Data S-N Curve property
+
+    Parameters
+    ----------
+    table : dict
+        materials.GetMaterialPropertyByName(ed, "S-N Curve"): {'Cycles': [unit, ...], 'Alternating Stress': [unit, ...]}
+        and optionally 'R-Ratio' or 'Mean Stress' [unit, ...] when several curves are defined
+    stress_scale : float, optional
+        Factor from the stress unit of the table to the output stress unit.  Default = 1.0.
+
+    Returns
+    -------
+    SNCurve
+        Points of fully_reversed_rows()
+    """
+    rows = fully_reversed_rows(table)
+    return SNCurve([table['Alternating Stress'][i] * stress_scale for i in rows], [table['Cycles'][i] for i in rows])
+
+
+def miner_damage(index, node_ids, curves, blocks):
+    """
+    Miner's rule damage of every node, sum of n / N(Sa) over the load blocks
+
+    Parameters
+    ----------
+    index : NodeMaterialIndex
+        Node to material index
+    node_ids : list of int
+        Node IDs
+    curves : dict
+        S-N curve of each material, {material name: SNCurve}
+    blocks : list of tuple
+        (sa, n) load blocks: alternating stress of each node (aligned with node_ids) and number of applied cycles
+
+    Returns
+    -------
+    list of float
+        Cumulative damage of each node, aligned with node_ids
+    """
+    damage = [0.0] * len(node_ids)
+    for material, positions in index.groups(node_ids).items():
+        curve = curves[material]
+        for sa, n in blocks:
+            if not n:
+                continue
+            allowable = curve.cycles([sa[k] for k in positions])
+            for k, cycles in zip(positions, allowable):
+                damage[k] += n / cycles
+    return damage
+
+
+def steinberg_blocks(sa_sigma, n_cycles):
+    """
+    Load blocks of Steinberg's three-band method
+
+    Parameters
+    ----------
+    sa_sigma : list of list of float
+        1-sigma, 2-sigma and 3-sigma alternating stress of each node
+    n_cycles : float
+        Total number of cycles, i.e. duration x expected frequency
+
+    Returns
+    -------
+    list of tuple
+        (sa, n) load blocks for miner_damage()
+    """
+    return [(sa, fraction * n_cycles) for sa, (sigma, fraction) in zip(sa_sigma, STEINBERG_BANDS)]
+
+
+def max_damage(node_ids, damage):
+    """
+    Maximum damage and its node
+
+    Parameters
+    ----------
+    node_ids : list of int
+        Node IDs
+    damage : list of float
+        Damage of each node, aligned with node_ids
+
+    Returns
+    -------
+    tuple
+        (maximum damage, node ID), (0.0, None) without nodes
+    """
+    if not len(damage):
+        return 0.0, None
+    k = max(range(len(damage)), key=damage.__getitem__)
+    return damage[k], node_ids[k]
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import time
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    criteria = [sys.argv[2].lower()] if len(sys.argv) > 2 else sorted(CRITERIA)
+    rng = random.Random(3)
+    sa = [rng.uniform(0.0, 20000.0) for _ in range(n_nodes)]
+    sm = [rng.uniform(0.0, 40000.0) for _ in range(n_nodes)]
+    se = [rng.choice([18000.0, 25000.0]) for _ in range(n_nodes)]
+    s = [rng.choice([60000.0, 80000.0]) for _ in range(n_nodes)]
+    for k in range(0, n_nodes, 97):
+        sm[k] = 0.0
+    for k in range(0, n_nodes, 89):
+        sa[k] = 0.0
+
+    def chain(criterion):
+        """One pass per operator with an intermediate list per step, as the DPF operator chain does"""
+        sa_se = [a / e for a, e in zip(sa, se)]
+        sm_s = [m / x for m, x in zip(sm, s)]
+        if criterion in ('g', 's'):
+            total = [a + m for a, m in zip(sa_se, sm_s)]
+            return [1.0 / t if t else INF for t in total]
+        if criterion == 'asme':
+            total = [a + m for a, m in zip([v * v for v in sa_se], [v * v for v in sm_s])]
+            return [math.sqrt(1.0 / t) if t else INF for t in total]
+        if criterion == 'l':
+            total = [a + m for a, m in zip(sa, sm)]
+            return [x / t if t else INF for x, t in zip(s, total)]
+        term1 = [(2.0 * m / a) ** 2 if a and m else None for m, a in zip(sm_s, sa_se)]
+        term2 = [math.sqrt(1.0 + t) - 1.0 if t is not None else None for t in term1]
+        term3 = [0.5 * a * t if t is not None else None for a, t in zip(sa_se, term2)]
+        out = []
+        for a, m, t, e, x, r, q in zip(sa, sm, term3, se, s, sa_se, sm_s):
+            if t is not None:
+                out.append(t / (q * q))
+            elif m:
+                out.append(x / m)
+            elif a:
+                out.append(e / a)
+            else:
+                out.append(INF)
+        return out
+
+    print('%d nodes' % n_nodes)
+    for criterion in criteria:
+        t0 = time.time()
+        chain(criterion)
+        t1 = time.time()
+        safety_factors(sa, sm, se, s, criterion)
+        t2 = time.time()
+        print('%-20s chain: %.3f s   fused: %.3f s' % (CRITERIA[criterion][0], t1 - t0, t2 - t1))
+
+    # Strengths of every node: one lookup chain per node against one gather from the node to body array
+    n_bodies = 200
+    per_body = n_nodes // n_bodies
+    body_nodes = [list(range(b * per_body + 1, (b + 1) * per_body + 2)) for b in range(n_bodies)]
+    body_materials = ['Steel' if b % 3 else 'Aluminum' for b in range(n_bodies)]
+    mats = {'Steel': {'S_e': 25000.0, 'S_ut': 80000.0}, 'Aluminum': {'S_e': 18000.0, 'S_ut': 60000.0}}
+    node_ids = [nid for nodes in body_nodes[::2] for nid in nodes]
+    owner = {}
+    for b, nodes in enumerate(body_nodes):
+        for nid in nodes:
+            owner.setdefault(nid, b)
+    t0 = time.time()
+    ref = [[], []]
+    for nid in node_ids:
+        mat = body_materials[owner[nid]]
+        ref[0].append(mats[mat]['S_e'])
+        ref[1].append(mats[mat]['S_ut'])
+    t1 = time.time()
+    index = NodeMaterialIndex(body_nodes, body_materials)
+    t2 = time.time()
+    index.gather(node_ids, mats, ['S_e', 'S_ut'])
+    t3 = time.time()
+    print('%d nodes of %d bodies' % (len(node_ids), n_bodies))
+    print('lookup per node: %.3f s   build index: %.3f s   gather: %.3f s' % (t1 - t0, t2 - t1, t3 - t2))
+
+    # Miner's rule on Basquin curves N = (S / A)^(1/b) tabulated from 10^3 to 10^7 cycles
+    basquin = {'Steel': (150000.0, -0.1), 'Aluminum': (90000.0, -0.12)}
+    tables = {}
+    for mat, (a, b) in basquin.items():
+        grid = [10.0 ** e for e in range(3, 8)]
+        tables[mat] = {'Cycles': [''] + grid, 'Alternating Stress': ['psi'] + [a * n ** b for n in grid]}
+    curves = dict((mat, sn_curve(tables[mat], 1.0)) for mat in tables)
+    n_node = len(node_ids)
+    sa1 = [rng.uniform(0.0, 60000.0) for _ in range(n_node)]
+    sa2 = [0.5 * v for v in sa1]
+    blocks = [(sa1, 1000.0), (sa2, 20000.0)]
+    t0 = time.time()
+    damage = miner_damage(index, node_ids, curves, blocks)
+    t1 = time.time()
+    print("Miner's rule, %d nodes x %d blocks: %.3f s, max damage %.3g at node %d"
+          % ((n_node, len(blocks), t1 - t0) + max_damage(node_ids, damage)))
+
+    # Steinberg: 1, 2 and 3 sigma bands of one random vibration response, 1 hour at 120 Hz
+    sigma1 = [v / 10.0 for v in sa1]
+    bands = [[sigma * v for v in sigma1] for sigma, fraction in STEINBERG_BANDS]
+    t0 = time.time()
+    damage = miner_damage(index, node_ids, curves, steinberg_blocks(bands, 3600.0 * 120.0))
+    t1 = time.time()
+    print("Steinberg three-band: %.3f s, max damage %.3g at node %d" % ((t1 - t0,) + max_damage(node_ids, damage)))
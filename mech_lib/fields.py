@@ -0,0 +1,273 @@
+"""
+Lazy view of the non-empty fields of a DPF fields container, and alignment of field data to a node order.
+==========================================================================================================
+
+Result operators scoped to part of the model return a fields container with a field for every label space of the
+result file, including fields without any entity (e.g. bodies or element shapes outside the scoping).  The scripts used
+to drop them by building a new ``FieldsContainer`` and re-adding every non-empty field with its label space after every
+read.  ``NonEmptyFields`` wraps the container instead: it finds the non-empty fields on first access (one
+``ElementaryDataCount`` check per field) and exposes them with the same ``FieldCount``, ``[i]`` and
+``GetLabelSpace(i)`` interface, so downstream reductions skip the empty fields without any container being
+materialized.  DPF operators are connected to the original container (empty fields convert and scale for free) and the
+view is taken of their output.
+
+Output columns used to be filled with ``field.GetEntityDataById(nd)[0]`` for every node of every column, one scoping
+lookup per call.  ``ScopingAlignment`` computes the permutation from the scoping IDs of a field to a target node order
+once (and reuses it for every field with the same scoping IDs, e.g. all time sets of one read) so that each column is
+one take of the field data.
+
+A fields container can also hold several fields per time set (e.g. one per element shape) and skip time sets without
+data, so result sources do not index it by position: ``container_by_time()`` selects the fields by their 'time' label
+and concatenates the fields that share a time set.
+
+Run this module directly to compare the view with the copy, and the take with the lookups, on stand-in fields:
+
+    python -m mech_lib.fields [n_fields] [n_empty_per_field] [n_columns]
+"""
+from __future__ import division
+
+
+class NonEmptyFields(object):
+    """
+    Fields of a fields container that have at least one entity
+
+    Parameters
+    ----------
+    fc : FieldsContainer
+        Source fields container, e.g. the evaluated output of a result operator
+    """
+
+    def __init__(self, fc):
+        self.fc = fc
+        self._indices = None
+
+    @property
+    def indices(self):
+        """
+        Indices in the source container of the non-empty fields (found on first access)
+        """
+        if self._indices is None:
+            fc = self.fc
+            self._indices = [i for i in range(fc.FieldCount) if fc[i].ElementaryDataCount > 0]
+        return self._indices
+
+    @property
+    def FieldCount(self):
+        return len(self.indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        return self.fc[self.indices[i]]
+
+    def __iter__(self):
+        fc = self.fc
+        for i in self.indices:
+            yield fc[i]
+
+    def GetLabelSpace(self, i):
+        """
+        Label space of the i-th non-empty field
+        """
+        return self.fc.GetLabelSpace(self.indices[i])
+
+
+def fields_by_time(fields, time_ids):
+    """
+    Merge the fields of a result read into one (scoping_ids, data) pair per time set
+
+    A fields container can hold more than one field per time set (e.g. one per element shape) and skips time sets that
+    have no field, so fields are selected by their time label and fields sharing a time set are concatenated.
+
+    Parameters
+    ----------
+    fields : iterable of tuple
+        (time_id, scoping_ids, data) of each field
+    time_ids : list of int
+        Requested time set ids
+
+    Returns
+    -------
+    list of tuple
+        (scoping_ids, data) for each time id, empty if no field has that time set
+    """
+    by_time = dict((t, ([], [])) for t in time_ids)
+    for t, ids, data in fields:
+        if t in by_time:
+            by_time[t][0].extend(ids)
+            by_time[t][1].extend(data)
+    return [by_time[t] for t in time_ids]
+
+
+def container_by_time(fc, time_ids):
+    """
+    fields_by_time() of the fields of a DPF fields container, selected by their 'time' label
+
+    Parameters
+    ----------
+    fc : FieldsContainer
+        Fields container of a result read
+    time_ids : list of int
+        Requested time set ids
+
+    Returns
+    -------
+    list of tuple
+        (scoping_ids, data) for each time id
+    """
+    return fields_by_time(((fc.GetLabelSpace(i)['time'], fc[i].ScopingIds, fc[i].Data)
+                           for i in range(fc.FieldCount)), time_ids)
+
+
+class ScopingAlignment(object):
+    """
+    Take field data in a target node order
+
+    Parameters
+    ----------
+    target_ids : list of int
+        Node (or element) IDs in output order, e.g. the scoping IDs of the first mean stress field
+    """
+
+    def __init__(self, target_ids):
+        self.target_ids = list(target_ids)
+        self._ids = None
+        self._perm = None
+        self.built = 0
+
+    def permutation(self, scoping_ids):
+        """
+        Position in scoping_ids of every target ID, None if scoping_ids is already in target order
+
+        Parameters
+        ----------
+        scoping_ids : list of int
+            Scoping IDs of a field
+
+        Returns
+        -------
+        list of int or None
+        """
+        ids = list(scoping_ids)
+        if ids == self.target_ids:
+            return None
+        if ids != self._ids:
+            position = dict(zip(ids, range(len(ids))))
+            missing = [nid for nid in self.target_ids if nid not in position]
+            if missing:
+                raise ValueError("Field has no data for " + str(len(missing)) + " target IDs, e.g. " + str(missing[0]))
+            self._ids = ids
+            self._perm = [position[nid] for nid in self.target_ids]
+            self.built += 1
+        return self._perm
+
+    def take(self, field, component=0):
+        """
+        One component of the field data of every target ID
+
+        Parameters
+        ----------
+        field : Field
+            Field with ScopingIds and Data (n_components values per entity)
+        component : int, optional
+            Component to take.  Default = 0, e.g. a scalar von Mises stress.
+
+        Returns
+        -------
+        list of float
+            Values aligned with target_ids
+        """
+        ids = field.ScopingIds
+        data = field.Data
+        n_comp = len(data) // len(ids) if len(ids) else 1
+        perm = self.permutation(ids)
+        if perm is None:
+            if n_comp == 1:
+                return list(data)
+            return list(data[component::n_comp])
+        if n_comp == 1:
+            return [data[k] for k in perm]
+        return [data[k * n_comp + component] for k in perm]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_fields = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_empty = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    n_columns = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    class _Field(object):
+        def __init__(self, n):
+            self.ElementaryDataCount = n
+            self.Data = [float(k) for k in range(n)]
+            self.ScopingIds = list(range(1, n + 1))
+
+        def GetEntityDataById(self, nid):
+            k = self.ScopingIds.index(nid)
+            return self.Data[k:k + 1]
+
+    class _FieldsContainer(object):
+        """Stand-in for FieldsContainer: Add copies the label space, as the .NET container does"""
+
+        def __init__(self):
+            self.fields = []
+            self.spaces = []
+            self.Labels = []
+
+        @property
+        def FieldCount(self):
+            return len(self.fields)
+
+        def __getitem__(self, i):
+            return self.fields[i]
+
+        def GetLabelSpace(self, i):
+            return self.spaces[i]
+
+        def Add(self, field, space):
+            self.fields.append(field)
+            self.spaces.append(dict(space))
+
+    source = _FieldsContainer()
+    for t in range(n_fields):
+        source.Add(_Field(500), {'time': t + 1, 'body': 0})
+        for b in range(n_empty):
+            source.Add(_Field(0), {'time': t + 1, 'body': b + 1})
+
+    def copy(fc):
+        result = _FieldsContainer()
+        result.Labels = list(fc.GetLabelSpace(0).keys())
+        for i in range(fc.FieldCount):
+            if fc[i].ElementaryDataCount > 0:
+                result.Add(fc[i], fc.GetLabelSpace(i))
+        return result
+
+    t0 = time.time()
+    copied = copy(source)
+    [max(copied[i].Data) for i in range(copied.FieldCount)]
+    t1 = time.time()
+    view = NonEmptyFields(source)
+    [max(f.Data) for f in view]
+    t2 = time.time()
+    print('%d fields (%d empty)' % (source.FieldCount, source.FieldCount - n_fields))
+    print('copy + reduce: %.4f s' % (t1 - t0))
+    print('view + reduce: %.4f s' % (t2 - t1))
+
+    # Columns of fields read in a different node order (one field per time set, same scoping): a scoping lookup per
+    # node against one take per column, for the same columns both ways
+    fields = []
+    for t in range(n_columns):
+        field = _Field(2000)
+        field.ScopingIds.reverse()
+        field.Data = [v + t for v in field.Data]
+        fields.append(field)
+    nodes = sorted(fields[0].ScopingIds)
+    t0 = time.time()
+    [[f.GetEntityDataById(nd)[0] for nd in nodes] for f in fields]
+    t1 = time.time()
+    aligned = ScopingAlignment(nodes)
+    [aligned.take(f) for f in fields]
+    t2 = time.time()
+    print('%d nodes x %d columns, by lookup: %.4f s, by take: %.4f s' % (len(nodes), n_columns, t1 - t0, t2 - t1))
@@ -0,0 +1,281 @@
+"""
+Vectorized force and moment reactions for joints.
+=================================================
+
+For every MPC184 joint the reaction of a fixed DOF is the constraint force/moment (SMISC items 1 to 6) and the
+reaction of a free DOF is the joint element force/moment (JEF, SMISC items 43 to 48).  The free/fixed state of the six
+DOFs is read from the joint definition once per joint into a boolean mask, and the components of all joints and all
+times are then selected and totalled one column at a time instead of comparing the joint enums for every joint and
+time.
+
+The SMISC reactions are components in the joint's reference coordinate system.  global_components() rotates them to the
+global coordinate system for all joints and times at once: the rotation matrix of every joint (columns = the reference
+X, Y and Z axes in global coordinates) is collected once, its nine entries are expanded to joint-major columns and each
+global component is one multiply-add pass over those columns.
+
+Columns are flat and joint-major (row ``j * n_times + t``), the layout returned by mech_lib.smisc_reader.  Values are
+plain floats; the reaction sign and the unit conversion are applied as SMISC read factors by the calling script.
+
+Run this module directly to benchmark the kernel against the per-joint loop on synthetic arrays:
+
+    python -m mech_lib.joint_reactions [n_joints] [n_times]
+"""
+from __future__ import division
+
+import math
+import random
+
+from mech_lib.beam_resultants import expand
+
+# item_index is the SMISC item ID found in MPC184 documentation
+# FX, FY, FZ = constraint forces, MX, MY, MZ = constraint moments, JEF1 to JEF6 = joint element forces and moments
+FORCE_ITEMS = {'FX': 1, 'FY': 2, 'FZ': 3, 'JEF1': 43, 'JEF2': 44, 'JEF3': 45}
+MOMENT_ITEMS = {'MX': 4, 'MY': 5, 'MZ': 6, 'JEF4': 46, 'JEF5': 47, 'JEF6': 48}
+JOINT_ITEMS = dict(list(FORCE_ITEMS.items()) + list(MOMENT_ITEMS.items()))
+
+# Output components in DOF order, the constraint item and the joint element item of each
+COMPONENTS = ['FX', 'FY', 'FZ', 'MX', 'MY', 'MZ']
+JEF_ITEMS = ['JEF1', 'JEF2', 'JEF3', 'JEF4', 'JEF5', 'JEF6']
+
+# Keys of the dictionary returned by compute_joint_reactions(), in the order of the output spreadsheet columns
+COLUMN_KEYS = ['FX', 'FY', 'FZ', 'F_total', 'MX', 'MY', 'MZ', 'M_total']
+
+# Keys of the dictionary returned by global_components() (the totals do not change with the coordinate system)
+GLOBAL_KEYS = ['FX_global', 'FY_global', 'FZ_global', 'MX_global', 'MY_global', 'MZ_global']
+
+
+def dof_mask(free_x, free_y, free_z, rotations):
+    """
+    Build the free/fixed mask of one joint
+
+    Parameters
+    ----------
+    free_x, free_y, free_z : bool
+        True if the translation DOF is free
+    rotations : str
+        Free rotation DOFs: 'all', 'x', 'y', 'z' or '' (none), e.g. from the JointRotationDOFType enum name
+
+    Returns
+    -------
+    list of bool
+        True for each free DOF in COMPONENTS order
+    """
+    rotations = rotations.lower()
+    return [bool(free_x), bool(free_y), bool(free_z),
+            rotations in ('all', 'x'), rotations in ('all', 'y'), rotations in ('all', 'z')]
+
+
+def rotation_dofs(enum_name):
+    """
+    Map a JointRotationDOFType enum name (e.g. 'FreeAll', 'FreeX', 'Fixed') to the rotations argument of dof_mask()
+    """
+    name = str(enum_name).lower()
+    if name == 'freeall':
+        return 'all'
+    if name in ('freex', 'freey', 'freez'):
+        return name[-1]
+    return ''
+
+
+def select_components(items, masks, n_times):
+    """
+    Select the constraint or joint element component of every DOF for all joints and times
+
+    Parameters
+    ----------
+    items : dict
+        Flat joint-major columns keyed by the names in JOINT_ITEMS
+    masks : list of list of bool
+        dof_mask() of each joint
+    n_times : int
+        Number of time sets in each column
+
+    Returns
+    -------
+    dict
+        Flat joint-major columns keyed by COMPONENTS
+    """
+    out = {}
+    for d, (con, jef) in enumerate(zip(COMPONENTS, JEF_ITEMS)):
+        free = expand([m[d] for m in masks], n_times)
+        out[con] = [j if f else c for f, c, j in zip(free, items[con], items[jef])]
+    return out
+
+
+def compute_joint_reactions(items, masks, n_times):
+    """
+    Compute the force and moment reaction components and totals for all joints and times
+
+    Parameters
+    ----------
+    items : dict
+        Flat joint-major columns keyed by the names in JOINT_ITEMS
+    masks : list of list of bool
+        dof_mask() of each joint
+    n_times : int
+        Number of time sets in each column
+
+    Returns
+    -------
+    dict
+        Flat joint-major columns keyed by COLUMN_KEYS
+    """
+    out = select_components(items, masks, n_times)
+    out['F_total'] = [math.sqrt(x*x + y*y + z*z) for x, y, z in zip(out['FX'], out['FY'], out['FZ'])]
+    out['M_total'] = [math.sqrt(x*x + y*y + z*z) for x, y, z in zip(out['MX'], out['MY'], out['MZ'])]
+    return out
+
+
+def csys_matrix(x_axis, y_axis, z_axis):
+    """
+    Build the rotation matrix of a coordinate system from its axes
+
+    Parameters
+    ----------
+    x_axis, y_axis, z_axis : sequence of float
+        Direction of each axis in global coordinates, e.g. the XAxis, YAxis and ZAxis of a coordinate system object.
+        The axes are normalized.
+
+    Returns
+    -------
+    list of float
+        The nine entries of the matrix, row by row, whose columns are the unit axes (local to global)
+    """
+    axes = []
+    for a in (x_axis, y_axis, z_axis):
+        a = [float(c) for c in a]
+        n = math.sqrt(a[0]*a[0] + a[1]*a[1] + a[2]*a[2])
+        axes.append([c / n for c in a])
+    return [axes[c][r] for r in range(3) for c in range(3)]
+
+
+IDENTITY = csys_matrix([1, 0, 0], [0, 1, 0], [0, 0, 1])
+
+
+def global_components(res, matrices, n_times):
+    """
+    Rotate the force and moment components of all joints and times from the reference to the global coordinate system
+
+    Parameters
+    ----------
+    res : dict
+        Columns returned by compute_joint_reactions()
+    matrices : list of list of float
+        csys_matrix() of the reference coordinate system of each joint
+    n_times : int
+        Number of time sets in each column
+
+    Returns
+    -------
+    dict
+        Flat joint-major columns keyed by GLOBAL_KEYS
+    """
+    entries = [expand([m[k] for m in matrices], n_times) for k in range(9)]
+    out = {}
+    for local, keys in ((COMPONENTS[:3], GLOBAL_KEYS[:3]), (COMPONENTS[3:], GLOBAL_KEYS[3:])):
+        x, y, z = [res[k] for k in local]
+        for r, key in enumerate(keys):
+            a, b, c = entries[3*r:3*r + 3]
+            out[key] = [ai*xi + bi*yi + ci*zi for ai, bi, ci, xi, yi, zi in zip(a, b, c, x, y, z)]
+    return out
+
+
+def joint_rows(res, prefix, times, sets, keys=COLUMN_KEYS):
+    """
+    Yield one output row per joint and time set
+
+    Parameters
+    ----------
+    res : dict
+        Columns returned by compute_joint_reactions()
+    prefix : list of list
+        Leading (time independent) output values for each joint
+    times, sets : list
+        Time and set values written for each time set
+    keys : list of str, optional
+        Result columns written after the time and set columns.  Default = COLUMN_KEYS.
+
+    Returns
+    -------
+    generator of list
+    """
+    n = len(times)
+    columns = [res[k] for k in keys]
+    for b, pre in enumerate(prefix):
+        for t in range(n):
+            i = b * n + t
+            yield pre + [times[t], sets[t]] + [c[i] for c in columns]
+
+
+def _scalar_reference(items, masks, n_times):
+    """
+    Per-joint, per-time loop equivalent to the original scripts (for checking and benchmarking only)
+    """
+    out = dict((k, []) for k in COLUMN_KEYS)
+    for b, mask in enumerate(masks):
+        for t in range(n_times):
+            i = b * n_times + t
+            vals = []
+            for d in range(6):
+                if mask[d]:
+                    vals.append(items[JEF_ITEMS[d]][i])
+                else:
+                    vals.append(items[COMPONENTS[d]][i])
+            for k, v in zip(COMPONENTS, vals):
+                out[k].append(v)
+            out['F_total'].append((vals[0]**2 + vals[1]**2 + vals[2]**2)**0.5)
+            out['M_total'].append((vals[3]**2 + vals[4]**2 + vals[5]**2)**0.5)
+    return out
+
+
+def _rotate_reference(res, matrices, n_times):
+    """
+    Per-joint, per-time matrix-vector products (for checking and benchmarking only)
+    """
+    out = dict((k, []) for k in GLOBAL_KEYS)
+    for b, m in enumerate(matrices):
+        for t in range(n_times):
+            i = b * n_times + t
+            for local, keys in ((COMPONENTS[:3], GLOBAL_KEYS[:3]), (COMPONENTS[3:], GLOBAL_KEYS[3:])):
+                v = [res[k][i] for k in local]
+                for r, key in enumerate(keys):
+                    out[key].append(sum(m[3*r + c] * v[c] for c in range(3)))
+    return out
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_joints = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_times = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rng = random.Random(0)
+    size = n_joints * n_times
+    items = dict((k, [rng.uniform(-1000.0, 1000.0) for _ in range(size)]) for k in JOINT_ITEMS)
+    rot = ['all', 'x', 'y', 'z', '']
+    masks = [dof_mask(rng.random() < 0.5, rng.random() < 0.5, rng.random() < 0.5, rng.choice(rot))
+             for _ in range(n_joints)]
+
+    t0 = time.time()
+    res = compute_joint_reactions(items, masks, n_times)
+    t1 = time.time()
+    _scalar_reference(items, masks, n_times)
+    t2 = time.time()
+    print('%d joints x %d times' % (n_joints, n_times))
+    print('column kernel: %.3f s' % (t1 - t0))
+    print('scalar loop:   %.3f s' % (t2 - t1))
+
+    def random_csys():
+        x = [rng.uniform(-1, 1) for _ in range(3)]
+        v = [rng.uniform(-1, 1) for _ in range(3)]
+        z = [x[1]*v[2] - x[2]*v[1], x[2]*v[0] - x[0]*v[2], x[0]*v[1] - x[1]*v[0]]
+        y = [z[1]*x[2] - z[2]*x[1], z[2]*x[0] - z[0]*x[2], z[0]*x[1] - z[1]*x[0]]
+        return csys_matrix(x, y, z)
+
+    matrices = [random_csys() for _ in range(n_joints)]
+    t0 = time.time()
+    global_components(res, matrices, n_times)
+    t1 = time.time()
+    _rotate_reference(res, matrices, n_times)
+    t2 = time.time()
+    print('to global, batched:   %.3f s' % (t1 - t0))
+    print('to global, per joint: %.3f s' % (t2 - t1))
@@ -0,0 +1,397 @@
+"""
+Net force and moment reactions of many named selections from one nodal force read.
+==================================================================================
+
+Building an ``element_nodal_forces`` operator for every named selection reads the element records of the result file
+once per named selection, and nodes shared by several named selections (edges, common faces) are read once per
+selection they belong to.  Here the nodes of all named selections are merged into one sorted union, the nodal forces
+of the union are read once per chunk of time sets, and the net force and moment of every named selection are obtained
+with a segmented sum over a precomputed node to named selection membership index.  The cost is one read of the union
+plus one pass over the memberships, instead of one read per named selection.
+
+``NodeSetIndex`` holds the union and the membership index in a compressed layout: ``members`` lists the union
+positions of the nodes of every named selection one after the other, and ``offsets[s]:offsets[s + 1]`` is the segment
+of named selection ``s``.
+
+The moments are summed about the global origin.  transfer_reactions() moves them to a reference point per named
+selection afterwards, using M_p = M_0 - p x F on the net force and moment of every named selection and time at once (no
+per node work), and resolves the components in the axes of a coordinate system per named selection.
+
+The ``data`` of each time set returned by a source read is node-major with 3 force components per node.  Time the per
+named selection reads against the union read with:
+
+    python -m mech_lib.nodal_reactions [n_nodes] [n_sets] [n_times]
+"""
+from __future__ import division
+
+import math
+import random
+import struct
+
+from mech_lib.beam_resultants import expand
+from mech_lib.fields import container_by_time
+from mech_lib.joint_reactions import IDENTITY
+
+# Keys of the dictionary returned by net_reactions()
+COLUMN_KEYS = ['FX', 'FY', 'FZ', 'F_total', 'MX', 'MY', 'MZ', 'M_total']
+
+
+class NodeSetIndex(object):
+    """
+    Union of the nodes of several node sets and the membership of every node set in the union
+
+    Parameters
+    ----------
+    node_sets : list of list of int
+        Node IDs of each node set, e.g. of each named selection.  Duplicates within a set are ignored.
+    """
+
+    def __init__(self, node_sets):
+        union = set()
+        for nodes in node_sets:
+            union.update(nodes)
+        self.node_ids = sorted(union)
+        self.position = dict((nid, p) for p, nid in enumerate(self.node_ids))
+        self.members = []
+        self.offsets = [0]
+        for nodes in node_sets:
+            self.members.extend(sorted(self.position[nid] for nid in set(nodes)))
+            self.offsets.append(len(self.members))
+        self.counts = [self.offsets[s + 1] - self.offsets[s] for s in range(len(node_sets))]
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def segment_sums(self, column):
+        """
+        Sum a union-aligned column over the nodes of each node set
+
+        Parameters
+        ----------
+        column : list of float
+            One value per union node, in node_ids order
+
+        Returns
+        -------
+        list of float
+            One sum per node set
+        """
+        members = self.members
+        offsets = self.offsets
+        return [sum([column[p] for p in members[offsets[s]:offsets[s + 1]]]) for s in range(len(self.counts))]
+
+    def segment_max(self, column):
+        """
+        Maximum of a union-aligned column over the nodes of each node set and the union position where it occurs
+
+        Parameters
+        ----------
+        column : list of float
+            One value per union node, in node_ids order
+
+        Returns
+        -------
+        tuple of list
+            (maxima, positions), one entry per node set.  An empty node set gives (-inf, None).
+        """
+        members = self.members
+        offsets = self.offsets
+        maxima = []
+        positions = []
+        for s in range(len(self.counts)):
+            segment = members[offsets[s]:offsets[s + 1]]
+            values = [column[p] for p in segment]
+            if not values:
+                maxima.append(float('-inf'))
+                positions.append(None)
+                continue
+            m = max(values)
+            maxima.append(m)
+            positions.append(segment[values.index(m)])
+        return maxima, positions
+
+
+def gather_nodal(ids, data, position, n_nodes, n_components=3, scale=1.0):
+    """
+    Scatter the entities of a flat multi-component field into union-aligned columns
+
+    Parameters
+    ----------
+    ids : list of int
+        Scoping ids of the field
+    data : list of float
+        Flat entity-major field data with n_components values per entity
+    position : dict
+        Union position keyed by node ID (NodeSetIndex.position).  Entities not in the union are skipped.
+    n_nodes : int
+        Number of union nodes
+    n_components : int, optional
+        Number of components per entity.  Default = 3.
+    scale : float, optional
+        Factor applied to every value.  Default = 1.0.
+
+    Returns
+    -------
+    list of list of float
+        One column per component.  Union nodes missing from the field are set to 0.0, a node that appears more than
+        once (fields of several element shapes merged into one time set) gets the sum of its entries.
+    """
+    columns = [[0.0] * n_nodes for _ in range(n_components)]
+    for k, nid in enumerate(ids):
+        p = position.get(nid)
+        if p is None:
+            continue
+        offset = k * n_components
+        for c in range(n_components):
+            columns[c][p] += data[offset + c] * scale
+    return columns
+
+
+def net_reactions(index, coords, fields, scale=1.0):
+    """
+    Net force and moment about the global origin of every node set at every time set
+
+    Parameters
+    ----------
+    index : NodeSetIndex
+        Union and membership of the node sets
+    coords : list of list of float
+        X, Y and Z coordinate columns of the union nodes (gather_nodal() of the node coordinates field)
+    fields : list of tuple
+        (scoping_ids, data) of the nodal forces for each time set, as returned by a source read()
+    scale : float, optional
+        Factor applied to the forces (e.g. -1 for reactions or -sigma for random vibration).  Default = 1.0.
+
+    Returns
+    -------
+    dict
+        Flat set-major columns (row ``s * n_times + t``) keyed by COLUMN_KEYS
+    """
+    n_sets = len(index.counts)
+    n_times = len(fields)
+    out = dict((k, [0.0] * (n_sets * n_times)) for k in COLUMN_KEYS)
+    x, y, z = coords
+    for t, (ids, data) in enumerate(fields):
+        fx, fy, fz = gather_nodal(ids, data, index.position, len(index), 3, scale)
+        mx = [yi*fzi - zi*fyi for yi, zi, fyi, fzi in zip(y, z, fy, fz)]
+        my = [zi*fxi - xi*fzi for xi, zi, fxi, fzi in zip(x, z, fx, fz)]
+        mz = [xi*fyi - yi*fxi for xi, yi, fxi, fyi in zip(x, y, fx, fy)]
+        for key, column in (('FX', fx), ('FY', fy), ('FZ', fz), ('MX', mx), ('MY', my), ('MZ', mz)):
+            col = out[key]
+            for s, v in enumerate(index.segment_sums(column)):
+                col[s * n_times + t] = v
+    out['F_total'] = [math.sqrt(a*a + b*b + c*c) for a, b, c in zip(out['FX'], out['FY'], out['FZ'])]
+    out['M_total'] = [math.sqrt(a*a + b*b + c*c) for a, b, c in zip(out['MX'], out['MY'], out['MZ'])]
+    return out
+
+
+def transfer_reactions(res, origins, matrices, n_times):
+    """
+    Move the net moments to a reference point and resolve the components in a coordinate system, per node set
+
+    Parameters
+    ----------
+    res : dict
+        Columns returned by net_reactions()
+    origins : list of list of float
+        Global coordinates of the moment reference point of each node set (same length unit as the node coordinates)
+    matrices : list of list of float or None
+        mech_lib.joint_reactions.csys_matrix() of the coordinate system of each node set, or None for the global axes
+    n_times : int
+        Number of time sets in each column
+
+    Returns
+    -------
+    dict
+        Flat set-major columns keyed by COLUMN_KEYS
+    """
+    px, py, pz = [expand([o[c] for o in origins], n_times) for c in range(3)]
+    fx, fy, fz = res['FX'], res['FY'], res['FZ']
+    mx = [m - (b*fzi - c*fyi) for m, b, c, fyi, fzi in zip(res['MX'], py, pz, fy, fz)]
+    my = [m - (c*fxi - a*fzi) for m, a, c, fxi, fzi in zip(res['MY'], px, pz, fx, fz)]
+    mz = [m - (a*fyi - b*fxi) for m, a, b, fxi, fyi in zip(res['MZ'], px, py, fx, fy)]
+    out = {}
+    if all(m is None for m in matrices):
+        out.update({'FX': list(fx), 'FY': list(fy), 'FZ': list(fz), 'MX': mx, 'MY': my, 'MZ': mz})
+    else:
+        # Global to local is the transpose of the local to global matrix: component i = sum over j of R[j][i] * v[j]
+        entries = [expand([m[k] if m is not None else IDENTITY[k] for m in matrices], n_times) for k in range(9)]
+        for keys, (x, y, z) in ((('FX', 'FY', 'FZ'), (fx, fy, fz)), (('MX', 'MY', 'MZ'), (mx, my, mz))):
+            for i, key in enumerate(keys):
+                a, b, c = entries[i], entries[3 + i], entries[6 + i]
+                out[key] = [ai*xi + bi*yi + ci*zi for ai, bi, ci, xi, yi, zi in zip(a, b, c, x, y, z)]
+    out['F_total'] = list(res['F_total'])
+    out['M_total'] = [math.sqrt(a*a + b*b + c*c) for a, b, c in zip(out['MX'], out['MY'], out['MZ'])]
+    return out
+
+
+class DpfNodalForceSource(object):
+    """
+    Nodal force source reading a result file through DPF in Mechanical
+
+    Parameters
+    ----------
+    data_sources : dpf.DataSources
+        Data sources of the result file
+    unit_name : str, optional
+        Force unit to convert the forces to, e.g. 'lbf'.  Default = None (result file units).
+    """
+
+    def __init__(self, data_sources, unit_name=None):
+        import Ans.DataProcessing as dpf
+        self.dpf = dpf
+        self.data_sources = data_sources
+        self.unit_name = unit_name
+        self.reads = 0
+
+    def read(self, node_ids, time_ids):
+        """
+        Read the element nodal forces summed at the nodes
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        dpf = self.dpf
+        time_scoping = dpf.Scoping()
+        time_scoping.Ids = list(time_ids)
+        time_scoping.Location = 'Time'
+        mesh_scoping = dpf.Scoping()
+        mesh_scoping.Ids = list(node_ids)
+        mesh_scoping.Location = dpf.locations.nodal
+        op = dpf.operators.result.element_nodal_forces()
+        op.inputs.data_sources.Connect(self.data_sources)
+        op.inputs.time_scoping.Connect(time_scoping)
+        op.inputs.mesh_scoping.Connect(mesh_scoping)
+        op.inputs.requested_location.Connect('Nodal')
+        fc = op.outputs.fields_container
+        if self.unit_name:
+            conv = dpf.operators.math.unit_convert_fc()
+            conv.inputs.unit_name.Connect(self.unit_name)
+            conv.inputs.fields_container.Connect(fc)
+            fc = conv.outputs.fields_container
+        fc = fc.GetData()
+        self.reads += 1
+        return container_by_time(fc, time_ids)
+
+
+class SyntheticNodalForceSource(object):
+    """
+    Local stand-in for a result file holding nodal forces
+
+    The forces of each node and time set are stored packed so that every read has to unpack the record of every
+    requested node.  ``reads`` and ``nodes_read`` count the operator evaluations and node records traversed.
+
+    Parameters
+    ----------
+    node_ids : list of int
+        Nodes in the result file
+    time_ids : list of int
+        Time set ids in the result file
+    seed : int, optional
+        Random seed.  Default = 0.
+    """
+
+    def __init__(self, node_ids, time_ids, seed=0):
+        rng = random.Random(seed)
+        self._records = {}
+        for t in time_ids:
+            for nid in node_ids:
+                self._records[(nid, t)] = struct.pack('<3d', *[rng.uniform(-100.0, 100.0) for _ in range(3)])
+        self.reads = 0
+        self.nodes_read = 0
+
+    def read(self, node_ids, time_ids):
+        """
+        Read the nodal forces of the requested nodes
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        self.reads += 1
+        out = []
+        for t in time_ids:
+            ids = []
+            data = []
+            for nid in node_ids:
+                record = self._records.get((nid, t))
+                if record is None:
+                    continue
+                self.nodes_read += 1
+                ids.append(nid)
+                data.extend(struct.unpack('<3d', record))
+            out.append((ids, data))
+        return out
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_sets = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    n_times = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    rng = random.Random(1)
+    node_ids = list(range(1, n_nodes + 1))
+    time_ids = list(range(1, n_times + 1))
+    source = SyntheticNodalForceSource(node_ids, time_ids)
+    xyz = dict((nid, [rng.uniform(-50.0, 50.0) for _ in range(3)]) for nid in node_ids)
+
+    # Overlapping node sets: each covers a random window of the nodes, so neighbouring sets share nodes
+    width = max(1, 3 * n_nodes // n_sets)
+    node_sets = []
+    for s in range(n_sets):
+        first = rng.randrange(0, max(1, n_nodes - width))
+        node_sets.append(node_ids[first:first + width])
+
+    # One read per node set, as in the original script
+    t0 = time.time()
+    single = []
+    for nodes in node_sets:
+        index = NodeSetIndex([nodes])
+        coords = gather_nodal(nodes, [c for nid in nodes for c in xyz[nid]], index.position, len(index))
+        single.append(net_reactions(index, coords, source.read(index.node_ids, time_ids), -1.0))
+    t1 = time.time()
+    single_reads, single_nodes = source.reads, source.nodes_read
+    source.reads = source.nodes_read = 0
+
+    # One read of the union
+    index = NodeSetIndex(node_sets)
+    coords = gather_nodal(index.node_ids, [c for nid in index.node_ids for c in xyz[nid]], index.position, len(index))
+    union = net_reactions(index, coords, source.read(index.node_ids, time_ids), -1.0)
+    t2 = time.time()
+
+    for s in range(n_sets):
+        for k in COLUMN_KEYS:
+            a = union[k][s * n_times:(s + 1) * n_times]
+            b = single[s][k]
+            assert all(abs(u - v) <= 1e-9 * max(1.0, abs(v)) for u, v in zip(a, b)), (s, k)
+    print('%d nodes, %d named selections (%d memberships, %d union nodes) x %d times' % (
+        n_nodes, n_sets, len(index.members), len(index), n_times))
+    print('per named selection: %.3f s, %d reads, %d node records' % (t1 - t0, single_reads, single_nodes))
+    print('union read:          %.3f s, %d reads, %d node records' % (t2 - t1, source.reads, source.nodes_read))
+
+    # Moments about a point per named selection: transferring the net reactions matches summing (r - p) x F per node
+    from mech_lib.joint_reactions import csys_matrix
+    origins = [[rng.uniform(-50.0, 50.0) for _ in range(3)] for _ in range(n_sets)]
+    matrices = [None] * n_sets
+    matrices[0] = csys_matrix([0, 1, 0], [-1, 0, 0], [0, 0, 1])
+    t0 = time.time()
+    moved = transfer_reactions(union, origins, matrices, n_times)
+    t1 = time.time()
+    for s in (0, n_sets - 1):
+        nodes = node_sets[s]
+        sub = NodeSetIndex([nodes])
+        shifted = [c - origins[s][k] for nid in nodes for k, c in enumerate(xyz[nid])]
+        ref = net_reactions(sub, gather_nodal(nodes, shifted, sub.position, len(sub)),
+                            source.read(sub.node_ids, time_ids), -1.0)
+        if s == 0:
+            ref = dict((k, ref[k]) for k in COLUMN_KEYS)
+            ref['FX'], ref['FY'] = ref['FY'], [-v for v in ref['FX']]
+            ref['MX'], ref['MY'] = ref['MY'], [-v for v in ref['MX']]
+        for k in COLUMN_KEYS:
+            a = moved[k][s * n_times:(s + 1) * n_times]
+            assert all(abs(u - v) <= 1e-7 * max(1.0, abs(v)) for u, v in zip(a, ref[k])), (s, k)
+    print('moments moved to %d reference points: %.4f s' % (n_sets, t1 - t0))
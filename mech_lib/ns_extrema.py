@@ -0,0 +1,625 @@
+"""
+Maximum nodal result of many named selections from one result read.
+===================================================================
+
+Scoping a ``stress_von_mises`` (or ``displacement``) operator to one named selection at a time evaluates the operator,
+the unit conversion, the scaling and ``min_max_fc`` once per named selection, so a model with 100 named selections
+reads the result file 100 times.  Here the elements of all named selections are merged into one scoping, the nodal
+result of that union is read once per chunk of time sets, and the maximum of every named selection, together with the
+node where it occurs, is obtained with a segmented reduction over the node to named selection membership index of
+mech_lib.nodal_reactions.NodeSetIndex.
+
+Nodal values of an elemental result (stress) are averaged over the scoped elements, so a plain union read would
+average a node shared by two named selections (e.g. at a body interface) over the elements of both.  For those results
+``read_sets()`` reads the unaveraged element nodal values of the union once and averages them over the elements of
+each named selection in memory, which gives the same values as one read per named selection.  Nodal results
+(deformation, velocity, acceleration) are not averaged and are read on the union directly.
+
+A list of result kinds (RESULT_KINDS: stress, deformation, velocity, acceleration) is extracted in one pass with
+result_maxima(): each time chunk is read once per kind, and a vector kind gives the maxima of its norm and of its three
+components from that single read.
+
+``TopNodes`` keeps the N highest nodes of every named selection (node, value and time set of the node's peak) in one
+bounded min-heap per named selection, updated as each chunk of time sets is read, so hotspot tables cost O(named
+selections x N) memory whatever the mesh size.  Only the N largest values of a segment are offered to its heap
+(heapq.nlargest) and a value below the smallest kept value is rejected before any heap work.  maxima_rows() and
+hotspot_rows() lay the maxima and the kept nodes out as the output rows of the named selection scripts.
+
+Sources return one value per node and also provide ``read_sets(element_sets, time_ids)`` for results averaged at the
+nodes of each set.  The benchmark times the reads per named selection against the union read and the heaps against a
+full sort:
+
+    python -m mech_lib.ns_extrema [n_elements] [n_sets] [n_times] [top_n]
+"""
+from __future__ import division
+
+import heapq
+import math
+import random
+import struct
+
+from mech_lib.fields import container_by_time
+from mech_lib.nodal_reactions import NodeSetIndex, gather_nodal
+
+# Keys of the dictionary returned by nodal_maxima()
+COLUMN_KEYS = ['max', 'node']
+
+# Result kinds of result_maxima(): (dpf.operators.result operator, location of the ids read, output quantities).  A kind
+# with one quantity is a scalar result, a kind with four quantities is a vector result giving its norm and its X, Y and
+# Z components (the maximum of a component is the largest signed value).
+RESULT_KINDS = {
+    'stress': ('stress_von_mises', 'Elemental', ['Eqv. Stress']),
+    'deformation': ('displacement', 'Nodal', ['Total Deformation', 'X Deformation', 'Y Deformation', 'Z Deformation']),
+    'velocity': ('velocity', 'Nodal', ['Total Velocity', 'X Velocity', 'Y Velocity', 'Z Velocity']),
+    'acceleration': ('acceleration', 'Nodal',
+                     ['Total Acceleration', 'X Acceleration', 'Y Acceleration', 'Z Acceleration']),
+}
+
+# Element nodal result and invariant operator giving each averaged result of read_sets(): the tensor is averaged at the
+# nodes before the invariant, as in the nodal result operator
+ELEMENTAL_NODAL_RESULTS = {
+    'stress_von_mises': ('stress', 'von_mises_eqv_fc'),
+}
+
+
+def gather_scalar(ids, data, position, n_nodes, fill=float('-inf')):
+    """
+    Scatter a one-component nodal field into a union-aligned column
+
+    Parameters
+    ----------
+    ids : list of int
+        Scoping ids of the field
+    data : list of float
+        Field data, one value per entity
+    position : dict
+        Union position keyed by node ID (NodeSetIndex.position).  Entities not in the union are skipped.
+    n_nodes : int
+        Number of union nodes
+    fill : float, optional
+        Value of the union nodes missing from the field.  Default = -inf (never a maximum).
+
+    Returns
+    -------
+    list of float
+    """
+    column = [fill] * n_nodes
+    for nid, v in zip(ids, data):
+        p = position.get(nid)
+        if p is not None:
+            column[p] = v
+    return column
+
+
+def nodal_maxima(index, fields, scale=1.0):
+    """
+    Maximum value and node of every node set at every time set
+
+    Parameters
+    ----------
+    index : mech_lib.nodal_reactions.NodeSetIndex
+        Union and membership of the node sets
+    fields : list of tuple
+        (scoping_ids, data) of the nodal result for each time set, as returned by a source read()
+    scale : float, optional
+        Positive factor applied to the maxima (e.g. the sigma of a random vibration).  Default = 1.0.
+
+    Returns
+    -------
+    dict
+        Flat set-major columns (row ``s * n_times + t``) keyed by COLUMN_KEYS.  'node' is the node ID of the maximum,
+        None (and 'max' None) for a node set without result values.
+    """
+    n_sets = len(index.counts)
+    n_times = len(fields)
+    out = dict((k, [None] * (n_sets * n_times)) for k in COLUMN_KEYS)
+    for t, (ids, data) in enumerate(fields):
+        column = gather_scalar(ids, data, index.position, len(index))
+        maxima, positions = index.segment_max(column)
+        for s, (m, p) in enumerate(zip(maxima, positions)):
+            if p is None or m == float('-inf'):
+                continue
+            i = s * n_times + t
+            out['max'][i] = m * scale
+            out['node'][i] = index.node_ids[p]
+    return out
+
+
+def vector_fields(fields):
+    """
+    Split 3-component nodal fields into the fields of their norm and of each component
+
+    Parameters
+    ----------
+    fields : list of tuple
+        (scoping_ids, data) for each time set with 3 values per node, as returned by a source read()
+
+    Returns
+    -------
+    list of list of tuple
+        Fields of the norm, X, Y and Z component, each in the layout of fields with one value per node
+    """
+    out = [[], [], [], []]
+    for ids, data in fields:
+        x, y, z = data[0::3], data[1::3], data[2::3]
+        out[0].append((ids, [math.sqrt(a*a + b*b + c*c) for a, b, c in zip(x, y, z)]))
+        out[1].append((ids, x))
+        out[2].append((ids, y))
+        out[3].append((ids, z))
+    return out
+
+
+def result_maxima(kind, index, fields, scale=1.0):
+    """
+    Maxima of every quantity of a result kind for every node set and time set, from one read of the result
+
+    Parameters
+    ----------
+    kind : str
+        Key of RESULT_KINDS
+    index : mech_lib.nodal_reactions.NodeSetIndex
+        Union and membership of the node sets
+    fields : list of tuple
+        (scoping_ids, data) for each time set, as returned by the read() of the source of the kind
+    scale : float, optional
+        Positive factor applied to the maxima.  Default = 1.0.
+
+    Returns
+    -------
+    list of dict
+        nodal_maxima() of each quantity of the kind, in RESULT_KINDS order
+    """
+    if len(RESULT_KINDS[kind][2]) == 1:
+        return [nodal_maxima(index, fields, scale)]
+    return [nodal_maxima(index, f, scale) for f in vector_fields(fields)]
+
+
+def set_result_maxima(kind, set_indexes, set_fields, scale=1.0):
+    """
+    result_maxima() of a result averaged over each node set separately, e.g. from a source read_sets()
+
+    Parameters
+    ----------
+    kind : str
+        Key of RESULT_KINDS
+    set_indexes : list of mech_lib.nodal_reactions.NodeSetIndex
+        Index of each node set on its own
+    set_fields : iterable of list of tuple
+        (scoping_ids, data) for each time set, for each node set
+    scale : float, optional
+        Positive factor applied to the maxima.  Default = 1.0.
+
+    Returns
+    -------
+    list of dict
+        Same layout as result_maxima() over all node sets (row ``s * n_times + t``)
+    """
+    out = [dict((k, []) for k in COLUMN_KEYS) for _ in RESULT_KINDS[kind][2]]
+    for index, fields in zip(set_indexes, set_fields):
+        for o, res in zip(out, result_maxima(kind, index, fields, scale)):
+            for k in COLUMN_KEYS:
+                o[k].extend(res[k])
+    return out
+
+
+class TopNodes(object):
+    """
+    Bounded record of the N highest nodes of every node set over all time sets read
+
+    A node is kept once per node set, with the value and time set of its peak.
+
+    Parameters
+    ----------
+    n_sets : int
+        Number of node sets
+    n : int
+        Number of nodes kept per node set
+    """
+
+    def __init__(self, n_sets, n):
+        self.n = n
+        self.heaps = [[] for _ in range(n_sets)]
+        self.entries = [{} for _ in range(n_sets)]
+
+    def update(self, index, fields, time_ids, scale=1.0, first_set=0):
+        """
+        Offer the nodal values of a chunk of time sets to the heaps
+
+        Parameters
+        ----------
+        index : mech_lib.nodal_reactions.NodeSetIndex
+            Union and membership of the node sets
+        fields : list of tuple
+            (scoping_ids, data) of the nodal result for each time set, as returned by a source read()
+        time_ids : list of int
+            Time set id of each field
+        scale : float, optional
+            Positive factor applied to the values.  Default = 1.0.
+        first_set : int, optional
+            Heap of the first node set of index, for an index holding only some of the node sets.  Default = 0.
+        """
+        members = index.members
+        offsets = index.offsets
+        node_ids = index.node_ids
+        for (ids, data), tid in zip(fields, time_ids):
+            column = gather_scalar(ids, data, index.position, len(index))
+            for s in range(len(index.counts)):
+                heap = self.heaps[first_set + s]
+                entries = self.entries[first_set + s]
+                segment = members[offsets[s]:offsets[s + 1]]
+                for p in heapq.nlargest(self.n, segment, key=column.__getitem__):
+                    v = column[p]
+                    if v == float('-inf') or (len(heap) == self.n and v * scale <= heap[0][0]):
+                        break
+                    self._offer(heap, entries, v * scale, node_ids[p], tid)
+
+    def _offer(self, heap, entries, value, node, tid):
+        entry = entries.get(node)
+        if entry is not None:
+            if value > entry[0]:
+                entry[0] = value
+                entry[2] = tid
+                heapq.heapify(heap)
+            return
+        entry = [value, node, tid]
+        entries[node] = entry
+        if len(heap) < self.n:
+            heapq.heappush(heap, entry)
+        else:
+            del entries[heapq.heappushpop(heap, entry)[1]]
+
+    def rows(self, s):
+        """
+        Kept nodes of node set s, highest first
+
+        Returns
+        -------
+        list of tuple
+            (value, node_id, time_set_id)
+        """
+        return [tuple(e) for e in sorted(self.heaps[s], key=lambda e: (-e[0], e[1]))]
+
+    def node_ids(self):
+        """
+        Sorted IDs of all kept nodes (e.g. to look up their coordinates)
+        """
+        return sorted(set(node for entries in self.entries for node in entries))
+
+
+def maxima_rows(maxima, time_ids, times):
+    """
+    Output rows of the maxima of every node set
+
+    Parameters
+    ----------
+    maxima : dict
+        Columns returned by nodal_maxima()
+    time_ids : list of int
+        Time set id of each time of the maxima
+    times : list of float
+        Time of every time set of the result file (time set id t at times[t - 1])
+
+    Returns
+    -------
+    list of list of list
+        For each node set, one row [time, time_set_id, max, node] per time set
+    """
+    n = len(time_ids)
+    return [[[times[tid - 1], tid, maxima['max'][s * n + t], maxima['node'][s * n + t]]
+             for t, tid in enumerate(time_ids)] for s in range(len(maxima['max']) // n)]
+
+
+def hotspot_rows(top, names, set_ids, coords, times):
+    """
+    Output rows of the nodes kept by a TopNodes, with their coordinates
+
+    Parameters
+    ----------
+    top : TopNodes
+        Kept nodes of every node set
+    names : list of str
+        Name of each node set, e.g. of each named selection
+    set_ids : list of int
+        ID of each node set, e.g. the named selection ObjectIds
+    coords : tuple
+        (scoping_ids, data) of the node coordinates with 3 values per node, e.g. of the converted output of
+        dpf.operators.mesh.node_coordinates.  Only the kept nodes are taken.
+    times : list of float
+        Time of every time set of the result file (time set id t at times[t - 1])
+
+    Returns
+    -------
+    list of list
+        Rows [name, set_id, rank, node, x, y, z, value, time, time_set_id], node set by node set, highest value
+        first (rank 1)
+    """
+    hot_ids = top.node_ids()
+    position = dict((node, p) for p, node in enumerate(hot_ids))
+    x, y, z = gather_nodal(coords[0], coords[1], position, len(hot_ids))
+    rows = []
+    for s, (name, set_id) in enumerate(zip(names, set_ids)):
+        for rank, (value, node, tid) in enumerate(top.rows(s)):
+            p = position[node]
+            rows.append([name, set_id, rank + 1, node, x[p], y[p], z[p], value, times[tid - 1], tid])
+    return rows
+
+
+class DpfNodalResultSource(object):
+    """
+    Nodal result source reading a result file through DPF in Mechanical
+
+    Parameters
+    ----------
+    data_sources : dpf.DataSources
+        Data sources of the result file
+    result : str, optional
+        Name of the dpf.operators.result operator.  Default = 'stress_von_mises'.
+    unit_name : str, optional
+        Unit to convert the result to, e.g. 'psi'.  Default = None (result file units).
+    norm : bool, optional
+        Take the norm of a vector result (e.g. total deformation from 'displacement').  Default = False.
+    location : str, optional
+        Location of the ids passed to read(): 'Elemental' (the nodes of the elements, averaged over the elements) or
+        'Nodal'.  Default = 'Elemental'.
+    """
+
+    def __init__(self, data_sources, result='stress_von_mises', unit_name=None, norm=False, location='Elemental'):
+        import Ans.DataProcessing as dpf
+        self.dpf = dpf
+        self.data_sources = data_sources
+        self.result = result
+        self.unit_name = unit_name
+        self.norm = norm
+        self.location = location
+        self.reads = 0
+        self._mesh = None
+
+    @property
+    def mesh(self):
+        """
+        Mesh of the result file, read on first access and reused by every read_sets() call
+        """
+        if self._mesh is None:
+            mesh_op = self.dpf.operators.mesh.mesh_provider()
+            mesh_op.inputs.data_sources.Connect(self.data_sources)
+            self._mesh = mesh_op.outputs.mesh.GetData()
+        return self._mesh
+
+    def read(self, entity_ids, time_ids):
+        """
+        Read the nodal result of the element or node ids (see location)
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id.  Fields of a time id without entities are skipped.
+        """
+        dpf = self.dpf
+        time_scoping = dpf.Scoping()
+        time_scoping.Ids = list(time_ids)
+        time_scoping.Location = 'Time'
+        mesh_scoping = dpf.Scoping()
+        mesh_scoping.Ids = list(entity_ids)
+        if self.location.lower() == 'nodal':
+            mesh_scoping.Location = dpf.locations.nodal
+        else:
+            mesh_scoping.Location = dpf.locations.elemental
+        op = getattr(dpf.operators.result, self.result)()
+        op.inputs.data_sources.Connect(self.data_sources)
+        op.inputs.time_scoping.Connect(time_scoping)
+        op.inputs.mesh_scoping.Connect(mesh_scoping)
+        fc = op.outputs.fields_container
+        if self.norm:
+            nrm = dpf.operators.math.norm_fc()
+            nrm.inputs.fields_container.Connect(fc)
+            fc = nrm.outputs.fields_container
+        fc = self._convert(fc).GetData()
+        self.reads += 1
+        return container_by_time(fc, time_ids)
+
+    def read_sets(self, element_sets, time_ids):
+        """
+        Read the result of the union of the element sets once and average it over the elements of each set
+
+        Parameters
+        ----------
+        element_sets : list of list of int
+            Element IDs of each set, e.g. of each named selection
+        time_ids : list of int
+            Time set ids
+
+        Returns
+        -------
+        generator of list of tuple
+            For each element set, (scoping_ids, data) for each time id, averaged over the elements of the set only
+        """
+        dpf = self.dpf
+        if self.result not in ELEMENTAL_NODAL_RESULTS:
+            raise ValueError('No element nodal read for result ' + self.result)
+        base, invariant = ELEMENTAL_NODAL_RESULTS[self.result]
+        time_scoping = dpf.Scoping()
+        time_scoping.Ids = list(time_ids)
+        time_scoping.Location = 'Time'
+        union = dpf.Scoping()
+        union.Ids = sorted(set(eid for elems in element_sets for eid in elems))
+        union.Location = dpf.locations.elemental
+        op = getattr(dpf.operators.result, base)()
+        op.inputs.data_sources.Connect(self.data_sources)
+        op.inputs.time_scoping.Connect(time_scoping)
+        op.inputs.mesh_scoping.Connect(union)
+        op.inputs.requested_location.Connect(dpf.locations.elemental_nodal)
+        elem_nodal = op.outputs.fields_container.GetData()
+        self.reads += 1
+        mesh = self.mesh
+        for elems in element_sets:
+            scoping = dpf.Scoping()
+            scoping.Ids = list(elems)
+            scoping.Location = dpf.locations.elemental
+            rescope = dpf.operators.scoping.rescope_fc()
+            rescope.inputs.fields_container.Connect(elem_nodal)
+            rescope.inputs.mesh_scoping.Connect(scoping)
+            avg = dpf.operators.averaging.elemental_nodal_to_nodal_fc()
+            avg.inputs.fields_container.Connect(rescope.outputs.fields_container)
+            avg.inputs.mesh.Connect(mesh)
+            inv = getattr(dpf.operators.invariant, invariant)()
+            inv.inputs.fields_container.Connect(avg.outputs.fields_container)
+            yield container_by_time(self._convert(inv.outputs.fields_container).GetData(), time_ids)
+
+    def _convert(self, fc):
+        if self.unit_name:
+            conv = self.dpf.operators.math.unit_convert_fc()
+            conv.inputs.unit_name.Connect(self.unit_name)
+            conv.inputs.fields_container.Connect(fc)
+            fc = conv.outputs.fields_container
+        return fc
+
+
+class SyntheticNodalResultSource(object):
+    """
+    Local stand-in for a result file holding an element nodal result averaged at the nodes
+
+    The value of each element, node and time set is stored packed so that every read has to unpack the record of every
+    node of the requested elements.  ``reads`` and ``nodes_read`` count the operator evaluations and element node
+    records traversed.  Nodal values are averaged over the requested elements, as the stress of a named selection.
+
+    Parameters
+    ----------
+    connectivity : dict
+        Node IDs of each element ID
+    time_ids : list of int
+        Time set ids in the result file
+    seed : int, optional
+        Random seed.  Default = 0.
+    """
+
+    def __init__(self, connectivity, time_ids, seed=0):
+        rng = random.Random(seed)
+        self.connectivity = connectivity
+        self._records = {}
+        for t in time_ids:
+            for eid in sorted(connectivity):
+                for nid in connectivity[eid]:
+                    self._records[(eid, nid, t)] = struct.pack('<d', rng.uniform(0.0, 1000.0))
+        self.reads = 0
+        self.nodes_read = 0
+
+    def _unpack(self, element_ids, t):
+        values = {}
+        for eid in element_ids:
+            for nid in self.connectivity[eid]:
+                values[(eid, nid)] = struct.unpack('<d', self._records[(eid, nid, t)])[0]
+                self.nodes_read += 1
+        return values
+
+    def _average(self, element_ids, values):
+        contribs = {}
+        for eid in sorted(set(element_ids)):
+            for nid in self.connectivity[eid]:
+                contribs.setdefault(nid, []).append(values[(eid, nid)])
+        nodes = sorted(contribs)
+        return nodes, [sum(contribs[nid]) / len(contribs[nid]) for nid in nodes]
+
+    def read(self, element_ids, time_ids):
+        """
+        Read the nodal result of the nodes of the elements, averaged over the elements
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        self.reads += 1
+        element_ids = sorted(set(element_ids))
+        return [self._average(element_ids, self._unpack(element_ids, t)) for t in time_ids]
+
+    def read_sets(self, element_sets, time_ids):
+        """
+        Read the union of the element sets once and average the result over the elements of each set
+
+        Returns
+        -------
+        generator of list of tuple
+            For each element set, (scoping_ids, data) for each time id
+        """
+        self.reads += 1
+        union = sorted(set(eid for elems in element_sets for eid in elems))
+        values = [self._unpack(union, t) for t in time_ids]
+        for elems in element_sets:
+            yield [self._average(elems, v) for v in values]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_elements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_sets = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    n_times = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    top_n = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    rng = random.Random(1)
+    # Strip of 8-node bricks: element e shares its 4 last nodes with element e + 1
+    connectivity = dict((e, list(range(4 * e, 4 * e + 8))) for e in range(1, n_elements + 1))
+    time_ids = list(range(1, n_times + 1))
+    source = SyntheticNodalResultSource(connectivity, time_ids)
+
+    # Overlapping element sets (named selections of bodies or groups of bodies)
+    width = max(1, 3 * n_elements // n_sets)
+    elem_sets = []
+    for s in range(n_sets):
+        first = rng.randrange(1, max(2, n_elements - width))
+        elem_sets.append(list(range(first, first + width)))
+    node_sets = [sorted(set(nid for eid in elems for nid in connectivity[eid])) for elems in elem_sets]
+
+    # One read and one max per named selection, as in the original script
+    t0 = time.time()
+    single = []
+    for elems, nodes in zip(elem_sets, node_sets):
+        fields = source.read(elems, time_ids)
+        maxima = []
+        for ids, data in fields:
+            m = max(data)
+            maxima.append((m, ids[data.index(m)]))
+        single.append(maxima)
+    t1 = time.time()
+    single_reads, single_nodes = source.reads, source.nodes_read
+    source.reads = source.nodes_read = 0
+
+    # One read of the union averaged per named selection, and a max per named selection
+    set_indexes = [NodeSetIndex([nodes]) for nodes in node_sets]
+    per_set = []
+    for set_index, fields in zip(set_indexes, source.read_sets(elem_sets, time_ids)):
+        per_set.append(nodal_maxima(set_index, fields))
+    t2 = time.time()
+    union_reads, union_nodes = source.reads, source.nodes_read
+
+    print('%d elements, %d named selections x %d times' % (n_elements, n_sets, n_times))
+    print('per named selection: %.3f s, %d reads, %d node records' % (t1 - t0, single_reads, single_nodes))
+    print('union read, set avg: %.3f s, %d reads, %d node records' % (t2 - t1, union_reads, union_nodes))
+
+    # A plain union read averages the nodes shared by named selections over the elements of all of them
+    index = NodeSetIndex(node_sets)
+    union_elements = sorted(set(eid for elems in elem_sets for eid in elems))
+    union = nodal_maxima(index, source.read(union_elements, time_ids))
+    changed = sum(1 for s in range(n_sets) for t in range(n_times) if union['max'][s * n_times + t] != single[s][t][0])
+    print('union read, union avg: %d of %d maxima differ from the reads per named selection' % (changed,
+                                                                                              n_sets * n_times))
+
+    # Top-N nodes per named selection from heaps updated one time set at a time
+    t0 = time.time()
+    top = TopNodes(n_sets, top_n)
+    for tid in time_ids:
+        top.update(index, source.read(union_elements, [tid]), [tid])
+    t1 = time.time()
+    print('top %d nodes per named selection, streamed: %.3f s (%d nodes kept)' % (top_n, t1 - t0, len(top.node_ids())))
+
+    # Full sort of the peak of every node of every named selection
+    fields = source.read(union_elements, time_ids)
+    t0 = time.time()
+    for s in range(n_sets):
+        peaks = {}
+        for (ids, data), tid in zip(fields, time_ids):
+            values = dict(zip(ids, data))
+            for nid in node_sets[s]:
+                if nid not in peaks or values[nid] > peaks[nid][0]:
+                    peaks[nid] = (values[nid], nid, tid)
+        sorted(peaks.values(), key=lambda e: (-e[0], e[1]))[:top_n]
+    print('top %d nodes per named selection, full sort: %.3f s' % (top_n, time.time() - t0))
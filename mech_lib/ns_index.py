@@ -0,0 +1,365 @@
+"""
+Persistent named selection to element and node ID index.
+========================================================
+
+The named selection scripts collect the element and node IDs of every named selection by calling
+``MeshRegionById`` for each geometry entity of the selection and concatenating the ID lists, which repeats IDs shared
+by neighbouring entities and is redone by every script for every analysis.  ``NamedSelectionIndex`` maps each named
+selection ObjectId to sorted, deduplicated element and node ID lists, built once per mesh state and saved to a JSON
+file that all scripts share (e.g. in the project user files directory).
+
+The file is keyed by a mesh fingerprint (see mesh_key()): the element and node counts and a checksum of the IDs,
+coordinates and connectivity of a fixed sample of nodes and elements, so a remesh with the same counts (Mechanical
+numbers both from 1) is still detected without reading the whole mesh.  A different fingerprint discards the whole
+index.  Each entry also stores the geometry entity IDs it was built from, so editing the scoping of one named selection
+only rebuilds that entry.  On a loaded index no MeshRegionById call is made at all, which is where the time goes in
+Mechanical (each call crosses into the .NET mesh API).
+
+``BodyIndex`` holds the element and node IDs of every body of the geometry the same way but as one CSR structure per
+ID kind (an offsets array into one concatenated ID array), in its own file, so the per-body scripts do not add one
+entry per body to the named selection index.
+
+The ID lists are stored as zlib compressed, base64 encoded arrays of 32-bit integers, which are decoded with a few C
+calls instead of parsing one JSON number per ID.  Compare building and loading with:
+
+    python -m mech_lib.ns_index [n_selections] [n_entities] [ids_per_entity]
+"""
+from __future__ import division
+
+import base64
+import json
+import os
+import zlib
+from array import array
+
+# Default file names of the shared named selection index and of the body index
+INDEX_FILE_NAME = 'ns_id_index.json'
+BODY_INDEX_FILE_NAME = 'body_id_index.json'
+
+# Number of nodes and elements whose coordinates and connectivity enter the mesh fingerprint
+N_SAMPLES = 64
+
+
+def _bytes(values, typecode):
+    a = array(typecode, values)
+    return a.tobytes() if hasattr(a, 'tobytes') else a.tostring()
+
+
+def _checksum(values, typecode='i'):
+    return zlib.crc32(_bytes(values, typecode)) & 0xffffffff
+
+
+def pack_ids(ids):
+    """
+    Encode a list of IDs as a compressed, base64 encoded array of 32-bit integers
+    """
+    return base64.b64encode(zlib.compress(_bytes(ids, 'i'), 1)).decode('ascii')
+
+
+def unpack_ids(text):
+    """
+    Decode the IDs encoded by pack_ids()
+    """
+    a = array('i')
+    data = zlib.decompress(base64.b64decode(text))
+    if hasattr(a, 'frombytes'):
+        a.frombytes(data)
+    else:
+        a.fromstring(data)
+    return a.tolist()
+
+
+def mesh_key(mesh_data):
+    """
+    Fingerprint of the mesh of a Mechanical model
+
+    Parameters
+    ----------
+    mesh_data : Ansys.ACT.Automation.Mechanical.MeshData
+        Mesh data, e.g. analysis.MeshData
+
+    Returns
+    -------
+    dict
+        {'elements': int, 'nodes': int, 'sample': int}: the counts and a checksum of the IDs and coordinates of
+        N_SAMPLES evenly spaced nodes and of the IDs and node IDs of N_SAMPLES evenly spaced elements
+    """
+    element_ids = mesh_data.ElementIds
+    node_ids = mesh_data.NodeIds
+    n_elements = int(mesh_data.ElementCount)
+    n_nodes = int(mesh_data.NodeCount)
+    sample_elements = [element_ids[i] for i in range(0, n_elements, max(1, n_elements // N_SAMPLES))][:N_SAMPLES]
+    sample_nodes = [node_ids[i] for i in range(0, n_nodes, max(1, n_nodes // N_SAMPLES))][:N_SAMPLES]
+    coords = []
+    for nid in sample_nodes:
+        node = mesh_data.NodeById(nid)
+        coords += [node.X, node.Y, node.Z]
+    connectivity = []
+    for eid in sample_elements:
+        connectivity += list(mesh_data.ElementById(eid).NodeIds)
+    ids = sample_elements + sample_nodes + connectivity
+    return {'elements': n_elements, 'nodes': n_nodes,
+            'sample': zlib.crc32(_bytes(ids, 'i'), _checksum(coords, 'd')) & 0xffffffff}
+
+
+def region_ids(mesh_data, location_ids):
+    """
+    Sorted, deduplicated element and node IDs of a list of geometry entities
+
+    Parameters
+    ----------
+    mesh_data : Ansys.ACT.Automation.Mechanical.MeshData
+        Mesh data with a MeshRegionById() method
+    location_ids : list of int
+        Geometry entity IDs, e.g. named_selection.Location.Ids
+
+    Returns
+    -------
+    tuple
+        (element_ids, node_ids) as sorted lists of int
+    """
+    elements = set()
+    nodes = set()
+    for loc_id in location_ids:
+        region = mesh_data.MeshRegionById(loc_id)
+        elements.update(region.ElementIds)
+        nodes.update(region.NodeIds)
+    return sorted(elements), sorted(nodes)
+
+
+class NamedSelectionIndex(object):
+    """
+    Element and node IDs of named selections, persisted to a JSON file (ID lists packed with pack_ids())
+
+    Parameters
+    ----------
+    cache_file : str
+        Path of the JSON file
+    key : dict
+        Mesh fingerprint, e.g. mesh_key(analysis.MeshData).  Must be JSON serializable.
+    """
+
+    def __init__(self, cache_file, key):
+        self.cache_file = cache_file
+        self.key = json.loads(json.dumps(key, sort_keys=True))
+        self.sets = {}
+        self.built = 0
+        self.reused = 0
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    stored = json.load(f)
+            except ValueError:
+                stored = {}
+            if stored.get('key') == self.key:
+                self.sets = stored.get('sets', {})
+
+    def ids(self, ns_id, location_ids, mesh_data):
+        """
+        Return the element and node IDs of a named selection, building the entry if it is missing or stale
+
+        Parameters
+        ----------
+        ns_id : int
+            ObjectId of the named selection
+        location_ids : list of int
+            Geometry entity IDs of the named selection (named_selection.Location.Ids)
+        mesh_data : Ansys.ACT.Automation.Mechanical.MeshData
+            Mesh data used to build a missing entry
+
+        Returns
+        -------
+        tuple
+            (element_ids, node_ids) as sorted lists of int
+        """
+        locations = sorted(int(i) for i in location_ids)
+        entry = self.sets.get(str(ns_id))
+        if entry is not None and entry['locations'] == locations:
+            self.reused += 1
+            return unpack_ids(entry['elements']), unpack_ids(entry['nodes'])
+        elements, nodes = region_ids(mesh_data, locations)
+        self.sets[str(ns_id)] = {'locations': locations, 'elements': pack_ids(elements), 'nodes': pack_ids(nodes)}
+        self.built += 1
+        return elements, nodes
+
+    def save(self):
+        """
+        Write the index to disk if any entry was built (written to a temporary file first)
+        """
+        if not self.built:
+            return
+        tmp = self.cache_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'key': self.key, 'sets': self.sets}, f, separators=(',', ':'))
+        if os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+        os.rename(tmp, self.cache_file)
+
+
+class BodyIndex(object):
+    """
+    Element and node IDs of every body as CSR arrays, persisted to a JSON file
+
+    Body ``b`` owns ``element_ids[element_offsets[b]:element_offsets[b + 1]]`` (and the same for the nodes), in the
+    order of the bodies passed in.  The index is rebuilt with one MeshRegionById per body when the mesh fingerprint or
+    the list of bodies changes.
+
+    Parameters
+    ----------
+    cache_file : str
+        Path of the JSON file
+    key : dict
+        Mesh fingerprint, e.g. mesh_key(analysis.MeshData)
+    body_ids : list of int
+        Geometry body ID of each body, e.g. [b.GetGeoBody().Id for b in bodies]
+    mesh_data : Ansys.ACT.Automation.Mechanical.MeshData
+        Mesh data used to build a missing or stale index
+    """
+
+    def __init__(self, cache_file, key, body_ids, mesh_data):
+        self.key = json.loads(json.dumps(key, sort_keys=True))
+        self.body_ids = [int(i) for i in body_ids]
+        self.built = False
+        stored = None
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    stored = json.load(f)
+            except ValueError:
+                stored = None
+        if stored is not None and stored.get('key') == self.key and stored.get('bodies') == self.body_ids:
+            self.element_offsets = unpack_ids(stored['element_offsets'])
+            self.element_ids = unpack_ids(stored['element_ids'])
+            self.node_offsets = unpack_ids(stored['node_offsets'])
+            self.node_ids = unpack_ids(stored['node_ids'])
+            return
+        self.element_offsets, self.element_ids = [0], []
+        self.node_offsets, self.node_ids = [0], []
+        for body_id in self.body_ids:
+            elements, nodes = region_ids(mesh_data, [body_id])
+            self.element_ids.extend(elements)
+            self.element_offsets.append(len(self.element_ids))
+            self.node_ids.extend(nodes)
+            self.node_offsets.append(len(self.node_ids))
+        self.built = True
+        tmp = cache_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'key': self.key, 'bodies': self.body_ids,
+                       'element_offsets': pack_ids(self.element_offsets), 'element_ids': pack_ids(self.element_ids),
+                       'node_offsets': pack_ids(self.node_offsets), 'node_ids': pack_ids(self.node_ids)},
+                      f, separators=(',', ':'))
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        os.rename(tmp, cache_file)
+
+    def __len__(self):
+        return len(self.body_ids)
+
+    def elements(self, b):
+        """
+        Sorted element IDs of body index b
+        """
+        return self.element_ids[self.element_offsets[b]:self.element_offsets[b + 1]]
+
+    def nodes(self, b):
+        """
+        Sorted node IDs of body index b
+        """
+        return self.node_ids[self.node_offsets[b]:self.node_offsets[b + 1]]
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import tempfile
+    import time
+    n_sel = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    n_ent = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    per_ent = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    class _Region(object):
+        def __init__(self, elements, nodes):
+            self.ElementIds = elements
+            self.NodeIds = nodes
+
+    class _Node(object):
+        def __init__(self, nid):
+            self.X, self.Y, self.Z = nid * 0.1, nid * 0.2, nid * 0.3
+
+    class _Element(object):
+        def __init__(self, eid):
+            self.NodeIds = [2 * eid, 2 * eid + 1]
+
+    class _MeshData(object):
+        """Stand-in for MeshData: MeshRegionById returns overlapping ID lists of a body or face"""
+
+        def __init__(self, n_regions, per_region):
+            self.ElementCount = n_regions * per_region
+            self.NodeCount = 2 * n_regions * per_region
+            self.ElementIds = range(1, self.ElementCount + 1)
+            self.NodeIds = range(1, self.NodeCount + 1)
+            self.calls = 0
+            self._per = per_region
+
+        def NodeById(self, nid):
+            return _Node(nid)
+
+        def ElementById(self, eid):
+            return _Element(eid)
+
+        def MeshRegionById(self, loc_id):
+            self.calls += 1
+            first = loc_id * self._per // 2
+            return _Region(list(range(first, first + self._per)), list(range(2 * first, 2 * first + 2 * self._per)))
+
+    rng = random.Random(0)
+    mesh_data = _MeshData(n_sel * n_ent, per_ent)
+    selections = [(1000 + s, [rng.randrange(n_sel * n_ent) for _ in range(n_ent)]) for s in range(n_sel)]
+    path = os.path.join(tempfile.mkdtemp(), INDEX_FILE_NAME)
+
+    def original():
+        out = []
+        for ns_id, locs in selections:
+            elem_ids = []
+            node_ids = []
+            for loc in locs:
+                region = mesh_data.MeshRegionById(loc)
+                elem_ids += region.ElementIds
+                node_ids += region.NodeIds
+            out.append((sorted(set(elem_ids)), sorted(set(node_ids))))
+        return out
+
+    def indexed():
+        index = NamedSelectionIndex(path, mesh_key(mesh_data))
+        for ns_id, locs in selections:
+            index.ids(ns_id, locs, mesh_data)
+        index.save()
+
+    t0 = time.time()
+    original()
+    t1 = time.time()
+    calls = [mesh_data.calls]
+    indexed()
+    t2 = time.time()
+    calls.append(mesh_data.calls)
+    indexed()
+    t3 = time.time()
+    calls.append(mesh_data.calls)
+    print('%d named selections x %d entities x %d IDs' % (n_sel, n_ent, per_ent))
+    print('lists + set():  %.3f s, %d MeshRegionById calls' % (t1 - t0, calls[0]))
+    print('build index:    %.3f s, %d MeshRegionById calls' % (t2 - t1, calls[1] - calls[0]))
+    print('load index:     %.3f s, %d MeshRegionById calls, %.2f MB file' % (t3 - t2, calls[2] - calls[1],
+                                                                            os.path.getsize(path) / 1e6))
+    t0 = time.time()
+    mesh_key(mesh_data)
+    print('mesh_key:       %.3f s' % (time.time() - t0))
+
+    # Body index: one CSR file for all bodies
+    body_ids = list(range(0, n_sel * n_ent, max(1, n_ent // 4)))
+    body_path = os.path.join(os.path.dirname(path), BODY_INDEX_FILE_NAME)
+    BodyIndex(body_path, mesh_key(mesh_data), body_ids, mesh_data)
+    t0 = time.time()
+    BodyIndex(body_path, mesh_key(mesh_data), body_ids, mesh_data)
+    t1 = time.time()
+    print('body index:     %d bodies, loaded in %.3f s, %.2f MB file' % (len(body_ids), t1 - t0,
+                                                                        os.path.getsize(body_path) / 1e6))
@@ -0,0 +1,190 @@
+"""
+Bounded worker pool for independent per-analysis jobs.
+======================================================
+
+The spreadsheet scripts loop over ``analysisNumbers`` and every analysis has its own result file, so reading the
+results and writing the output file of one analysis does not depend on any other.  run_jobs() runs a worker function
+for several jobs at once on a bounded number of threads and returns the results in job order, whatever order the jobs
+finish in.  Only the 2024 R2 beam connection script
+(spreadsheet_output/compute_stress_resultants_for_beam_conns_2024R2.py) runs its analyses on the pool;
+mech_lib/README.md lists why the other scripts keep their serial loop.
+
+Only the result file work (DPF reads, pure Python computation and file output) belongs in the worker.  The Mechanical
+API (tree objects, Quantity, units) is not thread safe, so each script collects everything it needs from the API on the
+main thread first and hands the worker plain values plus the result file path; the worker opens its own data sources.
+
+If a job raises a concurrency error in the pool (see concurrency_error(): an I/O error such as a result file locked by
+another reader, or an error whose message names threads, locks or concurrent access) it is run again on the calling
+thread once the pool has finished (serial fallback, e.g. for a DPF build that does not allow concurrent reads) and only
+an error in the serial run is raised.  Any other error is deterministic, so it is raised without running the job again,
+with the traceback of the worker thread.
+
+Compare serial and concurrent execution of I/O bound stand-in jobs with:
+
+    python -m mech_lib.parallel [n_jobs] [max_workers]
+"""
+from __future__ import division
+
+import sys
+import threading
+import time
+
+
+# Words of the message of an error raised by concurrent use of a result file or of a non thread safe API
+CONCURRENCY_MARKERS = ('thread', 'concurren', 'lock', 'another process', 'in use', 'busy')
+
+
+def concurrency_error(exc):
+    """
+    Tell whether an error raised in the pool may be caused by running jobs concurrently
+
+    Parameters
+    ----------
+    exc : Exception
+        Error raised by the worker
+
+    Returns
+    -------
+    bool
+        True for I/O errors (IOError, OSError and the .NET I/O exceptions they map to) and for errors whose message
+        contains one of CONCURRENCY_MARKERS
+    """
+    if isinstance(exc, EnvironmentError):
+        return True
+    message = str(exc).lower()
+    return any(m in message for m in CONCURRENCY_MARKERS)
+
+
+def reraise(exc_info):
+    """
+    Raise a saved error again with the traceback of the place where it was first raised
+
+    Parameters
+    ----------
+    exc_info : tuple
+        (type, value, traceback) as returned by sys.exc_info()
+    """
+    exc_type, exc, tb = exc_info
+    if hasattr(exc, 'with_traceback'):
+        raise exc.with_traceback(tb)
+    # Python 2 (IronPython): the three-argument raise is a syntax error in Python 3
+    exec('raise exc_type, exc, tb')
+
+
+def _timed(worker, job):
+    t0 = time.time()
+    result = worker(job)
+    return result, time.time() - t0
+
+
+def run_jobs(jobs, worker, max_workers=1, fallback=True, retry_on=concurrency_error):
+    """
+    Run worker(job) for every job on at most max_workers threads
+
+    Parameters
+    ----------
+    jobs : list
+        Independent jobs, e.g. one dict of plain values per analysis
+    worker : callable
+        Called with one job, returns its result.  Must not use the Mechanical API when max_workers > 1.
+    max_workers : int, optional
+        Largest number of jobs running at once.  Default = 1 (serial, on the calling thread).
+    fallback : bool, optional
+        Run jobs that raised a retryable error in the pool again on the calling thread.  Default = True.
+    retry_on : callable, optional
+        Called with the error of a job that raised in the pool, True if the job may be run again serially.  Other
+        errors are raised once the pool has finished.  Default = concurrency_error.
+
+    Returns
+    -------
+    tuple
+        (results, stats).  results holds the worker result of each job in job order.  stats is a dict with 'wall'
+        (total seconds), 'seconds' (seconds of each job), 'workers' (threads used) and 'retried' (indices of the jobs
+        that were run again serially).
+    """
+    jobs = list(jobs)
+    n = len(jobs)
+    results = [None] * n
+    seconds = [0.0] * n
+    errors = [None] * n
+    workers = max(1, min(int(max_workers), n))
+    t0 = time.time()
+
+    if workers == 1:
+        for i, job in enumerate(jobs):
+            results[i], seconds[i] = _timed(worker, job)
+        return results, {'wall': time.time() - t0, 'seconds': seconds, 'workers': 1, 'retried': []}
+
+    lock = threading.Lock()
+    pending = iter(range(n))
+
+    def loop():
+        while True:
+            with lock:
+                i = next(pending, None)
+            if i is None:
+                return
+            try:
+                results[i], seconds[i] = _timed(worker, jobs[i])
+            except Exception:
+                errors[i] = sys.exc_info()
+
+    threads = [threading.Thread(target=loop) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    failed = [i for i in range(n) if errors[i] is not None]
+    for i in failed:
+        if not fallback or not retry_on(errors[i][1]):
+            reraise(errors[i])
+    retried = failed
+    for i in retried:
+        results[i], seconds[i] = _timed(worker, jobs[i])
+    return results, {'wall': time.time() - t0, 'seconds': seconds, 'workers': workers, 'retried': retried}
+
+
+def format_stats(names, stats):
+    """
+    Describe the timing of a run_jobs() call, one line per job plus a summary line
+
+    Parameters
+    ----------
+    names : list of str
+        Name of each job, e.g. the analysis names
+    stats : dict
+        Second value returned by run_jobs()
+
+    Returns
+    -------
+    str
+    """
+    lines = []
+    for i, (name, sec) in enumerate(zip(names, stats['seconds'])):
+        note = ' (run again serially)' if i in stats['retried'] else ''
+        lines.append('  %s: %.2f s%s' % (name, sec, note))
+    total = sum(stats['seconds'])
+    speedup = total / stats['wall'] if stats['wall'] > 0 else 1.0
+    lines.append('  %d job(s) on %d worker(s): %.2f s wall, %.2f s summed, speedup %.2fx' % (
+        len(names), stats['workers'], stats['wall'], total, speedup))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    def read_analysis(job):
+        """Stand-in for reading one result file: waiting on I/O releases the interpreter lock like a DPF read"""
+        time.sleep(0.5)
+        return sum(range(job * 1000))
+
+    jobs = list(range(n_jobs))
+    names = ['Analysis %d' % j for j in jobs]
+    serial_stats = run_jobs(jobs, read_analysis, 1)[1]
+    pooled_stats = run_jobs(jobs, read_analysis, max_workers)[1]
+    print('serial:')
+    print(format_stats(names, serial_stats))
+    print('pool:')
+    print(format_stats(names, pooled_stats))
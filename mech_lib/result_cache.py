@@ -0,0 +1,275 @@
+"""
+Persistent per time set cache of numeric results.
+=================================================
+
+A Python Code object evaluated after post processing is re-run every time the solution is re-evaluated, even when
+the result file has not changed.  ``ResultCache`` stores the numeric result columns of every time set in a directory
+next to the output so that a re-evaluation only computes the time sets that are not in the cache yet and reuses the
+rest.
+
+Each time set is one binary file of doubles (``array('d')``), object-major then column: ``n_objects * n_columns``
+values.  Names, IDs and other time independent columns are not stored, the calling script rebuilds them (e.g. from the
+beam table) when it writes the rows.  Sets are written as soon as they are computed and read back one chunk of time
+sets at a time, so memory is bounded by the chunk size on both the first evaluation and every re-evaluation.
+
+The cache is keyed by the result file (path, size and modification time) and by a signature of everything else that
+changes the values (units, number of objects, ...), stored in ``key.json`` in the cache directory.  If any part of the
+key differs from the stored key every set file is discarded (other files in the directory are left alone): a re-solve
+rewrites the result file, so none of the stored sets can be trusted.  Requesting new sets (e.g. a different time
+scoping) only computes those sets.
+
+Time the first evaluation against the re-evaluations with:
+
+    python -m mech_lib.result_cache [n_objects] [n_times]
+"""
+from __future__ import division
+
+import json
+import os
+from array import array
+
+KEY_FILE = 'key.json'
+
+# File name of a time set is SET_PREFIX + set id + SET_SUFFIX
+SET_PREFIX = 'set_'
+SET_SUFFIX = '.bin'
+
+
+def result_file_key(path):
+    """
+    Identify a result file by its path, size and modification time
+
+    Parameters
+    ----------
+    path : str
+        Result file path
+
+    Returns
+    -------
+    dict
+        {'path': str, 'size': int, 'mtime': float}.  Size and mtime are None if the file does not exist.
+    """
+    try:
+        st = os.stat(path)
+        size, mtime = st.st_size, st.st_mtime
+    except OSError:
+        size = mtime = None
+    return {'path': os.path.normcase(os.path.abspath(path)), 'size': size, 'mtime': mtime}
+
+
+def _normalize(obj):
+    """
+    Round trip an object through JSON so that it compares equal to the stored copy (tuples become lists, etc.)
+    """
+    return json.loads(json.dumps(obj, sort_keys=True))
+
+
+def _replace(tmp, path):
+    """
+    Move a fully written temporary file over path
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+
+
+def split_sets(columns, n_sets):
+    """
+    Split flat object-major (n_objects x n_sets) columns into one object-major, column-minor array per set
+
+    Parameters
+    ----------
+    columns : list of list of float
+        Result columns, entry ``o * n_sets + t`` is object o at set index t
+    n_sets : int
+        Number of time sets in the columns
+
+    Returns
+    -------
+    list of array.array
+        One array of ``n_objects * len(columns)`` doubles per set
+    """
+    if not columns:
+        return [array('d') for _ in range(n_sets)]
+    out = []
+    for t in range(n_sets):
+        values = array('d')
+        for row in zip(*[c[t::n_sets] for c in columns]):
+            values.extend(row)
+        out.append(values)
+    return out
+
+
+def join_sets(values, n_columns):
+    """
+    Inverse of split_sets(): flat object-major (n_objects x n_sets) columns from one array per set
+
+    Parameters
+    ----------
+    values : list of array.array
+        Values of each set as returned by split_sets()
+    n_columns : int
+        Number of result columns
+
+    Returns
+    -------
+    list of list of float
+        One flat object-major column per result column
+    """
+    n_sets = len(values)
+    columns = []
+    for c in range(n_columns):
+        per_set = [v[c::n_columns] for v in values]
+        col = [0.0] * (len(per_set[0]) * n_sets if per_set else 0)
+        for t, v in enumerate(per_set):
+            col[t::n_sets] = v
+        columns.append(col)
+    return columns
+
+
+class ResultCache(object):
+    """
+    Numeric result columns of each time set, one binary file per set in a cache directory
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path of the cache directory (created if needed)
+    key : dict
+        Cache key, e.g. {'result_file': result_file_key(path), 'units': [...], ...}.  Must be JSON serializable.
+    n_columns : int
+        Number of result columns stored per object
+    """
+
+    def __init__(self, cache_dir, key, n_columns):
+        self.cache_dir = cache_dir
+        self.key = _normalize(key)
+        self.n_columns = n_columns
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        key_file = os.path.join(cache_dir, KEY_FILE)
+        stored = None
+        if os.path.isfile(key_file):
+            try:
+                with open(key_file, 'r') as f:
+                    stored = json.load(f)
+            except ValueError:
+                stored = None
+        if stored != {'key': self.key, 'n_columns': n_columns}:
+            for name in os.listdir(cache_dir):
+                if name == KEY_FILE or (name.startswith(SET_PREFIX) and name.endswith(SET_SUFFIX)):
+                    os.remove(os.path.join(cache_dir, name))
+            with open(key_file + '.tmp', 'w') as f:
+                json.dump({'key': self.key, 'n_columns': n_columns}, f)
+            _replace(key_file + '.tmp', key_file)
+
+    def _path(self, set_id):
+        return os.path.join(self.cache_dir, SET_PREFIX + str(set_id) + SET_SUFFIX)
+
+    def missing(self, set_ids):
+        """
+        Return the time set ids that are not in the cache, in the requested order
+        """
+        return [s for s in set_ids if not os.path.isfile(self._path(s))]
+
+    def put(self, set_id, values):
+        """
+        Write the values of one time set (written to a temporary file first so an interrupted write never leaves a
+        corrupt set)
+        """
+        path = self._path(set_id)
+        with open(path + '.tmp', 'wb') as f:
+            array('d', values).tofile(f)
+        _replace(path + '.tmp', path)
+
+    def put_columns(self, set_ids, columns):
+        """
+        Store the object-major (n_objects x len(set_ids)) result columns of a chunk of time sets
+        """
+        for s, values in zip(set_ids, split_sets(columns, len(set_ids))):
+            self.put(s, values)
+
+    def get(self, set_id):
+        """
+        Return the values of one time set as an array of doubles
+        """
+        path = self._path(set_id)
+        values = array('d')
+        with open(path, 'rb') as f:
+            values.fromfile(f, os.path.getsize(path) // values.itemsize)
+        return values
+
+    def iter_columns(self, set_ids, chunk_size=0):
+        """
+        Read the cached time sets back one chunk at a time
+
+        Parameters
+        ----------
+        set_ids : list of int
+            Time set ids, all in the cache
+        chunk_size : int, optional
+            Number of time sets read at once.  Default = 0 (all time sets).
+
+        Returns
+        -------
+        generator of tuple
+            (start, chunk, columns) with flat object-major (n_objects x len(chunk)) result columns, the same layout
+            as mech_lib.beam_resultants.iter_beam_columns()
+        """
+        set_ids = list(set_ids)
+        if chunk_size <= 0:
+            chunk_size = max(len(set_ids), 1)
+        for start in range(0, len(set_ids), chunk_size):
+            chunk = set_ids[start:start + chunk_size]
+            yield start, chunk, join_sets([self.get(s) for s in chunk], self.n_columns)
+
+
+if __name__ == '__main__':
+    import shutil
+    import sys
+    import tempfile
+    import time
+    n_objects = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_times = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    n_columns = 11
+    tmp_dir = tempfile.mkdtemp()
+    rst = os.path.join(tmp_dir, 'file.rst')
+    with open(rst, 'wb') as f:
+        f.write(b'\0' * 1024)
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    key = {'result_file': result_file_key(rst), 'units': ['in', 'lbf']}
+
+    def compute(chunk):
+        time.sleep(0.001 * n_objects / 100 * len(chunk))    # stand-in for reading and computing the time sets
+        n = len(chunk)
+        return [[o * 0.5 + chunk[t] + c for o in range(n_objects) for t in range(n)] for c in range(n_columns)]
+
+    def evaluate(set_ids, chunk_size=5):
+        t0 = time.time()
+        cache = ResultCache(cache_dir, key, n_columns)
+        todo = cache.missing(set_ids)
+        for start in range(0, len(todo), chunk_size):
+            chunk = todo[start:start + chunk_size]
+            cache.put_columns(chunk, compute(chunk))
+        out = {}
+        for start, chunk, columns in cache.iter_columns(set_ids, chunk_size):
+            n = len(chunk)
+            for t, s in enumerate(chunk):
+                out[s] = [c[t::n] for c in columns]
+        return out, len(todo), time.time() - t0
+
+    first, n1, dt1 = evaluate(list(range(1, n_times + 1)))
+    second, n2, dt2 = evaluate(list(range(1, n_times + 1)))
+    third, n3, dt3 = evaluate(list(range(1, n_times + 6)))
+    size = sum(os.path.getsize(os.path.join(cache_dir, n)) for n in os.listdir(cache_dir))
+    print('%d objects x %d columns x %d times, %.1f MB on disk' % (n_objects, n_columns, n_times + 5, size / 1e6))
+    print('first evaluation:  %d sets computed, %.3f s' % (n1, dt1))
+    print('re-evaluation:     %d sets computed, %.3f s' % (n2, dt2))
+    print('5 new sets:        %d sets computed, %.3f s' % (n3, dt3))
+
+    with open(rst, 'ab') as f:
+        f.write(b'\0')
+    key = {'result_file': result_file_key(rst), 'units': ['in', 'lbf']}
+    fourth, n4, dt4 = evaluate(list(range(1, n_times + 1)))
+    print('result file changed: %d sets computed, %.3f s' % (n4, dt4))
+    shutil.rmtree(tmp_dir)
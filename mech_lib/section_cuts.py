@@ -0,0 +1,443 @@
+"""
+Free-body section cuts from one element nodal force read.
+=========================================================
+
+The internal force and moment transmitted across a plane are the sum, over the nodes on the cut, of the element nodal
+forces of the elements on one side of the plane: at a cut node the elements of both sides are in equilibrium, so the
+forces of the positive side elements at that node are the forces the negative side exerts on the positive side.
+
+``SectionCut`` is defined by a point, a normal and the elements of a body set.  The elements of the body set are
+assigned to a side with a precomputed element centroid array ((centroid - point) . normal > 0 is the positive side),
+the cut nodes are the nodes shared by positive and negative side elements, and only the positive side elements that
+touch a cut node are kept, each with the local indices of its cut nodes and the lever arm of those nodes about the cut
+point.  Evaluating a cut is then one pass over those terms per time set, so hundreds of cuts are evaluated from a single
+element nodal force read of the union of the kept elements.
+
+Element nodal forces are read element-major with 3 components for each node of the element in connectivity order (the
+layout of an ElementalNodal ``Field.Data``).  One read per cut against one read for all cuts:
+
+    python -m mech_lib.section_cuts [n_cells] [n_cuts] [n_times]
+"""
+from __future__ import division
+
+import math
+import random
+
+from mech_lib.fields import container_by_time
+
+# Keys of the dictionary returned by evaluate_cuts()
+COLUMN_KEYS = ['FX', 'FY', 'FZ', 'F_total', 'F_normal', 'MX', 'MY', 'MZ', 'M_total', 'M_normal']
+
+
+def element_centroids(element_ids, connectivity, coords):
+    """
+    Centroid of each element as the mean of its node coordinates
+
+    Parameters
+    ----------
+    element_ids : list of int
+        Elements of the body set
+    connectivity : dict
+        Node IDs of each element keyed by element ID
+    coords : dict
+        [x, y, z] keyed by node ID
+
+    Returns
+    -------
+    list of list of float
+        [x, y, z] of each element in element_ids order
+    """
+    out = []
+    for eid in element_ids:
+        nodes = connectivity[eid]
+        n = len(nodes)
+        out.append([sum([coords[nid][c] for nid in nodes]) / n for c in range(3)])
+    return out
+
+
+class SectionCut(object):
+    """
+    A plane cutting a body set, with the element and node terms needed to sum the force across it
+
+    Parameters
+    ----------
+    name : str
+        Name of the cut
+    point : list of float
+        Point on the plane (global coordinates), also the moment reference point
+    normal : list of float
+        Normal of the plane, pointing to the positive side (normalized)
+    element_ids : list of int
+        Elements of the body set
+    centroids : list of list of float
+        element_centroids() of element_ids
+    connectivity : dict
+        Node IDs of each element keyed by element ID
+    coords : dict
+        [x, y, z] keyed by node ID
+    """
+
+    def __init__(self, name, point, normal, element_ids, centroids, connectivity, coords):
+        self.name = name
+        self.point = [float(c) for c in point]
+        n = math.sqrt(sum([float(c)**2 for c in normal]))
+        self.normal = [float(c) / n for c in normal]
+        px, py, pz = self.point
+        nx, ny, nz = self.normal
+        positive = []
+        negative_nodes = set()
+        for eid, (cx, cy, cz) in zip(element_ids, centroids):
+            if (cx - px)*nx + (cy - py)*ny + (cz - pz)*nz > 0:
+                positive.append(eid)
+            else:
+                negative_nodes.update(connectivity[eid])
+        positive_nodes = set()
+        for eid in positive:
+            positive_nodes.update(connectivity[eid])
+        self.cut_nodes = sorted(positive_nodes & negative_nodes)
+        cut = set(self.cut_nodes)
+
+        # (element ID, [(local node index, rx, ry, rz), ...]) for every positive side element touching the cut
+        self.terms = []
+        for eid in positive:
+            local = [(k, coords[nid][0] - px, coords[nid][1] - py, coords[nid][2] - pz)
+                     for k, nid in enumerate(connectivity[eid]) if nid in cut]
+            if local:
+                self.terms.append((eid, local))
+        self.element_ids = [eid for eid, local in self.terms]
+
+    def evaluate(self, offsets, data, scale=1.0):
+        """
+        Net force and moment about the cut point for one time set
+
+        Parameters
+        ----------
+        offsets : dict
+            Offset of the first value of each element in data, keyed by element ID (element_offsets())
+        data : list of float
+            Flat element nodal force data of one time set
+        scale : float, optional
+            Factor applied to the forces.  Default = 1.0.
+
+        Returns
+        -------
+        list of float
+            [FX, FY, FZ, MX, MY, MZ]
+        """
+        fx = fy = fz = mx = my = mz = 0.0
+        for eid, local in self.terms:
+            off = offsets.get(eid)
+            if off is None:
+                continue
+            for k, rx, ry, rz in local:
+                i = off + 3 * k
+                x, y, z = data[i], data[i + 1], data[i + 2]
+                fx += x
+                fy += y
+                fz += z
+                mx += ry*z - rz*y
+                my += rz*x - rx*z
+                mz += rx*y - ry*x
+        return [fx * scale, fy * scale, fz * scale, mx * scale, my * scale, mz * scale]
+
+
+def element_offsets(ids, connectivity, n_values=None):
+    """
+    Offset of the first value of each element in a flat ElementalNodal field
+
+    Parameters
+    ----------
+    ids : list of int
+        Scoping ids of the field
+    connectivity : dict
+        Node IDs of each element keyed by element ID
+    n_values : int, optional
+        Length of the field data, checked against the connectivity if given
+
+    Returns
+    -------
+    dict
+        Offset keyed by element ID
+    """
+    offsets = {}
+    off = 0
+    for eid in ids:
+        offsets[eid] = off
+        off += 3 * len(connectivity[eid])
+    if n_values is not None and off != n_values:
+        raise ValueError('Element nodal data has %d values, the connectivity gives %d' % (n_values, off))
+    return offsets
+
+
+def connectivity_from_field(element_ids, field_ids, data_pointer, node_indexes, node_ids):
+    """
+    Node IDs of the requested elements from the flat connectivity property field of a mesh
+
+    Parameters
+    ----------
+    element_ids : iterable of int
+        Elements to return
+    field_ids : list of int
+        Scoping ids (element IDs) of the connectivity field
+    data_pointer : list of int
+        Offset of the first node index of each element of the field
+    node_indexes : list of int
+        Flat node indexes (into node_ids) of every element in connectivity order
+    node_ids : list of int
+        Node IDs of the mesh in index order
+
+    Returns
+    -------
+    dict
+        Node IDs of each requested element keyed by element ID
+    """
+    wanted = set(element_ids)
+    n = len(field_ids)
+    out = {}
+    for k, eid in enumerate(field_ids):
+        if eid in wanted:
+            end = data_pointer[k + 1] if k + 1 < n else len(node_indexes)
+            out[eid] = [node_ids[i] for i in node_indexes[data_pointer[k]:end]]
+    return out
+
+
+def cut_elements(cuts):
+    """
+    Sorted union of the elements needed by all cuts (the scoping of the single force read)
+    """
+    union = set()
+    for cut in cuts:
+        union.update(cut.element_ids)
+    return sorted(union)
+
+
+def evaluate_cuts(cuts, fields, connectivity, scale=1.0):
+    """
+    Net force and moment of every cut at every time set
+
+    Parameters
+    ----------
+    cuts : list of SectionCut
+        Section cuts
+    fields : list of tuple
+        (scoping_ids, data) of the element nodal forces for each time set, as returned by a source read()
+    connectivity : dict
+        Node IDs of each element keyed by element ID
+    scale : float, optional
+        Factor applied to the forces.  Default = 1.0.
+
+    Returns
+    -------
+    dict
+        Flat cut-major columns (row ``c * n_times + t``) keyed by COLUMN_KEYS.  F_normal is the force along the cut
+        normal and M_normal the moment about it.
+    """
+    n_times = len(fields)
+    out = dict((k, [0.0] * (len(cuts) * n_times)) for k in COLUMN_KEYS)
+    for t, (ids, data) in enumerate(fields):
+        offsets = element_offsets(ids, connectivity, len(data))
+        for c, cut in enumerate(cuts):
+            fx, fy, fz, mx, my, mz = cut.evaluate(offsets, data, scale)
+            nx, ny, nz = cut.normal
+            i = c * n_times + t
+            out['FX'][i] = fx
+            out['FY'][i] = fy
+            out['FZ'][i] = fz
+            out['MX'][i] = mx
+            out['MY'][i] = my
+            out['MZ'][i] = mz
+            out['F_total'][i] = math.sqrt(fx*fx + fy*fy + fz*fz)
+            out['M_total'][i] = math.sqrt(mx*mx + my*my + mz*mz)
+            out['F_normal'][i] = fx*nx + fy*ny + fz*nz
+            out['M_normal'][i] = mx*nx + my*ny + mz*nz
+    return out
+
+
+class DpfElementNodalForceSource(object):
+    """
+    Element nodal force source reading a result file through DPF in Mechanical
+
+    Parameters
+    ----------
+    data_sources : dpf.DataSources
+        Data sources of the result file
+    unit_name : str, optional
+        Force unit to convert the forces to, e.g. 'lbf'.  Default = None (result file units).
+    """
+
+    def __init__(self, data_sources, unit_name=None):
+        import Ans.DataProcessing as dpf
+        self.dpf = dpf
+        self.data_sources = data_sources
+        self.unit_name = unit_name
+        self.reads = 0
+
+    def read(self, element_ids, time_ids):
+        """
+        Read the element nodal forces (ElementalNodal location)
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        dpf = self.dpf
+        time_scoping = dpf.Scoping()
+        time_scoping.Ids = list(time_ids)
+        time_scoping.Location = 'Time'
+        mesh_scoping = dpf.Scoping()
+        mesh_scoping.Ids = list(element_ids)
+        mesh_scoping.Location = dpf.locations.elemental
+        op = dpf.operators.result.element_nodal_forces()
+        op.inputs.data_sources.Connect(self.data_sources)
+        op.inputs.time_scoping.Connect(time_scoping)
+        op.inputs.mesh_scoping.Connect(mesh_scoping)
+        fc = op.outputs.fields_container
+        if self.unit_name:
+            conv = dpf.operators.math.unit_convert_fc()
+            conv.inputs.unit_name.Connect(self.unit_name)
+            conv.inputs.fields_container.Connect(fc)
+            fc = conv.outputs.fields_container
+        fc = fc.GetData()
+        self.reads += 1
+        return container_by_time(fc, time_ids)
+
+
+class SyntheticElementNodalForceSource(object):
+    """
+    Local stand-in for a result file holding element nodal forces
+
+    ``reads`` and ``elements_read`` count the operator evaluations and element records traversed.
+
+    Parameters
+    ----------
+    connectivity : dict
+        Node IDs of each element keyed by element ID
+    time_ids : list of int
+        Time set ids in the result file
+    seed : int, optional
+        Random seed.  Default = 0.
+    """
+
+    def __init__(self, connectivity, time_ids, seed=0):
+        rng = random.Random(seed)
+        self._records = {}
+        for t in time_ids:
+            for eid, nodes in connectivity.items():
+                self._records[(eid, t)] = [rng.uniform(-100.0, 100.0) for _ in range(3 * len(nodes))]
+        self.reads = 0
+        self.elements_read = 0
+
+    def read(self, element_ids, time_ids):
+        """
+        Read the element nodal forces of the requested elements
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        self.reads += 1
+        out = []
+        for t in time_ids:
+            ids = []
+            data = []
+            for eid in element_ids:
+                record = self._records.get((eid, t))
+                if record is None:
+                    continue
+                self.elements_read += 1
+                ids.append(eid)
+                data.extend(record)
+            out.append((ids, data))
+        return out
+
+
+def _brute_force(point, normal, element_ids, centroids, connectivity, coords, source, time_ids):
+    """
+    Direct evaluation of one cut from the definition (for checking only)
+    """
+    side = [sum([(c[k] - point[k]) * normal[k] for k in range(3)]) > 0 for c in centroids]
+    pos = set(nid for eid, s in zip(element_ids, side) if s for nid in connectivity[eid])
+    neg = set(nid for eid, s in zip(element_ids, side) if not s for nid in connectivity[eid])
+    cut = pos & neg
+    rows = []
+    for ids, data in source.read([eid for eid, s in zip(element_ids, side) if s], time_ids):
+        f = [0.0] * 6
+        off = 0
+        for eid in ids:
+            for k, nid in enumerate(connectivity[eid]):
+                if nid in cut:
+                    v = data[off + 3*k:off + 3*k + 3]
+                    r = [coords[nid][c] - point[c] for c in range(3)]
+                    f[0] += v[0]
+                    f[1] += v[1]
+                    f[2] += v[2]
+                    f[3] += r[1]*v[2] - r[2]*v[1]
+                    f[4] += r[2]*v[0] - r[0]*v[2]
+                    f[5] += r[0]*v[1] - r[1]*v[0]
+            off += 3 * len(connectivity[eid])
+        rows.append(f)
+    return rows
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_cuts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    n_times = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rng = random.Random(2)
+
+    # Structured block of 8 node hexahedra, n_cells along each axis
+    def node_id(i, j, k):
+        return 1 + i + j * (n_cells + 1) + k * (n_cells + 1)**2
+
+    coords = {}
+    for k in range(n_cells + 1):
+        for j in range(n_cells + 1):
+            for i in range(n_cells + 1):
+                coords[node_id(i, j, k)] = [float(i), float(j), float(k)]
+    connectivity = {}
+    for k in range(n_cells):
+        for j in range(n_cells):
+            for i in range(n_cells):
+                connectivity[100001 + len(connectivity)] = [
+                    node_id(i, j, k), node_id(i + 1, j, k), node_id(i + 1, j + 1, k), node_id(i, j + 1, k),
+                    node_id(i, j, k + 1), node_id(i + 1, j, k + 1), node_id(i + 1, j + 1, k + 1),
+                    node_id(i, j + 1, k + 1)]
+    element_ids = sorted(connectivity)
+    time_ids = list(range(1, n_times + 1))
+    source = SyntheticElementNodalForceSource(connectivity, time_ids)
+
+    t0 = time.time()
+    centroids = element_centroids(element_ids, connectivity, coords)
+    cuts = []
+    for c in range(n_cuts):
+        point = [rng.uniform(1.0, n_cells - 1.0) for _ in range(3)]
+        normal = [rng.uniform(-1.0, 1.0) for _ in range(3)]
+        cuts.append(SectionCut('Cut %d' % c, point, normal, element_ids, centroids, connectivity, coords))
+    t1 = time.time()
+    scoping = cut_elements(cuts)
+    res = evaluate_cuts(cuts, source.read(scoping, time_ids), connectivity)
+    t2 = time.time()
+    one_read = (source.reads, source.elements_read)
+    source.reads = source.elements_read = 0
+
+    for c in (0, n_cuts - 1):
+        cut = cuts[c]
+        ref = _brute_force(cut.point, cut.normal, element_ids, centroids, connectivity, coords, source, time_ids)
+        for t in range(n_times):
+            got = [res[k][c * n_times + t] for k in ('FX', 'FY', 'FZ', 'MX', 'MY', 'MZ')]
+            assert all(abs(a - b) <= 1e-8 * max(1.0, abs(b)) for a, b in zip(got, ref[t])), (c, t)
+    source.reads = source.elements_read = 0
+
+    t3 = time.time()
+    for cut in cuts:
+        evaluate_cuts([cut], source.read(cut.element_ids, time_ids), connectivity)
+    t4 = time.time()
+    print('%d elements, %d cuts (%d elements on the cut faces) x %d times' % (
+        len(element_ids), n_cuts, len(scoping), n_times))
+    print('cut setup (centroids, sides, cut nodes): %.3f s' % (t1 - t0))
+    print('one read for all cuts: %.3f s, %d reads, %d element records' % (t2 - t1, one_read[0], one_read[1]))
+    print('one read per cut:      %.3f s, %d reads, %d element records' % (t4 - t3, source.reads, source.elements_read))
@@ -0,0 +1,232 @@
+"""
+Batched reader for SMISC element results.
+=========================================
+
+Running ``dpf.operators.result.smisc()`` once per item index re-reads the element records from the result file for
+every item.  The SMISC operator can return ``num_components`` consecutive items starting at ``item_index`` in a single
+field, so all requested items are grouped into as few contiguous runs as possible and each run is read once for the
+whole element and time scoping.  The result is a dense item x element x time block: one flat element-major column of
+length ``n_elements * n_times`` per requested item (the layout used by ``mech_lib.beam_resultants``).
+
+SMISC sources take ``read(first_item, num_components, element_ids, time_ids)`` and return ``num_components`` values
+per element (the layout of ``Field.Data`` for a multi-component DPF field).  Measure the batching speedup with:
+
+    python -m mech_lib.smisc_reader [n_elements] [n_times]
+"""
+from __future__ import division
+
+import random
+import struct
+
+from mech_lib.fields import container_by_time
+
+
+def item_runs(item_indices, max_gap=None):
+    """
+    Group SMISC item indices into contiguous runs that can each be read with one operator evaluation
+
+    Parameters
+    ----------
+    item_indices : iterable of int
+        Requested SMISC item indices (duplicates are allowed)
+    max_gap : int, optional
+        Largest number of unrequested items allowed inside a run.  Default = None, which reads everything in one run.
+
+    Returns
+    -------
+    list of tuple
+        (first_item, num_components) for each run
+    """
+    indices = sorted(set(item_indices))
+    if not indices:
+        return []
+    runs = []
+    first = last = indices[0]
+    for idx in indices[1:]:
+        if max_gap is not None and idx - last - 1 > max_gap:
+            runs.append((first, last - first + 1))
+            first = idx
+        last = idx
+    runs.append((first, last - first + 1))
+    return runs
+
+
+def read_smisc_block(source, items, element_ids, time_ids, factors=None, max_gap=None):
+    """
+    Read every requested SMISC item for an element and time scoping with one traversal per contiguous run of items
+
+    Parameters
+    ----------
+    source : object
+        Result source with a ``read(first_item, num_components, element_ids, time_ids)`` method
+    items : dict
+        SMISC item index keyed by item name, e.g. {'FX_I': 1, 'FX_J': 14}
+    element_ids : list of int
+        Element order of the output columns
+    time_ids : list of int
+        Time set ids to read
+    factors : dict, optional
+        Scale factor keyed by item name (e.g. sigma level times unit conversion).  Missing names use 1.0.
+    max_gap : int, optional
+        Passed to item_runs().  Default = None, i.e. one traversal for all items.
+
+    Returns
+    -------
+    dict
+        Flat element-major column (length len(element_ids) * len(time_ids)) keyed by item name.  Elements missing
+        from the result are set to 0.0.
+    """
+    if factors is None:
+        factors = {}
+    n_times = len(time_ids)
+    row = dict((eid, b * n_times) for b, eid in enumerate(element_ids))
+    size = len(element_ids) * n_times
+    block = dict((name, [0.0] * size) for name in items)
+
+    for first, count in item_runs(items.values(), max_gap):
+        wanted = [(name, idx - first, factors.get(name, 1.0)) for name, idx in items.items()
+                  if first <= idx < first + count]
+        for t, (ids, data) in enumerate(source.read(first, count, element_ids, time_ids)):
+            for k, eid in enumerate(ids):
+                b = row.get(eid)
+                if b is None:
+                    continue
+                offset = k * count
+                for name, comp, factor in wanted:
+                    block[name][b + t] = data[offset + comp] * factor
+    return block
+
+
+class DpfSmiscSource(object):
+    """
+    SMISC result source reading a result file through DPF in Mechanical
+
+    Parameters
+    ----------
+    data_sources : dpf.DataSources
+        Data sources of the result file
+    """
+
+    def __init__(self, data_sources):
+        import Ans.DataProcessing as dpf
+        self.dpf = dpf
+        self.data_sources = data_sources
+        self.reads = 0
+
+    def read(self, first_item, num_components, element_ids, time_ids):
+        """
+        Read num_components consecutive SMISC items starting at first_item
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        dpf = self.dpf
+        time_scoping = dpf.Scoping()
+        time_scoping.Ids = list(time_ids)
+        time_scoping.Location = 'Time'
+        mesh_scoping = dpf.Scoping()
+        mesh_scoping.Ids = list(element_ids)
+        mesh_scoping.Location = 'Elemental'
+        op = dpf.operators.result.smisc()
+        op.inputs.data_sources.Connect(self.data_sources)
+        op.inputs.time_scoping.Connect(time_scoping)
+        op.inputs.mesh_scoping.Connect(mesh_scoping)
+        op.inputs.item_index.Connect(first_item)
+        op.inputs.num_components.Connect(num_components)
+        fc = op.outputs.fields_container.GetData()
+        self.reads += 1
+        return container_by_time(fc, time_ids)
+
+
+class SyntheticSmiscSource(object):
+    """
+    Local stand-in for a result file holding SMISC records
+
+    Each element record for a time set is stored packed, as in a result file, so every read has to unpack the whole
+    record of every element in the scoping no matter how many items are requested.  ``reads`` and ``records_read``
+    count the operator evaluations and element records traversed.
+
+    Parameters
+    ----------
+    element_ids : list of int
+        Elements in the result file
+    time_ids : list of int
+        Time set ids in the result file
+    n_items : int, optional
+        Number of SMISC items per element record.  Default = 48 (enough for beam and joint items).
+    seed : int, optional
+        Random seed.  Default = 0.
+    """
+
+    def __init__(self, element_ids, time_ids, n_items=48, seed=0):
+        rng = random.Random(seed)
+        self.n_items = n_items
+        self._fmt = '<%dd' % n_items
+        self._records = {}
+        for t in time_ids:
+            for eid in element_ids:
+                values = [rng.uniform(-1000.0, 1000.0) for _ in range(n_items)]
+                self._records[(eid, t)] = struct.pack(self._fmt, *values)
+        self.reads = 0
+        self.records_read = 0
+
+    def value(self, item_index, element_id, time_id):
+        """
+        Return a single SMISC value (for checking results)
+        """
+        return struct.unpack(self._fmt, self._records[(element_id, time_id)])[item_index - 1]
+
+    def read(self, first_item, num_components, element_ids, time_ids):
+        """
+        Read num_components consecutive SMISC items starting at first_item
+
+        Returns
+        -------
+        list of tuple
+            (scoping_ids, data) for each time id
+        """
+        self.reads += 1
+        lo = first_item - 1
+        hi = lo + num_components
+        out = []
+        for t in time_ids:
+            ids = []
+            data = []
+            for eid in element_ids:
+                record = self._records.get((eid, t))
+                if record is None:
+                    continue
+                self.records_read += 1
+                ids.append(eid)
+                data.extend(struct.unpack(self._fmt, record)[lo:hi])
+            out.append((ids, data))
+        return out
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from mech_lib.beam_resultants import BEAM_ITEMS
+    n_elements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_times = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    element_ids = list(range(100001, 100001 + n_elements))
+    time_ids = list(range(1, n_times + 1))
+    source = SyntheticSmiscSource(element_ids, time_ids)
+
+    # One evaluation per item, as in the original scripts
+    t0 = time.time()
+    for name, idx in BEAM_ITEMS.items():
+        read_smisc_block(source, {name: idx}, element_ids, time_ids)
+    t1 = time.time()
+    single_reads, single_records = source.reads, source.records_read
+    source.reads = source.records_read = 0
+
+    # Batched
+    read_smisc_block(source, BEAM_ITEMS, element_ids, time_ids)
+    t2 = time.time()
+
+    print('%d elements x %d times, %d items' % (n_elements, n_times, len(BEAM_ITEMS)))
+    print('per item: %.3f s, %d reads, %d records' % (t1 - t0, single_reads, single_records))
+    print('batched:  %.3f s, %d reads, %d records' % (t2 - t1, source.reads, source.records_read))
@@ -0,0 +1,378 @@
+"""
+Narrow-band and Dirlik fatigue damage from nodal stress PSD responses.
+=====================================================================
+
+The random vibration path of the pre-stressed RS/RV script only uses the 1-sigma von Mises stress (set 2), from which
+the Steinberg three-band damage of mech_lib.fatigue assumes a Gaussian response with 68.3/27.1/4.33 % of the cycles
+at 1/2/3 sigma.  Frequency-domain methods use the shape of the stress PSD instead: the spectral moments
+
+    m_i = integral f^i G(f) df,   i = 0, 1, 2, 4
+
+give the rms stress sigma = sqrt(m0), the rate of positive zero crossings v0 = sqrt(m2/m0), the rate of peaks
+vp = sqrt(m4/m2) and the irregularity factor gamma = m2 / sqrt(m0 m4).  With Z = amplitude / sigma:
+
+    narrow-band (Rayleigh)   D = v0 T integral p(Z) / N(Z sigma) dZ,   p(Z) = Z exp(-Z^2/2)
+    Dirlik                   D = vp T integral p(Z) / N(Z sigma) dZ,
+                             p(Z) = D1/Q exp(-Z/Q) + D2 Z/R^2 exp(-Z^2/(2 R^2)) + D3 Z exp(-Z^2/2)
+
+where D1, D2, D3, Q and R are Dirlik's coefficients of xm = m1/m0 sqrt(m2/m4) and gamma, T is the duration and N the
+S-N curve of the node material (mech_lib.fatigue.SNCurve, parsed once per material from Engineering Data).
+
+``SpectralGrid`` holds the trapezoid weights f^i df of the frequency grid, so the four moments of a node are four dot
+products with its PSD row, and the Z grid and its weights, so both damages come from one 1/N evaluation per Z point.
+PSD rows are processed a chunk of nodes at a time (``iter_node_chunks``) so memory does not grow with the model.
+
+DPF does not expose the stress PSD of every node of a random vibration result, so ``CsvStressPsdSource`` reads it from a
+CSV file with a header row ``Node, f1, f2, ...`` (frequencies in Hz) and one row ``node ID, G(f1), G(f2), ...`` per
+node (stress^2/Hz), e.g. exported from MAPDL.  Time the chunks on synthetic PSD rows with:
+
+    python -m mech_lib.spectral_fatigue [n_nodes] [n_frequencies] [chunk_size]
+"""
+from __future__ import division
+
+import csv
+import math
+import random
+
+from mech_lib.fatigue import NodeMaterialIndex, SNCurve
+
+# Spectral moment orders used by the narrow-band and Dirlik methods
+MOMENT_ORDERS = (0, 1, 2, 4)
+
+# 1 - gamma below which a response is treated as narrow-band (Dirlik's coefficients are singular at gamma = 1)
+NARROW_BAND_TOL = 1e-9
+
+
+def trapezoid_weights(x):
+    """
+    Weights w of the trapezoid rule on a grid, integral y dx = sum(w * y)
+
+    Parameters
+    ----------
+    x : list of float
+        Increasing grid
+
+    Returns
+    -------
+    list of float
+    """
+    n = len(x)
+    w = [0.0] * n
+    for j in range(n - 1):
+        h = 0.5 * (x[j + 1] - x[j])
+        w[j] += h
+        w[j + 1] += h
+    return w
+
+
+class SpectralGrid(object):
+    """
+    Frequency and amplitude grids of the spectral fatigue integrals
+
+    Parameters
+    ----------
+    frequencies : list of float
+        Increasing frequencies of the PSD rows, Hz
+    z_max : float, optional
+        Largest amplitude integrated, in rms stresses.  Default = 10.
+    n_z : int, optional
+        Number of points of the amplitude grid.  Default = 201.
+    """
+
+    def __init__(self, frequencies, z_max=10.0, n_z=201):
+        self.frequencies = [float(f) for f in frequencies]
+        if any(f1 <= f0 for f0, f1 in zip(self.frequencies, self.frequencies[1:])):
+            raise ValueError("PSD frequencies must be increasing")
+        df = trapezoid_weights(self.frequencies)
+        self.moment_weights = [[w * f ** i for w, f in zip(df, self.frequencies)] for i in MOMENT_ORDERS]
+        self.z = [z_max * j / (n_z - 1) for j in range(n_z)]
+        self.z_weights = trapezoid_weights(self.z)
+
+    def moments(self, psd):
+        """
+        Spectral moments m0, m1, m2, m4 of one PSD row
+
+        Parameters
+        ----------
+        psd : list of float
+            PSD of the stress at each frequency, stress^2/Hz
+
+        Returns
+        -------
+        tuple
+            (m0, m1, m2, m4)
+        """
+        return tuple(sum(w * g for w, g in zip(weights, psd)) for weights in self.moment_weights)
+
+
+def dirlik_coefficients(m0, m1, m2, m4):
+    """
+    Dirlik's coefficients of the amplitude distribution
+
+    Parameters
+    ----------
+    m0, m1, m2, m4 : float
+        Spectral moments
+
+    Returns
+    -------
+    tuple or None
+        (D1, D2, D3, Q, R), None for a narrow-band response (1 - gamma below NARROW_BAND_TOL, e.g. a PSD on a single
+        frequency line) or where a denominator of the coefficients vanishes
+    """
+    xm = m1 / m0 * math.sqrt(m2 / m4)
+    gamma = m2 / math.sqrt(m0 * m4)
+    if 1.0 - gamma < NARROW_BAND_TOL:
+        return None
+    d1 = 2.0 * (xm - gamma * gamma) / (1.0 + gamma * gamma)
+    den_r = 1.0 - gamma - d1 + d1 * d1
+    if abs(den_r) < NARROW_BAND_TOL or d1 == 0:
+        return None
+    r = (gamma - xm - d1 * d1) / den_r
+    if abs(1.0 - r) < NARROW_BAND_TOL:
+        return None
+    d2 = den_r / (1.0 - r)
+    d3 = 1.0 - d1 - d2
+    q = 1.25 * (gamma - d3 - d2 * r) / d1
+    return d1, d2, d3, q, r
+
+
+def node_damage(grid, moments, curve, duration):
+    """
+    Narrow-band and Dirlik damage of one node
+
+    Parameters
+    ----------
+    grid : SpectralGrid
+        Frequency and amplitude grids
+    moments : tuple
+        (m0, m1, m2, m4) of the stress PSD of the node
+    curve : mech_lib.fatigue.SNCurve
+        S-N curve of the node material (amplitude, fully reversed)
+    duration : float
+        Exposure duration, s
+
+    Returns
+    -------
+    tuple
+        (narrow-band damage, Dirlik damage), (0.0, 0.0) for a zero PSD
+    """
+    m0, m1, m2, m4 = moments
+    if m0 <= 0 or m2 <= 0 or m4 <= 0:
+        return 0.0, 0.0
+    sigma = math.sqrt(m0)
+    z = grid.z
+    inv_n = [1.0 / n for n in curve.cycles([zj * sigma for zj in z])]
+    # Rayleigh density weighted by the quadrature weights, shared by both methods
+    rayleigh = [w * zj * math.exp(-0.5 * zj * zj) * v for zj, w, v in zip(z, grid.z_weights, inv_n)]
+    narrow = sum(rayleigh)
+    d_nb = math.sqrt(m2 / m0) * duration * narrow
+    coefficients = dirlik_coefficients(m0, m1, m2, m4)
+    if coefficients is None:
+        # Narrow-band limit (gamma -> 1, vp -> v0): the Dirlik density is the Rayleigh density
+        return d_nb, d_nb
+    d1, d2, d3, q, r = coefficients
+    if d1 <= 0 or q <= 0 or r == 0:
+        return d_nb, d_nb
+    r2 = r * r
+    dirlik = d3 * narrow + sum(w * (d1 / q * math.exp(-zj / q) + d2 * zj / r2 * math.exp(-0.5 * zj * zj / r2)) * v
+                               for zj, w, v in zip(z, grid.z_weights, inv_n) if v)
+    d_dk = math.sqrt(m4 / m2) * duration * dirlik
+    return d_nb, d_dk
+
+
+def psd_damage(grid, index, node_ids, psd_rows, curves, duration):
+    """
+    Narrow-band and Dirlik damage of a chunk of nodes
+
+    Parameters
+    ----------
+    grid : SpectralGrid
+        Frequency and amplitude grids
+    index : mech_lib.fatigue.NodeMaterialIndex
+        Node to material index
+    node_ids : list of int
+        Node IDs of the chunk
+    psd_rows : list of list of float
+        Stress PSD of each node on the grid frequencies, aligned with node_ids
+    curves : dict
+        S-N curve of each material, {material name: SNCurve}
+    duration : float
+        Exposure duration, s
+
+    Returns
+    -------
+    dict
+        {'m0', 'm1', 'm2', 'm4', 'narrow_band', 'dirlik'} lists aligned with node_ids
+    """
+    n = len(node_ids)
+    res = dict((k, [0.0] * n) for k in ('m0', 'm1', 'm2', 'm4', 'narrow_band', 'dirlik'))
+    for material, positions in index.groups(node_ids).items():
+        curve = curves[material]
+        for k in positions:
+            moments = grid.moments(psd_rows[k])
+            res['m0'][k], res['m1'][k], res['m2'][k], res['m4'][k] = moments
+            res['narrow_band'][k], res['dirlik'][k] = node_damage(grid, moments, curve, duration)
+    return res
+
+
+def iter_node_chunks(rows, chunk_size):
+    """
+    Group (node ID, PSD row) pairs into chunks of nodes
+
+    Parameters
+    ----------
+    rows : iterable of tuple
+        (node ID, PSD row) pairs, e.g. a PSD source read
+    chunk_size : int
+        Number of nodes per chunk (0 = all nodes in one chunk)
+
+    Yields
+    ------
+    tuple
+        (node_ids, psd_rows)
+    """
+    node_ids = []
+    psd_rows = []
+    for nid, psd in rows:
+        node_ids.append(nid)
+        psd_rows.append(psd)
+        if chunk_size > 0 and len(node_ids) == chunk_size:
+            yield node_ids, psd_rows
+            node_ids = []
+            psd_rows = []
+    if node_ids:
+        yield node_ids, psd_rows
+
+
+def damage_by_node(source, index, curves, duration, node_ids=None, chunk_size=0, **grid_options):
+    """
+    Narrow-band and Dirlik damage of the nodes of a PSD source, a chunk of nodes at a time
+
+    Parameters
+    ----------
+    source : CsvStressPsdSource or SyntheticStressPsdSource
+        Source with frequencies and a read(node_ids) method yielding (node ID, PSD row) pairs
+    index : mech_lib.fatigue.NodeMaterialIndex
+        Node to material index
+    curves : dict
+        S-N curve of each material, {material name: SNCurve}
+    duration : float
+        Exposure duration, s
+    node_ids : collection of int, optional
+        Only these nodes (e.g. a set of the nodes of all named selections).  Default = all nodes of the source.
+    chunk_size : int, optional
+        Number of PSD rows held at once (0 = all).  Default = 0.
+    **grid_options
+        z_max and n_z of the SpectralGrid
+
+    Returns
+    -------
+    dict
+        {node ID: (narrow-band damage, Dirlik damage)}
+    """
+    grid = SpectralGrid(source.frequencies, **grid_options)
+    out = {}
+    for ids, rows in iter_node_chunks(source.read(node_ids), chunk_size):
+        res = psd_damage(grid, index, ids, rows, curves, duration)
+        for nid, d_nb, d_dk in zip(ids, res['narrow_band'], res['dirlik']):
+            out[nid] = (d_nb, d_dk)
+    return out
+
+
+class CsvStressPsdSource(object):
+    """
+    Nodal stress PSD read from a CSV file, one row per node
+
+    Parameters
+    ----------
+    path : str
+        CSV file with a header row (Node, f1, f2, ...) and rows (node ID, G(f1), G(f2), ...)
+    scale : float, optional
+        Factor from the file stress unit to the output stress unit (the PSD is scaled by its square).  Default = 1.0.
+    """
+
+    def __init__(self, path, scale=1.0):
+        self.path = path
+        self.scale = scale
+        with open(path, 'r') as f:
+            header = next(csv.reader(f))
+        self.frequencies = [float(v) for v in header[1:]]
+
+    def read(self, node_ids=None):
+        """
+        Stream the PSD rows of the file
+
+        Parameters
+        ----------
+        node_ids : collection of int, optional
+            Only yield these nodes.  Default = all nodes of the file.
+
+        Yields
+        ------
+        tuple
+            (node ID, PSD row)
+        """
+        s2 = self.scale * self.scale
+        with open(self.path, 'r') as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if not row:
+                    continue
+                nid = int(float(row[0]))
+                if node_ids is not None and nid not in node_ids:
+                    continue
+                yield nid, [s2 * float(v) for v in row[1:]]
+
+
+class SyntheticStressPsdSource(object):
+    """
+    Stand-in for a nodal stress PSD: a sum of two band-limited plateaus of random level per node
+
+    Parameters
+    ----------
+    node_ids : list of int
+        Node IDs
+    frequencies : list of float
+        Frequency grid, Hz
+    seed : int, optional
+        Random seed.  Default = 0.
+    """
+
+    def __init__(self, node_ids, frequencies, seed=0):
+        self.node_ids = list(node_ids)
+        self.frequencies = list(frequencies)
+        self.seed = seed
+
+    def read(self, node_ids=None):
+        rng = random.Random(self.seed)
+        for nid in self.node_ids:
+            low = rng.uniform(1.0e3, 1.0e5)
+            high = rng.uniform(0.0, 1.0) * low
+            row = [(low if 80.0 <= f <= 120.0 else 0.0) + (high if 400.0 <= f <= 500.0 else 0.0)
+                   for f in self.frequencies]
+            if node_ids is None or nid in node_ids:
+                yield nid, row
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_freq = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    chunk_size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    freqs = [10.0 + 990.0 * j / (n_freq - 1) for j in range(n_freq)]
+    node_ids = list(range(1, n_nodes + 1))
+    index = NodeMaterialIndex([node_ids], ['Steel'])
+    grid_n = [10.0 ** e for e in range(0, 40)]
+    curves = {'Steel': SNCurve([200000.0 * n ** (-1.0 / 8.0) for n in grid_n], grid_n)}
+    source = SyntheticStressPsdSource(node_ids, freqs)
+
+    t0 = time.time()
+    damage = damage_by_node(source, index, curves, 3600.0, chunk_size=chunk_size)
+    t1 = time.time()
+    n_chunks = -(-n_nodes // chunk_size) if chunk_size > 0 else 1
+    print('%d nodes x %d frequencies in %d chunks: %.3f s' % (n_nodes, n_freq, n_chunks, t1 - t0))
+    ratio = sum(d / nb for nb, d in damage.values() if nb) / n_nodes
+    print('mean Dirlik / narrow-band damage: %.3f' % ratio)
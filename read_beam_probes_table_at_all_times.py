@@ -11,6 +11,7 @@ import csv
 import mech_dpf
 import materials
 import Ans.DataProcessing as dpf
+import sys
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -18,8 +19,13 @@ mech_dpf.setExtAPI(ExtAPI)
 ################### Parameters ########################
 analysisNumbers = [0]       # List of analysis systems to apply this script
 RESULTS_FOLDER = 'Beam Probes'   # Name of results TreeGroupingFolder
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 ################### End Parameters ########################
 
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib import beam_table
+
 
 def findTreeGroupingFolders(item):
     """
@@ -133,18 +139,17 @@ for a in analysisNumbers:
     stiffnessUnit = '[' + stiffnessUnit + ']'
     inertiaUnit = '[' + lengthUnit + '^4]'
     
-    # Get all materials and properties
-    mats = {}
-    matList = ExtAPI.DataModel.Project.Model.Materials.Children
-    matNames = [m.Name for m in matList]
-    matEDs = [m.GetEngineeringDataMaterial() for m in matList]
-    matProps = [materials.GetListMaterialProperties(ed) for ed in matEDs]
-    for n, ed, p in zip(matNames, matEDs, matProps):
-        if 'Elasticity' in p:
-            elasticity = materials.GetMaterialPropertyByName(ed, "Elasticity")
-            if "Young's Modulus" in elasticity:
-                mats[n] = {}
-                mats[n]['ElasticModulus'] = elasticity["Young's Modulus"][1] * Quantity('1 ['+ elasticity["Young's Modulus"][0] + ']')
+    # Beam connection table, read through the API only when the beams, their sections or the mesh have changed
+    beam_conns = DataModel.GetObjectsByType(DataModelObjectCategory.Beam)
+    tableFile = user_dir + '/' + analysis.Name + ' - beam_table.json'
+    moduli = beam_table.material_moduli(Model.Materials.Children)
+    tableKey = beam_table.beam_model_key(beam_conns, solver_data, moduli, analysis.MeshData)
+    table = beam_table.load_or_build(tableFile, tableKey, lambda: beam_table.beam_records(beam_conns, solver_data, moduli))
+    meshOp = dpf.operators.mesh.mesh_provider()
+    meshOp.inputs.data_sources.Connect(dpf.DataSources(analysis.ResultFileName))
+    table = table.with_lengths(beam_table.mesh_beam_lengths(meshOp.outputs.mesh.GetData(), table.element_id))
+    tableRows = table.index_by('object_id')
+    geom = table.geometry((Quantity(1, 'mm') / lengthQuan).Value, (Quantity(1, 'MPa') / stressQuan).Value)
     
     # Loop through all beam probes and create a results dictionary
     res = {}
@@ -152,7 +157,8 @@ for a in analysisNumbers:
         result.Activate()
         rid = result.BoundaryConditionSelection.ObjectId
         res[rid] = {}
-        res[rid]['Name'] = result.BoundaryConditionSelection.Name
+        row = tableRows[rid]
+        res[rid]['Name'] = table.name[row]
         timeCol = [a[0] for a in getTableData(result,2)]
         res[rid]['Time'] = [float(t) for t in timeCol[1:]]
         FX =[a[0] for a in getTableData(result,3)]
@@ -184,33 +190,20 @@ for a in analysisNumbers:
             else:
                 bendMom.append(j * momentQuan)
         res[rid]['Bending Moment'] = bendMom
-        rad = result.BoundaryConditionSelection.Radius
+        rad = geom['radius'][row] * lengthQuan
         res[rid]['Radius'] = rad
-        mat = result.BoundaryConditionSelection.Material
-        res[rid]['Material'] = mat
-        
-        # Compute beam length from reference and mobile coordinates
-        xr = result.BoundaryConditionSelection.ReferenceXCoordinate
-        yr = result.BoundaryConditionSelection.ReferenceYCoordinate
-        zr = result.BoundaryConditionSelection.ReferenceZCoordinate
-        xm = result.BoundaryConditionSelection.MobileXCoordinate
-        ym = result.BoundaryConditionSelection.MobileYCoordinate
-        zm = result.BoundaryConditionSelection.MobileZCoordinate
-        length = ((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5)
-        res[rid]['Length'] = length
+        res[rid]['Material'] = table.material[row]
         
-        # Compute beam area, diameter, moments of inertia, axial stiffness
-        area = pi*rad**2
-        res[rid]['dia'] = 2.0*rad
+        # Beam length, area, diameter, moments of inertia and axial stiffness from the beam table
+        res[rid]['Length'] = geom['length'][row] * lengthQuan
+        area = geom['area'][row] * areaQuan
+        res[rid]['dia'] = geom['dia'][row] * lengthQuan
         res[rid]['area'] = area
-        I = pi*rad**4/4.0
+        I = geom['I'][row] * inertiaQuan
         res[rid]['I'] = I
-        J = pi*rad**4/2.0
+        J = geom['J'][row] * inertiaQuan
         res[rid]['J'] = J
-        if mat in mats.keys():
-            modulus = mats[mat]['ElasticModulus']
-            stiffness = modulus*area/length
-            res[rid]['Stiffness'] = stiffness
+        res[rid]['Stiffness'] = geom['stiffness'][row] * stiffnessQuan
         
         # Compute the various stresses
         dirStr = [f/area for f in FX]
@@ -264,10 +257,7 @@ for a in analysisNumbers:
             data[cols[5]].append(res[rid]['area'] / areaQuan)
             data[cols[6]].append(res[rid]['I'] / inertiaQuan)
             data[cols[7]].append(res[rid]['J'] / inertiaQuan)
-            if res[rid]['Material'] in mats.keys():
-                data[cols[8]].append(res[rid]['Stiffness'] / stiffnessQuan)
-            else:
-                data[cols[8]].append(0)
+            data[cols[8]].append(res[rid]['Stiffness'] / stiffnessQuan)
             data[cols[9]].append(res[rid]['Time'][t])
             data[cols[10]].append(t+1)
             data[cols[11]].append(res[rid]['Axial'][t] / forceQuan)
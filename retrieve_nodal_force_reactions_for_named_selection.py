@@ -16,6 +16,12 @@ NAMED_SEL_FOLDER = 'Reaction Force Faces'        # Named selection folder name c
 # Set the scale factor for Random Vibration Analyses
 # The last part of the Enumeration can be (Sigma1, Sigma2, Sigma3, UserDefined)
 SCALE_FACTOR = Ansys.Mechanical.DataModel.Enums.ScaleFactorType.Sigma3
+UNION_READ = 'y'                # READ THE NODAL FORCES OF ALL NAMED SELECTIONS AT ONCE (must be one of 'y' or 'n')
+TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE WHEN UNION_READ = 'y' (0 = ALL)
+# MOMENT REFERENCE PER NAMED SELECTION NAME, A COORDINATE SYSTEM NAME OR A POINT [x, y, z] IN lengthUnitStr, e.g.
+# {'NS_Bracket_Face': 'Bracket CSYS', 'NS_Pin_Face': [1.0, 0.0, 2.5]}.  NAMED SELECTIONS NOT LISTED USE THE GLOBAL ORIGIN.
+MOMENT_REFERENCE = {}
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 import wbjn
@@ -24,6 +30,13 @@ import csv
 import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib import nodal_reactions as nr
+from mech_lib.joint_reactions import csys_matrix
+from mech_lib.beam_resultants import iter_time_chunks
+from mech_lib.ns_index import NamedSelectionIndex, mesh_key, INDEX_FILE_NAME
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -101,30 +114,69 @@ def writeCSV(filename, data, cols):
         writer.writerows(zip(*[data[col] for col in cols]))
         
 
-def removeFieldsWithZeroEntities(fc):
+def getMomentReference(nsName):
     """
-    Remove fields with 0 entities by creating a new fields container
+    Get the moment reference of a named selection from MOMENT_REFERENCE
     
     Parameters
     ----------
-    fc : FieldsContainer
-        Source FieldsContainer that may contain 0 entity fields
+    nsName : str
+        Name of the named selection
     
     Returns
     -------
-    FieldsContainer
+    tuple
+        (label, origin, matrix).  origin is the reference point in lengthUnitStr in the global coordinate system and
+        matrix is the rotation matrix of the coordinate system, or None for the global axes.
     """
-    # Remove fields with 0 entities by creating a new fields container by adding fields if they are greater than zero.
-    # Create empry fields_container and set label space equal to that of the source FC
-    result = dpf.FieldsContainer()
-    result.Labels = list(fc.GetLabelSpace(0).Keys)
-    resultLblSpcLen = len(result.Labels)
-    # Get fields with more than zero entities
-    for i in range(fc.FieldCount):
-        if fc[i].ElementaryDataCount > 0:
-            result.Add(fc[i],fc.GetLabelSpace(i))
-    return result
+    ref = MOMENT_REFERENCE.get(nsName)
+    if ref is None:
+        return 'Global', [0.0, 0.0, 0.0], None
+    if isinstance(ref, str):
+        csysList = [c for c in Model.CoordinateSystems.Children if c.Name.ToLower() == ref.ToLower()]
+        if len(csysList) == 0:
+            print("[WARNING] Coordinate system " + ref + " not found, moments of " + nsName + " are about the global origin")
+            return 'Global', [0.0, 0.0, 0.0], None
+        csys = csysList[0]
+        origin = [(csys.OriginX / lengthQuan).Value, (csys.OriginY / lengthQuan).Value, (csys.OriginZ / lengthQuan).Value]
+        return csys.Name, origin, csys_matrix(csys.XAxis, csys.YAxis, csys.ZAxis)
+    origin = [float(c) for c in ref]
+    return 'Point (%g, %g, %g)' % tuple(origin), origin, None
+
+
+def appendReactions(res, nsKeys, net, setIds, times):
+    """
+    Append the net reactions of a chunk of time sets to the results dictionary of each named selection
     
+    Parameters
+    ----------
+    res : dict
+        Results dictionary keyed by named selection ObjectId
+    nsKeys : list of int
+        Named selection ObjectIds in the order of the net reaction columns
+    net : dict
+        Flat named selection-major columns returned by nodal_reactions.net_reactions() or transfer_reactions()
+    setIds : list of int
+        Time set ids of the chunk
+    times : list of float
+        Time of each set of the chunk
+    
+    Returns
+    -------
+    None
+    """
+    n = len(setIds)
+    for s, nid in enumerate(nsKeys):
+        for t in range(n):
+            i = s * n + t
+            res[nid]['Times'].append(times[t])
+            res[nid]['Sets'].append(setIds[t])
+            for d in desiredReactions:
+                res[nid]['F' + d].append(net['F' + d][i])
+                res[nid]['M' + d].append(net['M' + d][i])
+            res[nid]['Total Reaction Force'].append(net['F_total'][i])
+            res[nid]['Total Reaction Moment'].append(net['M_total'][i])
+
 
 def createRestrictedNodalScopingFieldsContainer(fc, nodalScoping):
     """
@@ -224,10 +276,6 @@ for a in analysisNumbers:
     elemGlobalNFOp.inputs.mesh_scoping.Connect(myScoping)
     elemGlobalNFOp.inputs.requested_location.Connect('Nodal')
     elemGlobalNodeForcesFC = elemGlobalNFOp.outputs.fields_container
-    elemGlobalNodeForces = elemGlobalNodeForcesFC.GetData()
-    
-    # Remove fields with 0 entities by creating a new fields container
-    elemGlobalNodeForcesFC = removeFieldsWithZeroEntities(elemGlobalNodeForces)
     
     # Create component selector operators
     compSelFcOp = dpf.operators.logic.component_selector_fc()
@@ -246,18 +294,16 @@ for a in analysisNumbers:
     elemGlobalNodeForceQuan = Quantity(1, elemGlobalNodeForceUnits)
     """
     
-    # Create scale operator and set the scale factor = -1 for non Random Vibration analyses
+    # Set the scale factor = -1 for non Random Vibration analyses
     # Negative scaling since the reaction force is the negative of the nodal forces
-    scaleOp = dpf.operators.math.scale_fc()
     if str(analysis_type).ToLower() == 'spectrum':
         scaleFactor = -RANDOM_VIBRATION_SIGMA
     else:
         scaleFactor = -1
-    if ANSYS_VER.ToUpper() == '2024 R2' or ANSYS_VER.ToUpper() == '2025 R1':
-        scaleOp.inputs.ponderation.Connect(scaleFactor)   # 2024 R2 or 2025 R1
-    else:
-        scaleOp.inputs.weights.Connect(scaleFactor)       # 2025 R2
         
+    # Element and node Ids of the named selections, reused from the user files directory while the mesh is unchanged
+    nsIndex = NamedSelectionIndex(user_dir + '/' + INDEX_FILE_NAME, mesh_key(meshData))
+
     # Loop through all named selections and create a results dictionary
     res = {}
     for n in nsChildren:
@@ -276,102 +322,42 @@ for a in analysisNumbers:
         res[nid]['Total Reaction Moment'] = []
         
         #Get the mesh element and node Ids
-        elemIds = []
-        nodeIds = []
-        for nlocId in n.Location.Ids:
-            solMesh = meshData.MeshRegionById(nlocId)
-            elemIds += solMesh.ElementIds
-            nodeIds += solMesh.NodeIds
-        nodeIds = list(set(nodeIds))
-        elemIds = list(set(elemIds))
+        elemIds, nodeIds = nsIndex.ids(nid, n.Location.Ids, meshData)
         res[nid]['Elements'] = elemIds
         res[nid]['Nodes'] = nodeIds
         res[nid]['Num Nodes'] = len(nodeIds)
-        
-        # Scope the results to the element Ids
-        scoping = dpf.Scoping()
-        scoping.Ids = nodeIds
-        scoping.Location = dpf.locations.nodal
-        
-        # Elemental nodal forces operator
-        elemNFOp = dpf.operators.result.element_nodal_forces()
-        elemNFOp.inputs.data_sources.Connect(dataSource)
-        elemNFOp.inputs.time_scoping.Connect(timeScoping)
-        elemNFOp.inputs.mesh_scoping.Connect(scoping)
-        elemNFOp.inputs.requested_location.Connect('Nodal')
-        elemNodeForcesFC = elemNFOp.outputs.fields_container
-        elemNodeForces = elemNodeForcesFC.GetData()
-        
-        # Remove fields with 0 entities by creating a new fields container
-        #elemNodeForcesFC = removeFieldsWithZeroEntities(elemNodeForces)
-        
-        # Create component selector operators
-        compSelFcOp = dpf.operators.logic.component_selector_fc()
-    
-        # Convert the reaction force to desired force units
-        unitConvOp = dpf.operators.math.unit_convert_fc()
-        unitConvOp.inputs.unit_name.Connect(forceUnitStr)
-        unitConvOp.inputs.fields_container.Connect(elemNodeForcesFC)
-        
-        # Scale the reaction force
-        elemNodeForcesFC = unitConvOp.outputs.fields_container
-        scaleOp.inputs.fields_container.Connect(elemNodeForcesFC)
-        elemNodeForcesFC = scaleOp.outputs.fields_container
-        elemNodeForces = elemNodeForcesFC.GetData()
-        elemNodeForceUnits = elemNodeForces[0].Unit
-        elemNodeForceQuan = Quantity(1, elemNodeForceUnits)
-        #print("Element nodal force units: " + elemNodeForceUnits)
-        
-        # Compute the total force of all force components at all times
-        sumFcOp = dpf.operators.math.accumulate_fc()
-        sumFcOp.inputs.time_scoping.Connect(timeScoping)
-        sumFcOp.inputs.fields_container.Connect(elemNodeForcesFC)
-        fsumFC = sumFcOp.outputs.fields_container.GetData()         # Net force vector
-        normFcOp = dpf.operators.math.norm_fc()
-        normFcOp.inputs.fields_container.Connect(fsumFC)
-        totalForce = normFcOp.outputs.fields_container.GetData()    # Force magnitude
-        compSelFcOp.inputs.fields_container.Connect(fsumFC)
-        
-        # Create a field rescricted to the nodes in the scoping
-        #nodeCoordsScop = dpf.Field()
-        #nodeCoordsScop.Location = 'Nodal'
-        #nodeCoordsScop.Unit = nodePosUnits
-        #[nodeCoordsScop.Add(node, nodeCoords.GetEntityDataById(node)) for node in nodeIds]
-        #print("Nodal coordinates units: " + nodeCoords.Unit)
-        
-        # Conversion factors
-        forceConvFac = elemNodeForceQuan/forceQuan
-        momentConvFac = (elemNodeForceQuan * nodePosQuan)/momentQuan
+    nsIndex.save()
 
-        for tid, t in enumerate(timeIds):
-            res[nid]['Times'].append(all_times[t-1])
-            res[nid]['Sets'].append(t)
-            
-            # Create cross product operator
-            crossProdOp = dpf.operators.math.cross_product()
-            #crossProdOp.inputs.fieldA.Connect(nodeCoordsScop)
-            crossProdOp.inputs.fieldA.Connect(nodeCoords)
-            crossProdOp.inputs.fieldB.Connect(elemNodeForces[tid])
-            
-            # Compute the moment field
-            momReacts = crossProdOp.outputs.field.GetData()
-            sumOp = dpf.operators.math.accumulate()
-            sumOp.inputs.time_scoping.Connect(timeScoping)
-            sumOp.inputs.fieldA.Connect(momReacts)
-            momSum = sumOp.outputs.field.GetData()                  # Net moment vector
-            normOp = dpf.operators.math.norm()
-            normOp.inputs.field.Connect(momSum)
-            totalMoment = normOp.outputs.field.GetData()            # Moment magnitude
-            compSelFieldOp = dpf.operators.logic.component_selector()
-            compSelFieldOp.inputs.field.Connect(momSum)
-            
-            for j,d in enumerate(desiredReactions):
-                compSelFcOp.inputs.component_number.Connect(j)
-                compSelFieldOp.inputs.component_number.Connect(j)
-                res[nid]['F' + d].append(compSelFcOp.outputs.fields_container.GetData()[tid].Data[0])
-                res[nid]['M' + d].append(compSelFieldOp.outputs.field.GetData().Data[0])
-            res[nid]['Total Reaction Force'].append(totalForce[tid].Data[0])
-            res[nid]['Total Reaction Moment'].append(totalMoment.Data[0])
+    # Union of the nodes of all named selections, their coordinates and the moment reference of each named selection
+    nsKeys = [n.ObjectId for n in nsChildren]
+    index = nr.NodeSetIndex([res[nid]['Nodes'] for nid in nsKeys])
+    coords = nr.gather_nodal(nodeCoords.ScopingIds, nodeCoords.Data, index.position, len(index))
+    refs = [getMomentReference(n.Name) for n in nsChildren]
+    if str(analysis_type).ToLower() == 'spectrum' and any(r[0] != 'Global' for r in refs):
+        # Combined (RMS) force and moment components cannot be transferred to another point or rotated
+        print("[WARNING] MOMENT_REFERENCE is not used for spectrum analysis " + analysis.Name)
+        refs = [('Global', [0.0, 0.0, 0.0], None) for n in nsChildren]
+    for nid, r in zip(nsKeys, refs):
+        res[nid]['Reference'] = r[0]
+    origins = [r[1] for r in refs]
+    matrices = [r[2] for r in refs]
+    source = nr.DpfNodalForceSource(dataSource, forceUnitStr)
+    
+    if UNION_READ == 'y'.ToLower():
+        # Read the nodal forces of the union of all named selection nodes once per chunk of time sets and sum them
+        # over the nodes of each named selection with the node to named selection membership index
+        for start, chunk in iter_time_chunks(timeIds, TIME_CHUNK_SIZE):
+            net = nr.net_reactions(index, coords, source.read(index.node_ids, chunk), scaleFactor)
+            net = nr.transfer_reactions(net, origins, matrices, len(chunk))
+            appendReactions(res, nsKeys, net, chunk, [all_times[t-1] for t in chunk])
+    else:
+        # Read the nodal forces of one named selection at a time (all time sets)
+        for s, nid in enumerate(nsKeys):
+            setIndex = nr.NodeSetIndex([res[nid]['Nodes']])
+            nsCoords = [[c[index.position[node]] for node in setIndex.node_ids] for c in coords]
+            net = nr.net_reactions(setIndex, nsCoords, source.read(setIndex.node_ids, timeIds), scaleFactor)
+            net = nr.transfer_reactions(net, [origins[s]], [matrices[s]], len(timeIds))
+            appendReactions(res, [nid], net, timeIds, [all_times[t-1] for t in timeIds])
 
 
     # Create data dictionary to written to output csv file
@@ -379,6 +365,7 @@ for a in analysisNumbers:
     cols = ['Named Selection',
             'Named Selection ID',
             'Number of Nodes',
+            'Moment Reference',
             'Time ' + timeUnit,
             'Set',
             'FX ' + forceUnit,
@@ -398,16 +385,17 @@ for a in analysisNumbers:
             data[cols[0]].append(res[nid]['Name'])
             data[cols[1]].append(nid)
             data[cols[2]].append(res[nid]['Num Nodes'])
-            data[cols[3]].append(res[nid]['Times'][t])
-            data[cols[4]].append(res[nid]['Sets'][t])
-            data[cols[5]].append(res[nid]['FX'][t])
-            data[cols[6]].append(res[nid]['FY'][t])
-            data[cols[7]].append(res[nid]['FZ'][t])
-            data[cols[8]].append(res[nid]['Total Reaction Force'][t])
-            data[cols[9]].append(res[nid]['MX'][t])
-            data[cols[10]].append(res[nid]['MY'][t])
-            data[cols[11]].append(res[nid]['MZ'][t])
-            data[cols[12]].append(res[nid]['Total Reaction Moment'][t])
+            data[cols[3]].append(res[nid]['Reference'])
+            data[cols[4]].append(res[nid]['Times'][t])
+            data[cols[5]].append(res[nid]['Sets'][t])
+            data[cols[6]].append(res[nid]['FX'][t])
+            data[cols[7]].append(res[nid]['FY'][t])
+            data[cols[8]].append(res[nid]['FZ'][t])
+            data[cols[9]].append(res[nid]['Total Reaction Force'][t])
+            data[cols[10]].append(res[nid]['MX'][t])
+            data[cols[11]].append(res[nid]['MY'][t])
+            data[cols[12]].append(res[nid]['MZ'][t])
+            data[cols[13]].append(res[nid]['Total Reaction Moment'][t])
 
     x = datetime.datetime.now()
     
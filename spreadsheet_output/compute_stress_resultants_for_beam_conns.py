@@ -17,6 +17,7 @@ else:
     stressUnitStr = forceUnitStr + '*' + lengthUnitStr + '^-2'          # Desired stress output unit
 momentUnitStr = forceUnitStr + '*' + lengthUnitStr                  # Desired moment/torque output unit
 stiffnessUnitStr = forceUnitStr + '*' + lengthUnitStr + '^-1'       # Desired stiffness output unit
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 
@@ -26,6 +27,10 @@ import csv
 import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib import beam_table
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -149,69 +154,48 @@ for a in analysisNumbers:
     timeScoping.Ids = timeIds
     timeScoping.Location = 'Time'
     
-    # Get all materials and properties
-    mats = {}
-    matList = ExtAPI.DataModel.Project.Model.Materials.Children
-    matNames = [m.Name for m in matList]
-    matEDs = [m.GetEngineeringDataMaterial() for m in matList]
-    matProps = [materials.GetListMaterialProperties(ed) for ed in matEDs]
-    for n, ed, p in zip(matNames, matEDs, matProps):
-        if 'Elasticity' in p:
-            elasticity = materials.GetMaterialPropertyByName(ed, "Elasticity")
-            if "Young's Modulus" in elasticity:
-                mats[n] = {}
-                mats[n]['ElasticModulus'] = elasticity["Young's Modulus"][1] * Quantity('1 ['+ elasticity["Young's Modulus"][0] + ']')
+    # Beam connection table, read through the API only when the beams, their sections or the mesh have changed, with
+    # the length of every solved beam from its element nodes in the result mesh
+    beam_conns = DataModel.GetObjectsByType(DataModelObjectCategory.Beam)
+    tableFile = user_dir + '/' + analysis.Name + ' - beam_table.json'
+    moduli = beam_table.material_moduli(Model.Materials.Children)
+    tableKey = beam_table.beam_model_key(beam_conns, solver_data, moduli, analysis.MeshData)
+    table = beam_table.load_or_build(tableFile, tableKey, lambda: beam_table.beam_records(beam_conns, solver_data, moduli)).solved()
+    table = table.with_lengths(beam_table.mesh_beam_lengths(my_mesh, table.element_id))
+    mmQuan = Quantity(1, 'mm')
+    mpaQuan = Quantity(1, 'MPa')
 
     # Get all beams and the element information
     beams = {}
-    beam_conns = DataModel.GetObjectsByType(DataModelObjectCategory.Beam)
-    beamElemIds = [solver_data.GetObjectData(beam).ElementId for beam in beam_conns]
-    
-    for b, eid in zip(beam_conns, beamElemIds):
-        if eid != 0:
-            beams[eid]={}
-            beams[eid]['Name'] = b.Name
-            beams[eid]['Conn ID'] = b.ObjectId
-            xr = b.ReferenceXCoordinate
-            yr = b.ReferenceYCoordinate
-            zr = b.ReferenceZCoordinate
-            xm = b.MobileXCoordinate
-            ym = b.MobileYCoordinate
-            zm = b.MobileZCoordinate
-            l = ((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5)
-            beams[eid]['len'] = l
-            beams[eid]['Material'] = b.Material
-            rad = b.Radius
-            beams[eid]['rad'] = rad
-            area = pi*rad**2
-            beams[eid]['area'] = area
-            beams[eid]['dia'] = 2.0*rad
-            beams[eid]['I'] = pi*rad**4/4.0
-            beams[eid]['J'] = pi*rad**4/2.0
-            if b.Material in mats.keys():
-                modulus = mats[b.Material]['ElasticModulus']
-                stiffness = modulus*area/l
-                beams[eid]['Stiffness'] = stiffness
-            beams[eid]['times'] = all_times
-            beams[eid]['FX'] = []
-            beams[eid]['Shear Force'] = []
-            beams[eid]['Bending Moment'] = []
-            beams[eid]['Torque'] = []
-            beams[eid]['Direct Stress'] = []
-            beams[eid]['Bending Stress'] = []
-            beams[eid]['Torsional Stress'] = []
-            beams[eid]['Equivalent Stress'] = []
-            beams[eid]['Combined Stress'] = []
+    for k, eid in enumerate(table.element_id):
+        beams[eid]={}
+        beams[eid]['Name'] = table.name[k]
+        beams[eid]['Conn ID'] = table.object_id[k]
+        l = table.length[k] * mmQuan
+        beams[eid]['len'] = l
+        beams[eid]['Material'] = table.material[k]
+        rad = table.radius[k] * mmQuan
+        beams[eid]['rad'] = rad
+        area = pi*rad**2
+        beams[eid]['area'] = area
+        beams[eid]['dia'] = 2.0*rad
+        beams[eid]['I'] = pi*rad**4/4.0
+        beams[eid]['J'] = pi*rad**4/2.0
+        if table.modulus[k] is not None:
+            stiffness = table.modulus[k] * mpaQuan * area / l
+            beams[eid]['Stiffness'] = stiffness
+        beams[eid]['times'] = all_times
+        beams[eid]['FX'] = []
+        beams[eid]['Shear Force'] = []
+        beams[eid]['Bending Moment'] = []
+        beams[eid]['Torque'] = []
+        beams[eid]['Direct Stress'] = []
+        beams[eid]['Bending Stress'] = []
+        beams[eid]['Torsional Stress'] = []
+        beams[eid]['Equivalent Stress'] = []
+        beams[eid]['Combined Stress'] = []
     
-    beamElemIds = [b for b in beamElemIds if b != 0]
-    xRefCoords = [b.ReferenceXCoordinate for b in beam_conns]
-    yRefCoords = [b.ReferenceYCoordinate for b in beam_conns]
-    zRefCoords = [b.ReferenceZCoordinate for b in beam_conns]
-    xMobCoords = [b.MobileXCoordinate for b in beam_conns]
-    yMobCoords = [b.MobileYCoordinate for b in beam_conns]
-    zMobCoords = [b.MobileZCoordinate for b in beam_conns]
-    beamLengths = [((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5) for xr, yr ,zr, xm, ym, zm in zip(xRefCoords, yRefCoords, zRefCoords, xMobCoords, yMobCoords, zMobCoords)]
-    beamMats = [b.Material for b in beam_conns]
+    beamElemIds = table.element_id
     
     # Beam Element Scoping
     beamElem_scoping = dpf.Scoping()
@@ -331,7 +315,7 @@ for a in analysisNumbers:
             data[cols[6]].append(beams[eid]['area'] / areaQuan)
             data[cols[7]].append(beams[eid]['I'] / inertiaQuan)
             data[cols[8]].append(beams[eid]['J'] / inertiaQuan)
-            if beams[eid]['Material'] in mats.keys():
+            if 'Stiffness' in beams[eid]:
                 data[cols[9]].append(beams[eid]['Stiffness'] / stiffnessQuan)
             else:
                 data[cols[9]].append(0)
@@ -10,8 +10,11 @@ analysisNumbers = [0]           # LIST OF ANALYSIS SYSTEMS TO APPLY THIS SCRIPT
 lengthUnitStr = 'in'            # DESIRED LENGTH OUTPUT UNIT (usually 'in' or 'mm')
 forceUnitStr = 'lbf'            # DESIRED FOURCE OUTPUT UNIT (usually 'lbf' or 'N')
 CALCULATE_STIFFNESS = 'y'       # USE ELASTIC CONSTANTS TO CALCULATE STIFFNESS (must be one of 'y' or 'n')
-RANDOM_VIBRATION_SIGMA = 3      # SCALE FACTOR (SIGMA) FOR RESULTS OUTPUT
-ANSYS_VER = '2024 R2'           # Ansys version ('2024 R2', '2025 R1', '2025 R2')
+RANDOM_VIBRATION_SIGMA = [1, 2, 3]  # SCALE FACTORS (SIGMA LEVELS) FOR RANDOM VIBRATION OUTPUT, ALL IN ONE FILE
+TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE (0 = ALL, > 0 BOUNDS MEMORY FOR LONG TRANSIENTS)
+MAX_WORKERS = 1                 # NUMBER OF ANALYSES READ AND WRITTEN CONCURRENTLY (1 = SERIAL)
+ENVELOPE_ONLY = 'n'             # ONE ROW PER BEAM WITH THE MAXIMUM OVER ALL TIMES (must be one of 'y' or 'n')
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 import wbjn
@@ -20,6 +23,13 @@ import csv
 import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib import beam_resultants as br
+from mech_lib import smisc_reader
+from mech_lib import beam_table
+from mech_lib import parallel
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -54,16 +64,16 @@ forceQuan = Quantity(1, forceUnitStr)           # Desired force output unit quan
 momentQuan = Quantity(1, momentUnitStr)         # Desired moment output unit quantity
 stressQuan = Quantity(1, stressUnitStr)         # Desired stress output unit quantity
 
-def writeCSV(filename, data, cols):
+def writeCSVRows(filename, rows, cols):
     """
-    Function to write python data to a csv file.
+    Function to write rows of python data to a csv file as they are produced.
     
     Parameters
     ----------
     filename : str
         Filepath for the output file
-    data : dict
-        Data dictionary
+    rows : iterable of list
+        Rows of data, e.g. a generator that yields one row at a time
     cols : list of str
         Column header names
     
@@ -74,26 +84,41 @@ def writeCSV(filename, data, cols):
     with open(filename, 'wb') as csvfile:
         writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
         writer.writerow(cols)
-        writer.writerows(zip(*[data[col] for col in cols]))
+        writer.writerows(rows)
 
 
-def computeEquivStress(combStrs, torStrs):
+def runBeamJob(job):
     """
-    Function to compute the von Mises equivalent stress given the combined and torsional stresses
+    Read, compute and write the beam results of one analysis.  Only DPF and plain Python values are used (no
+    Mechanical API calls), so several jobs can run on worker threads (see mech_lib.parallel).
     
     Parameters
     ----------
-    combStrs : stress Quantity
-        Combined stress = direct stress plus bending stress
-    torStrs : stress Quantity
-        Torsional stress
+    job : dict
+        Values collected from the Mechanical API for one analysis on the main thread
     
     Returns
-    von Mises stress Quantity
+    -------
+    str
+        Filepath of the output file
     """
-    return (combStrs**2 + 3.0*torStrs**2)**(0.5)
+    # Each job opens its own data sources
+    dataSources = dpf.DataSources()
+    dataSources.SetResultFilePath(job['filepath'])
+    smiscSource = smisc_reader.DpfSmiscSource(dataSources)
+    args = (smiscSource, job['beam_keys'], job['timeIds'], job['beamRads'], job['section'], job['prefix'],
+            job['times'], job['sets'], job['factors'], TIME_CHUNK_SIZE)
+    if job['envKeys'] is not None:
+        rows = br.envelope_beam_rows(*args, keys=job['envKeys'], scales=job['sigmas'])
+    else:
+        # Read, compute and write the results one chunk of time sets at a time
+        rows = br.stream_beam_rows(*args, scales=job['sigmas'])
+    writeCSVRows(job['filename'], rows, job['cols'])
+    return job['filename']
 
 
+# Collect everything needed from the Mechanical API on the main thread, one job per analysis
+jobs = []
 for a in analysisNumbers:
     analysis = Model.Analyses[a]
     solver_data = analysis.Solution.SolverData
@@ -125,11 +150,15 @@ for a in analysisNumbers:
         solForceQuan = Quantity(1, solForceUnitStr)
         solMomentQuan = Quantity(1, solMomentUnitStr)
     
-    # Set the scale factor = 1 for non Random Vibration analyses
+    # Sigma levels written for Random Vibration analyses (None for other analyses).  The SMISC items are read once at
+    # 1 sigma; all resultants scale linearly, so every level and its governing end come from the same pass.
     if str(analysis_type).ToLower() == 'spectrum':
-        scale_factor = RANDOM_VIBRATION_SIGMA
+        if isinstance(RANDOM_VIBRATION_SIGMA, list):
+            sigmas = RANDOM_VIBRATION_SIGMA
+        else:
+            sigmas = [RANDOM_VIBRATION_SIGMA]
     else:
-        scale_factor = 1
+        sigmas = None
     
     # Result Data
     filepath = analysis.ResultFileName
@@ -161,183 +190,43 @@ for a in analysisNumbers:
     timeScoping.Ids = timeIds
     timeScoping.Location = 'Time'
     
-    # Get all materials and properties
-    if CALCULATE_STIFFNESS == 'y'.ToLower():
-        mats = {}
-        matList = ExtAPI.DataModel.Project.Model.Materials.Children
-        matNames = [m.Name for m in matList]
-        matEDs = [m.GetEngineeringDataMaterial() for m in matList]
-        matProps = [materials.GetListMaterialProperties(ed) for ed in matEDs]
-        for n, ed, p in zip(matNames, matEDs, matProps):
-            if 'Elasticity' in p:
-                elasticity = materials.GetMaterialPropertyByName(ed, "Elasticity")
-                if "Young's Modulus" in elasticity:
-                    mats[n] = {}
-                    mats[n]['ElasticModulus'] = elasticity["Young's Modulus"][1] * Quantity('1 ['+ elasticity["Young's Modulus"][0] + ']')
-
-    # Get all beams and the element information
-    beams = {}
+    # Beam connection table, read through the API only when the beams, their sections or the mesh have changed
     beam_conns = DataModel.GetObjectsByType(DataModelObjectCategory.Beam)
-    beamElemIds = [solver_data.GetObjectData(beam).ElementId for beam in beam_conns]
-    
-    for b, eid in zip(beam_conns, beamElemIds):
-        if eid != 0:
-            beams[eid]={}
-            beams[eid]['Name'] = b.Name
-            beams[eid]['Conn ID'] = b.ObjectId
-            xr = b.ReferenceXCoordinate
-            yr = b.ReferenceYCoordinate
-            zr = b.ReferenceZCoordinate
-            xm = b.MobileXCoordinate
-            ym = b.MobileYCoordinate
-            zm = b.MobileZCoordinate
-            l = ((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5)
-            beams[eid]['len'] = l
-            beams[eid]['Material'] = b.Material
-            rad = b.Radius
-            beams[eid]['rad'] = rad
-            area = pi*rad**2
-            beams[eid]['area'] = area
-            beams[eid]['dia'] = 2.0*rad
-            beams[eid]['I'] = pi*rad**4/4.0
-            beams[eid]['J'] = pi*rad**4/2.0
-            if CALCULATE_STIFFNESS == 'y'.ToLower():
-                if b.Material in mats.keys():
-                    modulus = mats[b.Material]['ElasticModulus']
-                    stiffness = modulus*area/l
-                    beams[eid]['Stiffness'] = stiffness
-            beams[eid]['times'] = all_times
-            beams[eid]['FX'] = []
-            beams[eid]['SF_Y'] = []
-            beams[eid]['SF_Z'] = []
-            beams[eid]['Total Shear Force'] = []
-            beams[eid]['Bending Moment'] = []
-            beams[eid]['Torque'] = []
-            beams[eid]['Direct Stress'] = []
-            beams[eid]['Bending Stress'] = []
-            beams[eid]['Torsional Stress'] = []
-            beams[eid]['Equivalent Stress'] = []
-            beams[eid]['Combined Stress'] = []
-    
-    beamElemIds = [b for b in beamElemIds if b != 0]
-    xRefCoords = [b.ReferenceXCoordinate for b in beam_conns]
-    yRefCoords = [b.ReferenceYCoordinate for b in beam_conns]
-    zRefCoords = [b.ReferenceZCoordinate for b in beam_conns]
-    xMobCoords = [b.MobileXCoordinate for b in beam_conns]
-    yMobCoords = [b.MobileYCoordinate for b in beam_conns]
-    zMobCoords = [b.MobileZCoordinate for b in beam_conns]
-    beamLengths = [((xr-xm)**2 + (yr-ym)**2 + (zr-zm)**2)**(0.5) for xr, yr ,zr, xm, ym, zm in zip(xRefCoords, yRefCoords, zRefCoords, xMobCoords, yMobCoords, zMobCoords)]
-    beamMats = [b.Material for b in beam_conns]
-    
-    # Beam Element Scoping
-    beamElem_scoping = dpf.Scoping()
-    beamElem_scoping.Location = "Elemental"
-    beamElem_scoping.Ids = beams.keys()
-    
+    tableFile = user_dir + '/' + analysis.Name + ' - beam_table.json'
+    moduli = beam_table.material_moduli(Model.Materials.Children)
+    tableKey = beam_table.beam_model_key(beam_conns, solver_data, moduli, analysis.MeshData)
+    table = beam_table.load_or_build(tableFile, tableKey, lambda: beam_table.beam_records(beam_conns, solver_data, moduli)).solved()
+    table = table.with_lengths(beam_table.mesh_beam_lengths(my_mesh, table.element_id))
+    beam_keys = table.element_id
+    nBeams = len(beam_keys)
+    nTimes = len(timeScoping.Ids)
+
+    # Beam geometry and axial stiffness as floats in the desired output units
+    section = table.geometry((Quantity(1, 'mm') / lengthQuan).Value, (Quantity(1, 'MPa') / stressQuan).Value)
+    beamRads = section['radius']
+
     analysis_settings = analysis.AnalysisSettings
 
     # Get Field data
-    # item_index is the SMISC item ID found in BEAM188 documentation
-    # FX = axial force, MY = Bending moment in Y-dir, MZ = Bending Moment in Z-dir, TQ = torque, SFz = Shear Force in Z-dir, SFy = Shear force in Y-dir
+    # SMISC item indices for BEAM188 are defined in br.FORCE_ITEMS and br.MOMENT_ITEMS
     # SDIR = direct stress from axial loading
     # SByT = Bending stress on top in Y-dir, SByB = Bending stress on bottom in Y-dir
     # SBzT = Bending stress on top in Z-dir, SBzB = Bending stress on bottom in Z-dir
-    
-    force_fields_idx = {'FX_I': 1, 'FX_J': 14, 'SFz_I': 5, 'SFz_J': 18, 'SFy_I': 6, 'SFy_J': 19}
-    moment_fields_idx = {'MY_I': 2, 'MY_J': 15, 'MZ_I': 3, 'MZ_J': 16, 'TQ_I': 4, 'TQ_J': 17}
     stress_fields_idx = {'SDIR_I': 31, 'SDIR_J': 36, 'SByT_I': 32, 'SByT_J': 37, 'SByB_I': 33, 'SByB_J': 38, 'SBzT_I': 34, 'SBzT_J': 39, 'SBzB_I': 35, 'SBzB_J': 40}
     
-    force_fields = {}
-    moment_fields = {}
-
-    # Create force and moment operator
-    smiscOp = dpf.operators.result.smisc()
-    smiscOp.inputs.data_sources.Connect(dataSources)
-    smiscOp.inputs.time_scoping.Connect(timeScoping)
-    smiscOp.inputs.mesh_scoping.Connect(beamElem_scoping)
-    
-    # Create scale operator
-    scale_op = dpf.operators.math.scale_fc()
-    if ANSYS_VER.ToUpper() == '2024 R2':
-        scale_op.inputs.ponderation.Connect(scale_factor)   # 2024 R2
-    else:
-        scale_op.inputs.weights.Connect(scale_factor)       # 2025 R2
-    
+    # Conversion factors from solver units to the desired output units
+    forceFactor = (solForceQuan / forceQuan).Value
+    momentFactor = (solMomentQuan / momentQuan).Value
 
-    for k, v in force_fields_idx.items():
-        smiscOp.inputs.item_index.Connect(v)
-        force_fc = smiscOp.outputs.fields_container
-        scale_op.inputs.fields_container.Connect(force_fc)
-        force_fields[k] = scale_op.outputs.fields_container.GetData()
-    for k, v in moment_fields_idx.items():
-        smiscOp.inputs.item_index.Connect(v)
-        moment_fc = smiscOp.outputs.fields_container
-        scale_op.inputs.fields_container.Connect(moment_fc)
-        moment_fields[k] = scale_op.outputs.fields_container.GetData()
-        
-    # Place the axial forces and direct stresses into the data dictionary
-    for t in range(len(timeScoping.Ids)):
-        for i, eid in enumerate(force_fields['FX_I'][t].ScopingIds):
-            F_I = force_fields['FX_I'][t].Data[i]
-            F_J = force_fields['FX_J'][t].Data[i]
-            if abs(F_I) >= abs(F_J):
-                f = F_I * solForceQuan
-            else:
-                f = F_J * solForceQuan
-            beams[eid]['FX'].append(f)
-            SFz_I = force_fields['SFz_I'][t].Data[i]
-            SFy_I = force_fields['SFy_I'][t].Data[i]
-            SFz_J = force_fields['SFz_J'][t].Data[i]
-            SFy_J = force_fields['SFy_J'][t].Data[i]
-            if abs(SFy_I) >= abs(SFy_J):
-                beams[eid]['SF_Y'].append(SFy_I * solForceQuan)
-                SFy = SFy_I
-            else:
-                beams[eid]['SF_Y'].append(SFy_J * solForceQuan)
-                SFy = SFy_J
-            if abs(SFz_I) >= abs(SFz_J):
-                beams[eid]['SF_Z'].append(SFz_I * solForceQuan)
-                SFz = SFz_I
-            else:
-                beams[eid]['SF_Z'].append(SFz_J * solForceQuan)
-                SFz = SFz_J
-            SF = (SFz**2 + SFy**2)**(0.5)
-            beams[eid]['Total Shear Force'].append(SF * solForceQuan)
-            s = f/beams[eid]['area']
-            beams[eid]['Direct Stress'].append(s)
-            
-    # Compute the equivalent stress at I and J.  Record whichever result is larger in magnitude in the data dictionary.
-    for t in range(len(timeScoping.Ids)):
-        for i, eid in enumerate(moment_fields['MY_I'][t].ScopingIds):
-            M_I = (moment_fields['MY_I'][t].Data[i]**2 + moment_fields['MZ_I'][t].Data[i]**2)**(0.5)*solMomentQuan
-            M_J = (moment_fields['MY_J'][t].Data[i]**2 + moment_fields['MZ_J'][t].Data[i]**2)**(0.5)*solMomentQuan
-            TQ_I = moment_fields['TQ_I'][t].Data[i]*solMomentQuan
-            TQ_J = moment_fields['TQ_J'][t].Data[i]*solMomentQuan
-            bendStr_I = M_I * beams[eid]['rad'] / beams[eid]['I']
-            bendStr_J = M_J * beams[eid]['rad'] / beams[eid]['I']
-            combStr_I = beams[eid]['Direct Stress'][t] + bendStr_I
-            combStr_J = beams[eid]['Direct Stress'][t] + bendStr_J
-            torStr_I = TQ_I * beams[eid]['rad'] / beams[eid]['J']
-            torStr_J = TQ_J * beams[eid]['rad'] / beams[eid]['J']
-            eqvStr_I = computeEquivStress(combStr_I, torStr_I)
-            eqvStr_J = computeEquivStress(combStr_J, torStr_J)
-            if abs(eqvStr_I) >= abs(eqvStr_J):
-                beams[eid]['Bending Moment'].append(M_I)
-                beams[eid]['Torque'].append(TQ_I)
-                beams[eid]['Bending Stress'].append(bendStr_I)
-                beams[eid]['Torsional Stress'].append(torStr_I)
-                beams[eid]['Equivalent Stress'].append(eqvStr_I)
-                beams[eid]['Combined Stress'].append(combStr_I)
-            else:
-                beams[eid]['Bending Moment'].append(M_J)
-                beams[eid]['Torque'].append(TQ_J)
-                beams[eid]['Bending Stress'].append(bendStr_J)
-                beams[eid]['Torsional Stress'].append(torStr_J)
-                beams[eid]['Equivalent Stress'].append(eqvStr_J)
-                beams[eid]['Combined Stress'].append(combStr_J)
+    # Read every SMISC item in one pass, scaled to the desired output units
+    factors = {}
+    for k in br.BEAM_ITEMS:
+        if k in br.FORCE_ITEMS:
+            factors[k] = forceFactor
+        else:
+            factors[k] = momentFactor
     
-    # Create data dictionary to written to output csv file
-    data = {}
+    # Output columns
     if CALCULATE_STIFFNESS == 'y'.ToLower():
         cols = ['Beam Connection Name',
                 'Beam Element ID',
@@ -386,56 +275,67 @@ for a in analysisNumbers:
                 'Combined Stress ' + stressUnit,
                 'Torsional Stress ' + stressUnit]
     
-    for c in cols:
-        data[c] = []
-
-    beam_keys = sorted(beams.keys())
-    for eid in beam_keys:
-        for t in range(len(timeScoping.Ids)):
-            data[cols[0]].append(beams[eid]['Name'])
-            data[cols[1]].append(eid)
-            data[cols[2]].append(beams[eid]['Conn ID'])
-            data[cols[3]].append(beams[eid]['Material'])
-            data[cols[4]].append(beams[eid]['dia'] / lengthQuan)
-            data[cols[5]].append(beams[eid]['len'] / lengthQuan)
-            data[cols[6]].append(beams[eid]['area'] / areaQuan)
-            data[cols[7]].append(beams[eid]['I'] / inertiaQuan)
-            data[cols[8]].append(beams[eid]['J'] / inertiaQuan)
-            p = 9       # index of next column
-            if CALCULATE_STIFFNESS == 'y'.ToLower():
-                q = 1
-                if beams[eid]['Material'] in mats.keys():
-                    data[cols[p]].append(beams[eid]['Stiffness'] / stiffnessQuan)
-                else:
-                    data[cols[p]].append(0)
-            else:
-                q = 0
-            data[cols[p + q]].append(beams[eid]['times'][t])
-            if str(analysis_type).ToLower().Contains('spectrum'): 
-                data[cols[p + q + 1]].append(timeSets[t])
-            else:
-                data[cols[p + q + 1]].append(t+1)
-            data[cols[p + q + 2]].append(beams[eid]['FX'][t] / forceQuan)
-            data[cols[p + q + 3]].append(beams[eid]['SF_Y'][t] / forceQuan)
-            data[cols[p + q + 4]].append(beams[eid]['SF_Z'][t] / forceQuan)
-            data[cols[p + q + 5]].append(beams[eid]['Total Shear Force'][t] / forceQuan)
-            data[cols[p + q + 6]].append(beams[eid]['Torque'][t] / momentQuan)
-            data[cols[p + q + 7]].append(beams[eid]['Bending Moment'][t] / momentQuan)
-            data[cols[p + q + 8]].append(beams[eid]['Equivalent Stress'][t] / stressQuan)
-            data[cols[p + q + 9]].append(beams[eid]['Direct Stress'][t] / stressQuan)
-            data[cols[p + q + 10]].append(beams[eid]['Bending Stress'][t] / stressQuan)
-            data[cols[p + q + 11]].append(beams[eid]['Combined Stress'][t] / stressQuan)
-            data[cols[p + q + 12]].append(beams[eid]['Torsional Stress'][t] / stressQuan)
+    if sigmas is not None:
+        cols.insert(cols.index('Set') + 1, 'Sigma')
+    
+    times = [all_times[t] for t in range(nTimes)]
+    if str(analysis_type).ToLower().Contains('spectrum'): 
+        sets = [timeSets[t] for t in range(nTimes)]
+    else:
+        sets = [t+1 for t in range(nTimes)]
+    
+    # Time independent columns for each beam
+    prefix = [list(v) for v in zip(table.name, beam_keys, table.object_id, table.material, section['dia'],
+                                   section['length'], section['area'], section['I'], section['J'])]
+    if CALCULATE_STIFFNESS == 'y'.ToLower():
+        for row, k in zip(prefix, section['stiffness']):
+            row.append(k)
+    
+    if ENVELOPE_ONLY == 'y'.ToLower():
+        # One row per beam with the maximum of each resultant over all time sets and where it occurred
+        envKeys = br.ENVELOPE_KEYS
+        envCols = ['Axial Force ' + forceUnit, 'Total Shear Force ' + forceUnit, 'Torque ' + momentUnit,
+                   'Bending Moment ' + momentUnit, 'Equivalent Stress ' + stressUnit]
+        cols = cols[:cols.index('Time ' + timeUnit)]
+        if sigmas is not None:
+            cols.append('Sigma')
+        for c in envCols:
+            name = c.split(' [')[0]
+            cols += ['Max ' + c, 'Time of Max ' + name + ' ' + timeUnit, 'Set of Max ' + name]
+        resultsName = ' - Bolt_Envelope_'
+    else:
+        envKeys = None
+        resultsName = ' - Bolt_Results_'
         
 
     x = datetime.datetime.now()
     
-    file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Bolt_Results_' + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
-    writeCSV(user_dir + '/' + file_name_body + ".csv", data, cols)
-    
-    print("[INFO] Process completed for " + analysis.Name)
-    print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34))
-    print("Analysis Type: " + str(analysis_type)  + '\n')
+    file_name_body = analysis.Name + ' - type=' + str(analysis_type) + resultsName + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
+    jobs.append({'name': analysis.Name,
+                 'type': str(analysis_type),
+                 'file_name_body': file_name_body,
+                 'filename': user_dir + '/' + file_name_body + ".csv",
+                 'filepath': filepath,
+                 'cols': cols,
+                 'beam_keys': beam_keys,
+                 'timeIds': list(timeIds),
+                 'beamRads': beamRads,
+                 'section': section,
+                 'prefix': prefix,
+                 'times': times,
+                 'sets': sets,
+                 'factors': factors,
+                 'envKeys': envKeys,
+                 'sigmas': sigmas})
     
     model.ReleaseStreams()
+
+# Read, compute and write the results of all analyses, MAX_WORKERS at a time
+results, stats = parallel.run_jobs(jobs, runBeamJob, MAX_WORKERS)
+for job in jobs:
+    print("[INFO] Process completed for " + job['name'])
+    print("Open File: " + chr(34) + user_dir + chr(92) + job['file_name_body'] + ".csv" + chr(34))
+    print("Analysis Type: " + job['type']  + '\n')
+print("[INFO] Timing")
+print(parallel.format_stats([job['name'] for job in jobs], stats))
     
@@ -17,6 +17,10 @@ NAMED_SEL_FOLDER = 'Results Scoping'        # Named selection folder name contai
 # Set the scale factor for Random Vibration Analyses
 # The last part of the Enumeration can be (Sigma1, Sigma2, Sigma3, UserDefined)
 SCALE_FACTOR = Ansys.Mechanical.DataModel.Enums.ScaleFactorType.Sigma3
+UNION_READ = 'y'                # READ THE STRESS OF ALL NAMED SELECTIONS AT ONCE, AVERAGED PER NAMED SELECTION (must be one of 'y' or 'n')
+TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE WHEN UNION_READ = 'y' (0 = ALL)
+TOP_N = 0                       # NUMBER OF HIGHEST STRESS NODES PER NAMED SELECTION WRITTEN TO A HOTSPOT CSV (0 = NONE)
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 import wbjn
@@ -25,6 +29,13 @@ import csv
 import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib.ns_index import NamedSelectionIndex, mesh_key, INDEX_FILE_NAME
+from mech_lib import ns_extrema as ne
+from mech_lib.nodal_reactions import NodeSetIndex
+from mech_lib.beam_resultants import iter_time_chunks
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -166,28 +177,14 @@ for a in analysisNumbers:
     nameSelOp.inputs.data_sources.Connect(dataSource)
     nameSelOp.inputs.requested_location.Connect('Nodal')
     
-    # Create vonMises stress operator
-    seqvOp = dpf.operators.result.stress_von_mises()
-    seqvOp.inputs.data_sources.Connect(dataSource)
-    seqvOp.inputs.time_scoping.Connect(timeScoping)
-    
-    # Create the min-max operator
-    minMaxOp = dpf.operators.min_max.min_max_fc()
-    
-    # Create the unit convert operator
-    unitConvOp = dpf.operators.math.unit_convert_fc()
-    unitConvOp.inputs.unit_name.Connect(stressUnitStr)
-    
-    # Create scale operator and set the scale factor = 1 for non Random Vibration analyses
-    scaleOp = dpf.operators.math.scale_fc()
+    # Set the scale factor = 1 for non Random Vibration analyses
     if str(analysis_type).ToLower() == 'spectrum':
         scaleFactor = RANDOM_VIBRATION_SIGMA
     else:
         scaleFactor = 1
-    if ANSYS_VER.ToUpper() == '2024 R2':
-        scaleOp.inputs.ponderation.Connect(scaleFactor)   # 2024 R2
-    else:
-        scaleOp.inputs.weights.Connect(scaleFactor)       # 2025 R2
+    
+    # Element and node Ids of the named selections, reused from the user files directory while the mesh is unchanged
+    nsIndex = NamedSelectionIndex(user_dir + '/' + INDEX_FILE_NAME, mesh_key(meshData))
     
     # Loop through all named selections and create a results dictionary
     res = {}
@@ -195,59 +192,40 @@ for a in analysisNumbers:
         nid = n.ObjectId
         res[nid] = {}
         res[nid]['Name'] = n.Name
-        res[nid]['Times'] = []
-        res[nid]['Sets'] = []
-        res[nid]['Max Eqv. Stress'] = []
+        res[nid]['Rows'] = []
         
         #Get the mesh element and node Ids
-        elemIds = []
-        nodeIds = []
-        for nlocId in n.Location.Ids:
-            solMesh = meshData.MeshRegionById(nlocId)
-            elemIds += solMesh.ElementIds
-            nodeIds += solMesh.NodeIds
+        elemIds, nodeIds = nsIndex.ids(nid, n.Location.Ids, meshData)
         res[nid]['Elements'] = elemIds
         res[nid]['Nodes'] = nodeIds
-        
-        # Scope the von Mises stress results to the element Ids
-        scoping = dpf.Scoping()
-        scoping.Ids = elemIds
-        scoping.Location = dpf.locations.elemental
-        
-        # Scope von Mises stress results to active named selection
-        seqvOp.inputs.mesh_scoping.Connect(scoping)
-        vmStressFC = seqvOp.outputs.fields_container
-        vmStress = vmStressFC.GetData()
-        
-        # Convert the von Mises stress to desired stress units
-        unitConvOp.inputs.fields_container.Connect(vmStress)
-        
-        # Scale the von Mises stress
-        vmStressFC = unitConvOp.outputs.fields_container
-        scaleOp.inputs.fields_container.Connect(vmStressFC)
-        vmStress = scaleOp.outputs.fields_container.GetData()
-        
-        # Remove fields with 0 entities by creating a new fields container by adding fields
-        # if they are greater than zero.
-        # Create empry fields_container and set label space equal to that of the stress FC
-        fc = dpf.FieldsContainer()
-        fc.Labels = list(vmStress.GetLabelSpace(0).Keys)
-        fcLblSpcLen = len(fc.Labels)
-        # Get fields with more than zero entities
-        j = 1
-        for i in range(vmStress.FieldCount):
-            if vmStress[i].ElementaryDataCount > 0:
-                fc.Add(vmStress[i],vmStress.GetLabelSpace(i))
-                j = j + 1
-        
-        # Get the maximum von Mises stress for all times
-        minMaxOp.inputs.fields_container.Connect(fc)
-        maxVmStress = minMaxOp.outputs.field_max.GetData()
-        
-        for t in range(len(timeScoping.Ids)):
-            res[nid]['Times'].append(all_times[t])
-            res[nid]['Sets'].append(timeScoping.Ids[t])
-            res[nid]['Max Eqv. Stress'].append(maxVmStress.Data[t])
+    nsIndex.save()
+    
+    # von Mises stress in the desired stress unit, read from the result file through DPF
+    nsKeys = [n.ObjectId for n in nsChildren]
+    source = ne.DpfNodalResultSource(dataSource, 'stress_von_mises', stressUnitStr)
+    top = ne.TopNodes(len(nsKeys), TOP_N)
+    
+    if UNION_READ == 'y'.ToLower():
+        # Read the stress of the elements of all named selections once per chunk of time sets and average it over the
+        # elements of each named selection, so nodes shared by named selections get the same stress as in a read per
+        # named selection
+        indexes = [NodeSetIndex([res[nid]['Nodes']]) for nid in nsKeys]
+        elemSets = [res[nid]['Elements'] for nid in nsKeys]
+        for start, chunk in iter_time_chunks(timeIds, TIME_CHUNK_SIZE):
+            for s, fields in enumerate(source.read_sets(elemSets, chunk)):
+                maxima = ne.nodal_maxima(indexes[s], fields, scaleFactor)
+                res[nsKeys[s]]['Rows'] += ne.maxima_rows(maxima, chunk, all_times)[0]
+                if TOP_N > 0:
+                    top.update(indexes[s], fields, chunk, scaleFactor, s)
+    else:
+        # Read the von Mises stress of one named selection at a time (all time sets)
+        for s, nid in enumerate(nsKeys):
+            index = NodeSetIndex([res[nid]['Nodes']])
+            fields = source.read(res[nid]['Elements'], timeIds)
+            maxima = ne.nodal_maxima(index, fields, scaleFactor)
+            res[nid]['Rows'] += ne.maxima_rows(maxima, timeIds, all_times)[0]
+            if TOP_N > 0:
+                top.update(index, fields, timeIds, scaleFactor, s)
         
     # Create data dictionary to written to output csv file
     data = {}
@@ -255,18 +233,16 @@ for a in analysisNumbers:
             'Named Selection ID',
             'Time ' + timeUnit,
             'Set',
-            'Max Eqv. Stress ' + stressUnit]
+            'Max Eqv. Stress ' + stressUnit,
+            'Max Node']
     
     for c in cols:
         data[c] = []
 
     for nid in sorted(res.keys()):
-        for t in range(len(timeScoping.Ids)):
-            data[cols[0]].append(res[nid]['Name'])
-            data[cols[1]].append(nid)
-            data[cols[2]].append(res[nid]['Times'][t])
-            data[cols[3]].append(res[nid]['Sets'][t])
-            data[cols[4]].append(res[nid]['Max Eqv. Stress'][t])
+        for row in res[nid]['Rows']:
+            for c, v in zip(cols, [res[nid]['Name'], nid] + row):
+                data[c].append(v)
 
     x = datetime.datetime.now()
     
@@ -276,4 +252,34 @@ for a in analysisNumbers:
     print("[INFO] Process completed for " + analysis.Name)
     print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34) + '\n')
     
+    if TOP_N > 0:
+        # Coordinates (about the global coordinate system) of the hotspot nodes only, in the output length unit
+        ndCoordsOp = dpf.operators.mesh.node_coordinates()
+        ndCoordsOp.inputs.mesh.Connect(my_mesh)
+        ndUnitConvOp = dpf.operators.math.unit_convert()
+        ndUnitConvOp.inputs.unit_name.Connect(lengthUnitStr)
+        ndUnitConvOp.inputs.entity_to_convert.Connect(ndCoordsOp.outputs.getcoordinates_as_field())
+        nodeCoords = ndUnitConvOp.outputs.getconverted_entity_as_field()
+        
+        hotCols = ['Named Selection',
+                   'Named Selection ID',
+                   'Rank',
+                   'Node',
+                   'X ' + lengthUnit,
+                   'Y ' + lengthUnit,
+                   'Z ' + lengthUnit,
+                   'Eqv. Stress ' + stressUnit,
+                   'Time ' + timeUnit,
+                   'Set']
+        hotData = dict((c, []) for c in hotCols)
+        hotRows = ne.hotspot_rows(top, [res[nid]['Name'] for nid in nsKeys], nsKeys,
+                                  (nodeCoords.ScopingIds, nodeCoords.Data), all_times)
+        for row in hotRows:
+            for c, v in zip(hotCols, row):
+                hotData[c].append(v)
+        
+        file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Eqv_Stress_Hotspots_' + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
+        writeCSV(user_dir + '/' + file_name_body + ".csv", hotData, hotCols)
+        print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34) + '\n')
+    
     model.ReleaseStreams()
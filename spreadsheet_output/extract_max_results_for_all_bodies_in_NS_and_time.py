@@ -0,0 +1,259 @@
+"""
+Extract Maximum Stress, Deformation, Velocity and Acceleration for all bodies in named selections at all analysis times.
+======================================================================================================================
+
+This script extracts, in one pass, the maximum of each requested result kind for each group of scoped bodies within
+named selections for all analysis times, and writes them to one spreadsheet.  The named selections that are of interest
+are placed in a Tree Grouping folder called `Results Scoping`.
+
+The result file, time scoping, named selections, unit conversion and scaling are set up once per analysis, and each
+chunk of time sets is read once per result kind for all named selections.  Deformation, velocity and acceleration give
+the maximum of the total (norm) and of the X, Y and Z components (largest signed value) from the same read.
+
+Averaged results (stress) are read once on the elements of all named selections and averaged over the elements of each
+named selection (or body) separately, so a node at a body interface gets the same value as in a read per named
+selection.
+
+With PER_BODY = 'y' the maxima are computed for every unsuppressed body of the geometry instead, from a body to element
+and node index built once from the mesh data (kept as CSR arrays in its own file, see mech_lib.ns_index.BodyIndex), so
+no named selection per body is needed (see model_setup/create_named_sels_for_all_bodies.py).
+
+"""
+################################## USER INPUTS ##################################
+analysisNumbers = [0]           # LIST OF ANALYSIS SYSTEMS TO APPLY THIS SCRIPT
+staticStrLastTimeOnly = 'Y'     # 'Y' = only output last time step for static structural, 'N' = output all time steps
+lengthUnitStr = 'in'            # DESIRED LENGTH OUTPUT UNIT (usually 'in' or 'mm', case sensitive)
+forceUnitStr = 'lbf'            # DESIRED FOURCE OUTPUT UNIT (usually 'lbf' or 'N', case sensitive)
+velocityUnitStr = 'in/s'        # DESIRED VELOCITY OUTPUT UNIT (usually 'in/s' or 'mm/s', case sensitive)
+accelerationUnitStr = 'in/s^2'  # DESIRED ACCELERATION OUTPUT UNIT (usually 'in/s^2' or 'mm/s^2', case sensitive)
+RANDOM_VIBRATION_SIGMA = 3      # SCALE FACTOR (SIGMA) FOR RESULTS OUTPUT
+NAMED_SEL_FOLDER = 'Results Scoping'        # Named selection folder name containing NS used for results scoping
+PER_BODY = 'n'                  # 'y' = MAXIMA OF EVERY BODY OF THE GEOMETRY (NAMED_SEL_FOLDER NOT USED), 'n' = OF THE NAMED SELECTIONS
+RESULT_KINDS = ['stress', 'deformation', 'velocity', 'acceleration']    # ANY OF 'stress', 'deformation', 'velocity', 'acceleration'
+TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE (0 = ALL, > 0 BOUNDS MEMORY FOR LONG TRANSIENTS)
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
+#################################################################################
+
+import wbjn
+import datetime
+import csv
+import mech_dpf
+import Ans.DataProcessing as dpf
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib import ns_extrema as ne
+from mech_lib.ns_index import NamedSelectionIndex, BodyIndex, mesh_key, INDEX_FILE_NAME, BODY_INDEX_FILE_NAME
+from mech_lib.nodal_reactions import NodeSetIndex
+from mech_lib.beam_resultants import iter_time_chunks
+cmd = 'returnValue(GetUserFilesDirectory())'
+user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
+mech_dpf.setExtAPI(ExtAPI)
+
+
+if lengthUnitStr.ToLower() == 'in' and forceUnitStr.ToLower() == 'lbf':
+    stressUnitStr = 'psi'
+elif lengthUnitStr.ToLower() == 'mm' and forceUnitStr.ToUpper() == 'N':
+    stressUnitStr = 'MPa'
+else:
+    stressUnitStr = forceUnitStr + '*' + lengthUnitStr + '^-2'          # Desired stress output unit
+
+# Output unit of each result kind
+unitStrs = {'stress': stressUnitStr,
+            'deformation': lengthUnitStr,
+            'velocity': velocityUnitStr,
+            'acceleration': accelerationUnitStr}
+
+kinds = [k.ToLower() for k in RESULT_KINDS]
+for k in kinds:
+    if k not in ne.RESULT_KINDS:
+        raise ValueError("RESULT_KINDS entry " + k + " must be one of " + ', '.join(sorted(ne.RESULT_KINDS)))
+
+
+def findTreeGroupingFolders(item):
+    """
+    Return a list of Tree Grouping Folders for a Model item containder (e.g., Named Selections)
+
+    Parameters
+    ----------
+    item : ExtAPI.DataModel.Project.Model item
+        Model tree item that would contain one or more Tree Grouping Folders
+
+    Returns
+    -------
+    List
+    """
+    TreeGroupingFolderList = []
+    for child in item.Children:
+        if child.GetType() == Ansys.ACT.Automation.Mechanical.TreeGroupingFolder:
+            TreeGroupingFolderList.append(child)
+    return TreeGroupingFolderList
+
+
+def getNamedSelectionsGroupByName(name):
+    """
+    Get the Named Selections grouping folder by name
+
+    Parameters
+    ----------
+    name : str
+        Name of the Named Selections grouping folder
+
+    Returns
+    -------
+    Ansys.ACT.Automation.Mechanical.TreeGroupingFolder
+    """
+    groups = findTreeGroupingFolders(Model.NamedSelections)
+    for group in groups:
+        if group.Name.ToLower() == name.ToLower():
+            return group
+
+
+def getResultSets():
+    """
+    Get the scoping of every maximum: the named selections in NAMED_SEL_FOLDER, or every body if PER_BODY = 'y'
+
+    Returns
+    -------
+    list of tuple
+        (name, ObjectId, geometry entity Ids) of each named selection or body
+    """
+    if PER_BODY.ToLower() == 'y':
+        bodies = Model.Geometry.GetChildren(DataModelObjectCategory.Body, True)
+        return [(b.Name, b.ObjectId, [b.GetGeoBody().Id]) for b in bodies if not b.Suppressed]
+    nsGroup = getNamedSelectionsGroupByName(NAMED_SEL_FOLDER)
+    return [(n.Name, n.ObjectId, list(n.Location.Ids)) for n in nsGroup.Children]
+
+
+def writeCSVRows(filename, rows, cols):
+    """
+    Function to write rows of python data to a csv file as they are produced.
+
+    Parameters
+    ----------
+    filename : str
+        Filepath for the output file
+    rows : iterable of list
+        Rows of data, e.g. a generator that yields one row at a time
+    cols : list of str
+        Column header names
+
+    Returns
+    -------
+    None
+    """
+    with open(filename, 'wb') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(cols)
+        writer.writerows(rows)
+
+
+for a in analysisNumbers:
+    analysis = Model.Analyses[a]
+    analysis_type = analysis.AnalysisType
+    meshData = analysis.MeshData
+
+    # Result Data
+    filepath = analysis.ResultFileName
+
+    # Data Sources
+    dataSource = dpf.DataSources()
+    dataSource.SetResultFilePath(filepath)
+
+    # Model and time steps
+    model = dpf.Model(dataSource)
+    all_times = model.TimeFreqSupport.TimeFreqs.Data
+    timeUnitStr = str(model.TimeFreqSupport.TimeFreqs.Unit)               # Time stepping unit
+    timeUnit = '[' + timeUnitStr + ']'
+    number_sets = model.TimeFreqSupport.NumberSets      # Number of time steps
+    timeIds = range(1, number_sets + 1)                 # List of time steps
+    if str(analysis_type).ToLower() == 'spectrum':
+        timeIds = [2]
+    elif str(analysis_type).ToLower() == 'responsespectrum':
+        timeIds = [1]
+    elif str(analysis_type).ToLower() == 'static':
+        if staticStrLastTimeOnly.ToLower() == 'y':
+            timeIds = [timeIds[len(timeIds)-1]]            # Last time step
+
+    # Velocity and acceleration records are not in the result file of a static structural or modal analysis.  In the
+    # result file of a spectrum analysis the 1 sigma (or combined) velocity and acceleration are separate sets stored as
+    # displacement records, which the velocity and acceleration operators do not read, so they are not written either.
+    analysisKinds = kinds
+    if str(analysis_type).ToLower() in ('static', 'modal', 'spectrum', 'responsespectrum'):
+        analysisKinds = [k for k in kinds if k not in ('velocity', 'acceleration')]
+        if len(analysisKinds) < len(kinds):
+            print("[WARNING] Velocity and acceleration are not written for " + str(analysis_type) + " analysis " + analysis.Name)
+
+    # Set the scale factor = 1 for non Random Vibration analyses
+    if str(analysis_type).ToLower() == 'spectrum':
+        scaleFactor = RANDOM_VIBRATION_SIGMA
+    else:
+        scaleFactor = 1
+
+    # Named selections (or bodies) and their element and node Ids, reused from the user files directory while the mesh
+    # is unchanged
+    resultSets = getResultSets()
+    meshKey = mesh_key(meshData)
+    if PER_BODY.ToLower() == 'y':
+        bodyIndex = BodyIndex(user_dir + '/' + BODY_INDEX_FILE_NAME, meshKey, [locIds[0] for name, objectId, locIds in resultSets], meshData)
+        nsIds = [(bodyIndex.elements(b), bodyIndex.nodes(b)) for b in range(len(bodyIndex))]
+    else:
+        nsIndex = NamedSelectionIndex(user_dir + '/' + INDEX_FILE_NAME, meshKey)
+        nsIds = [nsIndex.ids(objectId, locIds, meshData) for name, objectId, locIds in resultSets]
+        nsIndex.save()
+
+    # Node to named selection membership index shared by the nodal result kinds, and the index of each named selection
+    # on its own for the results averaged per named selection
+    index = NodeSetIndex([nodeIds for elemIds, nodeIds in nsIds])
+    elemSets = [elemIds for elemIds, nodeIds in nsIds]
+    setIndexes = None
+    if any(ne.RESULT_KINDS[k][1] != 'Nodal' for k in analysisKinds):
+        setIndexes = [NodeSetIndex([nodeIds]) for elemIds, nodeIds in nsIds]
+    sources = {}
+    for k in analysisKinds:
+        operator, location, quantities = ne.RESULT_KINDS[k]
+        sources[k] = ne.DpfNodalResultSource(dataSource, operator, unitStrs[k], location=location)
+
+    # Read each chunk of time sets once per result kind for all named selections
+    results = []
+    for start, chunk in iter_time_chunks(timeIds, TIME_CHUNK_SIZE):
+        maxima = []
+        for k in analysisKinds:
+            if ne.RESULT_KINDS[k][1] == 'Nodal':
+                fields = sources[k].read(index.node_ids, chunk)
+                maxima.extend(ne.result_maxima(k, index, fields, scaleFactor))
+            else:
+                setFields = sources[k].read_sets(elemSets, chunk)
+                maxima.extend(ne.set_result_maxima(k, setIndexes, setFields, scaleFactor))
+        results.append((chunk, maxima))
+
+    if PER_BODY.ToLower() == 'y':
+        cols = ['Body', 'Body ID']
+    else:
+        cols = ['Named Selection', 'Named Selection ID']
+    cols += ['Time ' + timeUnit, 'Set']
+    for k in analysisKinds:
+        for q in ne.RESULT_KINDS[k][2]:
+            cols += ['Max ' + q + ' [' + unitStrs[k] + ']', 'Max ' + q + ' Node']
+
+    def maxRows():
+        for s, (name, objectId, locIds) in enumerate(resultSets):
+            for chunk, maxima in results:
+                m = len(chunk)
+                for t, tid in enumerate(chunk):
+                    i = s * m + t
+                    row = [name, objectId, all_times[tid-1], tid]
+                    for res in maxima:
+                        row += [res['max'][i], res['node'][i]]
+                    yield row
+
+    x = datetime.datetime.now()
+
+    file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Max_Results_' + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
+    writeCSVRows(user_dir + '/' + file_name_body + ".csv", maxRows(), cols)
+
+    reads = sum(src.reads for src in sources.values())
+    print("[INFO] Process completed for " + analysis.Name + " (" + str(len(resultSets)) + " named selections or bodies, " + str(reads) + " result read(s))")
+    print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34) + '\n')
+
+    model.ReleaseStreams()
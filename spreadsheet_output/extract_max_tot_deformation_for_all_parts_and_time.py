@@ -16,6 +16,10 @@ NAMED_SEL_FOLDER = 'Results Scoping'        # Named selection folder name contai
 # Set the scale factor for Random Vibration Analyses
 # The last part of the Enumeration can be (Sigma1, Sigma2, Sigma3, UserDefined)
 SCALE_FACTOR = Ansys.Mechanical.DataModel.Enums.ScaleFactorType.Sigma3
+UNION_READ = 'y'                # READ THE DISPLACEMENT OF ALL NAMED SELECTIONS AT ONCE (must be one of 'y' or 'n')
+TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE WHEN UNION_READ = 'y' (0 = ALL)
+TOP_N = 0                       # NUMBER OF HIGHEST DISPLACEMENT NODES PER NAMED SELECTION WRITTEN TO A HOTSPOT CSV (0 = NONE)
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 import wbjn
@@ -24,6 +28,13 @@ import csv
 import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib.ns_index import NamedSelectionIndex, mesh_key, INDEX_FILE_NAME
+from mech_lib import ns_extrema as ne
+from mech_lib.nodal_reactions import NodeSetIndex
+from mech_lib.beam_resultants import iter_time_chunks
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -153,33 +164,14 @@ for a in analysisNumbers:
     nameSelOp.inputs.data_sources.Connect(dataSource)
     nameSelOp.inputs.requested_location.Connect('Nodal')
     
-    # Create displacement operator
-    dispOp = dpf.operators.result.displacement()
-    dispOp.inputs.data_sources.Connect(dataSource)
-    dispOp.inputs.time_scoping.Connect(timeScoping)
-    
-    # Create the norm operator
-    nrm = dpf.operators.math.norm_fc()
-    nrm2 = dpf.operators.math.norm_fc()
-    
-    # Create the min-max operator
-    minMaxOp = dpf.operators.min_max.min_max_fc()
-    minMaxOp2 = dpf.operators.min_max.min_max()
-    
-    # Create the unit convert operator
-    unitConvOp = dpf.operators.math.unit_convert_fc()
-    unitConvOp.inputs.unit_name.Connect(lengthUnitStr)
-    
-    # Create scale operator and set the scale factor = 1 for non Random Vibration analyses
-    scaleOp = dpf.operators.math.scale_fc()
+    # Set the scale factor = 1 for non Random Vibration analyses
     if str(analysis_type).ToLower() == 'spectrum':
         scaleFactor = RANDOM_VIBRATION_SIGMA
     else:
         scaleFactor = 1
-    if ANSYS_VER.ToUpper() == '2024 R2':
-        scaleOp.inputs.ponderation.Connect(scaleFactor)   # 2024 R2
-    else:
-        scaleOp.inputs.weights.Connect(scaleFactor)       # 2025 R2
+    
+    # Element and node Ids of the named selections, reused from the user files directory while the mesh is unchanged
+    nsIndex = NamedSelectionIndex(user_dir + '/' + INDEX_FILE_NAME, mesh_key(meshData))
     
     # Loop through all named selections and create a results dictionary
     res = {}
@@ -187,64 +179,40 @@ for a in analysisNumbers:
         nid = n.ObjectId
         res[nid] = {}
         res[nid]['Name'] = n.Name.ToUpper()
-        res[nid]['Times'] = []
-        res[nid]['Sets'] = []
-        res[nid]['Max Total Displacement'] = []
-        #res[nid]['custom FC'] = []
+        res[nid]['Rows'] = []
         
         #Get the mesh element and node Ids
-        elemIds = []
-        nodeIds = []
-        for nlocId in n.Location.Ids:
-            solMesh = meshData.MeshRegionById(nlocId)
-            elemIds += solMesh.ElementIds
-            nodeIds += solMesh.NodeIds
+        elemIds, nodeIds = nsIndex.ids(nid, n.Location.Ids, meshData)
         res[nid]['NS Location'] = n.Location.Ids
         res[nid]['Elements'] = elemIds
         res[nid]['Nodes'] = nodeIds
-        
-        # Scope displacement results to to node Ids
-        scoping = dpf.Scoping()
-        scoping.Ids = nodeIds
-        scoping.Location = dpf.locations.nodal
-        dispOp.inputs.mesh_scoping.Connect(scoping)
-        uFC = dispOp.outputs.fields_container
-        u = uFC.GetData()
-
-        # Convert the total displacement result to desired units
-        unitConvOp.inputs.fields_container.Connect(u)
-        
-        # Scale the displacement
-        uFC = unitConvOp.outputs.fields_container
-        scaleOp.inputs.fields_container.Connect(uFC)
-        u = scaleOp.outputs.fields_container.GetData()
-        
-        # Remove fields with 0 entities by creating a new fields container by adding fields
-        # if they are greater than zero.
-        # Create empry fields_container and set label space equal to that of the displacement FC
-        fc = dpf.FieldsContainer()
-        fc.Labels = list(u.GetLabelSpace(0).Keys)
-        fcLblSpcLen = len(fc.Labels)
-        # Get fields with more than zero entities
-        for i in range(u.FieldCount):
-            if u[i].ElementaryDataCount > 0:
-                fc.Add(u[i],u.GetLabelSpace(i))
-        
-        # Take the norm of the displacement from the custom fields container
-        nrm.inputs.fields_container.Connect(fc)
-        nrm_field = nrm.outputs.getfields_container()
-        
-        # Get the maximum total displacement for all times
-        minMaxOp.inputs.fields_container.Connect(nrm_field)
-        # Try to remove the fileds with 0 entites by creating a new field.  Not working yet.
-
-        maxTotalDisp = minMaxOp.outputs.field_max.GetData()
-        #maxTotalDisp = minMaxOp2.outputs.field_max.GetData()
-        res[nid]['custom FC'] = fc
-        for t in range(len(timeScoping.Ids)):
-            res[nid]['Times'].append(all_times[t])
-            res[nid]['Sets'].append(timeScoping.Ids[t])
-            res[nid]['Max Total Displacement'].append(maxTotalDisp.Data[t])
+    nsIndex.save()
+    
+    # Total displacement (norm of the displacement) in the desired length unit, read from the result file through DPF
+    nsKeys = [n.ObjectId for n in nsChildren]
+    source = ne.DpfNodalResultSource(dataSource, 'displacement', lengthUnitStr, norm=True, location='Nodal')
+    top = ne.TopNodes(len(nsKeys), TOP_N)
+    
+    if UNION_READ == 'y'.ToLower():
+        # Read the displacement of the nodes of all named selections once per chunk of time sets and take the maximum
+        # of each named selection with the node to named selection membership index
+        index = NodeSetIndex([res[nid]['Nodes'] for nid in nsKeys])
+        for start, chunk in iter_time_chunks(timeIds, TIME_CHUNK_SIZE):
+            fields = source.read(index.node_ids, chunk)
+            maxima = ne.nodal_maxima(index, fields, scaleFactor)
+            for nid, rows in zip(nsKeys, ne.maxima_rows(maxima, chunk, all_times)):
+                res[nid]['Rows'] += rows
+            if TOP_N > 0:
+                top.update(index, fields, chunk, scaleFactor)
+    else:
+        # Read the displacement of one named selection at a time (all time sets)
+        for s, nid in enumerate(nsKeys):
+            index = NodeSetIndex([res[nid]['Nodes']])
+            fields = source.read(index.node_ids, timeIds)
+            maxima = ne.nodal_maxima(index, fields, scaleFactor)
+            res[nid]['Rows'] += ne.maxima_rows(maxima, timeIds, all_times)[0]
+            if TOP_N > 0:
+                top.update(index, fields, timeIds, scaleFactor, s)
         
     # Create data dictionary to written to output csv file
     data = {}
@@ -252,18 +220,16 @@ for a in analysisNumbers:
             'Named Selection ID',
             'Time ' + timeUnit,
             'Set',
-            'Max Total Displacement ' + lengthUnit]
+            'Max Total Displacement ' + lengthUnit,
+            'Max Node']
     
     for c in cols:
         data[c] = []
 
     for nid in sorted(res.keys()):
-        for t in range(len(timeScoping.Ids)):
-            data[cols[0]].append(res[nid]['Name'])
-            data[cols[1]].append(nid)
-            data[cols[2]].append(res[nid]['Times'][t])
-            data[cols[3]].append(res[nid]['Sets'][t])
-            data[cols[4]].append(res[nid]['Max Total Displacement'][t])
+        for row in res[nid]['Rows']:
+            for c, v in zip(cols, [res[nid]['Name'], nid] + row):
+                data[c].append(v)
 
     x = datetime.datetime.now()
     
@@ -273,4 +239,34 @@ for a in analysisNumbers:
     print("[INFO] Process completed for " + analysis.Name)
     print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34) + '\n')
     
+    if TOP_N > 0:
+        # Coordinates (about the global coordinate system) of the hotspot nodes only, in the output length unit
+        ndCoordsOp = dpf.operators.mesh.node_coordinates()
+        ndCoordsOp.inputs.mesh.Connect(my_mesh)
+        ndUnitConvOp = dpf.operators.math.unit_convert()
+        ndUnitConvOp.inputs.unit_name.Connect(lengthUnitStr)
+        ndUnitConvOp.inputs.entity_to_convert.Connect(ndCoordsOp.outputs.getcoordinates_as_field())
+        nodeCoords = ndUnitConvOp.outputs.getconverted_entity_as_field()
+        
+        hotCols = ['Named Selection',
+                   'Named Selection ID',
+                   'Rank',
+                   'Node',
+                   'X ' + lengthUnit,
+                   'Y ' + lengthUnit,
+                   'Z ' + lengthUnit,
+                   'Total Displacement ' + lengthUnit,
+                   'Time ' + timeUnit,
+                   'Set']
+        hotData = dict((c, []) for c in hotCols)
+        hotRows = ne.hotspot_rows(top, [res[nid]['Name'] for nid in nsKeys], nsKeys,
+                                  (nodeCoords.ScopingIds, nodeCoords.Data), all_times)
+        for row in hotRows:
+            for c, v in zip(hotCols, row):
+                hotData[c].append(v)
+        
+        file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Total_Displacement_Hotspots_' + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
+        writeCSV(user_dir + '/' + file_name_body + ".csv", hotData, hotCols)
+        print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34) + '\n')
+    
     model.ReleaseStreams()
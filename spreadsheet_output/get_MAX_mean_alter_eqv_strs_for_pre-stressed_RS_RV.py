@@ -24,6 +24,7 @@ NAMED_SEL_FOLDER = 'Results Scoping'        # Named selection folder name contai
 # Set the scale factor for Random Vibration Analyses
 # The last part of the Enumeration can be (Sigma1, Sigma2, Sigma3, UserDefined)
 SCALE_FACTOR = Ansys.Mechanical.DataModel.Enums.ScaleFactorType.Sigma3
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 import wbjn
@@ -32,6 +33,10 @@ import csv
 import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib.fields import NonEmptyFields
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
@@ -137,8 +142,10 @@ def get_node_at_max(fc):
     result = 0
     values = fc.Data
     nodes = fc.ScopingIds
-    for n in nodes:
-        v = max(fc.GetEntityDataById(n))
+    n_comp = len(values) // len(nodes) if len(nodes) else 1
+    # Walk the data array in scoping order instead of looking up each node Id
+    for k, n in enumerate(nodes):
+        v = max(values[k * n_comp:(k + 1) * n_comp])
         if v >= max_val:
             max_val = v
             result = n
@@ -228,24 +235,10 @@ for n in ns:
     scoping.Location = dpf.locations.elemental
     seqv_op.inputs.mesh_scoping.Connect(scoping)
     vm_stress_fc = seqv_op.outputs.fields_container
-    vm_stress = vm_stress_fc.GetData()
     
-    # Remove fields with 0 entities by creating a new fields container by adding fields
-    # if they are greater than zero.
-    # Create empry fields_container and set label space equal to that of the stress FC
-    fc = dpf.FieldsContainer()
-    fc.Labels = list(vm_stress.GetLabelSpace(0).Keys)
-    fc_lbl_spc_len = len(fc.Labels)
-    # Get fields with more than zero entities
-    j = 1
-    for i in range(vm_stress.FieldCount):
-        if vm_stress[i].ElementaryDataCount > 0:
-            fc.Add(vm_stress[i],vm_stress.GetLabelSpace(i))
-            j = j + 1
-    
-    # Convert the von Mises stress to desired stress units
-    unit_conv_op.inputs.fields_container.Connect(fc)
-    vm_stress = unit_conv_op.outputs.fields_container.GetData()
+    # Convert the von Mises stress to desired stress units and skip the fields with 0 entities
+    unit_conv_op.inputs.fields_container.Connect(vm_stress_fc)
+    vm_stress = NonEmptyFields(unit_conv_op.outputs.fields_container.GetData())
 
     # Add values of stress for all times in time scoping
     for t in range(len(time_scoping.Ids)):
@@ -349,27 +342,13 @@ if len(child_analysis_nums) > 0:
             scoping.Ids = res[nid]['Elements']
             scoping.Location = dpf.locations.elemental
             seqv_op.inputs.mesh_scoping.Connect(scoping)
-            vm_stress = seqv_op.outputs.fields_container.GetData()
-            
-            # Remove fields with 0 entities by creating a new fields container by adding fields
-            # if they are greater than zero.
-            # Create empry fields_container and set label space equal to that of the stress FC
-            fc = dpf.FieldsContainer()
-            fc.Labels = list(vm_stress.GetLabelSpace(0).Keys)
-            fc_lbl_spc_len = len(fc.Labels)
-            # Get fields with more than zero entities
-            j = 1
-            for i in range(vm_stress.FieldCount):
-                if vm_stress[i].ElementaryDataCount > 0:
-                    fc.Add(vm_stress[i],vm_stress.GetLabelSpace(i))
-                    j = j + 1
             
             # Convert the von Mises stress to desired stress units
-            unit_conv_op.inputs.fields_container.Connect(fc)
-            # Scale the von Mises stress
+            unit_conv_op.inputs.fields_container.Connect(seqv_op.outputs.fields_container)
+            # Scale the von Mises stress and skip the fields with 0 entities
             vm_stress_fc = unit_conv_op.outputs.fields_container
             scale_op.inputs.fields_container.Connect(vm_stress_fc)
-            vm_stress = scale_op.outputs.fields_container.GetData()
+            vm_stress = NonEmptyFields(scale_op.outputs.fields_container.GetData())
             res[nid][analysis_name + ' vm_scldFC'] = vm_stress
             res[nid][analysis_name + ' Eqv Stress at Max SS Node'] = max(vm_stress[0].GetEntityDataById(node))
             
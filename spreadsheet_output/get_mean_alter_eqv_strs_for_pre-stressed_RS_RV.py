@@ -24,12 +24,20 @@ STATIC_STR_ANALYSIS_NUM = 0     # Analysis numbers for the static structural ana
 STATIC_STR_LAST_TIME_ONLY = 'y'     # 'Y' = only output last time step for static structural, 'N' = output all time steps
 CHILD_ANALYSIS_NUMS = [2, 3]          # LIST OF CHILD ANALYSIS RANDOM VIBRATION SYSTEMS TO APPLY THIS SCRIPT
 ASSESS_FATIGUE = 'y'        # Flag to assess fatigue using Soderberg, Goodman, ASME, etc.
-FATIGUE_LINE_TYPE = 'Ger'     # Fatigue line type: one of {'G': Goodman, 'S': Soderberg, 'Ger': Gerber, 'ASME': ASME-elliptic}
+FATIGUE_LINE_TYPE = 'Ger'     # Fatigue line type: one of {'G': Goodman, 'S': Soderberg, 'Ger': Gerber, 'ASME': ASME-elliptic, 'L': Langer static yield}
                               # Requires S-N curve and strength parameters for material in Engineering Data
 COMPUTE_DAMAGE = 'n'        # Flag to use Miner's rule to compute damage (requires S-N curve for material in Engineering Data)
+DAMAGE_CYCLES = [1000, 1000]    # Number of applied cycles of each RS analysis in CHILD_ANALYSIS_NUMS (if COMPUTE_DAMAGE = 'y')
+RV_DURATION = 3600.0            # Duration in seconds of each RV analysis (Steinberg 3-band and spectral damage)
+RV_EXPECTED_FREQS = [100.0, 100.0]  # Expected frequency in Hz of each RV analysis in CHILD_ANALYSIS_NUMS (cycles = duration x freq)
+SPECTRAL_FATIGUE = 'n'      # Flag for narrow-band and Dirlik damage of RV analyses from nodal stress PSD (requires S-N curve)
+STRESS_PSD_FILES = ['', '']     # Stress PSD CSV file (header Node, f1, f2, ...) of each analysis in CHILD_ANALYSIS_NUMS, '' = none
+PSD_STRESS_UNIT_STR = 'psi'     # Stress unit of the stress PSD files (PSD in stress^2/Hz)
+PSD_NODE_CHUNK = 5000           # Number of nodes of the stress PSD files held in memory at once (0 = all)
 LEN_UNIT_STR = 'in'            # DESIRED LENGTH OUTPUT UNIT (usually 'in' or 'mm', case sensitive)
 FORCE_UNIT_STR = 'lbf'            # DESIRED FOURCE OUTPUT UNIT (usually 'lbf' or 'N', case sensitive)
 NAMED_SEL_FOLDER = 'Results Scoping'        # Named selection folder name containing NS used for results scoping
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
 #################################################################################
 
 import wbjn
@@ -39,10 +47,15 @@ import mech_dpf
 import Ans.DataProcessing as dpf
 import materials
 import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib.ns_index import NamedSelectionIndex, BodyIndex, mesh_key, INDEX_FILE_NAME, BODY_INDEX_FILE_NAME
+from mech_lib.fields import NonEmptyFields, ScopingAlignment
+from mech_lib.fatigue import safety_factors, CRITERIA, NodeMaterialIndex, fully_reversed_rows, sn_curve, miner_damage, max_damage, steinberg_blocks
+from mech_lib.spectral_fatigue import CsvStressPsdSource, damage_by_node
 cmd = 'returnValue(GetUserFilesDirectory())'
 user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
 mech_dpf.setExtAPI(ExtAPI)
-ANSYS_VER = str(ExtAPI.DataModel.Project.ProductVersion)
 
 if LEN_UNIT_STR.ToLower() == 'in' and FORCE_UNIT_STR.ToLower() == 'lbf':
     stress_unit_str = 'psi'
@@ -63,172 +76,18 @@ stress_quan = Quantity(1, stress_unit_str)         # Desired stress output unit
 STATIC_STR_LAST_TIME_ONLY = STATIC_STR_LAST_TIME_ONLY.ToLower()
 ASSESS_FATIGUE = ASSESS_FATIGUE.ToLower()
 FATIGUE_LINE_TYPE = FATIGUE_LINE_TYPE.ToLower()
+if ASSESS_FATIGUE == 'y' and FATIGUE_LINE_TYPE not in CRITERIA:
+    raise ValueError("FATIGUE_LINE_TYPE must be one of " + ", ".join(sorted(CRITERIA)))
 COMPUTE_DAMAGE = COMPUTE_DAMAGE.ToLower()
+if COMPUTE_DAMAGE == 'y' and len(DAMAGE_CYCLES) != len(CHILD_ANALYSIS_NUMS):
+    raise ValueError("DAMAGE_CYCLES needs one number of cycles per analysis in CHILD_ANALYSIS_NUMS")
+if COMPUTE_DAMAGE == 'y' and len(RV_EXPECTED_FREQS) != len(CHILD_ANALYSIS_NUMS):
+    raise ValueError("RV_EXPECTED_FREQS needs one frequency per analysis in CHILD_ANALYSIS_NUMS")
+SPECTRAL_FATIGUE = SPECTRAL_FATIGUE.ToLower()
+if SPECTRAL_FATIGUE == 'y' and len(STRESS_PSD_FILES) != len(CHILD_ANALYSIS_NUMS):
+    raise ValueError("STRESS_PSD_FILES needs one file (or '') per analysis in CHILD_ANALYSIS_NUMS")
 
 
-def compute_load_line(alt_str_fc, mean_str_fc):
-    """
-    Compute the fatigue load line for stress fields containers
-    
-    Parameters
-    ----------
-    alt_str_fc : FieldsContainer
-        Nodal alternating stresses (Sa)
-    mean_str_fc : FieldsContainer
-        Nodal mean stresses (Sm)
-    
-    Returns
-    -------
-    result : FieldsContainer
-        Fatigue load line r = Sa / Sm
-    """
-    op = dpf.operators.math.component_wise_divide()
-    op.inputs.fieldA.Connect(alt_str_fc[0])
-    # Create an empty Fields container to contain results using mean stress label space
-    result = dpf.FieldsContainer()
-    result.Labels = list(mean_str_fc.GetLabelSpace(0).Keys)
-    result_lbl_spc_len = len(result.Labels)
-    # Get fields with more than zero entities
-    for i in range(mean_str_fc.FieldCount):
-        if mean_str_fc[i].ElementaryDataCount > 0:
-            op.inputs.fieldB.Connect(mean_str_fc[i])
-            res = op.outputs.field.GetData()
-            result.Add(res, mean_str_fc.GetLabelSpace(i))
-    return result
-
-
-def fatigue_safety_factor(Se, S, Sa, Sm, fat_criterion='s'):
-    """
-    Compute the factor of safety in fatigue
-    
-    Parameters
-    ----------
-    Se : Field
-        Endurance limit for each node
-    S : Field
-        Tensile yield strength or tensile ultimate stress for each node, depending on fatigue criterion
-    Sa : FieldsContainer
-        Nodal alternating stresses
-    Sm : FieldsContainer
-        Nodal mean stresses
-    fat_criterion : str, optional
-        Fatigue criterion, one of fat_criteria.keys().  Default = 's' for Soderberg.
-    
-    Returns
-    -------
-    nf : FieldsContainer
-        Nodal factor of safety in fatigue
-    """
-    # Create an empty Fields container to contain results using mean stress label spac
-    nf = dpf.FieldsContainer()
-    nf.Labels = list(Sm.GetLabelSpace(0).Keys)
-    nf_lbl_spc_len = len(nf.Labels)
-    div_op = dpf.operators.math.component_wise_divide()         # Component-wise division operator
-    div_fc_op = dpf.operators.math.component_wise_divide_fc()   # FieldsContainer division operator
-    prod_fc_op = dpf.operators.math.component_wise_product_fc() # FieldsContainer product operator
-    pow_fc_op = dpf.operators.math.pow_fc()                        # FieldsContainer raise to power operator
-    sqr_fc_op = dpf.operators.math.sqr_fc()                     # Fields container component-wise squaring operator
-    sqr_op = dpf.operators.math.sqr()                           # Component-wise squaring operator
-    sqrt_fc_op = dpf.operators.math.sqrt_fc()                   # Component-wise square root operator
-    sqrt_op = dpf.operators.math.sqrt()                         # Component-wise square root operator
-    add_op = dpf.operators.math.add_fc()                        # Sum two fields containers
-    scale_fc_op = dpf.operators.math.scale_fc()                 # Fields container scaling operator
-    scale_op = dpf.operators.math.scale()                       # Component-wise scaling operator
-    add_const_fc_op = dpf.operators.math.add_constant_fc()      # Add constant to a FieldsContainer operator
-    
-    # Create the ratio of Sa/Se which is used in all fatigue criteria
-    Sa_Se = dpf.FieldsFactory.CreateScalarField(numEntities=len(Sa[0].ScopingIds), location='Nodal')
-    div_op.inputs.fieldA.Connect(Sa[0])
-    div_op.inputs.fieldB.Connect(Se)
-    Sa_Se = div_op.outputs.field.GetData()
-    # Make a fields container for Sa/Se that has same label space as Sm
-    Sa_Se_fc = dpf.FieldsContainer()
-    Sa_Se_fc.Labels = list(Sm.GetLabelSpace(0).Keys)
-    for i in range(Sm.FieldCount):
-        if Sm[i].ElementaryDataCount > 0:
-            Sa_Se_fc.Add(Sa_Se, Sm.GetLabelSpace(i))
-    
-    # Compute the ratio of Sm/S, where S = Sy or Sut depending on the fatigue criterion
-    Sm_S = dpf.FieldsContainer()
-    Sm_S.Labels = list(Sm.GetLabelSpace(0).Keys)
-    for i in range(Sm.FieldCount):
-        if Sm[i].ElementaryDataCount > 0:
-            div_op.inputs.fieldA.Connect(Sm[i])
-            div_op.inputs.fieldB.Connect(S)
-            res = div_op.outputs.field.GetData()
-            Sm_S.Add(res, Sm.GetLabelSpace(i))
-            
-    # Soderberg and Goodman
-    if fat_criterion == 's' or fat_criterion == 'g':
-        # nf = 1 / (Sa/Se + Sm/S)
-        # Add Sa_Se and Sm_S and take inverse
-        add_op.inputs.fields_container1.Connect(Sa_Se)
-        add_op.inputs.fields_container2.Connect(Sm_S)
-        sum_temp = add_op.outputs.fields_container.GetData()
-        pow_fc_op.inputs.fields_container.Connect(sum_temp)
-        pow_fc_op.inputs.factor.Connect(-1)
-        nf = pow_fc_op.outputs.fields_container.GetData()
-    elif fat_criterion == 'asme':
-        # nf = sqrt{1 / [ (Sa/Se)^2 + (Sm/S)^2 ] }
-        # Square Sa/Se
-        sqr_op.inputs.field.Connect(Sa_Se)
-        Sa_Se_sq = sqr_op.outputs.field.GetData()
-        # Square Sm/S
-        sqr_fc_op.inputs.fields_container.Connect(Sm_S)
-        Sm_S_sq = sqr_fc_op.outputs.fields_container.GetData()
-        # Sum them, take inverse, then take square root
-        add_op.inputs.fields_container1.Connect(Sa_Se_sq)
-        add_op.inputs.fields_container2.Connect(Sm_S_sq)
-        sum_temp = add_op.outputs.fields_container.GetData()
-        pow_fc_op.inputs.fields_container.Connect(sum_temp)
-        pow_fc_op.inputs.factor.Connect(-1)
-        inv_temp = pow_fc_op.outputs.fields_container.GetData()
-        sqrt_fc_op.inputs.fields_container.Connect(inv_temp)
-        nf = sqrt_fc_op.outputs.fields_container.GetData()
-    elif fat_criterion == 'ger':
-        # nf = 1/2 * (S/Sm)^2 * Sa/Se * {-1 + sqrt[1 + (2 * Sm/S * Se/Sa)^2] }
-        # Create term1 = (2 * Sm/S * Se/Sa)^2 fields container
-        div_fc_op.inputs.fields_containerA.Connect(Sm_S)
-        div_fc_op.inputs.fields_containerB.Connect(Sa_Se_fc)
-        term1 = div_fc_op.outputs.fields_container.GetData()
-        if ANSYS_VER.ToUpper() == '2024 R2':
-            scale_fc_op.inputs.ponderation.Connect(2)   # 2024 R2
-        else:
-            scale_fc_op.inputs.weights.Connect(2)       # 2025 R2
-        scale_fc_op.inputs.fields_container.Connect(term1)
-        term1 = scale_fc_op.outputs.fields_container.GetData()
-        sqr_fc_op.inputs.fields_container.Connect(term1)
-        term1 = sqr_fc_op.outputs.fields_container.GetData()
-        # Compute -1 + sqrt(1 + term1)
-        add_const_fc_op.inputs.fields_container.Connect(term1)
-        add_const_fc_op.inputs.weights.Connect(1)
-        term2 = add_const_fc_op.outputs.fields_container.GetData()
-        sqrt_fc_op.inputs.fields_container.Connect(term2)
-        term2 = sqrt_fc_op.outputs.fields_container.GetData()
-        add_const_fc_op.inputs.fields_container.Connect(term2)
-        add_const_fc_op.inputs.weights.Connect(-1)
-        term2 = add_const_fc_op.outputs.fields_container.GetData()
-        # compute term3 = 1/2 * Sa/Se * term2
-        prod_fc_op.inputs.fields_container.Connect(term2)
-        prod_fc_op.inputs.fieldB.Connect(Sa_Se)
-        term3 = prod_fc_op.outputs.fields_container.GetData()
-        if ANSYS_VER.ToUpper() == '2024 R2':
-            scale_fc_op.inputs.ponderation.Connect(.5)   # 2024 R2
-        else:
-            scale_fc_op.inputs.weights.Connect(.5)       # 2025 R2
-        scale_fc_op.inputs.fields_container.Connect(term3)
-        term3 = scale_fc_op.outputs.fields_container.GetData()
-        # Finally, compute nf = (S/Sm)^2 * term3
-        pow_fc_op.inputs.fields_container.Connect(Sm_S)
-        pow_fc_op.inputs.factor.Connect(-2)
-        nf = pow_fc_op.outputs.fields_container.GetData()
-        prod_fc_op.inputs.fields_container.Connect(term2)
-        prod_fc_op.inputs.fieldB.Connect(nf)
-        nf = prod_fc_op.outputs.fields_container.GetData()
-    
-    return nf
-    
-
 def find_tree_grouping_folders(item):
     """
     Return a list of Tree Grouping Folders for a Model item containder (e.g., Named Selections)
@@ -268,31 +127,6 @@ def get_named_sels_group_by_name(name):
             return group
 
 
-def remove_fields_with_zero_entities(fc):
-    """
-    Remove fields with 0 entities by creating a new fields container
-    
-    Parameters
-    ----------
-    fc : FieldsContainer
-        Source FieldsContainer that may contain 0 entity fields
-    
-    Returns
-    -------
-    FieldsContainer
-    """
-    # Remove fields with 0 entities by creating a new fields container by adding fields if they are greater than zero.
-    # Create empry fields_container and set label space equal to that of the source FC
-    result = dpf.FieldsContainer()
-    result.Labels = list(fc.GetLabelSpace(0).Keys)
-    result_lbl_spc_len = len(result.Labels)
-    # Get fields with more than zero entities
-    for i in range(fc.FieldCount):
-        if fc[i].ElementaryDataCount > 0:
-            result.Add(fc[i],fc.GetLabelSpace(i))
-    return result
-
-
 def write_csv(filename, data, cols):
     """
     Function to write python data to a csv file.
@@ -345,9 +179,9 @@ ss_time_scoping.Location = 'Time'
 
 
 """
-##### Create material fatigue properties dictionary if need to assess fatigue
+##### Create material fatigue properties dictionary if need to assess fatigue or compute damage
 """
-if ASSESS_FATIGUE == 'y':
+if ASSESS_FATIGUE == 'y' or COMPUTE_DAMAGE == 'y' or SPECTRAL_FATIGUE == 'y':
     mats = {}
     mat_list = ExtAPI.DataModel.Project.Model.Materials.Children
     mat_names = [m.Name for m in mat_list]
@@ -361,37 +195,38 @@ if ASSESS_FATIGUE == 'y':
             mats[n]['S-N Curve'] = sn_crv
             alt_strs = sn_crv['Alternating Stress']
             mats[n]['str_units'] = alt_strs[0]
-            if 'R-Ratio' in sn_crv:
-                if -1 in sn_crv['R-Ratio']:
-                    # Get the index of the last -1 in the R-Ratio list and call that the location of the endurance limit
-                    index_r_rat_neg_1 = len(sn_crv['R-Ratio']) - 1 - sn_crv['R-Ratio'][::-1].index(-1)
-                    mats[n]['S_e'] = alt_strs[index_r_rat_neg_1]
-                else:
-                    print('S-N curve with R-Ratio = -1 or Mean Stress = 0 needed for material: ' + n)
-                    sys_exit()
-            else:
-                mats[n]['S_e'] = alt_strs[len(alt_strs)-1]      # if only one S-N curve is defined
-            mats[n]['S_e'] = (mats[n]['S_e'] * Quantity(1, alt_strs[0]) / stress_quan).Value
+            # Endurance limit (last point) and S-N curve of the same fully reversed points (R-Ratio = -1, Mean Stress = 0
+            # or the only curve defined)
+            rows = fully_reversed_rows(sn_crv)
+            if not rows:
+                raise ValueError('S-N curve with R-Ratio = -1 or Mean Stress = 0 needed for material: ' + n)
+            mats[n]['S_e'] = (alt_strs[rows[-1]] * Quantity(1, alt_strs[0]) / stress_quan).Value
+            if COMPUTE_DAMAGE == 'y' or SPECTRAL_FATIGUE == 'y':
+                # Fully reversed S-N curve as a log-log interpolation table in the output stress unit
+                mats[n]['S_N'] = sn_curve(sn_crv, (Quantity(1, alt_strs[0]) / stress_quan).Value)
         else:
             print('S-N Curve needed in Engineering Data defintion for material: ' + n)
             sys_exit()
-        if FATIGUE_LINE_TYPE.ToLower() == 's' or FATIGUE_LINE_TYPE.ToLower() == 'asme':      # Soderberg or ASME elliptic
-            if 'Tensile Yield Strength' in p:
-                s_y = materials.GetMaterialPropertyByName(ed, "Tensile Yield Strength")
-                mats[n]['S_y'] = (s_y['Tensile Yield Strength'][1] * Quantity(1, s_y['Tensile Yield Strength'][0]) / stress_quan).Value
-            else:
-                print('Tensile Yield Strength needed in Engineering Data defintion for material: ' + n)
-                sys_exit()
-        elif FATIGUE_LINE_TYPE.ToLower() == 'g' or FATIGUE_LINE_TYPE.ToLower() == 'ger':      # Modified Goodman or Gerber
-            if 'Tensile Ultimate Strength' in p:
-                s_ut = materials.GetMaterialPropertyByName(ed, "Tensile Ultimate Strength")
-                mats[n]['S_ut'] = (s_ut['Tensile Ultimate Strength'][1] * Quantity(1, s_ut['Tensile Ultimate Strength'][0]) / stress_quan).Value
+        if ASSESS_FATIGUE == 'y':
+            if CRITERIA[FATIGUE_LINE_TYPE][1] == 'S_y':      # Soderberg, ASME elliptic or Langer
+                if 'Tensile Yield Strength' in p:
+                    s_y = materials.GetMaterialPropertyByName(ed, "Tensile Yield Strength")
+                    mats[n]['S_y'] = (s_y['Tensile Yield Strength'][1] * Quantity(1, s_y['Tensile Yield Strength'][0]) / stress_quan).Value
+                else:
+                    print('Tensile Yield Strength needed in Engineering Data defintion for material: ' + n)
+                    sys_exit()
+            elif CRITERIA[FATIGUE_LINE_TYPE][1] == 'S_ut':      # Modified Goodman or Gerber
+                if 'Tensile Ultimate Strength' in p:
+                    s_ut = materials.GetMaterialPropertyByName(ed, "Tensile Ultimate Strength")
+                    mats[n]['S_ut'] = (s_ut['Tensile Ultimate Strength'][1] * Quantity(1, s_ut['Tensile Ultimate Strength'][0]) / stress_quan).Value
+                else:
+                    print('Tensile Ultimate Strength needed in Engineering Data defintion for material: ' + n)
+                    sys_exit()
             else:
-                print('Tensile Ultimate Strength needed in Engineering Data defintion for material: ' + n)
+                print("Invalid fatigue line type selected.")
                 sys_exit()
-        else:
-            print("Invalid fatigue line type selected.")
-            sys_exit()
+    if COMPUTE_DAMAGE == 'y' or SPECTRAL_FATIGUE == 'y':
+        sn_curves = dict((n, mats[n]['S_N']) for n in mats)
 
 """
 ##### Get all named selections that are grouped under the folder NAMED_SEL_FOLDER
@@ -402,23 +237,53 @@ ns_names = [n.Name for n in ns]
 ns_ids = [n.ObjectId for n in ns]
 ns_entities = [n.Entities for n in ns]
 
+# Element and node Ids of each named selection, reused from the user files directory while the mesh is unchanged
+mesh_fingerprint = mesh_key(mesh_data)
+ns_index = NamedSelectionIndex(user_dir + '/' + INDEX_FILE_NAME, mesh_fingerprint)
+ns_mesh_ids = dict((n.ObjectId, ns_index.ids(n.ObjectId, n.Location.Ids, mesh_data)) for n in ns)
+if ASSESS_FATIGUE == 'y' or COMPUTE_DAMAGE == 'y' or SPECTRAL_FATIGUE == 'y':
+    # Node to body array and body to material map of all unsuppressed bodies, built once for all named selections
+    mesh_bodies = [b for b in bodies if not b.Suppressed]
+    body_index = BodyIndex(user_dir + '/' + BODY_INDEX_FILE_NAME, mesh_fingerprint, [b.GetGeoBody().Id for b in mesh_bodies], mesh_data)
+    body_nodes = [body_index.nodes(b) for b in range(len(body_index))]
+    node_mats = NodeMaterialIndex(body_nodes, [b.Material for b in mesh_bodies])
+ns_index.save()
+if SPECTRAL_FATIGUE == 'y':
+    # Nodes of all named selections, whose PSD damage is computed once per RV analysis and shared by the named selections
+    psd_node_ids = set()
+    for e_ids, n_ids in ns_mesh_ids.values():
+        psd_node_ids.update(n_ids)
+    psd_damage = {}
+
 
 """
 For each named selection (NS):
 1.  Obtain the nodes and elements in total for all bodies in the NS.
 2.  Create a von Mises stress fields container for the static structural analysis, known as the mean stress.
-3.  Depending on the need to assess fatigue, obtain the material for each node along with the necessary strength
-    parameters, creating fields for each strength parameter.
+3.  Depending on the need to assess fatigue, gather the necessary strength parameters of each node from the node to
+    material index.
 4.  Collect mean stress for all nodes in the data dictionary for future writing to CSV file.
 5.  For each RV/RS analysis system:
   5.1  Create a von Mises stress fields container called alternating stress.
   5.2  If fatigue assessment is desired, compute factor of safety in fatigue based on fatigue line type.
   5.3  If damage computation by Miner's rule is desired, compute it and add to data dictionary.
+  5.4  If spectral fatigue is desired for a RV analysis, add the narrow-band and Dirlik damage from the stress PSD.
 6.  Write a CSV file for each NS and RV/RS analysis system.   
 For each named selection, get the element Ids, Node Ids, and store them in the data dictionary.
-If fatigue is to be assessed, create Fields that contain fatigue parameters with nodal location. 
+If fatigue is to be assessed, gather the fatigue parameters of the nodes (aligned with the nodes). 
 """
 
+# Maximum damage of each named selection and analysis, written to a summary file if COMPUTE_DAMAGE = 'y'
+damage_cols = ['Named Selection',
+               'Named Selection ID',
+               'Analysis',
+               'Applied Cycles',
+               'Max Miner Damage',
+               'Max Miner Damage Node',
+               'Max Cumulative Miner Damage',
+               'Max Cumulative Miner Damage Node']
+damage_data = dict((c, []) for c in damage_cols)
+
 for n in ns:
     nid = n.ObjectId            # Named selection ID
     ns_name = n.Name            # Named selection Name
@@ -442,14 +307,7 @@ for n in ns:
     """
     1. Get the mesh element and node Ids
     """
-    elem_ids = []
-    node_ids = []
-    for nlocId in n.Location.Ids:
-        sol_mesh = mesh_data.MeshRegionById(nlocId)
-        elem_ids += sol_mesh.ElementIds
-        node_ids += sol_mesh.NodeIds
-    node_ids = list(set(node_ids))
-    elem_ids = list(set(elem_ids))
+    elem_ids, node_ids = ns_mesh_ids[nid]
 
     """
     2. Create a von Mises stress fields container for the static structural analysis, known as the mean stress.
@@ -464,75 +322,43 @@ for n in ns:
     seqv_op.inputs.requested_location.Connect('Nodal')
     seqv_op.inputs.mesh_scoping.Connect(mesh_scoping)
     mean_stress_fc = seqv_op.outputs.fields_container
-    mean_stress = mean_stress_fc.GetData()
 
-    # Remove fields with 0 entities by creating a new fields container
-    mean_stress_fc = remove_fields_with_zero_entities(mean_stress)
-
-    # Convert the von Mises stress to desired stress units
+    # Convert the von Mises stress to desired stress units and skip the fields with 0 entities
     unit_conv_fc_op = dpf.operators.math.unit_convert_fc()
     unit_conv_fc_op.inputs.unit_name.Connect(stress_unit_str)
     unit_conv_fc_op.inputs.fields_container.Connect(mean_stress_fc)
-    mean_stress = unit_conv_fc_op.outputs.fields_container.GetData()
-    nodes = mean_stress[0].ScopingIds
-
+    mean_stress = NonEmptyFields(unit_conv_fc_op.outputs.fields_container.GetData())
+    nodes = list(mean_stress[0].ScopingIds)
+    # Permutation from the scoping of each field to the output node order, computed once per scoping
+    node_order = ScopingAlignment(nodes)
 
     """
-    3.  Depending on the need to assess fatigue, obtain the material for each node along with the necessary strength
-        parameters, creating fields for each strength parameter.
+    3.  Depending on the need to assess fatigue, gather the necessary strength parameters of each node from the node to
+        material index.
     """   
     if ASSESS_FATIGUE == 'y':
-        fat_criteria = {'g': {'Name': 'Goodman'},
-                        's': {'Name': 'Soderberg'},
-                        'ger': {'Name': 'Gerber'},
-                        'asme': {'Name': 'ASME-elliptic'},
-                        'l': {'Name': 'Langer Static Yield'}
-                        }
-        S_e = dpf.FieldsFactory.CreateScalarField(numEntities=len(nodes), location='Nodal')
-        S_e.Unit = stress_unit_str
-        if FATIGUE_LINE_TYPE == 's' or FATIGUE_LINE_TYPE == 'asme':      # Soderberg or ASME elliptic
-            S_y = dpf.FieldsFactory.CreateScalarField(numEntities=len(nodes), location='Nodal')
-            S_y.Unit = stress_unit_str
-            fat_criteria['s']['strength'] = S_y
-            fat_criteria['asme']['strength'] = S_y
-            fat_criteria['l']['strength'] = S_y
-        elif FATIGUE_LINE_TYPE == 'g' or FATIGUE_LINE_TYPE == 'ger':      # Modified Goodman or Gerber
-            S_ut = dpf.FieldsFactory.CreateScalarField(numEntities=len(nodes), location='Nodal')
-            S_ut.Unit = stress_unit_str
-            fat_criteria['g']['strength'] = S_ut
-            fat_criteria['ger']['strength'] = S_ut
-        else:
-            pass
-        # Loop through each node, get the material and then place strengths in fields
-        for nd in nodes:
-            my_node = mesh_data.NodeById(nd)
-            body_id = my_node.BodyIds[0]
-            body = ExtAPI.DataModel.GeoData.GeoEntityById(body_id)
-            treebody=ExtAPI.DataModel.Project.Model.Geometry.GetBody(body)
-            nid_mat = treebody.Material
-            S_e.Add(nd, [mats[nid_mat]['S_e']])
-            if FATIGUE_LINE_TYPE == 's' or FATIGUE_LINE_TYPE == 'asme':      # Soderberg or ASME elliptic
-                S_y.Add(nd, [mats[nid_mat]['S_y']])
-            elif FATIGUE_LINE_TYPE == 'g' or FATIGUE_LINE_TYPE == 'ger':      # Modified Goodman or Gerber
-                S_ut.Add(nd, [mats[nid_mat]['S_ut']])
+        fat_name, fat_strength = CRITERIA[FATIGUE_LINE_TYPE]
+        S_e, S = node_mats.gather(nodes, mats, ['S_e', fat_strength])
 
     """
     4.  Collect mean stress for all nodes in the data dictionary for future writing to CSV file.
     """
+    # Mean stress of each static structural time aligned with the nodes, one take per field
+    S_m = [node_order.take(mean_stress[i]) for i in range(len(ss_active_times))]
     for i, t in enumerate(ss_active_times):
-        for nd in mean_stress[i].ScopingIds:
-            data[cols[0]].append(ns_name)
-            data[cols[1]].append(nid)
-            data[cols[2]].append(nd)
-            data[cols[3]].append(t)
-            data[cols[4]].append(ss_time_scoping.Ids[i])
-            data[cols[5]].append(mean_stress[i].GetEntityDataById(nd)[0])
+        data[cols[0]].extend([ns_name] * len(nodes))
+        data[cols[1]].extend([nid] * len(nodes))
+        data[cols[2]].extend(nodes)
+        data[cols[3]].extend([t] * len(nodes))
+        data[cols[4]].extend([ss_time_scoping.Ids[i]] * len(nodes))
+        data[cols[5]].extend(S_m[i])
     
     """
     5. For each named selection, obtain the alternating stress and write to CSV file for each RS/RV system.
     """
     if len(CHILD_ANALYSIS_NUMS) > 0:
-        for a in CHILD_ANALYSIS_NUMS:
+        cum_damage = [0.0] * len(nodes)     # Damage summed over the child analyses processed so far
+        for k_a, a in enumerate(CHILD_ANALYSIS_NUMS):
             cols = cols_ss[:]   # Reset the columns to those from the static structural analysis
             analysis = ExtAPI.DataModel.Project.Model.Analyses[a]
             solver_data = analysis.Solution.SolverData
@@ -570,7 +396,6 @@ for n in ns:
             seqv_op.inputs.data_sources.Connect(data_source)
             seqv_op.inputs.time_scoping.Connect(time_scoping)
             seqv_op.inputs.requested_location.Connect('Nodal')
-            alt_stress = []
 
             # Get the (unscaled) alternating (equivalent) stress
             if str(analysis_type).ToLower() == 'responsespectrum':
@@ -584,89 +409,108 @@ for n in ns:
             mesh_scoping.Ids = elem_ids
             mesh_scoping.Location = dpf.locations.elemental
             seqv_op.inputs.mesh_scoping.Connect(mesh_scoping)
-            alt_stress_temp = seqv_op.outputs.fields_container.GetData()
-            # Remove fields with 0 entities by creating a new fields container
-            alt_stress_fc = remove_fields_with_zero_entities(alt_stress_temp)
-            # Convert the alternating stress to desired stress units
+            # Convert the alternating stress to desired stress units and skip the fields with 0 entities
             unit_conv_fc_op = dpf.operators.math.unit_convert_fc()
             unit_conv_fc_op.inputs.unit_name.Connect(stress_unit_str)
-            unit_conv_fc_op.inputs.fields_container.Connect(alt_stress_fc)
-            # Scale the alternating (von Mises) stress
-            alt_stress_fc = unit_conv_fc_op.outputs.fields_container
-            alt_str_ss = alt_stress_fc.GetData()
-            alt_stress.append(alt_str_ss)
+            unit_conv_fc_op.inputs.fields_container.Connect(seqv_op.outputs.fields_container)
+            alt_str_ss = NonEmptyFields(unit_conv_fc_op.outputs.fields_container.GetData())
+            S_a = node_order.take(alt_str_ss[0])
             for i, t in enumerate(ss_active_times):
-                for nd in nodes:
-                    data[col_name].append(alt_str_ss[0].GetEntityDataById(nd)[0])
+                data[col_name].extend(S_a)
             
             """
             5.2  If fatigue assessment is desired, compute factor of safety in fatigue based on fatigue line type.
             """
             if ASSESS_FATIGUE == 'y':
-                # Compute load line and fatigue safety factor
-                load_lines = []
-                load_lines.append(compute_load_line(alt_stress[0], mean_stress))
-                fatigue_safety_factors = []
-                fatigue_safety_factors.append(fatigue_safety_factor(S_e, fat_criteria[FATIGUE_LINE_TYPE]['strength'], alt_stress[0], mean_stress, fat_criterion=FATIGUE_LINE_TYPE))
-                # Get the (unscaled) alternating (equivalent) stress
+                # Compute load line and fatigue safety factor of all nodes for each static structural time
                 if str(analysis_type).ToLower() == 'responsespectrum':
                     col_name1 = 'Load Line'
-                    col_name2 = fat_criteria[FATIGUE_LINE_TYPE]['Name'] + ' Fatigue Safety Factor'
+                    col_name2 = fat_name + ' Fatigue Safety Factor'
                 elif str(analysis_type).ToLower() == 'spectrum':
                     col_name1 = '1-sigma Load Line'
-                    col_name2 = fat_criteria[FATIGUE_LINE_TYPE]['Name'] + ' 1-sigma Fatigue Safety Factor'
+                    col_name2 = fat_name + ' 1-sigma Fatigue Safety Factor'
                 cols.append(col_name1)
                 cols.append(col_name2)
                 data[col_name1] = []
                 data[col_name2] = []
                 for i, t in enumerate(ss_active_times):
-                    for nd in nodes:
-                        data[col_name1].append(load_lines[0][0].GetEntityDataById(nd)[0])
-                        data[col_name2].append(fatigue_safety_factors[0][0].GetEntityDataById(nd)[0])
+                    load_line, nf = safety_factors(S_a, S_m[i], S_e, S, FATIGUE_LINE_TYPE)
+                    data[col_name1].extend(load_line)
+                    data[col_name2].extend(nf)
 
             # Create an alternating stress column for each scale factor if a RV analysis
             if str(analysis_type).ToLower() == 'spectrum':
-                for k, sf in enumerate([2, 3]):
-                    # Create scale operator
-                    scale_op = dpf.operators.math.scale_fc()
-                    if ANSYS_VER.ToUpper() == '2024 R2':
-                        scale_op.inputs.ponderation.Connect(sf)   # 2024 R2
-                    else:
-                        scale_op.inputs.weights.Connect(sf)       # 2025 R2
-                    
+                S_a_sigma = [S_a]      # 1-, 2- and 3-sigma alternating stress, reused for the Steinberg damage
+                for sf in [2, 3]:
                     # Add column to output data dictionary
                     col_name1 = str(sf) + '-sigma Alt Eqv Stress ' + stress_unit
                     cols.append(col_name1)
                     data[col_name1] = []
                     
                     """
-                    Get the von Mises stress at the corresponding node of the static structural analysis.  This is an 
+                    Scale the von Mises stress at the corresponding node of the static structural analysis.  This is an 
                     "alternating stress" component of the analysis.
-                    # Scale the von Mises stress
                     """
-                    scale_op.inputs.fields_container.Connect(alt_stress_fc)
-                    alt_stress_scld_fc = scale_op.outputs.fields_container
-                    alt_stress_scld = alt_stress_scld_fc.GetData()
-                    alt_stress.append(alt_stress_scld)
+                    S_a_scld = [sf * v for v in S_a]
+                    S_a_sigma.append(S_a_scld)
                     for i, t in enumerate(ss_active_times):
-                        for nd in nodes:
-                            data[col_name1].append(alt_stress_scld[0].GetEntityDataById(nd)[0])
+                        data[col_name1].extend(S_a_scld)
                     
                     if ASSESS_FATIGUE == 'y':
                         # Compute load lines and fatigue safety factors
-                        load_lines.append(compute_load_line(alt_stress_scld, mean_stress))
-                        fatigue_safety_factors.append(fatigue_safety_factor(S_e, fat_criteria[FATIGUE_LINE_TYPE]['strength'], alt_stress_scld, mean_stress, fat_criterion=FATIGUE_LINE_TYPE))
-                        # Get the (unscaled) alternating (equivalent) stress
                         col_name1 = str(sf) + '-sigma Load Line'
-                        col_name2 = fat_criteria[FATIGUE_LINE_TYPE]['Name'] + ' ' + str(sf) + '-sigma Fatigue Safety Factor'
+                        col_name2 = fat_name + ' ' + str(sf) + '-sigma Fatigue Safety Factor'
                         cols.append(col_name1)
                         cols.append(col_name2)
                         data[col_name1] = []
                         data[col_name2] = []
                         for i, t in enumerate(ss_active_times):
-                            for nd in nodes:
-                                data[col_name1].append(load_lines[k + 1][0].GetEntityDataById(nd)[0])
-                                data[col_name2].append(fatigue_safety_factors[k + 1][0].GetEntityDataById(nd)[0])
+                            load_line, nf = safety_factors(S_a_scld, S_m[i], S_e, S, FATIGUE_LINE_TYPE)
+                            data[col_name1].extend(load_line)
+                            data[col_name2].extend(nf)
+
+            """
+            5.3  If damage computation by Miner's rule is desired, compute it and add to data dictionary.
+            """
+            if COMPUTE_DAMAGE == 'y':
+                if str(analysis_type).ToLower() == 'spectrum':
+                    # Steinberg 3-band: 68.3, 27.1 and 4.33 % of duration x expected frequency at 1, 2 and 3 sigma
+                    n_cycles = RV_DURATION * RV_EXPECTED_FREQS[k_a]
+                    blocks = steinberg_blocks(S_a_sigma, n_cycles)
+                    col_name1 = 'Steinberg 3-Band Miner Damage'
+                else:
+                    n_cycles = DAMAGE_CYCLES[k_a]
+                    blocks = [(S_a, n_cycles)]
+                    col_name1 = 'Miner Damage'
+                damage = miner_damage(node_mats, nodes, sn_curves, blocks)
+                cum_damage = [c + d for c, d in zip(cum_damage, damage)]
+                col_name2 = 'Cumulative Miner Damage'
+                cols.append(col_name1)
+                cols.append(col_name2)
+                data[col_name1] = []
+                data[col_name2] = []
+                for i, t in enumerate(ss_active_times):
+                    data[col_name1].extend(damage)
+                    data[col_name2].extend(cum_damage)
+                d_max, d_node = max_damage(nodes, damage)
+                c_max, c_node = max_damage(nodes, cum_damage)
+                for c, v in zip(damage_cols, [ns_name, nid, analysis_name, n_cycles, d_max, d_node, c_max, c_node]):
+                    damage_data[c].append(v)
+
+            """
+            5.4  If spectral fatigue is desired for a RV analysis, add the narrow-band and Dirlik damage from the stress PSD.
+            """
+            if SPECTRAL_FATIGUE == 'y' and str(analysis_type).ToLower() == 'spectrum' and STRESS_PSD_FILES[k_a] != '':
+                if a not in psd_damage:
+                    psd_source = CsvStressPsdSource(STRESS_PSD_FILES[k_a], (Quantity(1, PSD_STRESS_UNIT_STR) / stress_quan).Value)
+                    psd_damage[a] = damage_by_node(psd_source, node_mats, sn_curves, RV_DURATION, psd_node_ids, PSD_NODE_CHUNK)
+                # Nodes without a PSD row in the file are left blank
+                d_psd = [psd_damage[a].get(nd, ('', '')) for nd in nodes]
+                for j, col_name1 in enumerate(['Narrow-Band Damage', 'Dirlik Damage']):
+                    cols.append(col_name1)
+                    data[col_name1] = []
+                    for i, t in enumerate(ss_active_times):
+                        data[col_name1].extend([d[j] for d in d_psd])
             
             x = datetime.datetime.now()
                 
@@ -678,4 +522,11 @@ for n in ns:
             
             model.ReleaseStreams()
             
+if COMPUTE_DAMAGE == 'y' and len(damage_data['Analysis']) > 0:
+    x = datetime.datetime.now()
+    file_name_body = 'miner_damage_summary--ns_folder=' + NAMED_SEL_FOLDER + '--' + x.strftime("%m-%d-%y")
+    write_csv(user_dir + '/' + file_name_body + ".csv", damage_data, damage_cols)
+    print("[INFO] Process completed for Miner's rule damage of the named selections")
+    print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34))
+
 ss_model.ReleaseStreams()
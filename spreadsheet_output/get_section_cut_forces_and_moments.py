@@ -0,0 +1,206 @@
+"""
+Get internal forces and moments across section cut planes.
+==========================================================
+
+Free-body section cuts: for every plane (point + normal) in SECTION_CUTS, the elements of a body named selection are
+split by their centroids, and the element nodal forces of the positive side elements on the cut nodes are summed to
+give the force and moment that the negative side exerts on the positive side, about the cut point.  All cuts of an
+analysis are evaluated from one element nodal force read, so no named selection of the cut faces is needed.
+
+"""
+################################## USER INPUTS ##################################
+analysisNumbers = [0]           # LIST OF ANALYSIS SYSTEMS TO APPLY THIS SCRIPT
+staticStrLastTimeOnly = 'N'     # 'Y' = only output last time step for static structural, 'N' = output all time steps
+lengthUnitStr = 'in'            # DESIRED LENGTH OUTPUT UNIT (usually 'in' or 'mm', case sensitive)
+forceUnitStr = 'lbf'            # DESIRED FOURCE OUTPUT UNIT (usually 'lbf' or 'N', case sensitive)
+TIME_CHUNK_SIZE = 0             # NUMBER OF TIME SETS READ AT ONCE (0 = ALL, > 0 BOUNDS MEMORY FOR LONG TRANSIENTS)
+# SECTION CUTS: [CUT NAME, NAMED SELECTION OF THE BODIES TO CUT, POINT [x, y, z] IN lengthUnitStr, NORMAL [nx, ny, nz]]
+SECTION_CUTS = [['Cut 1', 'Bracket Bodies', [0.0, 0.0, 1.0], [0.0, 0.0, 1.0]],
+                ['Cut 2', 'Bracket Bodies', [0.0, 0.0, 2.0], [0.0, 0.0, 1.0]]]
+REPO_DIR = r'C:\Users\Public\Ansys-Mechanical-Scripts'     # LOCAL PATH OF THIS REPOSITORY (contains mech_lib)
+#################################################################################
+
+import wbjn
+import datetime
+import csv
+import mech_dpf
+import Ans.DataProcessing as dpf
+import sys
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from mech_lib import section_cuts as sc
+from mech_lib.beam_resultants import iter_time_chunks
+from mech_lib.ns_index import NamedSelectionIndex, mesh_key, INDEX_FILE_NAME
+cmd = 'returnValue(GetUserFilesDirectory())'
+user_dir = wbjn.ExecuteCommand(ExtAPI, cmd)
+mech_dpf.setExtAPI(ExtAPI)
+
+#  Place units in Ansys Mechanical format for output conversion
+lengthUnit = '[' + lengthUnitStr + ']'
+forceUnit = '[' + forceUnitStr + ']'
+momentUnitStr = forceUnitStr + '*' + lengthUnitStr              # Desired moment/torque output unit
+momentUnit = '[' + momentUnitStr + ']'
+
+
+def writeCSVRows(filename, rows, cols):
+    """
+    Function to write rows of python data to a csv file as they are produced.
+
+    Parameters
+    ----------
+    filename : str
+        Filepath for the output file
+    rows : iterable of list
+        Rows of data, e.g. a generator that yields one row at a time
+    cols : list of str
+        Column header names
+
+    Returns
+    -------
+    None
+    """
+    with open(filename, 'wb') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(cols)
+        writer.writerows(rows)
+
+
+def getNamedSelectionElementIds(name, meshData, nsIndex):
+    """
+    Get the element Ids of all bodies in a named selection
+
+    Parameters
+    ----------
+    name : str
+        Name of the named selection
+    meshData : Ansys.ACT.Automation.Mechanical.MeshData
+        Mesh data of the analysis
+    nsIndex : mech_lib.ns_index.NamedSelectionIndex
+        Persistent named selection element and node Id index
+
+    Returns
+    -------
+    list of int
+        Sorted element Ids, empty if the named selection is not found
+    """
+    nsList = [n for n in DataModel.GetObjectsByType(DataModelObjectCategory.NamedSelection)
+              if n.Name.ToLower() == name.ToLower()]
+    if len(nsList) == 0:
+        print("[WARNING] Named selection " + name + " not found")
+        return []
+    return nsIndex.ids(nsList[0].ObjectId, nsList[0].Location.Ids, meshData)[0]
+
+
+for a in analysisNumbers:
+    analysis = Model.Analyses[a]
+    analysis_type = analysis.AnalysisType
+    meshData = analysis.MeshData
+
+    if str(analysis_type).ToLower().Contains('spectrum'):
+        # Combined (RMS) element nodal forces have no sign and cannot be summed across a cut
+        print("[WARNING] Section cuts are not computed for spectrum analysis " + analysis.Name + '\n')
+        continue
+
+    # Result Data
+    filepath = analysis.ResultFileName
+
+    # Data Sources
+    dataSource = dpf.DataSources()
+    dataSource.SetResultFilePath(filepath)
+
+    # Model, mesh and time steps
+    model = dpf.Model(dataSource)
+    mesh = model.Mesh
+    all_times = model.TimeFreqSupport.TimeFreqs.Data
+    timeUnitStr = str(model.TimeFreqSupport.TimeFreqs.Unit)               # Time stepping unit
+    timeUnit = '[' + timeUnitStr + ']'
+    number_sets = model.TimeFreqSupport.NumberSets      # Number of time steps
+    timeIds = range(1, number_sets + 1)                 # List of time steps
+    if str(analysis_type).ToLower() == 'static':
+        if staticStrLastTimeOnly.ToLower() == 'y':
+            timeIds = [timeIds[len(timeIds)-1]]            # Last time step
+
+    # Nodal coordinates (about the global coordinate system) in the output length unit
+    ndCoordsOp = dpf.operators.mesh.node_coordinates()
+    ndUnitConvOp = dpf.operators.math.unit_convert()
+    ndUnitConvOp.inputs.unit_name.Connect(lengthUnitStr)
+    ndCoordsOp.inputs.mesh.Connect(mesh)
+    nodeCoords = ndCoordsOp.outputs.getcoordinates_as_field()
+    ndUnitConvOp.inputs.entity_to_convert.Connect(nodeCoords)
+    nodeCoords = ndUnitConvOp.outputs.getconverted_entity_as_field()
+
+    # Connectivity of the elements of every body set and the coordinates of their nodes, read once
+    nsIndex = NamedSelectionIndex(user_dir + '/' + INDEX_FILE_NAME, mesh_key(meshData))
+    bodySets = {}
+    for cutName, nsName, point, normal in SECTION_CUTS:
+        if nsName not in bodySets:
+            bodySets[nsName] = getNamedSelectionElementIds(nsName, meshData, nsIndex)
+    nsIndex.save()
+    connField = mesh.GetPropertyField('connectivity')
+    connectivity = sc.connectivity_from_field(set(eid for eids in bodySets.values() for eid in eids),
+                                              connField.ScopingIds, connField.DataPointer, connField.Data,
+                                              mesh.NodeIds)
+    usedNodes = set()
+    for nodes in connectivity.values():
+        usedNodes.update(nodes)
+    coords = {}
+    coordIds = nodeCoords.ScopingIds
+    coordData = nodeCoords.Data
+    for k, nid in enumerate(coordIds):
+        if nid in usedNodes:
+            coords[nid] = [coordData[3*k], coordData[3*k + 1], coordData[3*k + 2]]
+
+    # Element centroids of each body set and the side, cut nodes and lever arms of each cut
+    centroids = dict((nsName, sc.element_centroids(eids, connectivity, coords)) for nsName, eids in bodySets.items())
+    cuts = []
+    for cutName, nsName, point, normal in SECTION_CUTS:
+        cut = sc.SectionCut(cutName, point, normal, bodySets[nsName], centroids[nsName], connectivity, coords)
+        cut.body_set = nsName
+        if len(cut.cut_nodes) == 0:
+            print("[WARNING] " + cutName + " does not cut any element of " + nsName)
+        cuts.append(cut)
+
+    # One element nodal force read of the elements on all cut faces per chunk of time sets
+    source = sc.DpfElementNodalForceSource(dataSource, forceUnitStr)
+    scoping = sc.cut_elements(cuts)
+    results = []
+    for start, chunk in iter_time_chunks(timeIds, TIME_CHUNK_SIZE):
+        results.append((chunk, sc.evaluate_cuts(cuts, source.read(scoping, chunk), connectivity)))
+
+    cols = ['Section Cut',
+            'Body Named Selection',
+            'Point ' + lengthUnit,
+            'Normal',
+            'Number of Cut Nodes',
+            'Time ' + timeUnit,
+            'Set',
+            'FX ' + forceUnit,
+            'FY ' + forceUnit,
+            'FZ ' + forceUnit,
+            'F_Total ' + forceUnit,
+            'F_Normal ' + forceUnit,
+            'MX ' + momentUnit,
+            'MY ' + momentUnit,
+            'MZ ' + momentUnit,
+            'M_Total ' + momentUnit,
+            'M_Normal ' + momentUnit]
+
+    def cutRows():
+        for c, cut in enumerate(cuts):
+            pre = [cut.name, cut.body_set, ' '.join('%g' % v for v in cut.point),
+                   ' '.join('%g' % v for v in cut.normal), len(cut.cut_nodes)]
+            for chunk, res in results:
+                n = len(chunk)
+                for t, tid in enumerate(chunk):
+                    i = c * n + t
+                    yield pre + [all_times[tid-1], tid] + [res[k][i] for k in sc.COLUMN_KEYS]
+
+    x = datetime.datetime.now()
+
+    file_name_body = analysis.Name + ' - type=' + str(analysis_type) + ' - Section_Cut_Forces_' + x.strftime("%m") + "-" + x.strftime("%d") + "-" + x.strftime("%y")
+    writeCSVRows(user_dir + '/' + file_name_body + ".csv", cutRows(), cols)
+
+    print("[INFO] Process completed for " + analysis.Name + " (" + str(len(cuts)) + " cuts, " + str(source.reads) + " force read(s))")
+    print("Open File: " + chr(34) + user_dir + chr(92) + file_name_body + ".csv" + chr(34) + '\n')
+
+    model.ReleaseStreams()
@@ -0,0 +1,130 @@
+import math
+
+import pytest
+
+from mech_lib import beam_resultants as br
+from mech_lib.smisc_reader import SyntheticSmiscSource
+
+N_BEAMS = 40
+N_TIMES = 6
+
+
+def close(a, b):
+    return all(abs(x - y) <= 1e-9 * max(1.0, abs(y)) for x, y in zip(a, b))
+
+
+@pytest.fixture
+def beams():
+    rad = [0.1 + 0.01 * (b % 7) for b in range(N_BEAMS)]
+    element_ids = list(range(1, N_BEAMS + 1))
+    time_ids = list(range(1, N_TIMES + 1))
+    return {'rad': rad, 'section': br.circular_section(rad), 'element_ids': element_ids, 'time_ids': time_ids,
+            'source': SyntheticSmiscSource(element_ids, time_ids), 'prefix': [[eid] for eid in element_ids]}
+
+
+def test_governing_keeps_the_sign_and_prefers_i_on_ties():
+    assert br.governing([1.0, -5.0, 2.0, -3.0], [-2.0, 4.0, -2.0, 3.0]) == [-2.0, -5.0, 2.0, -3.0]
+
+
+def test_circular_section():
+    sec = br.circular_section([2.0])
+    assert sec['dia'] == [4.0]
+    assert sec['area'] == [pytest.approx(4.0 * math.pi)]
+    assert sec['J'][0] == pytest.approx(2.0 * sec['I'][0]) == pytest.approx(8.0 * math.pi)
+
+
+def test_compute_beam_resultants_matches_the_scalar_loop():
+    rad = [0.1 + 0.001 * b for b in range(50)]
+    sec = br.circular_section(rad)
+    items = br.synthetic_items(50, 4)
+    res = br.compute_beam_resultants(items, rad, sec['area'], sec['I'], sec['J'], 4)
+    ref = br._scalar_reference(items, rad, sec['area'], sec['I'], sec['J'], 4)
+    assert res['End'] == ref['End']
+    for k in br.RESULT_KEYS[:-1]:
+        assert close(res[k], ref[k]), k
+
+
+def test_compute_beam_resultants_picks_the_end_of_the_larger_equivalent_stress():
+    items = dict((k, [0.0]) for k in br.BEAM_ITEMS)
+    items['MY_I'] = [3.0]
+    items['MZ_I'] = [4.0]
+    items['TQ_J'] = [10.0]
+    items['FX_J'] = [-2.0]
+    sec = br.circular_section([1.0])
+    res = br.compute_beam_resultants(items, [1.0], sec['area'], sec['I'], sec['J'], 1)
+    assert res['FX'] == [-2.0]
+    s_dir = -2.0 / sec['area'][0]
+    s_eqv_i = abs(s_dir + 5.0 / sec['I'][0])
+    s_eqv_j = math.hypot(s_dir, math.sqrt(3.0) * 10.0 / sec['J'][0])
+    assert res['End'] == ['I' if s_eqv_i >= s_eqv_j else 'J']
+    assert res['Equivalent Stress'][0] == pytest.approx(max(s_eqv_i, s_eqv_j))
+
+
+def test_streamed_rows_do_not_depend_on_the_chunk_size(beams):
+    b = beams
+    rows = {}
+    for chunk_size in (0, 4, 1):
+        rows[chunk_size] = sorted(br.stream_beam_rows(b['source'], b['element_ids'], b['time_ids'], b['rad'],
+                                                      b['section'], b['prefix'], b['time_ids'], b['time_ids'],
+                                                      chunk_size=chunk_size))
+    assert len(rows[0]) == N_BEAMS * N_TIMES
+    assert rows[0] == rows[4] == rows[1]
+
+
+def test_single_chunk_keeps_the_beam_then_time_order(beams):
+    b = beams
+    rows = list(br.stream_beam_rows(b['source'], b['element_ids'], b['time_ids'], b['rad'], b['section'],
+                                    b['prefix'], b['time_ids'], b['time_ids']))
+    assert [r[:3] for r in rows] == [[eid, t, t] for eid in b['element_ids'] for t in b['time_ids']]
+
+
+@pytest.mark.parametrize('chunk_size', [0, 4, 1])
+def test_envelope_is_the_signed_maximum_magnitude_of_every_key(beams, chunk_size):
+    b = beams
+    keys = br.ENVELOPE_KEYS
+    full = list(br.stream_beam_rows(b['source'], b['element_ids'], b['time_ids'], b['rad'], b['section'],
+                                    b['prefix'], b['time_ids'], b['time_ids'], keys=keys))
+    env = br.envelope_beam_rows(b['source'], b['element_ids'], b['time_ids'], b['rad'], b['section'], b['prefix'],
+                                b['time_ids'], b['time_ids'], chunk_size=chunk_size)
+    assert len(env) == N_BEAMS
+    for k, row in enumerate(env):
+        beam_rows = full[k * N_TIMES:(k + 1) * N_TIMES]
+        for j in range(len(keys)):
+            best = max(beam_rows, key=lambda r: abs(r[3 + j]))
+            assert row[1 + 3 * j:4 + 3 * j] == [best[3 + j], best[1], best[2]]
+
+
+def test_scales_match_one_read_per_scale(beams):
+    b = beams
+    sigmas = [1, 2, 3]
+    b['source'].reads = 0
+    multi = list(br.stream_beam_rows(b['source'], b['element_ids'], b['time_ids'][:1], b['rad'], b['section'],
+                                     b['prefix'], [0.0], [2], scales=sigmas))
+    reads = b['source'].reads
+    b['source'].reads = 0
+    ends = None
+    for j, f in enumerate(sigmas):
+        factors = dict((k, f) for k in br.BEAM_ITEMS)
+        single = list(br.stream_beam_rows(b['source'], b['element_ids'], b['time_ids'][:1], b['rad'], b['section'],
+                                          b['prefix'], [0.0], [2], factors, keys=br.COLUMN_KEYS + ['End']))
+        if ends is None:
+            ends = [row[-1] for row in single]
+        for k, row in enumerate(single):
+            scaled = multi[k * len(sigmas) + j]
+            assert scaled[:3] == row[:3] and scaled[3] == f and row[-1] == ends[k]
+            assert close(scaled[4:], row[3:-1])
+    assert reads * len(sigmas) == b['source'].reads
+
+
+def test_envelope_scales_multiply_the_maxima(beams):
+    b = beams
+    args = (b['source'], b['element_ids'], b['time_ids'], b['rad'], b['section'], b['prefix'], b['time_ids'],
+            b['time_ids'])
+    plain = br.envelope_beam_rows(*args)
+    scaled = br.envelope_beam_rows(*args, scales=[1, 3])
+    assert len(scaled) == 2 * N_BEAMS
+    for k, row in enumerate(plain):
+        for f, srow in zip([1, 3], scaled[2 * k:2 * k + 2]):
+            assert srow[:2] == [row[0], f]
+            assert srow[2::3] == [v * f for v in row[1::3]]
+            assert srow[3::3] == row[2::3] and srow[4::3] == row[3::3]
@@ -0,0 +1,41 @@
+import pytest
+
+from mech_lib import beam_table
+
+
+def records():
+    return [[100002, 11, 'Circular - 2', 'Steel', 2.0, 50.0, 200000.0],
+            [100001, 10, 'Circular - 1', 'Steel', 1.0, 40.0, 200000.0],
+            [0, 12, 'Circular - 3', 'Aluminum', 1.5, 30.0, None]]
+
+
+def test_element_lengths_use_the_i_and_j_nodes():
+    connectivity = {100001: [1, 2, 9], 100002: [2, 3], 100003: [4]}
+    coords = {1: [0.0, 0.0, 0.0], 2: [3.0, 4.0, 0.0], 3: [3.0, 4.0, 12.0], 9: [100.0, 0.0, 0.0]}
+    got = beam_table.element_lengths([100001, 100002, 100003, 100004], connectivity, coords)
+    assert got == {100001: 5.0, 100002: 12.0}
+
+
+def test_with_lengths_replaces_the_solved_beams_only():
+    table = beam_table.BeamTable(records()).with_lengths({100001: 45.0, 999: 1.0})
+    assert table.length == [50.0, 45.0, 30.0]
+    solved = table.solved()
+    assert solved.element_id == [100001, 100002]
+    geom = solved.geometry()
+    assert geom['length'] == [45.0, 50.0]
+    assert geom['stiffness'][0] == pytest.approx(200000.0 * geom['area'][0] / 45.0)
+
+
+def test_load_or_build_rebuilds_on_a_new_key(tmp_path):
+    path = str(tmp_path / 'beam_table.json')
+    calls = []
+
+    def build():
+        calls.append(1)
+        return records()
+
+    first = beam_table.load_or_build(path, {'beams': 3}, build)
+    again = beam_table.load_or_build(path, {'beams': 3}, build)
+    assert again.records == first.records and len(calls) == 1
+    beam_table.load_or_build(path, {'beams': 4}, build)
+    assert len(calls) == 2
@@ -0,0 +1,135 @@
+import math
+
+import pytest
+
+from mech_lib.fatigue import (INF, CRITERIA, STEINBERG_BANDS, NodeMaterialIndex, SNCurve, miner_damage, safety_factors,
+                              sn_curve, steinberg_blocks)
+
+SE = 20000.0
+S = 60000.0
+
+
+def textbook_gerber(sa, sm, se, s):
+    return 0.5 * (s / sm) ** 2 * (sa / se) * (-1.0 + math.sqrt(1.0 + (2.0 * sm / s * se / sa) ** 2))
+
+
+def test_gerber_matches_textbook_form():
+    sa = [5000.0, 12000.0, 300.0]
+    sm = [20000.0, 8000.0, 45000.0]
+    nf = safety_factors(sa, sm, [SE] * 3, [S] * 3, 'ger')[1]
+    for got, a, m in zip(nf, sa, sm):
+        assert got == pytest.approx(textbook_gerber(a, m, SE, S), rel=1e-12)
+
+
+def test_gerber_at_small_mean_stress_keeps_its_digits():
+    sa = [1000.0] * 3
+    sm = [1.0, 1e-1, 1e-2]
+    nf = safety_factors(sa, sm, [SE] * 3, [S] * 3, 'ger')[1]
+    # nf = Se/Sa (1 - x^2/4 + ...) with x = 2 (Sm/S) (Se/Sa): the textbook form loses this deficit to the cancellation
+    # of -1 + sqrt(...), the fused form keeps it
+    for got, m in zip(nf, sm):
+        x = 2.0 * m / S * SE / 1000.0
+        assert (SE / 1000.0 - got) / (SE / 1000.0) == pytest.approx(x * x / 4.0, rel=1e-3)
+    assert safety_factors([1000.0], [1e-12], [SE], [S], 'ger')[1][0] == pytest.approx(SE / 1000.0, rel=1e-15)
+
+
+@pytest.mark.parametrize('criterion', sorted(CRITERIA))
+def test_zero_mean_stress_is_fully_reversed(criterion):
+    load_line, nf = safety_factors([1000.0], [0.0], [SE], [S], criterion)
+    assert load_line == [INF]
+    expected = S / 1000.0 if criterion == 'l' else SE / 1000.0
+    assert nf[0] == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize('criterion', sorted(CRITERIA))
+def test_zero_alternating_stress_is_static(criterion):
+    load_line, nf = safety_factors([0.0], [3000.0], [SE], [S], criterion)
+    assert load_line == [0.0]
+    assert nf[0] == pytest.approx(S / 3000.0, rel=1e-12)
+
+
+@pytest.mark.parametrize('criterion', sorted(CRITERIA))
+def test_no_stress_has_infinite_safety_factor(criterion):
+    assert safety_factors([0.0], [0.0], [SE], [S], criterion) == ([INF], [INF])
+
+
+@pytest.mark.parametrize('criterion', ['ger', 'asme'])
+def test_near_pure_loads_reach_the_goodman_limits(criterion):
+    nf = safety_factors([1e-6, 1000.0], [1000.0, 1e-6], [SE] * 2, [S] * 2, criterion)[1]
+    assert nf[0] == pytest.approx(S / 1000.0, rel=1e-6)
+    assert nf[1] == pytest.approx(SE / 1000.0, rel=1e-6)
+
+
+def test_unknown_criterion():
+    with pytest.raises(ValueError):
+        safety_factors([1.0], [1.0], [SE], [S], 'x')
+
+
+def basquin_table(a, b, r_ratio=False):
+    grid = [10.0 ** e for e in range(3, 8)]
+    table = {'Cycles': [''] + grid, 'Alternating Stress': ['psi'] + [a * n ** b for n in grid]}
+    if r_ratio:
+        table['R-Ratio'] = [''] + [-1] * 5
+    return table
+
+
+def test_sn_curve_reproduces_a_power_law_and_extrapolates_above():
+    a, b = 150000.0, -0.1
+    curve = sn_curve(basquin_table(a, b))
+    stresses = [a * 2.0e6 ** b, a * 5.0e3 ** b, a * 10.0 ** b]
+    for got, s in zip(curve.cycles(stresses), stresses):
+        assert got == pytest.approx((s / a) ** (1.0 / b), rel=1e-9)
+
+
+def test_sn_curve_below_the_lowest_stress_has_infinite_life():
+    a, b = 150000.0, -0.1
+    curve = sn_curve(basquin_table(a, b))
+    s_min = a * 1.0e7 ** b
+    assert curve.cycles([0.999 * s_min, 0.0]) == [INF, INF]
+    assert curve.cycles([s_min])[0] == pytest.approx(1.0e7, rel=1e-9)
+
+
+def test_sn_curve_keeps_only_the_fully_reversed_points():
+    table = basquin_table(150000.0, -0.1, r_ratio=True)
+    table['Cycles'].append(1.0e3)
+    table['Alternating Stress'].append(1.0e6)
+    table['R-Ratio'].append(0.1)
+    ref = sn_curve(basquin_table(150000.0, -0.1))
+    got = sn_curve(table)
+    assert (got.log_s, got.log_n) == (ref.log_s, ref.log_n)
+
+
+def test_sn_curve_rejects_non_positive_points():
+    with pytest.raises(ValueError):
+        SNCurve([100.0, 0.0], [1e3, 1e6])
+
+
+def test_steinberg_fractions():
+    bands = [[1.0], [2.0], [3.0]]
+    blocks = steinberg_blocks(bands, 1000.0)
+    assert [n for sa, n in blocks] == pytest.approx([683.0, 271.0, 43.3])
+    assert [sa for sa, n in blocks] == bands
+    assert sum(f for sigma, f in STEINBERG_BANDS) == pytest.approx(0.9973, abs=1e-4)
+
+
+def test_steinberg_damage_closed_form():
+    a, b = 150000.0, -0.1
+    index = NodeMaterialIndex([[1, 2, 3]], ['Steel'])
+    curves = {'Steel': sn_curve(basquin_table(a, b))}
+    sigma1 = [3000.0, 8000.0, 20000.0]
+    n_cycles = 3600.0 * 120.0
+    bands = [[sigma * v for v in sigma1] for sigma, fraction in STEINBERG_BANDS]
+    damage = miner_damage(index, [1, 2, 3], curves, steinberg_blocks(bands, n_cycles))
+    s_min = a * 1.0e7 ** b
+    for got, v in zip(damage, sigma1):
+        ref = sum(fraction * n_cycles / (sigma * v / a) ** (1.0 / b)
+                  for sigma, fraction in STEINBERG_BANDS if sigma * v >= s_min)
+        assert got == pytest.approx(ref, rel=1e-9, abs=1e-15)
+    assert damage[0] == 0.0
+
+
+def test_miner_damage_uses_the_curve_of_each_material():
+    index = NodeMaterialIndex([[1, 2], [3]], ['Steel', 'Aluminum'])
+    curves = {'Steel': SNCurve([100.0, 50.0], [1e3, 1e6]), 'Aluminum': SNCurve([100.0, 50.0], [1e4, 1e7])}
+    damage = miner_damage(index, [3, 1], curves, [([100.0, 100.0], 10.0), ([50.0, 50.0], 1000.0)])
+    assert damage == pytest.approx([10.0 / 1e4 + 1000.0 / 1e7, 10.0 / 1e3 + 1000.0 / 1e6])
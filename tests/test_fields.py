@@ -0,0 +1,95 @@
+import pytest
+
+from mech_lib.fields import NonEmptyFields, ScopingAlignment, container_by_time
+
+
+class Field(object):
+    def __init__(self, ids, data):
+        self.ScopingIds = list(ids)
+        self.Data = list(data)
+        self.ElementaryDataCount = len(self.ScopingIds)
+
+
+class FieldsContainer(object):
+    """Stand-in for FieldsContainer with one label space per field"""
+
+    def __init__(self, fields, spaces):
+        self.fields = fields
+        self.spaces = spaces
+        self.reads = 0
+
+    @property
+    def FieldCount(self):
+        return len(self.fields)
+
+    def __getitem__(self, i):
+        self.reads += 1
+        return self.fields[i]
+
+    def GetLabelSpace(self, i):
+        return self.spaces[i]
+
+
+def container():
+    fields = [Field([], []), Field([1, 2], [1.0, 2.0]), Field([], []), Field([3], [3.0]), Field([2], [4.0])]
+    spaces = [{'time': 1, 'body': 0}, {'time': 1, 'body': 1}, {'time': 2, 'body': 0}, {'time': 2, 'body': 1},
+              {'time': 1, 'body': 2}]
+    return FieldsContainer(fields, spaces)
+
+
+def test_non_empty_fields_map_indices_and_label_spaces():
+    fc = container()
+    view = NonEmptyFields(fc)
+    assert fc.reads == 0
+    assert view.indices == [1, 3, 4]
+    assert view.FieldCount == len(view) == 3
+    assert [f.Data for f in view] == [[1.0, 2.0], [3.0], [4.0]]
+    assert view[1] is fc.fields[3]
+    assert [view.GetLabelSpace(i) for i in range(len(view))] == [fc.spaces[1], fc.spaces[3], fc.spaces[4]]
+
+
+def test_non_empty_fields_are_found_once():
+    fc = container()
+    view = NonEmptyFields(fc)
+    view.indices
+    reads = fc.reads
+    list(view)
+    view.indices
+    assert fc.reads == reads + 3
+
+
+def test_container_by_time_merges_the_fields_of_a_time_set():
+    assert container_by_time(container(), [2, 1, 5]) == [([3], [3.0]), ([1, 2, 2], [1.0, 2.0, 4.0]), ([], [])]
+
+
+def test_alignment_of_a_reordered_scoping():
+    aligned = ScopingAlignment([10, 20, 30])
+    assert aligned.take(Field([30, 10, 20, 40], [3.0, 1.0, 2.0, 4.0])) == [1.0, 2.0, 3.0]
+    assert aligned.take(Field([30, 10, 20, 40], [6.0, 4.0, 5.0, 0.0])) == [4.0, 5.0, 6.0]
+    assert aligned.built == 1
+    aligned.take(Field([20, 30, 10], [2.0, 3.0, 1.0]))
+    assert aligned.built == 2
+
+
+def test_alignment_of_a_field_in_target_order_is_a_copy():
+    aligned = ScopingAlignment([1, 2])
+    field = Field([1, 2], [5.0, 6.0])
+    assert aligned.permutation(field.ScopingIds) is None
+    taken = aligned.take(field)
+    assert taken == field.Data and taken is not field.Data
+    assert aligned.built == 0
+
+
+@pytest.mark.parametrize('ids', [[2, 1], [1, 2]])
+def test_alignment_takes_one_component_of_a_multi_component_field(ids):
+    xyz = {1: [1.0, 10.0, 100.0], 2: [2.0, 20.0, 200.0]}
+    field = Field(ids, [v for nid in ids for v in xyz[nid]])
+    aligned = ScopingAlignment([1, 2])
+    for c in range(3):
+        assert aligned.take(field, c) == [xyz[1][c], xyz[2][c]]
+
+
+def test_alignment_with_missing_ids_raises():
+    aligned = ScopingAlignment([1, 2, 3])
+    with pytest.raises(ValueError, match='2 target IDs, e.g. 2'):
+        aligned.take(Field([1], [1.0]))
@@ -0,0 +1,92 @@
+import math
+import random
+
+import pytest
+
+from mech_lib import joint_reactions as jr
+
+N_JOINTS = 12
+N_TIMES = 4
+
+
+def close(a, b):
+    return all(abs(x - y) <= 1e-9 * max(1.0, abs(y)) for x, y in zip(a, b))
+
+
+def random_csys(rng):
+    x = [rng.uniform(-1, 1) for _ in range(3)]
+    v = [rng.uniform(-1, 1) for _ in range(3)]
+    z = [x[1]*v[2] - x[2]*v[1], x[2]*v[0] - x[0]*v[2], x[0]*v[1] - x[1]*v[0]]
+    y = [z[1]*x[2] - z[2]*x[1], z[2]*x[0] - z[0]*x[2], z[0]*x[1] - z[1]*x[0]]
+    return jr.csys_matrix(x, y, z)
+
+
+@pytest.fixture
+def joints():
+    rng = random.Random(0)
+    size = N_JOINTS * N_TIMES
+    items = dict((k, [rng.uniform(-1000.0, 1000.0) for _ in range(size)]) for k in jr.JOINT_ITEMS)
+    masks = [jr.dof_mask(rng.random() < 0.5, rng.random() < 0.5, rng.random() < 0.5,
+                         rng.choice(['all', 'x', 'y', 'z', ''])) for _ in range(N_JOINTS)]
+    return {'rng': rng, 'items': items, 'masks': masks}
+
+
+@pytest.mark.parametrize('rotations, expected', [('all', [True, True, True]), ('X', [True, False, False]),
+                                                 ('y', [False, True, False]), ('z', [False, False, True]),
+                                                 ('', [False, False, False])])
+def test_dof_mask(rotations, expected):
+    assert jr.dof_mask(1, 0, True, rotations) == [True, False, True] + expected
+
+
+@pytest.mark.parametrize('name, expected', [('FreeAll', 'all'), ('FreeX', 'x'), ('FreeY', 'y'), ('FreeZ', 'z'),
+                                            ('Fixed', '')])
+def test_rotation_dofs(name, expected):
+    assert jr.rotation_dofs(name) == expected
+
+
+def test_free_dofs_take_the_joint_element_item():
+    items = dict((k, [float(i)]) for k, i in jr.JOINT_ITEMS.items())
+    res = jr.compute_joint_reactions(items, [jr.dof_mask(True, False, False, 'z')], 1)
+    assert [res[k][0] for k in jr.COMPONENTS] == [43.0, 2.0, 3.0, 4.0, 5.0, 48.0]
+    assert res['F_total'] == [pytest.approx(math.sqrt(43.0 ** 2 + 2.0 ** 2 + 3.0 ** 2))]
+
+
+def test_compute_joint_reactions_matches_the_scalar_loop(joints):
+    res = jr.compute_joint_reactions(joints['items'], joints['masks'], N_TIMES)
+    ref = jr._scalar_reference(joints['items'], joints['masks'], N_TIMES)
+    for k in jr.COLUMN_KEYS:
+        assert close(res[k], ref[k]), k
+
+
+def test_global_components_match_the_per_joint_rotation(joints):
+    res = jr.compute_joint_reactions(joints['items'], joints['masks'], N_TIMES)
+    matrices = [random_csys(joints['rng']) for _ in range(N_JOINTS)]
+    glob = jr.global_components(res, matrices, N_TIMES)
+    ref = jr._rotate_reference(res, matrices, N_TIMES)
+    for k in jr.GLOBAL_KEYS:
+        assert close(glob[k], ref[k]), k
+    # A rotation keeps the totals
+    f_total = [math.sqrt(x*x + y*y + z*z) for x, y, z in zip(glob['FX_global'], glob['FY_global'], glob['FZ_global'])]
+    m_total = [math.sqrt(x*x + y*y + z*z) for x, y, z in zip(glob['MX_global'], glob['MY_global'], glob['MZ_global'])]
+    assert close(f_total, res['F_total']) and close(m_total, res['M_total'])
+
+
+def test_global_components_of_the_global_csys_are_unchanged(joints):
+    res = jr.compute_joint_reactions(joints['items'], joints['masks'], N_TIMES)
+    same = jr.global_components(res, [jr.IDENTITY] * N_JOINTS, N_TIMES)
+    assert all(same[g] == res[k] for g, k in zip(jr.GLOBAL_KEYS, jr.COMPONENTS))
+
+
+def test_global_components_of_a_turned_csys():
+    # Reference X along global Y, reference Y along global -X
+    res = dict((k, [0.0]) for k in jr.COMPONENTS)
+    res['FX'] = [1.0]
+    res['MY'] = [2.0]
+    glob = jr.global_components(res, [jr.csys_matrix([0, 3, 0], [-1, 0, 0], [0, 0, 2])], 1)
+    assert [glob[k][0] for k in jr.GLOBAL_KEYS] == [0.0, 1.0, 0.0, -2.0, 0.0, 0.0]
+
+
+def test_joint_rows():
+    res = {'FX': [1.0, 2.0, 3.0, 4.0]}
+    rows = list(jr.joint_rows(res, [['A'], ['B']], [0.5, 1.0], [1, 2], keys=['FX']))
+    assert rows == [['A', 0.5, 1, 1.0], ['A', 1.0, 2, 2.0], ['B', 0.5, 1, 3.0], ['B', 1.0, 2, 4.0]]
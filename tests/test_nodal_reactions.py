@@ -0,0 +1,9 @@
+from mech_lib import nodal_reactions as nr
+
+
+def test_gather_nodal_sums_nodes_repeated_across_merged_fields():
+    position = {10: 0, 20: 1}
+    ids = [10, 20, 10, 30]
+    data = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 0.5, 0.5, 0.5, 9.0, 9.0, 9.0]
+    got = nr.gather_nodal(ids, data, position, 3, scale=2.0)
+    assert got == [[3.0, 8.0, 0.0], [5.0, 10.0, 0.0], [7.0, 12.0, 0.0]]
@@ -0,0 +1,155 @@
+import random
+
+import pytest
+
+from mech_lib import ns_extrema as nx
+from mech_lib.nodal_reactions import NodeSetIndex
+
+N_ELEMENTS = 60
+TIME_IDS = [1, 2, 3]
+
+
+@pytest.fixture
+def model():
+    rng = random.Random(3)
+    # Strip of 8-node bricks: element e shares its 4 last nodes with element e + 1
+    connectivity = dict((e, list(range(4 * e, 4 * e + 8))) for e in range(1, N_ELEMENTS + 1))
+    elem_sets = []
+    for s in range(8):
+        first = rng.randrange(1, N_ELEMENTS - 12)
+        elem_sets.append(list(range(first, first + 12)))
+    node_sets = [sorted(set(nid for eid in elems for nid in connectivity[eid])) for elems in elem_sets]
+    return {'source': nx.SyntheticNodalResultSource(connectivity, TIME_IDS), 'elem_sets': elem_sets,
+            'node_sets': node_sets}
+
+
+def brute_force_max(fields):
+    out = []
+    for ids, data in fields:
+        m = max(data)
+        out.append((m, ids[data.index(m)]))
+    return out
+
+
+def test_nodal_maxima_matches_a_max_per_set():
+    rng = random.Random(0)
+    node_sets = [[1, 2, 3, 4], [3, 4, 5], [9], [7, 8, 1]]
+    index = NodeSetIndex(node_sets)
+    fields = [(index.node_ids, [rng.uniform(-1.0, 1.0) for _ in index.node_ids]) for _ in TIME_IDS]
+    res = nx.nodal_maxima(index, fields, scale=2.0)
+    for s, nodes in enumerate(node_sets):
+        for t, (ids, data) in enumerate(fields):
+            values = dict(zip(ids, data))
+            best = max(nodes, key=values.get)
+            assert (res['max'][s * len(TIME_IDS) + t], res['node'][s * len(TIME_IDS) + t]) == (2.0 * values[best], best)
+
+
+def test_nodal_maxima_of_a_set_without_values_is_none():
+    index = NodeSetIndex([[1, 2], [5]])
+    res = nx.nodal_maxima(index, [([1, 2], [3.0, 4.0])])
+    assert res == {'max': [4.0, None], 'node': [2, None]}
+
+
+def test_read_sets_matches_one_read_per_set(model):
+    source = model['source']
+    single = [brute_force_max(source.read(elems, TIME_IDS)) for elems in model['elem_sets']]
+    source.reads = 0
+    set_indexes = [NodeSetIndex([nodes]) for nodes in model['node_sets']]
+    per_set = [nx.nodal_maxima(index, fields)
+               for index, fields in zip(set_indexes, source.read_sets(model['elem_sets'], TIME_IDS))]
+    assert source.reads == 1
+    for s, res in enumerate(per_set):
+        assert list(zip(res['max'], res['node'])) == single[s]
+
+    merged = nx.set_result_maxima('stress', set_indexes, source.read_sets(model['elem_sets'], TIME_IDS))
+    assert len(merged) == 1
+    assert merged[0]['max'] == [m for res in per_set for m in res['max']]
+    assert merged[0]['node'] == [n for res in per_set for n in res['node']]
+
+
+def test_union_read_averages_shared_nodes_over_all_sets(model):
+    source = model['source']
+    index = NodeSetIndex(model['node_sets'])
+    union_elements = sorted(set(eid for elems in model['elem_sets'] for eid in elems))
+    union = nx.nodal_maxima(index, source.read(union_elements, TIME_IDS))
+    single = [brute_force_max(source.read(elems, TIME_IDS)) for elems in model['elem_sets']]
+    n_times = len(TIME_IDS)
+    assert any(union['max'][s * n_times + t] != single[s][t][0]
+               for s in range(len(single)) for t in range(n_times))
+
+
+def test_vector_result_maxima_of_the_norm_and_components():
+    rng = random.Random(2)
+    node_sets = [[1, 2, 3], [3, 4], [5, 1]]
+    index = NodeSetIndex(node_sets)
+    vec = [(index.node_ids, [rng.uniform(-1.0, 1.0) for _ in range(3 * len(index))]) for _ in TIME_IDS]
+    res = nx.result_maxima('velocity', index, vec)
+    assert len(res) == len(nx.RESULT_KINDS['velocity'][2])
+    for s, nodes in enumerate(node_sets):
+        for t, (ids, data) in enumerate(vec):
+            row = s * len(TIME_IDS) + t
+            comps = dict((nid, data[3 * k:3 * k + 3]) for k, nid in enumerate(ids))
+            norm = max(sum(c * c for c in comps[nid]) ** 0.5 for nid in nodes)
+            assert res[0]['max'][row] == pytest.approx(norm, rel=1e-12)
+            for j in range(3):
+                assert res[1 + j]['max'][row] == max(comps[nid][j] for nid in nodes)
+
+
+def test_scalar_kind_reads_one_quantity():
+    index = NodeSetIndex([[1, 2]])
+    assert nx.result_maxima('stress', index, [([1, 2], [5.0, 6.0])]) == [{'max': [6.0], 'node': [2]}]
+
+
+def full_sort_top(fields, time_ids, nodes, n, scale=1.0):
+    peaks = {}
+    for (ids, data), tid in zip(fields, time_ids):
+        values = dict(zip(ids, data))
+        for nid in nodes:
+            if nid not in peaks or values[nid] * scale > peaks[nid][0]:
+                peaks[nid] = (values[nid] * scale, nid, tid)
+    return sorted(peaks.values(), key=lambda e: (-e[0], e[1]))[:n]
+
+
+@pytest.mark.parametrize('n', [1, 5, 1000])
+def test_top_nodes_streamed_per_time_match_a_full_sort(model, n):
+    source = model['source']
+    index = NodeSetIndex(model['node_sets'])
+    union_elements = sorted(set(eid for elems in model['elem_sets'] for eid in elems))
+    top = nx.TopNodes(len(model['node_sets']), n)
+    for tid in TIME_IDS:
+        top.update(index, source.read(union_elements, [tid]), [tid], scale=3.0)
+    fields = source.read(union_elements, TIME_IDS)
+    for s, nodes in enumerate(model['node_sets']):
+        assert top.rows(s) == full_sort_top(fields, TIME_IDS, nodes, n, 3.0)
+    assert top.node_ids() == sorted(set(row[1] for s in range(len(model['node_sets'])) for row in top.rows(s)))
+
+
+def test_top_nodes_of_indexes_of_one_set_each(model):
+    source = model['source']
+    top = nx.TopNodes(len(model['node_sets']), 4)
+    set_indexes = [NodeSetIndex([nodes]) for nodes in model['node_sets']]
+    for s, fields in enumerate(source.read_sets(model['elem_sets'], TIME_IDS)):
+        top.update(set_indexes[s], fields, TIME_IDS, first_set=s)
+    for s, elems in enumerate(model['elem_sets']):
+        fields = source.read(elems, TIME_IDS)
+        assert top.rows(s) == full_sort_top(fields, TIME_IDS, model['node_sets'][s], 4)
+
+
+def test_maxima_rows():
+    maxima = {'max': [1.0, 2.0, 3.0, 4.0], 'node': [10, 11, 12, None]}
+    times = [0.5, 1.0, 1.5]
+    assert nx.maxima_rows(maxima, [2, 3], times) == [[[1.0, 2, 1.0, 10], [1.5, 3, 2.0, 11]],
+                                                     [[1.0, 2, 3.0, 12], [1.5, 3, 4.0, None]]]
+
+
+def test_hotspot_rows():
+    index = NodeSetIndex([[1, 2, 3], [3, 4]])
+    top = nx.TopNodes(2, 2)
+    top.update(index, [([1, 2, 3, 4], [5.0, 7.0, 6.0, 1.0])], [1])
+    top.update(index, [([1, 2, 3, 4], [9.0, 0.0, 0.0, 2.0])], [2])
+    coords = ([4, 3, 2, 1, 8], [4.0, 0.0, 0.0, 3.0, 0.0, 0.0, 2.0, 0.0, 0.0, 1.0, 0.0, 1.5, 8.0, 8.0, 8.0])
+    rows = nx.hotspot_rows(top, ['A', 'B'], [100, 200], coords, [0.1, 0.2])
+    assert rows == [['A', 100, 1, 1, 1.0, 0.0, 1.5, 9.0, 0.2, 2],
+                    ['A', 100, 2, 2, 2.0, 0.0, 0.0, 7.0, 0.1, 1],
+                    ['B', 200, 1, 3, 3.0, 0.0, 0.0, 6.0, 0.1, 1],
+                    ['B', 200, 2, 4, 4.0, 0.0, 0.0, 2.0, 0.2, 2]]
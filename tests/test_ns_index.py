@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from mech_lib import ns_index
+from mech_lib.ns_index import BodyIndex, NamedSelectionIndex, mesh_key, pack_ids, region_ids, unpack_ids
+
+
+class Region(object):
+    def __init__(self, elements, nodes):
+        self.ElementIds = elements
+        self.NodeIds = nodes
+
+
+class Node(object):
+    def __init__(self, nid, shift):
+        self.X, self.Y, self.Z = nid * 0.1 + shift, nid * 0.2, nid * 0.3
+
+
+class Element(object):
+    def __init__(self, eid, shift):
+        self.NodeIds = [2 * eid + shift, 2 * eid + 1 + shift]
+
+
+class MeshData(object):
+    """Stand-in for MeshData: MeshRegionById returns overlapping ID lists of a body or face"""
+
+    def __init__(self, n_regions=40, per_region=10, shift=0):
+        self.ElementCount = n_regions * per_region
+        self.NodeCount = 2 * n_regions * per_region
+        self.ElementIds = range(1, self.ElementCount + 1)
+        self.NodeIds = range(1, self.NodeCount + 1)
+        self.calls = 0
+        self._per = per_region
+        self._shift = shift
+
+    def NodeById(self, nid):
+        return Node(nid, self._shift)
+
+    def ElementById(self, eid):
+        return Element(eid, self._shift)
+
+    def MeshRegionById(self, loc_id):
+        self.calls += 1
+        first = loc_id * self._per // 2
+        return Region(list(range(first, first + self._per)), list(range(2 * first, 2 * first + 2 * self._per)))
+
+
+def brute_force(mesh_data, locations):
+    elements = []
+    nodes = []
+    for loc in locations:
+        region = mesh_data.MeshRegionById(loc)
+        elements += region.ElementIds
+        nodes += region.NodeIds
+    return sorted(set(elements)), sorted(set(nodes))
+
+
+@pytest.mark.parametrize('ids', [[], [7], [3, -1, 2 ** 31 - 1, 0, 3]])
+def test_pack_unpack_round_trip(ids):
+    assert unpack_ids(pack_ids(ids)) == ids
+
+
+def test_mesh_key_detects_a_remesh_with_the_same_counts():
+    mesh_data = MeshData()
+    assert mesh_key(MeshData()) == mesh_key(mesh_data)
+    remeshed = MeshData(shift=1)
+    assert (remeshed.ElementCount, remeshed.NodeCount) == (mesh_data.ElementCount, mesh_data.NodeCount)
+    assert mesh_key(remeshed) != mesh_key(mesh_data)
+
+
+def test_index_matches_the_region_lists_and_is_reused(tmp_path):
+    path = str(tmp_path / ns_index.INDEX_FILE_NAME)
+    mesh_data = MeshData()
+    selections = [(1000, [0, 1, 2]), (1001, [5, 3]), (1002, [])]
+    ref = [brute_force(mesh_data, locs) for ns_id, locs in selections]
+
+    index = NamedSelectionIndex(path, mesh_key(mesh_data))
+    assert [index.ids(ns_id, locs, mesh_data) for ns_id, locs in selections] == ref
+    assert index.built == 3
+    index.save()
+
+    calls = mesh_data.calls
+    loaded = NamedSelectionIndex(path, mesh_key(mesh_data))
+    assert [loaded.ids(ns_id, locs, mesh_data) for ns_id, locs in selections] == ref
+    assert (loaded.built, loaded.reused, mesh_data.calls) == (0, 3, calls)
+
+
+def test_edited_scoping_rebuilds_only_its_entry(tmp_path):
+    path = str(tmp_path / ns_index.INDEX_FILE_NAME)
+    mesh_data = MeshData()
+    index = NamedSelectionIndex(path, mesh_key(mesh_data))
+    index.ids(1000, [0, 1], mesh_data)
+    index.ids(1001, [4], mesh_data)
+    index.save()
+
+    edited = NamedSelectionIndex(path, mesh_key(mesh_data))
+    assert edited.ids(1000, [1], mesh_data) == brute_force(mesh_data, [1])
+    assert edited.ids(1001, [4], mesh_data) == brute_force(mesh_data, [4])
+    assert (edited.built, edited.reused) == (1, 1)
+
+
+def test_new_mesh_key_discards_the_index(tmp_path):
+    path = str(tmp_path / ns_index.INDEX_FILE_NAME)
+    mesh_data = MeshData()
+    index = NamedSelectionIndex(path, mesh_key(mesh_data))
+    index.ids(1000, [0, 1], mesh_data)
+    index.save()
+    remeshed = MeshData(shift=1)
+    assert NamedSelectionIndex(path, mesh_key(remeshed)).sets == {}
+
+
+def test_corrupt_index_file_is_rebuilt(tmp_path):
+    path = str(tmp_path / ns_index.INDEX_FILE_NAME)
+    with open(path, 'w') as f:
+        f.write('{not json')
+    mesh_data = MeshData()
+    index = NamedSelectionIndex(path, mesh_key(mesh_data))
+    assert index.ids(1000, [2], mesh_data) == brute_force(mesh_data, [2])
+    index.save()
+    assert NamedSelectionIndex(path, mesh_key(mesh_data)).sets.keys() == index.sets.keys()
+
+
+def test_body_index_csr_matches_one_region_read_per_body(tmp_path):
+    path = str(tmp_path / ns_index.BODY_INDEX_FILE_NAME)
+    mesh_data = MeshData()
+    body_ids = [0, 3, 7, 8]
+    bodies = BodyIndex(path, mesh_key(mesh_data), body_ids, mesh_data)
+    assert bodies.built and mesh_data.calls == len(body_ids)
+
+    loaded = BodyIndex(path, mesh_key(mesh_data), body_ids, mesh_data)
+    assert not loaded.built and mesh_data.calls == len(body_ids)
+    assert len(loaded) == len(body_ids)
+    for b, body_id in enumerate(body_ids):
+        assert (loaded.elements(b), loaded.nodes(b)) == region_ids(mesh_data, [body_id])
+
+
+def test_body_index_rebuilds_on_new_bodies_or_mesh(tmp_path):
+    path = str(tmp_path / ns_index.BODY_INDEX_FILE_NAME)
+    mesh_data = MeshData()
+    BodyIndex(path, mesh_key(mesh_data), [0, 3], mesh_data)
+    assert BodyIndex(path, mesh_key(mesh_data), [0, 3, 5], mesh_data).built
+    remeshed = MeshData(shift=1)
+    assert BodyIndex(path, mesh_key(remeshed), [0, 3, 5], remeshed).built
+    assert os.listdir(str(tmp_path)) == [ns_index.BODY_INDEX_FILE_NAME]
@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+import traceback
+
+import pytest
+
+from mech_lib.parallel import concurrency_error, format_stats, reraise, run_jobs
+
+JOBS = list(range(6))
+
+
+def slow_square(job):
+    time.sleep(0.01 * (len(JOBS) - job))
+    return job * job
+
+
+@pytest.mark.parametrize('max_workers', [1, 3, 100])
+def test_results_are_in_job_order(max_workers):
+    results, stats = run_jobs(JOBS, slow_square, max_workers)
+    assert results == [j * j for j in JOBS]
+    assert stats['workers'] == min(max_workers, len(JOBS))
+    assert stats['retried'] == [] and len(stats['seconds']) == len(JOBS)
+
+
+def test_concurrency_errors_fall_back_to_the_calling_thread():
+    def flaky(job):
+        if threading.current_thread().name != 'MainThread':
+            raise RuntimeError('no concurrent reads on this thread')
+        return job
+
+    results, stats = run_jobs(JOBS, flaky, 3)
+    assert results == JOBS and stats['retried'] == JOBS
+    assert 'run again serially' in format_stats(['Analysis %d' % j for j in JOBS], stats)
+
+
+def test_no_fallback_raises_the_concurrency_error():
+    def locked(job):
+        raise IOError('result file is locked')
+
+    with pytest.raises(IOError):
+        run_jobs(JOBS, locked, 3, fallback=False)
+
+
+def test_deterministic_error_is_raised_once_with_the_worker_traceback():
+    calls = []
+
+    def broken(job):
+        calls.append(job)
+        raise ValueError('invalid input')
+
+    with pytest.raises(ValueError) as info:
+        run_jobs(JOBS, broken, 3)
+    assert sorted(calls) == JOBS
+    assert 'broken' in [frame.name for frame in traceback.extract_tb(info.value.__traceback__)]
+
+
+def test_reraise_keeps_the_original_traceback():
+    def fail():
+        raise KeyError('x')
+
+    try:
+        fail()
+    except KeyError:
+        saved = sys.exc_info()
+    with pytest.raises(KeyError) as info:
+        reraise(saved)
+    assert info.value is saved[1]
+    assert 'fail' in [frame.name for frame in traceback.extract_tb(info.value.__traceback__)]
+
+
+@pytest.mark.parametrize('exc, expected', [(IOError('x'), True), (OSError('x'), True),
+                                           (RuntimeError('File is in use by another process'), True),
+                                           (RuntimeError('Lock timeout'), True), (ValueError('bad input'), False)])
+def test_concurrency_error(exc, expected):
+    assert concurrency_error(exc) is expected
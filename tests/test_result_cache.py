@@ -0,0 +1,77 @@
+import os
+
+from mech_lib.result_cache import KEY_FILE, ResultCache, join_sets, result_file_key, split_sets
+
+N_OBJECTS = 4
+
+
+def columns(set_ids, n_columns=3):
+    n = len(set_ids)
+    return [[o * 0.5 + set_ids[t] + c for o in range(N_OBJECTS) for t in range(n)] for c in range(n_columns)]
+
+
+def make_rst(tmp_path):
+    rst = tmp_path / 'file.rst'
+    rst.write_bytes(b'\0' * 64)
+    return str(rst)
+
+
+def test_split_and_join_sets_round_trip():
+    cols = columns([1, 2, 3])
+    values = split_sets(cols, 3)
+    assert len(values) == 3 and len(values[0]) == N_OBJECTS * 3
+    assert list(values[1][:3]) == [2.0, 3.0, 4.0]
+    assert join_sets(values, 3) == cols
+
+
+def test_round_trip_through_the_cache_in_chunks(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), {'units': ['in']}, 3)
+    cache.put_columns([1, 2], columns([1, 2]))
+    cache.put_columns([3], columns([3]))
+    chunks = list(cache.iter_columns([1, 2, 3], chunk_size=2))
+    assert [(start, chunk) for start, chunk, cols in chunks] == [(0, [1, 2]), (2, [3])]
+    assert chunks[0][2] == columns([1, 2]) and chunks[1][2] == columns([3])
+    assert list(cache.iter_columns([3, 1]))[0][2] == columns([3, 1])
+
+
+def test_missing_sets_keep_the_requested_order(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), {}, 3)
+    cache.put_columns([2, 4], columns([2, 4]))
+    assert cache.missing([5, 4, 3, 2, 1]) == [5, 3, 1]
+    reopened = ResultCache(str(tmp_path / 'cache'), {}, 3)
+    assert reopened.missing([1, 2, 3, 4]) == [1, 3]
+
+
+def test_a_new_result_file_invalidates_every_set(tmp_path):
+    rst = make_rst(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    ResultCache(cache_dir, {'result_file': result_file_key(rst)}, 3).put_columns([1, 2], columns([1, 2]))
+    assert ResultCache(cache_dir, {'result_file': result_file_key(rst)}, 3).missing([1, 2]) == []
+    with open(rst, 'ab') as f:
+        f.write(b'\0')
+    assert ResultCache(cache_dir, {'result_file': result_file_key(rst)}, 3).missing([1, 2]) == [1, 2]
+
+
+def test_other_key_parts_and_column_count_invalidate(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    ResultCache(cache_dir, {'units': ['in', 'lbf']}, 3).put_columns([1], columns([1]))
+    assert ResultCache(cache_dir, {'units': ('in', 'lbf')}, 3).missing([1]) == []
+    assert ResultCache(cache_dir, {'units': ['mm', 'N']}, 3).missing([1]) == [1]
+    ResultCache(cache_dir, {'units': ['mm', 'N']}, 3).put_columns([1], columns([1]))
+    assert ResultCache(cache_dir, {'units': ['mm', 'N']}, 2).missing([1]) == [1]
+
+
+def test_invalidation_leaves_other_files_alone(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    ResultCache(str(cache_dir), {'v': 1}, 3).put_columns([1], columns([1]))
+    (cache_dir / 'notes.txt').write_text(u'keep')
+    (cache_dir / 'sub').mkdir()
+    ResultCache(str(cache_dir), {'v': 2}, 3)
+    assert sorted(os.listdir(str(cache_dir))) == sorted([KEY_FILE, 'notes.txt', 'sub'])
+
+
+def test_corrupt_key_file_clears_the_cache(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    ResultCache(str(cache_dir), {}, 3).put_columns([1], columns([1]))
+    (cache_dir / KEY_FILE).write_text(u'{not json')
+    assert ResultCache(str(cache_dir), {}, 3).missing([1]) == [1]
@@ -0,0 +1,37 @@
+from mech_lib.fields import fields_by_time
+from mech_lib import section_cuts as sc
+
+
+def test_connectivity_from_field_variable_element_sizes():
+    node_ids = [101, 102, 103, 104, 105, 106]
+    field_ids = [7, 8, 9]
+    data_pointer = [0, 4, 7]
+    node_indexes = [0, 1, 2, 3, 2, 3, 4, 1, 5]
+    got = sc.connectivity_from_field([9, 7], field_ids, data_pointer, node_indexes, node_ids)
+    assert got == {7: [101, 102, 103, 104], 9: [102, 106]}
+
+
+def test_fields_by_time_merges_fields_of_the_same_set():
+    fields = [(2, [1], [1.0, 2.0, 3.0]), (1, [5], [4.0, 5.0, 6.0]), (2, [3], [7.0, 8.0, 9.0]), (4, [1], [0.0] * 3)]
+    got = fields_by_time(fields, [1, 2, 3])
+    assert got == [([5], [4.0, 5.0, 6.0]), ([1, 3], [1.0, 2.0, 3.0, 7.0, 8.0, 9.0]), ([], [])]
+
+
+def test_split_read_evaluates_like_one_field_per_set():
+    connectivity = {1: [1, 2], 2: [2, 3], 3: [3, 4]}
+    coords = {1: [0.0, 0.0, 0.0], 2: [1.0, 0.0, 0.0], 3: [2.0, 0.0, 0.0], 4: [3.0, 0.0, 0.0]}
+    element_ids = [1, 2, 3]
+    centroids = sc.element_centroids(element_ids, connectivity, coords)
+    cut = sc.SectionCut('Cut', [1.5, 0.0, 0.0], [1.0, 0.0, 0.0], element_ids, centroids, connectivity, coords)
+    source = sc.SyntheticElementNodalForceSource(connectivity, [1, 2])
+    whole = source.read(sc.cut_elements([cut]), [1, 2])
+    split = []
+    for t, (ids, data) in zip([1, 2], whole):
+        for k, eid in enumerate(ids):
+            split.append((t, [eid], data[6 * k:6 * k + 6]))
+    split.reverse()
+    merged = fields_by_time(split, [1, 2])
+    ref = sc.evaluate_cuts([cut], whole, connectivity)
+    got = sc.evaluate_cuts([cut], merged, connectivity)
+    for key in sc.COLUMN_KEYS:
+        assert all(abs(a - b) < 1e-12 for a, b in zip(got[key], ref[key]))
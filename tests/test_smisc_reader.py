@@ -0,0 +1,47 @@
+import pytest
+
+from mech_lib.beam_resultants import BEAM_ITEMS
+from mech_lib.smisc_reader import SyntheticSmiscSource, item_runs, read_smisc_block
+
+ELEMENT_IDS = list(range(100001, 100031))
+TIME_IDS = [1, 2, 3]
+
+
+@pytest.fixture
+def source():
+    return SyntheticSmiscSource(ELEMENT_IDS, TIME_IDS)
+
+
+def test_item_runs_without_gap_limit_is_one_run():
+    assert item_runs([14, 1, 5, 5, 19]) == [(1, 19)]
+    assert item_runs([]) == []
+
+
+def test_item_runs_split_on_gaps_larger_than_max_gap():
+    assert item_runs([1, 2, 3, 14, 15, 19], max_gap=3) == [(1, 3), (14, 6)]
+    assert item_runs([1, 2, 3, 14, 15, 19], max_gap=0) == [(1, 3), (14, 2), (19, 1)]
+    assert item_runs([31, 36, 40], max_gap=4) == [(31, 10)]
+
+
+@pytest.mark.parametrize('max_gap', [None, 0, 3])
+def test_batched_read_matches_one_read_per_item(source, max_gap):
+    single = {}
+    for name, idx in BEAM_ITEMS.items():
+        single.update(read_smisc_block(source, {name: idx}, ELEMENT_IDS, TIME_IDS))
+    source.reads = 0
+    batched = read_smisc_block(source, BEAM_ITEMS, ELEMENT_IDS, TIME_IDS, max_gap=max_gap)
+    assert batched == single
+    assert source.reads == len(item_runs(BEAM_ITEMS.values(), max_gap))
+
+
+def test_block_layout_and_factors(source):
+    block = read_smisc_block(source, {'FX_J': 14, 'MY_I': 2}, ELEMENT_IDS, TIME_IDS, factors={'FX_J': 2.0})
+    n_times = len(TIME_IDS)
+    assert block['FX_J'][n_times + 1] == 2.0 * source.value(14, ELEMENT_IDS[1], TIME_IDS[1])
+    assert block['MY_I'][2 * n_times] == source.value(2, ELEMENT_IDS[2], TIME_IDS[0])
+
+
+def test_elements_missing_from_the_result_are_zero(source):
+    block = read_smisc_block(source, {'FX_I': 1}, [99, ELEMENT_IDS[0]], TIME_IDS)
+    assert block['FX_I'][:3] == [0.0] * 3
+    assert block['FX_I'][3] == source.value(1, ELEMENT_IDS[0], TIME_IDS[0])
@@ -0,0 +1,83 @@
+import csv
+import math
+
+import pytest
+
+from mech_lib.fatigue import NodeMaterialIndex, SNCurve
+from mech_lib.spectral_fatigue import (CsvStressPsdSource, SpectralGrid, SyntheticStressPsdSource, damage_by_node,
+                                       iter_node_chunks, psd_damage)
+
+A_COEF = 200000.0
+K = 8.0
+DURATION = 3600.0
+FREQS = [10.0 + 990.0 * j / 299 for j in range(300)]
+
+
+def power_law_curves():
+    """N = (S / A)^(-k), tabulated far below and above the stresses of the tests"""
+    grid_n = [10.0 ** e for e in range(0, 40)]
+    return {'Steel': SNCurve([A_COEF * n ** (-1.0 / K) for n in grid_n], grid_n)}
+
+
+def test_flat_band_moment():
+    grid = SpectralGrid(FREQS)
+    m0 = grid.moments([100.0 if 80.0 <= f <= 120.0 else 0.0 for f in FREQS])[0]
+    lo = max(f for f in FREQS if f < 80.0)
+    hi = min(f for f in FREQS if f > 120.0)
+    inside = [f for f in FREQS if 80.0 <= f <= 120.0]
+    exact = 100.0 * (inside[-1] - inside[0]) + 50.0 * (inside[0] - lo) + 50.0 * (hi - inside[-1])
+    assert m0 == pytest.approx(exact, rel=1e-9)
+
+
+def test_narrow_band_closed_form_and_dirlik_bound():
+    node_ids = list(range(1, 41))
+    index = NodeMaterialIndex([node_ids], ['Steel'])
+    source = SyntheticStressPsdSource(node_ids, FREQS)
+    res = psd_damage(SpectralGrid(FREQS), index, node_ids, [row for nid, row in source.read()], power_law_curves(),
+                     DURATION)
+    for j in range(len(node_ids)):
+        m0, m2 = res['m0'][j], res['m2'][j]
+        # v0 T (sqrt(2) sigma)^k Gamma(1 + k/2) / A^k
+        exact = math.sqrt(m2 / m0) * DURATION * math.sqrt(2.0 * m0) ** K * math.gamma(1.0 + K / 2.0) / A_COEF ** K
+        assert res['narrow_band'][j] == pytest.approx(exact, rel=1e-3)
+        # Dirlik is below the conservative narrow-band damage of a broad-band response
+        assert res['dirlik'][j] <= res['narrow_band'][j] * (1.0 + 1e-6)
+
+
+def test_zero_psd_has_no_damage():
+    index = NodeMaterialIndex([[1]], ['Steel'])
+    res = psd_damage(SpectralGrid(FREQS), index, [1], [[0.0] * len(FREQS)], power_law_curves(), DURATION)
+    assert (res['narrow_band'], res['dirlik']) == ([0.0], [0.0])
+
+
+def test_chunks_and_csv_source_match_one_pass(tmp_path):
+    node_ids = list(range(1, 31))
+    index = NodeMaterialIndex([node_ids], ['Steel'])
+    curves = power_law_curves()
+    source = SyntheticStressPsdSource(node_ids, FREQS)
+    whole = damage_by_node(source, index, curves, DURATION)
+    assert damage_by_node(source, index, curves, DURATION, chunk_size=7) == whole
+    assert [len(ids) for ids, rows in iter_node_chunks(source.read(), 7)] == [7, 7, 7, 7, 2]
+    subset = damage_by_node(source, index, curves, DURATION, set(node_ids[::2]), chunk_size=4)
+    assert subset == dict((nid, whole[nid]) for nid in node_ids[::2])
+
+    # MPa read as psi x 145.04
+    path = str(tmp_path / 'stress_psd.csv')
+    with open(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Node'] + FREQS)
+        for nid, row in source.read():
+            writer.writerow([nid] + [g / 145.04 ** 2 for g in row])
+    from_csv = damage_by_node(CsvStressPsdSource(path, 145.04), index, curves, DURATION, chunk_size=5)
+    for nid in node_ids:
+        assert from_csv[nid] == pytest.approx(whole[nid], rel=1e-9)
+
+
+@pytest.mark.parametrize('line', [5, 299])
+def test_single_line_psd_is_narrow_band(line):
+    index = NodeMaterialIndex([[1]], ['Steel'])
+    psd = [0.0] * len(FREQS)
+    psd[line] = 100.0
+    res = psd_damage(SpectralGrid(FREQS), index, [1], [psd], power_law_curves(), DURATION)
+    assert res['narrow_band'][0] > 0.0
+    assert res['dirlik'] == res['narrow_band']